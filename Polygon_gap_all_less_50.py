@@ -1,18 +1,37 @@
 #.. TCPL_Polygon gap calculation tool <50m (v1.0)
 
-import arcpy, os, math, time, uuid
+import arcpy, os, sys, math, time, uuid
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    pass
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.layer_pool import layer_workers, map_layers
+from tcpl_qc.opening_windows import window_boxes
+from tcpl_qc.raster_opening import raster_narrow_parts
+from tcpl_qc.segments import part_areas, part_ring_arrays, ring_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.triangulation import triangulation_narrow_parts
+
+run = RunRecord("Polygon_gap_all_less_50.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 LAYER_NAMES = ["AgricultureSurfaces", "HydrographySurfaces", "PhysiographySurfaces", "VegetationSurfaces"]
 THRESHOLD_M = 50.0
 MIN_AREA_M2 = 10.0
 XY_TOL_M = 0.001
 OUT_NAME = "polygon_gap_less_50"
+NARROW_MODE = "opening"   # "opening" = buffer/erase chain; "raster" = distance transform on a grid (faster, approximate);
+                          # "triangulation" = widths of the polygon's triangles (no buffers, follows its vertices)
+RASTER_CELL_M = 2.0       # raster mode cell size; parts are accurate to about one cell
+WORKERS = 0               # layer processes; 0 = one per CPU, at most one per layer
+OPENING_WINDOWS = True    # open/erase only near boundary segments closer than THRESHOLD_M (same result)
 
 RADIUS_M = THRESHOLD_M / 2.0
 
@@ -21,7 +40,7 @@ def msg(s):
     try:
         print(s)
     except:
-        pass
+        run.swallowed("print")
 
 def all_layers():
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -46,23 +65,25 @@ def gdb_of_fc(fc_path):
         return p2
     return p1
 
-def get_scratch_gdb(fallback_fc):
+def layer_scratch_gdb(fallback_fc, layer_label):
+    # A file geodatabase of its own for one worker process, so workers never share a lock.
+    folder = None
     try:
-        sg = arcpy.env.scratchGDB
-        if sg and arcpy.Exists(sg):
-            return sg
+        folder = arcpy.env.scratchFolder
     except:
-        pass
-    return gdb_of_fc(fallback_fc)
+        run.swallowed("scratchFolder")
+    if not folder or not os.path.isdir(folder):
+        folder = os.path.dirname(gdb_of_fc(fallback_fc))
+    name = "tcpl_%s_%s.gdb" % (layer_label, uuid.uuid4().hex[:8])
+    arcpy.CreateFileGDB_management(folder, name)
+    return os.path.join(folder, name)
 
-def unique_name(prefix, ws):
-    return arcpy.CreateUniqueName("%s_%s" % (prefix, uuid.uuid4().hex[:8]), ws)
-
-def ensure_metric_projected(in_fc, proj_ws):
+def metric_sr_of(in_fc):
+    """(sr, zone) of a metric SR for in_fc: its own when projected in metres (zone None), else UTM."""
     d = arcpy.Describe(in_fc)
     sr = d.spatialReference
     if sr and sr.type == "Projected" and sr.linearUnitName and sr.linearUnitName.lower().startswith("meter"):
-        return in_fc, sr
+        return sr, None
     ext = d.Extent
     center_pt = arcpy.Point((ext.XMin + ext.XMax) / 2.0, (ext.YMin + ext.YMax) / 2.0)
     center_geom = arcpy.PointGeometry(center_pt, sr)
@@ -71,17 +92,13 @@ def ensure_metric_projected(in_fc, proj_ws):
     lat = center_wgs.firstPoint.Y
     zone = int(math.floor((lon + 180.0) / 6.0) + 1)
     epsg = (32600 if lat >= 0 else 32700) + zone
-    utm = arcpy.SpatialReference(epsg)
-    out_fc = unique_name("tmp_proj", proj_ws)
-    msg("  Projecting to UTM Zone %d (EPSG:%d) in %s" % (zone, epsg, proj_ws))
-    arcpy.Project_management(in_fc, out_fc, utm)
-    return out_fc, utm
+    return arcpy.SpatialReference(epsg), zone
 
-def create_out_fc(out_dataset, template_sr):
-    out_fc = os.path.join(out_dataset, OUT_NAME)
+def create_gap_fc(workspace, name, template_sr):
+    out_fc = os.path.join(workspace, name)
     if arcpy.Exists(out_fc):
         arcpy.Delete_management(out_fc)
-    arcpy.CreateFeatureclass_management(out_dataset, OUT_NAME, "POLYGON", spatial_reference=template_sr)
+    arcpy.CreateFeatureclass_management(workspace, name, "POLYGON", spatial_reference=template_sr)
     arcpy.AddField_management(out_fc, "SourceLayer", "TEXT", field_length=40)
     arcpy.AddField_management(out_fc, "ParentOID", "LONG")
     arcpy.AddField_management(out_fc, "threshold_m", "DOUBLE")
@@ -89,87 +106,236 @@ def create_out_fc(out_dataset, template_sr):
     arcpy.AddField_management(out_fc, "method", "TEXT", field_length=20)
     return out_fc
 
+def create_out_fc(out_dataset, template_sr):
+    return create_gap_fc(out_dataset, OUT_NAME, template_sr)
+
+def parts_fc(part_fc, out_sr):
+    # Where a layer's parts go: the output itself in a serial run, or a
+    # feature class the worker creates in its own scratch geodatabase.
+    if not arcpy.Exists(part_fc):
+        create_gap_fc(os.path.dirname(part_fc), os.path.basename(part_fc), out_sr)
+    return part_fc
+
 def get_dataset_path(fc_path):
     parent = os.path.dirname(fc_path)
     return parent
 
-def get_fid_field_name(fc):
-    for f in arcpy.ListFields(fc):
-        if f.name.upper().startswith("FID_"):
-            return f.name
-    return None
+def read_polygons(src_fc):
+    # (OID, polygon) one at a time, as the cursor hands them out.
+    with arcpy.da.SearchCursor(src_fc, ["OID@", "SHAPE@"]) as cur:
+        for oid, geom in cur:
+            if geom is not None:
+                yield int(oid), geom
+
+def explode(polygons):
+    # MultipartToSinglepart: one polygon per outer ring, with its holes.
+    for oid, geom in polygons:
+        for i in range(geom.partCount):
+            yield oid, arcpy.Polygon(geom.getPart(i), geom.spatialReference)
+
+def repair(polygons):
+    # RepairGeometry: a union with itself simplifies the rings (orientation,
+    # self-intersections, repeated vertices); empty polygons are dropped.
+    for oid, geom in polygons:
+        try:
+            fixed = geom.union(geom)
+        except:
+            run.swallowed("repair")
+            continue
+        if fixed and fixed.area > 0:
+            run.count("polygons_in")
+            yield oid, fixed
+
+def project(polygons, sr):
+    # sr None: already metric.
+    for oid, geom in polygons:
+        yield oid, (geom if sr is None else geom.projectAs(sr))
+
+def union_all(geoms):
+    # Pairwise, so n shapes take log2(n) rounds of unions.
+    while len(geoms) > 1:
+        geoms = [geoms[i].union(geoms[i + 1]) if i + 1 < len(geoms) else geoms[i] for i in range(0, len(geoms), 2)]
+    return geoms[0]
+
+def box_union(boxes, grow, sr):
+    polys = []
+    for x0, y0, x1, y1 in boxes.tolist():
+        x0, y0, x1, y1 = x0 - grow, y0 - grow, x1 + grow, y1 + grow
+        corners = [arcpy.Point(x0, y0), arcpy.Point(x0, y1), arcpy.Point(x1, y1), arcpy.Point(x1, y0), arcpy.Point(x0, y0)]
+        polys.append(arcpy.Polygon(arcpy.Array(corners), sr))
+    return union_all(polys)
+
+def window_shapes(geom, metric_sr):
+    # Narrow parts only exist inside the windows of tcpl_qc.opening_windows and
+    # only depend on the polygon within 2 * RADIUS_M of them. Returns (windows
+    # grown by that much, windows), or None when nothing of the polygon is narrow.
+    try:
+        rings = ring_arrays(geom)
+    except:
+        run.swallowed("ring_arrays")
+        return None
+    if not len(rings[0]):
+        return None
+    _owner, boxes = window_boxes(FeatureStore.from_lines([0], [rings]), RADIUS_M, XY_TOL_M, stats=run.counters)
+    if not len(boxes):
+        return None
+    run.count("polygons_windowed")
+    return box_union(boxes, 2.0 * RADIUS_M, metric_sr), box_union(boxes, 0.0, metric_sr)
 
-def process_one_layer(src_fc, layer_label, out_fc, out_sr):
+def open_and_erase(polygons, metric_sr, windowed):
+    # Buffer -r / Buffer +r / Erase on one metric polygon at a time; windowed,
+    # on the piece of it around its windows only (the cut edges look narrow,
+    # so the result is cut back to the windows). Yields (OID, gap).
+    for oid, geom in polygons:
+        piece, windows = geom, None
+        if windowed:
+            shapes = window_shapes(geom, metric_sr)
+            if shapes is None:
+                continue
+            grown, windows = shapes
+            piece = geom.intersect(grown, 4)
+            if not piece or piece.area <= 0:
+                continue
+        try:
+            neg = piece.buffer(-RADIUS_M)
+        except:
+            run.swallowed("negative_buffer")
+            neg = None
+        try:
+            gap = piece.difference(neg.buffer(RADIUS_M)) if neg and neg.area > 0 else piece
+        except:
+            run.swallowed("erase")
+            continue
+        if windows is not None and gap and gap.area > 0:
+            gap = gap.intersect(windows, 4)
+        if gap and gap.area > 0:
+            yield oid, gap
+
+def area_filter(gaps, metric_sr):
+    # (OID, gap, area_m2) with the parts of every gap under MIN_AREA_M2
+    # dropped straight after the erase. One shoelace pass over all rings of
+    # the gap gives the area of each of its parts (metric, so m2). The
+    # raster and triangulation modes drop and count their parts under
+    # MIN_AREA_M2 one by one as well.
+    for oid, gap in gaps:
+        try:
+            xy, offsets, part_of = part_ring_arrays(gap)
+        except:
+            run.swallowed("ring_arrays")
+            continue
+        areas = part_areas(xy, offsets, part_of, gap.partCount)
+        keep = [i for i, a in enumerate(areas.tolist()) if a >= MIN_AREA_M2]
+        run.count("parts_below_min_area", len(areas) - len(keep))
+        if not keep:
+            continue
+        if len(keep) < len(areas):
+            gap = arcpy.Polygon(arcpy.Array([gap.getPart(i) for i in keep]), metric_sr)
+        yield oid, gap, float(areas[keep].sum())
+
+def back_project(gaps, metric_sr, out_sr):
+    for oid, gap, area in gaps:
+        if out_sr and out_sr.name != metric_sr.name:
+            gap = gap.projectAs(out_sr)
+        yield oid, gap, area
+
+def process_one_layer(src_fc, layer_label, out_sr, part_fc):
+    # Inserts the layer's parts into part_fc and returns how many. Each polygon is exploded, repaired,
+    # projected, opened, erased, filtered and projected back on its own and
+    # written before the next one is read: no intermediate feature classes,
+    # and ParentOID is the OID it was read with.
     msg("Processing: %s" % layer_label)
     if arcpy.Describe(src_fc).shapeType.upper() != "POLYGON":
         msg("  Skipped (not polygon): %s" % layer_label)
         return 0
-    scratch_ws = get_scratch_gdb(src_fc)
-    sel_fc = arcpy.CreateUniqueName("tmp_sel", "in_memory")
-    arcpy.CopyFeatures_management(src_fc, sel_fc)
-    sp_fc = arcpy.CreateUniqueName("tmp_sp", "in_memory")
-    arcpy.MultipartToSinglepart_management(sel_fc, sp_fc)
-    arcpy.RepairGeometry_management(sp_fc)
-    metric_fc, metric_sr = ensure_metric_projected(sp_fc, scratch_ws)
-    neg_fc = arcpy.CreateUniqueName("tmp_neg", "in_memory")
-    try:
-        arcpy.Buffer_analysis(metric_fc, neg_fc, "-%g Meters" % RADIUS_M, dissolve_option="NONE", method="PLANAR")
-    except:
-        neg_fc = arcpy.CreateUniqueName("tmp_neg_empty", "in_memory")
-        arcpy.CreateFeatureclass_management("in_memory", os.path.basename(neg_fc), "POLYGON", spatial_reference=metric_sr)
-    opened_fc = arcpy.CreateUniqueName("tmp_open", "in_memory")
-    if int(arcpy.GetCount_management(neg_fc).getOutput(0)) > 0:
-        arcpy.Buffer_analysis(neg_fc, opened_fc, "%g Meters" % RADIUS_M, dissolve_option="NONE", method="PLANAR")
-    else:
-        opened_fc = arcpy.CreateUniqueName("tmp_open_empty", "in_memory")
-        arcpy.CreateFeatureclass_management("in_memory", os.path.basename(opened_fc), "POLYGON", spatial_reference=metric_sr)
-    gap_tmp = arcpy.CreateUniqueName("tmp_gap", "in_memory")
-    try:
-        arcpy.Erase_analysis(metric_fc, opened_fc, gap_tmp)
-    except:
-        gap_tmp = arcpy.CreateUniqueName("tmp_gap_empty", "in_memory")
-        arcpy.CreateFeatureclass_management("in_memory", os.path.basename(gap_tmp), "POLYGON", spatial_reference=metric_sr)
-    if int(arcpy.GetCount_management(gap_tmp).getOutput(0)) > 0:
-        if "area_m2" not in [f.name.lower() for f in arcpy.ListFields(gap_tmp)]:
-            arcpy.AddField_management(gap_tmp, "area_m2", "DOUBLE")
-        arcpy.CalculateField_management(gap_tmp, "area_m2", "!shape.area@SQUAREMETERS!", "PYTHON_9.3")
-        if MIN_AREA_M2 > 0:
-            gap_lyr = arcpy.MakeFeatureLayer_management(gap_tmp, "gap_lyr").getOutput(0)
-            arcpy.SelectLayerByAttribute_management(gap_lyr, "NEW_SELECTION", "area_m2 >= %g" % MIN_AREA_M2)
-            gap_clean = arcpy.CreateUniqueName("tmp_gap_clean", "in_memory")
-            arcpy.CopyFeatures_management(gap_lyr, gap_clean)
-            gap_tmp = gap_clean
-    tagged = arcpy.CreateUniqueName("tmp_tag", "in_memory")
-    try:
-        arcpy.Identity_analysis(gap_tmp, metric_fc, tagged, "ONLY_FID")
-    except:
-        tagged = gap_tmp
-    back_proj = unique_name("tmp_backproj", scratch_ws)
-    arcpy.Project_management(tagged, back_proj, out_sr)
-    fid_field = get_fid_field_name(back_proj)
-    if fid_field and fid_field != "ParentOID":
-        if "ParentOID" not in [f.name for f in arcpy.ListFields(back_proj)]:
-            arcpy.AddField_management(back_proj, "ParentOID", "LONG")
-        arcpy.CalculateField_management(back_proj, "ParentOID", "!%s!" % fid_field, "PYTHON_9.3")
-    if "SourceLayer" not in [f.name for f in arcpy.ListFields(back_proj)]:
-        arcpy.AddField_management(back_proj, "SourceLayer", "TEXT", field_length=40)
-    if "threshold_m" not in [f.name for f in arcpy.ListFields(back_proj)]:
-        arcpy.AddField_management(back_proj, "threshold_m", "DOUBLE")
-    if "method" not in [f.name for f in arcpy.ListFields(back_proj)]:
-        arcpy.AddField_management(back_proj, "method", "TEXT", field_length=20)
-    if "area_m2" not in [f.name.lower() for f in arcpy.ListFields(back_proj)]:
-        arcpy.AddField_management(back_proj, "area_m2", "DOUBLE")
-        arcpy.CalculateField_management(back_proj, "area_m2", "!shape.area@SQUAREMETERS!", "PYTHON_9.3")
-    arcpy.CalculateField_management(back_proj, "SourceLayer", "'%s'" % layer_label, "PYTHON_9.3")
-    arcpy.CalculateField_management(back_proj, "threshold_m", THRESHOLD_M, "PYTHON_9.3")
-    arcpy.CalculateField_management(back_proj, "method", "'Opening'", "PYTHON_9.3")
-    if int(arcpy.GetCount_management(back_proj).getOutput(0)) > 0:
-        arcpy.Append_management(back_proj, out_fc, "NO_TEST")
-        return int(arcpy.GetCount_management(back_proj).getOutput(0))
+    metric_sr, zone = metric_sr_of(src_fc)
+    if zone is not None:
+        msg("  Projecting to UTM Zone %d (EPSG:%d) per polygon" % (zone, metric_sr.factoryCode))
+    part_fc = parts_fc(part_fc, out_sr)
+    polygons = project(repair(explode(read_polygons(src_fc))), metric_sr if zone is not None else None)
+    gaps = area_filter(open_and_erase(polygons, metric_sr, OPENING_WINDOWS), metric_sr)
+    gaps = back_project(gaps, metric_sr, out_sr)
+    count = 0
+    with run.stage("%s opening" % layer_label):
+        fields = ["SHAPE@", "SourceLayer", "ParentOID", "threshold_m", "area_m2", "method"]
+        with arcpy.da.InsertCursor(part_fc, fields) as ic:
+            for oid, gap, area in gaps:
+                ic.insertRow([gap, layer_label, oid, THRESHOLD_M, area, "Opening"])
+                count += 1
+    return count
+
+def rings_polygon(xy, offsets, sr):
+    # Holes are counter-clockwise rings, so arcpy sorts them from the outer rings itself.
+    rings = arcpy.Array()
+    for k in range(len(offsets) - 1):
+        rings.add(arcpy.Array([arcpy.Point(x, y) for x, y in xy[offsets[k]:offsets[k + 1]].tolist()]))
+    return arcpy.Polygon(rings, sr)
+
+def process_one_layer_headless(src_fc, layer_label, out_sr, part_fc):
+    # NARROW_MODE = "raster" or "triangulation": same output as
+    # process_one_layer, from tcpl_qc.raster_opening or
+    # tcpl_qc.triangulation instead of Buffer/Buffer/Erase.
+    if NARROW_MODE == "raster":
+        msg("Processing (raster %g m): %s" % (RASTER_CELL_M, layer_label))
     else:
+        msg("Processing (triangulation): %s" % layer_label)
+    d = arcpy.Describe(src_fc)
+    if d.shapeType.upper() != "POLYGON":
+        msg("  Skipped (not polygon): %s" % layer_label)
         return 0
+    metric_sr, zone = metric_sr_of(src_fc)
+    if zone is not None:
+        msg("  Projecting to UTM Zone %d (EPSG:%d) while reading" % (zone, metric_sr.factoryCode))
+    oids, lines = [], []
+    with run.stage("%s read" % layer_label):
+        with arcpy.da.SearchCursor(src_fc, ["OID@", "SHAPE@"], spatial_reference=metric_sr) as cur:
+            for oid, geom in cur:
+                if geom is None:
+                    continue
+                try:
+                    rings = ring_arrays(geom)
+                except:
+                    run.swallowed("ring_arrays")
+                    continue
+                if len(rings[0]):
+                    oids.append(int(oid))
+                    lines.append(rings)
+    run.count("polygons_in", len(oids))
+    with run.stage("%s opening" % layer_label):
+        polygons = FeatureStore.from_lines(oids, lines)
+        del lines
+        if NARROW_MODE == "raster":
+            windows = window_boxes(polygons, RADIUS_M, XY_TOL_M, stats=run.counters) if OPENING_WINDOWS else None
+            parts, areas = raster_narrow_parts(polygons, RADIUS_M, RASTER_CELL_M, min_area=MIN_AREA_M2,
+                                               windows=windows, stats=run.counters)
+            method = "Raster"
+        else:
+            parts, areas = triangulation_narrow_parts(polygons, THRESHOLD_M, min_area=MIN_AREA_M2,
+                                                      stats=run.counters)
+            method = "Triangulation"
+    with run.stage("%s write" % layer_label):
+        part_fc = parts_fc(part_fc, out_sr)
+        fields = ["SHAPE@", "SourceLayer", "ParentOID", "threshold_m", "area_m2", "method"]
+        with arcpy.da.InsertCursor(part_fc, fields) as ic:
+            for k in range(len(parts)):
+                xy, offsets = parts.line(k)
+                shape = rings_polygon(xy, offsets, metric_sr)
+                if out_sr and out_sr.name != metric_sr.name:
+                    shape = shape.projectAs(out_sr)
+                ic.insertRow([shape, layer_label, int(parts.oid[k]), THRESHOLD_M, float(areas[k]), method])
+    return len(parts)
+
+def layer_job(src_fc, layer_label, out_sr_text, part_fc):
+    # One map_layers job. The spatial reference comes as its
+    # exportToString() text: workers started afresh (Windows, ArcMap) get
+    # their jobs pickled, and arcpy objects do not pickle.
+    out_sr = arcpy.SpatialReference()
+    out_sr.loadFromString(out_sr_text)
+    fn = process_one_layer if NARROW_MODE == "opening" else process_one_layer_headless
+    return fn(src_fc, layer_label, out_sr, part_fc)
 
 def main():
+    if NARROW_MODE not in ("opening", "raster", "triangulation"):
+        raise RuntimeError("NARROW_MODE must be 'opening', 'raster' or 'triangulation', not %r" % NARROW_MODE)
     arcpy.env.XYTolerance = "%g Meters" % XY_TOL_M
     first_found = None
     layer_map = {}
@@ -186,16 +352,40 @@ def main():
     out_sr = arcpy.Describe(src_fc).spatialReference
     msg("Output dataset: %s" % out_dataset)
     out_fc = create_out_fc(out_dataset, out_sr)
-    total = 0
+    run.output = out_fc
+    found = []
     for name in LAYER_NAMES:
         lyr = layer_map.get(name)
         if not lyr:
             msg("Skipping (not found): %s" % name)
             continue
-        fc = lyr.dataSource
-        count = process_one_layer(fc, name, out_fc, out_sr)
-        msg("  Added %d parts from %s" % (count, name))
-        total += count
+        found.append((lyr.dataSource, name))
+    # One process inserts every layer's parts straight into the output. With
+    # several workers every layer writes into a scratch geodatabase of its
+    # own, appended here in LAYER_NAMES order and then deleted.
+    workers = layer_workers(WORKERS, len(found))
+    if workers > 1:
+        msg("Processing %d layers on %d worker processes" % (len(found), workers))
+        targets = [os.path.join(layer_scratch_gdb(fc, name), "tmp_%s_gap" % NARROW_MODE) for fc, name in found]
+    else:
+        targets = [out_fc] * len(found)
+    jobs = [(fc, name, out_sr.exportToString(), part_fc) for (fc, name), part_fc in zip(found, targets)]
+    counts = map_layers(layer_job, jobs, workers, run)
+    total = 0
+    with run.stage("merge"):
+        for (fc, name, _sr, part_fc), count in zip(jobs, counts):
+            if part_fc != out_fc:
+                if count > 0:
+                    arcpy.Append_management(part_fc, out_fc, "NO_TEST")
+                try:
+                    arcpy.Delete_management(os.path.dirname(part_fc))
+                except:
+                    run.swallowed("delete_scratch")
+            msg("  Added %d parts from %s" % (count, name))
+            run.info[name] = count
+            total += count
+    run.info["total"] = total
+    msg("Run record: %s" % run.finish())
     msg("Done. Created %s with %d polygon(s) where width < %.2f m." % (out_fc, total, THRESHOLD_M))
 
 if __name__ == "__main__":
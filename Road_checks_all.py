@@ -0,0 +1,234 @@
+#... TCPL run several road checks over one read of TransportationGroundCurves
+
+import arcpy, os, sys, math
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    pass
+from tcpl_qc.multi_check import CHECKS, SharedChecks
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import WGS84_GEOG_WKID, batch_utm_target, project_lines, utm_inverse, utm_zone_of_wkid
+
+run = RunRecord("Road_checks_all.py")
+
+arcpy.env.overwriteOutput = True
+try:
+    arcpy.env.addOutputsToMap = False
+except:
+    run.swallowed("addOutputsToMap")
+
+LAYER_NAME    = "TransportationGroundCurves"
+SUBTYPE_NAME  = "ROAD_C"
+FALLBACK_CODE = 100152
+EXTRA_CODES   = [100156, 100150]
+RUN           = ["gap_200", "gap_300", "snap_50", "midpoint_200", "length_300"]   # any of tcpl_qc.multi_check.CHECKS
+COORD_CACHE   = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB  = 2048   # cache size cap; least recently used entries go first
+
+def get_src_fc_from_map(name):
+    mxd = arcpy.mapping.MapDocument("CURRENT")
+    for lyr in arcpy.mapping.ListLayers(mxd):
+        if lyr.supports("DATASOURCE") and lyr.name.lower() == name.lower():
+            return lyr.dataSource
+    for lyr in arcpy.mapping.ListLayers(mxd, "*%s*" % name):
+        if lyr.supports("DATASOURCE"):
+            return lyr.dataSource
+    raise RuntimeError("Layer '%s' not found" % name)
+
+def resolve_subtype_code(fc, wanted_name, fallback_code):
+    try:
+        for code, props in (arcpy.da.ListSubtypes(fc) or {}).items():
+            nm = (props.get('Name') or props.get('SubtypeName') or "").upper()
+            if nm == wanted_name.upper():
+                return int(code)
+    except:
+        run.swallowed("ListSubtypes")
+    return int(fallback_code)
+
+def pick_metric_sr(desc):
+    try:
+        sr = desc.spatialReference
+        if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
+            return sr
+    except:
+        run.swallowed("spatialReference")
+    ext = desc.extent
+    lon = (ext.XMin + ext.XMax)/2.0
+    lat = (ext.YMin + ext.YMax)/2.0
+    zone = int(math.floor((lon + 180.0)/6.0) + 1)
+    try:
+        wkid = 32600 + zone if lat >= 0 else 32700 + zone
+        return arcpy.SpatialReference(wkid)
+    except:
+        run.swallowed("SpatialReference")
+        return arcpy.SpatialReference(3857)
+
+for name in RUN:
+    if name not in CHECKS:
+        raise RuntimeError("Unknown check '%s'; choose from %s" % (name, ", ".join(CHECKS)))
+
+src_fc   = get_src_fc_from_map(LAYER_NAME)
+desc     = arcpy.Describe(src_fc)
+src_sr   = desc.spatialReference
+out_path = desc.path
+out_fcs  = [os.path.join(out_path, CHECKS[name][2]) for name in RUN]
+# Midpoint checks also write the midpoint of every road read, as River_midpoint_Error does.
+pt_fcs   = [os.path.join(out_path, CHECKS[name][2] + "_midpts") for name in RUN if CHECKS[name][0] == "midpoint"]
+run.output = os.path.join(out_path, "road_checks_all")
+run.info["checks"] = list(RUN)
+
+subtype_field = desc.subtypeFieldName or "FCSubtype"
+road_code     = resolve_subtype_code(src_fc, SUBTYPE_NAME, FALLBACK_CODE)
+
+accepted_codes = set([road_code] + EXTRA_CODES)
+
+oid_name   = desc.OIDFieldName
+metric_sr  = pick_metric_sr(desc)
+attr_names = [f.name for f in arcpy.ListFields(src_fc) if f.type not in ("OID","Geometry","Raster")]
+
+# WGS84 lon/lat -> UTM is projected for the whole layer in one NumPy call.
+utm = batch_utm_target(src_sr.factoryCode, metric_sr.factoryCode)
+
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    cache_key = cache and fingerprint([src_fc], [arcpy.GetCount_management(src_fc).getOutput(0)],
+                                      metric_sr.exportToString(), [run.script, sorted(accepted_codes)])
+    roads = cache.get(cache_key, run.counters) if cache_key else None
+if roads is None:
+    oids, subtypes, lines = [], [], []
+    with run.stage("read"):
+        with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@", subtype_field]) as cur:
+            for oid, gsrc, st_code in cur:
+                if st_code not in accepted_codes:
+                    continue
+                if utm:
+                    gm = gsrc
+                else:
+                    try:
+                        gm = gsrc.projectAs(metric_sr) if src_sr.name != metric_sr.name else gsrc
+                    except:
+                        run.swallowed("projectAs")
+                        gm = gsrc
+                try:
+                    lm = line_arrays(gm)
+                except:
+                    run.swallowed("line_arrays")
+                    continue
+                if not len(lm[0]):
+                    continue
+                oids.append(int(oid)); subtypes.append(st_code); lines.append(lm)
+
+    with run.stage("project"):
+        if utm:
+            lines = project_lines(lines, *utm)
+        roads = FeatureStore.from_lines(oids, lines, subtypes)
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, roads, run.counters)
+run.info["features_read"] = len(roads)
+
+# Road_less_300 measures geodesic lengths on WGS84. For WGS84 lon/lat and
+# WGS84 UTM sources the lon/lat come back from the metric store in one call;
+# any other source is measured with getLength in an extra cursor pass.
+lonlat, lengths = None, None
+if any(CHECKS[name][0] == "length" for name in RUN) and len(roads):
+    with run.stage("measure"):
+        back = utm_zone_of_wkid(metric_sr.factoryCode)
+        if back and (src_sr.factoryCode == WGS84_GEOG_WKID or utm_zone_of_wkid(src_sr.factoryCode)):
+            lon, lat = utm_inverse(roads.xy[:, 0], roads.xy[:, 1], *back)
+            lonlat = list(zip(lon.tolist(), lat.tolist()))
+        else:
+            index = dict((o, i) for i, o in enumerate(roads.oid.tolist()))
+            lengths = [float("inf")] * len(roads)
+            with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@"]) as cur:
+                for oid, gsrc in cur:
+                    i = index.get(int(oid))
+                    if i is not None and gsrc:
+                        run.count("predicate_calls")
+                        lengths[i] = gsrc.getLength("GEODESIC", "METERS")
+
+with run.stage("create_output"):
+    for fc in out_fcs:
+        if arcpy.Exists(fc):
+            arcpy.Delete_management(fc)
+        arcpy.CreateFeatureclass_management(out_path, os.path.basename(fc), "POLYLINE",
+                                            template=src_fc, spatial_reference=src_sr)
+    for fc in pt_fcs:
+        if arcpy.Exists(fc):
+            arcpy.Delete_management(fc)
+        arcpy.CreateFeatureclass_management(out_path, os.path.basename(fc), "POINT", None, "DISABLED", "DISABLED",
+                                            src_sr)
+
+flagged, mid_points = {}, {}
+if len(roads):
+    shared = SharedChecks(roads, lonlat=lonlat, lengths=lengths, names=RUN)
+    for name in RUN:
+        with run.stage("check %s" % name):
+            index = shared.run(name, run.counters)
+            flagged[name] = set(roads.oid[index].tolist())
+            if CHECKS[name][0] == "midpoint":
+                mid_points[name] = shared.mids()
+        run.info["flagged " + name] = len(flagged[name])
+
+with run.stage("write"):
+    wanted = [(name, fc) for name, fc in zip(RUN, out_fcs) if flagged.get(name)]
+    if wanted:
+        insert_fields = ["SHAPE@"] + attr_names
+        cursors = [(flagged[name], arcpy.da.InsertCursor(fc, insert_fields)) for name, fc in wanted]
+        try:
+            with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@"] + attr_names) as cur:
+                for row in cur:
+                    oid = int(row[0])
+                    for keep, ic in cursors:
+                        if oid in keep:
+                            ic.insertRow(list(row[1:]))
+        finally:
+            for _, ic in cursors:
+                del ic
+            del cursors
+
+with run.stage("write midpoints"):
+    utm_back = batch_utm_target(src_sr.factoryCode, metric_sr.factoryCode)
+    for name, fc in zip([n for n in RUN if CHECKS[n][0] == "midpoint"], pt_fcs):
+        mids = mid_points.get(name)
+        if mids is None or not len(mids):
+            continue
+        if utm_back:
+            # All midpoints back to WGS84 lon/lat in one inverse call.
+            lon, lat = utm_inverse(mids[:, 0], mids[:, 1], *utm_back)
+            mids_src = [arcpy.PointGeometry(arcpy.Point(x, y), src_sr) for x, y in zip(lon.tolist(), lat.tolist())]
+        else:
+            mids_src = []
+            for mx, my in mids.tolist():
+                mid_m = arcpy.PointGeometry(arcpy.Point(mx, my), metric_sr)
+                try:
+                    mids_src.append(mid_m.projectAs(src_sr) if metric_sr.name != src_sr.name else mid_m)
+                except:
+                    run.swallowed("projectAs")
+                    mids_src.append(mid_m)
+        with arcpy.da.InsertCursor(fc, ["SHAPE@"]) as ip:
+            for mid_src in mids_src:
+                ip.insertRow([mid_src])
+
+try:
+    mxd = arcpy.mapping.MapDocument("CURRENT")
+    df  = arcpy.mapping.ListDataFrames(mxd)[0]
+    for fc in out_fcs + pt_fcs:
+        arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(fc), "TOP")
+    arcpy.RefreshTOC(); arcpy.RefreshActiveView()
+except:
+    run.swallowed("add_layer")
+
+print "Accepted subtype codes:", sorted(list(accepted_codes))
+print "Features read:", len(roads)
+for name, fc in zip(RUN, out_fcs):
+    print "%-14s %6d -> %s" % (name, len(flagged.get(name, ())), fc)
+for name, fc in zip([n for n in RUN if CHECKS[n][0] == "midpoint"], pt_fcs):
+    print "%-14s %6d -> %s" % ("  midpoints", len(mid_points.get(name, ())), fc)
+print "Run record:", run.finish()
+print "Done."
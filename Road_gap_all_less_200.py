@@ -1,12 +1,26 @@
 #...# ...TCPL calculate Gap by Buffer
 
-import arcpy, os, math
+import arcpy, os, sys, math
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    pass
+from tcpl_qc.gap_table import table_gap_check
+from tcpl_qc.tiling import parallel_gap_check
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines
+
+run = RunRecord("Road_gap_all_less_200.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 LAYER_NAME    = "TransportationGroundCurves"
 SUBTYPE_NAME  = "ROAD_C"
@@ -14,6 +28,11 @@ FALLBACK_CODE = 100152
 EXTRA_CODES   = [100156, 100150]
 RADIUS_M      = 200.0
 BUF_EPS       = 0.001
+WORKERS       = 0       # gap check processes; 0 = one per CPU
+GAP_TABLE     = None    # .npz distance table shared by the 200/300 m scripts; None = measure every run
+TABLE_MAX_M   = 300.0   # largest radius the table answers
+COORD_CACHE   = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB  = 2048   # cache size cap; least recently used entries go first
 OUT_NAME      = "road_gap_less_200"
 
 def get_src_fc_from_map(name):
@@ -33,7 +52,7 @@ def resolve_subtype_code(fc, wanted_name, fallback_code):
             if nm == wanted_name.upper():
                 return int(code)
     except:
-        pass
+        run.swallowed("ListSubtypes")
     return int(fallback_code)
 
 def pick_metric_sr(desc):
@@ -42,7 +61,7 @@ def pick_metric_sr(desc):
         if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
             return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     ext = desc.extent
     lon = (ext.XMin + ext.XMax)/2.0
     lat = (ext.YMin + ext.YMax)/2.0
@@ -51,6 +70,7 @@ def pick_metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
 src_fc   = get_src_fc_from_map(LAYER_NAME)
@@ -58,6 +78,7 @@ desc     = arcpy.Describe(src_fc)
 src_sr   = desc.spatialReference
 out_path = desc.path
 out_fc   = os.path.join(out_path, OUT_NAME)
+run.output = out_fc
 
 subtype_field = desc.subtypeFieldName or "FCSubtype"
 road_code     = resolve_subtype_code(src_fc, SUBTYPE_NAME, FALLBACK_CODE)
@@ -68,28 +89,53 @@ oid_name   = desc.OIDFieldName
 metric_sr  = pick_metric_sr(desc)
 attr_names = [f.name for f in arcpy.ListFields(src_fc) if f.type not in ("OID","Geometry","Raster")]
 
-roads = []
-with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@", subtype_field] + attr_names) as cur:
-    for row in cur:
-        if row[2] not in accepted_codes:
-            continue
-        soid  = int(row[0])
-        gsrc  = row[1]
-        attrs = list(row[3:])
-        try:
-            gm = gsrc.projectAs(metric_sr) if src_sr.name != metric_sr.name else gsrc
-        except:
-            gm = gsrc
-        try:
-            bm = gm.buffer(RADIUS_M + BUF_EPS)
-        except:
-            continue
-        roads.append({"oid": soid, "geom_src": gsrc, "geom_m": gm, "buf_m": bm, "attrs": attrs})
-
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-arcpy.CreateFeatureclass_management(out_path, OUT_NAME, "POLYLINE",
-                                    template=src_fc, spatial_reference=src_sr)
+# WGS84 lon/lat -> UTM is projected for the whole layer in one NumPy call.
+utm = batch_utm_target(src_sr.factoryCode, metric_sr.factoryCode)
+
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    cache_key = cache and fingerprint([src_fc], [arcpy.GetCount_management(src_fc).getOutput(0)],
+                                      metric_sr.exportToString(), [run.script, sorted(accepted_codes)])
+    roads = cache.get(cache_key, run.counters) if cache_key else None
+if roads is None:
+    oids, subtypes, lines = [], [], []
+    with run.stage("read"):
+        with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@", subtype_field]) as cur:
+            for oid, gsrc, st_code in cur:
+                if st_code not in accepted_codes:
+                    continue
+                if utm:
+                    gm = gsrc
+                else:
+                    try:
+                        gm = gsrc.projectAs(metric_sr) if src_sr.name != metric_sr.name else gsrc
+                    except:
+                        run.swallowed("projectAs")
+                        gm = gsrc
+                try:
+                    lm = line_arrays(gm)
+                except:
+                    run.swallowed("line_arrays")
+                    continue
+                if not len(lm[0]):
+                    continue
+                oids.append(int(oid)); subtypes.append(st_code); lines.append(lm)
+
+    with run.stage("project"):
+        if utm:
+            lines = project_lines(lines, *utm)
+        roads = FeatureStore.from_lines(oids, lines, subtypes)
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, roads, run.counters)
+run.info["features_read"] = len(roads)
+
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(out_path, OUT_NAME, "POLYLINE",
+                                        template=src_fc, spatial_reference=src_sr)
 
 if not roads:
     try:
@@ -98,35 +144,30 @@ if not roads:
         arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
         arcpy.RefreshTOC(); arcpy.RefreshActiveView()
     except:
-        pass
+        run.swallowed("add_layer")
+    run.finish()
     raise SystemExit
 
-keep_mutual   = set()
-keep_onesided = set()
-
-n = len(roads)
-for i in range(n):
-    gi = roads[i]["geom_m"]; bi = roads[i]["buf_m"]; oi = roads[i]["oid"]
-    for j in range(i+1, n):
-        gj = roads[j]["geom_m"]; bj = roads[j]["buf_m"]; oj = roads[j]["oid"]
-        try:
-            a_in_b = gi.within(bj)
-            b_in_a = gj.within(bi)
-        except:
-            continue
-        if a_in_b and b_in_a:
-            keep_mutual.add(oi); keep_mutual.add(oj)
-        elif a_in_b or b_in_a:
-            keep_onesided.add(oi if a_in_b else oj)
+with run.stage("check"):
+    if GAP_TABLE:
+        mutual_idx, onesided_idx = table_gap_check(roads, RADIUS_M + BUF_EPS, GAP_TABLE, TABLE_MAX_M + BUF_EPS,
+                                                   stats=run.counters)
+    else:
+        mutual_idx, onesided_idx = parallel_gap_check(roads, RADIUS_M + BUF_EPS, workers=WORKERS, stats=run.counters)
+keep_mutual   = set(int(roads.oid[i]) for i in mutual_idx)
+keep_onesided = set(int(roads.oid[i]) for i in onesided_idx)
 
 final_keep = keep_mutual.union(keep_onesided)
 
-if final_keep:
-    insert_fields = ["SHAPE@"] + attr_names
-    with arcpy.da.InsertCursor(out_fc, insert_fields) as ic:
-        for rec in roads:
-            if rec["oid"] in final_keep:
-                ic.insertRow([rec["geom_src"]] + rec["attrs"])
+with run.stage("write"):
+    if final_keep:
+        insert_fields = ["SHAPE@"] + attr_names
+        with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@"] + attr_names) as cur, \
+             arcpy.da.InsertCursor(out_fc, insert_fields) as ic:
+            for row in cur:
+                if int(row[0]) in final_keep:
+                    ic.insertRow(list(row[1:]))
+run.info["kept"] = len(final_keep)
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -134,11 +175,12 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print "Output:", out_fc
 print "Accepted subtype codes:", sorted(list(accepted_codes))
 print "Features read:", len(roads)
 print "Kept (mutual):", len(keep_mutual), " | Kept (one-sided):", len(keep_onesided)
 print "Final kept (union):", len(final_keep)
+print "Run record:", run.finish()
 print "Done."
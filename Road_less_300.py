@@ -1,11 +1,24 @@
 #... TCPL Calculate and filter Roads less than 300m.
 
-import arcpy, os
+import arcpy, os, sys
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    pass
+from tcpl_qc.geodesic import shorter_than
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays, pack_lines
+from tcpl_qc.tmerc import WGS84_GEOG_WKID, project_lines, utm_zone_of_wkid
+
+run = RunRecord("Road_less_300.py")
+
 arcpy.env.overwriteOutput = True
 
 LAYER_NAME   = "TransportationGroundCurves"
 SUBTYPE_NAMES = ["ROAD_C", "CART_TRACK_C", "TRAIL_C"]
 FALLBACK_CODES = [100152]
+MAX_LENGTH_M = 300.0
 
 def get_src_fc_from_map(name):
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -31,12 +44,12 @@ def resolve_subtype_codes(fc, wanted_names, fallback_codes):
             if c is not None:
                 codes.add(int(c))
     except:
-        pass
+        run.swallowed("ListSubtypes")
     for c in fallback_codes or []:
         try:
             codes.add(int(c))
         except:
-            pass
+            run.swallowed("fallback_code")
     if not codes:
         raise RuntimeError("Could not resolve subtype codes for {}. "
                            "Check names or provide numeric codes."
@@ -48,28 +61,30 @@ src_desc  = arcpy.Describe(src_fc)
 out_path  = src_desc.path
 out_name  = "road_less_300"
 out_fc    = os.path.join(out_path, out_name)
+run.output = out_fc
 
 subtype_field = src_desc.subtypeFieldName or "FCSubtype"
 CODES = resolve_subtype_codes(src_fc, SUBTYPE_NAMES, FALLBACK_CODES)
 
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-
 try:
     container_sr = arcpy.Describe(out_path).spatialReference
 except:
+    run.swallowed("container_sr")
     container_sr = None
 sr_for_output = container_sr if container_sr and container_sr.name != "Unknown" else src_desc.spatialReference
 
-arcpy.CreateFeatureclass_management(
-    out_path=out_path,
-    out_name=out_name,
-    geometry_type=src_desc.shapeType,
-    template=src_fc,
-    has_m="ENABLED" if src_desc.hasM else "DISABLED",
-    has_z="ENABLED" if src_desc.hasZ else "DISABLED",
-    spatial_reference=sr_for_output
-)
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(
+        out_path=out_path,
+        out_name=out_name,
+        geometry_type=src_desc.shapeType,
+        template=src_fc,
+        has_m="ENABLED" if src_desc.hasM else "DISABLED",
+        has_z="ENABLED" if src_desc.hasZ else "DISABLED",
+        spatial_reference=sr_for_output
+    )
 
 src_fields = {f.name: f for f in arcpy.ListFields(src_fc)}
 out_fields = {f.name: f for f in arcpy.ListFields(out_fc)}
@@ -78,21 +93,58 @@ copy_fields = [n for n in src_fields
                and n.upper() not in ("OBJECTID","GLOBALID","SHAPE","SHAPE_LENGTH","SHAPE_AREA")
                and out_fields[n].editable]
 
-search_fields = ["SHAPE@", subtype_field] + copy_fields
+search_fields = ["OID@", "SHAPE@", subtype_field] + copy_fields
 insert_fields = ["SHAPE@"] + copy_fields
 
+# WGS84 lon/lat or WGS84 UTM sources are measured in bulk with NumPy; only
+# lines whose length is within a hair of MAX_LENGTH_M get the exact geodesic
+# (Vincenty) computation. Anything else falls back to getLength per feature.
+src_code = src_desc.spatialReference.factoryCode
+utm      = utm_zone_of_wkid(src_code)
+short_oids = None
+n_exact    = 0
+if src_code == WGS84_GEOG_WKID or utm:
+    oids, lines = [], []
+    with run.stage("read"):
+        with arcpy.da.SearchCursor(src_fc, ["OID@", "SHAPE@", subtype_field]) as cur:
+            for oid, geom, st_code in cur:
+                if geom and st_code in CODES:
+                    oids.append(oid)
+                    lines.append(line_arrays(geom))
+    with run.stage("measure"):
+        if utm:
+            lines = project_lines(lines, utm[0], utm[1], inverse=True)
+        short, n_exact = shorter_than(*pack_lines(lines), threshold_m=MAX_LENGTH_M)
+        short_oids = set(o for o, s in zip(oids, short.tolist()) if s)
+    run.info["features_read"] = len(oids)
+    run.count("predicate_calls", len(oids) + n_exact)
+    run.count("exact_lengths", n_exact)
+
 kept = 0
-with arcpy.da.SearchCursor(src_fc, search_fields) as s_cur, \
-     arcpy.da.InsertCursor(out_fc, insert_fields) as i_cur:
-    for row in s_cur:
-        geom = row[0]
-        st_code = row[1]
-        if geom and (st_code in CODES) and geom.getLength("GEODESIC", "METERS") < 300.0:
-            i_cur.insertRow([row[0]] + [row[2 + idx] for idx in range(len(copy_fields))])
-            kept += 1
+# Without the bulk path the lengths are measured here, inside the write stage.
+with run.stage("write"):
+    with arcpy.da.SearchCursor(src_fc, search_fields) as s_cur, \
+         arcpy.da.InsertCursor(out_fc, insert_fields) as i_cur:
+        for row in s_cur:
+            geom = row[1]
+            st_code = row[2]
+            if not geom or st_code not in CODES:
+                continue
+            if short_oids is not None:
+                is_short = row[0] in short_oids
+            else:
+                run.count("predicate_calls")
+                is_short = geom.getLength("GEODESIC", "METERS") < MAX_LENGTH_M
+            if is_short:
+                i_cur.insertRow([row[1]] + [row[3 + idx] for idx in range(len(copy_fields))])
+                kept += 1
+run.info["kept"] = kept
 
 print("Source FC: {}".format(src_fc))
 print("Used subtype codes: {}".format(CODES))
 print("Output FC: {}".format(out_fc))
-print("✅ Created '{}' with {} features (< 300 m from {})."
-      .format(out_fc, kept, SUBTYPE_NAMES))
+if short_oids is not None:
+    print("Exact geodesic lengths computed: {} of {}".format(n_exact, len(oids)))
+print("Run record: {}".format(run.finish()))
+print("✅ Created '{}' with {} features (< {:g} m from {})."
+      .format(out_fc, kept, MAX_LENGTH_M, SUBTYPE_NAMES))
@@ -1,10 +1,24 @@
-import arcpy, os, math, uuid
+import arcpy, os, sys, math, uuid
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    pass
+from tcpl_qc.endpoint_pool import parallel_snap_check
+from tcpl_qc.endpoint_profile import endpoint_profile
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines
+
+run = RunRecord("Road_snap_50.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 LAYER_NAME    = "TransportationGroundCurves"
 SUBTYPE_NAME  = "ROAD_C"
@@ -14,6 +28,11 @@ EXTRA_CODES   = [100156, 100150]
 NEAR_TOL_M       = 50.0
 VERTEX_EPS_M     = 0.2
 ENVELOPE_PAD_M   = NEAR_TOL_M
+WORKERS          = 0      # endpoint check processes; 0 = one per CPU
+PROFILE          = None   # .npz endpoint profile; set it to re-run other tolerances without geometry
+PROFILE_MAX_M    = 100.0  # largest NEAR_TOL_M the profile answers
+COORD_CACHE      = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB     = 2048   # cache size cap; least recently used entries go first
 OUT_NAME         = "snap_50"
 
 def get_src_fc_from_map(name):
@@ -33,7 +52,7 @@ def resolve_subtype_code(fc, wanted_name, fallback_code):
             if nm == wanted_name.upper():
                 return int(code)
     except:
-        pass
+        run.swallowed("ListSubtypes")
     return int(fallback_code)
 
 def pick_metric_sr(desc):
@@ -42,7 +61,7 @@ def pick_metric_sr(desc):
         if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
             return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     ext = desc.extent
     lon = (ext.XMin + ext.XMax) / 2.0
     lat = (ext.YMin + ext.YMax) / 2.0
@@ -51,17 +70,15 @@ def pick_metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
-def extent_hits_point_buffer(line_ext, px, py, r):
-    return not (line_ext.XMin > px + r or line_ext.XMax < px - r or
-                line_ext.YMin > py + r or line_ext.YMax < py - r)
-
 src_fc   = get_src_fc_from_map(LAYER_NAME)
 desc     = arcpy.Describe(src_fc)
 src_sr   = desc.spatialReference
 out_path = desc.path
 out_fc   = os.path.join(out_path, OUT_NAME)
+run.output = out_fc
 
 subtype_field   = desc.subtypeFieldName or "FCSubtype"
 road_code       = resolve_subtype_code(src_fc, SUBTYPE_NAME, FALLBACK_CODE)
@@ -71,70 +88,70 @@ oid_name   = desc.OIDFieldName
 metric_sr  = pick_metric_sr(desc)
 attr_names = [f.name for f in arcpy.ListFields(src_fc) if f.type not in ("OID","Geometry","Raster")]
 
-roads = []
-with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@", subtype_field] + attr_names) as cur:
-    for row in cur:
-        if row[2] not in accepted_codes:
-            continue
-        oid  = int(row[0])
-        gsrc = row[1]
-        attrs = list(row[3:])
-        try:
-            gm = gsrc.projectAs(metric_sr) if src_sr.name != metric_sr.name else gsrc
-        except:
-            gm = gsrc
-        roads.append({"oid": oid, "geom_src": gsrc, "geom_m": gm, "ext": gm.extent, "attrs": attrs})
-
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-arcpy.CreateFeatureclass_management(out_path, OUT_NAME, "POLYLINE",
-                                    template=src_fc, spatial_reference=src_sr)
-
-flagged = set()
-
-for i, ri in enumerate(roads):
-    gi = ri["geom_m"]
-    if gi is None or gi.pointCount < 2:
-        continue
-    p_start = gi.firstPoint
-    p_end   = gi.lastPoint
-    for (px, py) in ((p_start.X, p_start.Y), (p_end.X, p_end.Y)):
-        near_any = False
-        snapped_to_vertex = False
-        pt = arcpy.PointGeometry(arcpy.Point(px, py), metric_sr)
-        for j, rj in enumerate(roads):
-            if rj["oid"] == ri["oid"]:
-                continue
-            if not extent_hits_point_buffer(rj["ext"], px, py, ENVELOPE_PAD_M):
-                continue
-            gj = rj["geom_m"]
-            try:
-                d = pt.distanceTo(gj)
-            except:
-                continue
-            if d <= NEAR_TOL_M:
-                near_any = True
-                for part in gj:
-                    for v in part:
-                        if v is None:
-                            continue
-                        dv = arcpy.PointGeometry(v, metric_sr).distanceTo(pt)
-                        if dv <= VERTEX_EPS_M:
-                            snapped_to_vertex = True
-                            break
-                    if snapped_to_vertex:
-                        break
-                if near_any and not snapped_to_vertex:
-                    break
-        if near_any and not snapped_to_vertex:
-            flagged.add(ri["oid"])
-
-if flagged:
-    insert_fields = ["SHAPE@"] + attr_names
-    with arcpy.da.InsertCursor(out_fc, insert_fields) as ic:
-        for rec in roads:
-            if rec["oid"] in flagged:
-                ic.insertRow([rec["geom_src"]] + rec["attrs"])
+# WGS84 lon/lat -> UTM is projected for the whole layer in one NumPy call.
+utm = batch_utm_target(src_sr.factoryCode, metric_sr.factoryCode)
+
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    cache_key = cache and fingerprint([src_fc], [arcpy.GetCount_management(src_fc).getOutput(0)],
+                                      metric_sr.exportToString(), [run.script, sorted(accepted_codes)])
+    roads = cache.get(cache_key, run.counters) if cache_key else None
+if roads is None:
+    oids, subtypes, lines = [], [], []
+    with run.stage("read"):
+        with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@", subtype_field]) as cur:
+            for oid, gsrc, st_code in cur:
+                if st_code not in accepted_codes:
+                    continue
+                if utm:
+                    gm = gsrc
+                else:
+                    try:
+                        gm = gsrc.projectAs(metric_sr) if src_sr.name != metric_sr.name else gsrc
+                    except:
+                        run.swallowed("projectAs")
+                        gm = gsrc
+                try:
+                    lm = line_arrays(gm)
+                except:
+                    run.swallowed("line_arrays")
+                    continue
+                oids.append(int(oid)); subtypes.append(st_code); lines.append(lm)
+
+    with run.stage("project"):
+        if utm:
+            lines = project_lines(lines, *utm)
+        roads = FeatureStore.from_lines(oids, lines, subtypes)
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, roads, run.counters)
+run.info["features_read"] = len(roads)
+
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(out_path, OUT_NAME, "POLYLINE",
+                                        template=src_fc, spatial_reference=src_sr)
+
+with run.stage("check"):
+    if PROFILE:
+        profile = endpoint_profile(roads, PROFILE, PROFILE_MAX_M, "feature", stats=run.counters)
+        flagged = profile.snap_check(NEAR_TOL_M, VERTEX_EPS_M)
+    else:
+        flagged = parallel_snap_check(roads, NEAR_TOL_M, VERTEX_EPS_M, pad=ENVELOPE_PAD_M, workers=WORKERS,
+                                      stats=run.counters)
+    flagged = set(roads.oid[flagged].tolist())
+
+with run.stage("write"):
+    if flagged:
+        insert_fields = ["SHAPE@"] + attr_names
+        with arcpy.da.SearchCursor(src_fc, [oid_name, "SHAPE@"] + attr_names) as cur, \
+             arcpy.da.InsertCursor(out_fc, insert_fields) as ic:
+            for row in cur:
+                if int(row[0]) in flagged:
+                    ic.insertRow(list(row[1:]))
+run.info["flagged"] = len(flagged)
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -142,10 +159,11 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print("Output:", out_fc)
 print("Accepted subtype codes:", sorted(list(accepted_codes)))
 print("Features scanned:", len(roads))
 print("Lines flagged (endpoint near <= %.1f m but not snapped to a vertex): %d" % (NEAR_TOL_M, len(flagged)))
+print("Run record:", run.finish())
 print("Done.")
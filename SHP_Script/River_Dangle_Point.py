@@ -1,10 +1,24 @@
-import arcpy, os, math, re
+import arcpy, os, sys, math, re
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except NameError:
+    pass
+from tcpl_qc.endpoint_pool import parallel_river_dangles
+from tcpl_qc.endpoint_profile import endpoint_profile
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines, utm_inverse
+
+run = RunRecord("River_Dangle_Point.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 TARGET_NAMES        = {"river_c", "ditch_c"}
 NEAR_TOL_M          = 50.0
@@ -12,6 +26,11 @@ VERTEX_EPS_M        = 0.20
 SEGMENT_EPS_M       = 0.20
 PARALLEL_ANGLE_DEG  = 15.0
 ENVELOPE_PAD_M      = NEAR_TOL_M
+WORKERS             = 0      # endpoint check processes; 0 = one per CPU
+PROFILE             = None   # .npz endpoint profile; set it to re-run other tolerances without geometry
+PROFILE_MAX_M       = 100.0  # largest NEAR_TOL_M the profile answers
+COORD_CACHE         = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB        = 2048   # cache size cap; least recently used entries go first
 OUT_BASENAME        = "snap_50"
 
 def norm_name(s):
@@ -38,7 +57,7 @@ def pick_metric_sr(desc):
             if ("meter" in unit) or ("metre" in unit):
                 return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     try:
         wgs84 = arcpy.SpatialReference(4326)
         cen = arcpy.PointGeometry(desc.extent.centroid, desc.spatialReference).projectAs(wgs84)
@@ -47,56 +66,28 @@ def pick_metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
-def extent_hits_point_buffer(line_ext, px, py, r):
-    return not (line_ext.XMin > px + r or line_ext.XMax < px - r or
-                line_ext.YMin > py + r or line_ext.YMax < py - r)
-
-def unit_vec(dx, dy):
-    m = math.hypot(dx, dy)
-    if m == 0: return (0.0, 0.0)
-    return (dx/m, dy/m)
-
-def angle_deg(u, v):
-    ux, uy = u; vx, vy = v
-    dot = ux*vx + uy*vy
-    if dot > 1.0: dot = 1.0
-    if dot < -1.0: dot = -1.0
-    return math.degrees(math.acos(dot))
-
-def endpoints_and_dirs(geom):
-    out = []
-    for part in geom:
-        pts = [p for p in part if p]
-        n = len(pts)
-        if n >= 2:
-            dx = pts[1].X - pts[0].X
-            dy = pts[1].Y - pts[0].Y
-            out.append({"pt": pts[0], "dir": unit_vec(dx, dy)})
-            dx2 = pts[-1].X - pts[-2].X
-            dy2 = pts[-1].Y - pts[-2].Y
-            out.append({"pt": pts[-1], "dir": unit_vec(dx2, dy2)})
+def back_project_points(points, metric_sr):
+    # Metric endpoints back to each feature's own SR; WGS84 targets in one inverse call.
+    out = [None] * len(points)
+    batch = [k for k, p in enumerate(points) if batch_utm_target(p["sr"].factoryCode, metric_sr.factoryCode)]
+    if batch:
+        zone, south = batch_utm_target(points[batch[0]]["sr"].factoryCode, metric_sr.factoryCode)
+        lon, lat = utm_inverse([points[k]["x"] for k in batch], [points[k]["y"] for k in batch], zone, south)
+        for k, x, y in zip(batch, lon.tolist(), lat.tolist()):
+            out[k] = arcpy.PointGeometry(arcpy.Point(x, y), points[k]["sr"])
+    for k, p in enumerate(points):
+        if out[k] is None:
+            pt_m = arcpy.PointGeometry(arcpy.Point(p["x"], p["y"]), metric_sr)
+            try:
+                out[k] = pt_m.projectAs(p["sr"])
+            except:
+                run.swallowed("projectAs")
+                out[k] = pt_m
     return out
 
-def neighbor_dir_at(polyline, dist_along, delta):
-    try:
-        a = max(0.0, dist_along - delta)
-        b = min(polyline.length, dist_along + delta)
-        pa = polyline.positionAlongLine(a).firstPoint
-        pb = polyline.positionAlongLine(b).firstPoint
-        return unit_vec(pb.X - pa.X, pb.Y - pa.Y)
-    except:
-        return (0.0, 0.0)
-
-def project_point_on_line(point_geom, polyline):
-    try:
-        qp, dalong, dfrom, _right = polyline.queryPointAndDistance(point_geom)
-        return (qp, dalong, dfrom)
-    except:
-        dfrom = point_geom.distanceTo(polyline)
-        return (None, None, dfrom)
-
 layers = list_target_layers()
 first_desc = arcpy.Describe(layers[0])
 src_sr     = first_desc.spatialReference
@@ -104,40 +95,61 @@ out_path   = first_desc.path if getattr(first_desc, "path", None) else os.path.d
 is_gdb     = (out_path or "").lower().endswith(".gdb")
 out_name   = OUT_BASENAME if is_gdb else OUT_BASENAME + ".shp"
 out_fc     = os.path.join(out_path, out_name)
+run.output = out_fc
 metric_sr  = pick_metric_sr(first_desc)
 
-features = []
-for lid, lyr in enumerate(layers):
-    d = arcpy.Describe(lyr)
-    oid_name = d.OIDFieldName
-    with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
-        for oid, gsrc in cur:
-            if gsrc is None:
-                continue
-            try:
-                same_sr = (d.spatialReference and metric_sr and
-                           getattr(d.spatialReference, "factoryCode", None) == getattr(metric_sr, "factoryCode", None))
-                gm = gsrc if same_sr else gsrc.projectAs(metric_sr)
-            except:
-                continue
-            if gm is None or gm.pointCount < 2:
-                continue
-            features.append({
-                "lid": lid,
-                "layer_name": lyr.name,
-                "oid": int(oid),
-                "geom_src": gsrc,
-                "geom_m": gm,
-                "ext": gm.extent,
-                "endpoints": endpoints_and_dirs(gm)
-            })
-
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-arcpy.CreateFeatureclass_management(out_path, out_name, "POINT", None, "DISABLED", "DISABLED", src_sr)
-arcpy.AddField_management(out_fc, "SRC_LAYER", "TEXT", field_length=64)
-arcpy.AddField_management(out_fc, "SRC_OID",   "LONG")
-arcpy.AddField_management(out_fc, "REASON",    "TEXT", field_length=32)
+layer_srs = [arcpy.Describe(lyr).spatialReference or src_sr for lyr in layers]
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    queries = [lyr.definitionQuery if lyr.supports("DEFINITIONQUERY") else "" for lyr in layers]
+    cache_key = cache and fingerprint([lyr.dataSource for lyr in layers],
+                                      [arcpy.GetCount_management(lyr).getOutput(0) for lyr in layers],
+                                      metric_sr.exportToString(), [run.script, queries])
+    features = cache.get(cache_key, run.counters) if cache_key else None
+if features is None:
+    oids, layer_ids, lines = [], [], []
+    for lid, lyr in enumerate(layers):
+        d = arcpy.Describe(lyr)
+        oid_name = d.OIDFieldName
+        utm = d.spatialReference and batch_utm_target(d.spatialReference.factoryCode, metric_sr.factoryCode)
+        layer_lines = []
+        with run.stage("read %s" % lyr.name):
+            with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
+                for oid, gsrc in cur:
+                    if gsrc is None:
+                        continue
+                    try:
+                        same_sr = (d.spatialReference and metric_sr and
+                                   getattr(d.spatialReference, "factoryCode", None) == getattr(metric_sr, "factoryCode", None))
+                        gm = gsrc if utm or same_sr else gsrc.projectAs(metric_sr)
+                        lm = line_arrays(gm)
+                    except:
+                        run.swallowed("projectAs")
+                        continue
+                    if len(lm[0]) < 2:
+                        continue
+                    oids.append(int(oid)); layer_ids.append(lid); layer_lines.append(lm)
+        if utm:
+            # WGS84 lon/lat -> UTM for the whole layer in one NumPy call.
+            with run.stage("project %s" % lyr.name):
+                layer_lines = project_lines(layer_lines, *utm)
+        lines.extend(layer_lines)
+
+    with run.stage("store"):
+        features = FeatureStore.from_lines(oids, lines, layers=layer_ids, layer_names=[lyr.name for lyr in layers])
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, features, run.counters)
+run.info["features_read"] = len(features)
+
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(out_path, out_name, "POINT", None, "DISABLED", "DISABLED", src_sr)
+    arcpy.AddField_management(out_fc, "SRC_LAYER", "TEXT", field_length=64)
+    arcpy.AddField_management(out_fc, "SRC_OID",   "LONG")
+    arcpy.AddField_management(out_fc, "REASON",    "TEXT", field_length=32)
 
 if not features:
     try:
@@ -146,78 +158,37 @@ if not features:
         arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
         arcpy.RefreshTOC(); arcpy.RefreshActiveView()
     except:
-        pass
+        run.swallowed("add_layer")
+    run.finish()
     raise SystemExit
 
-points_out = []
-
-for rec in features:
-    eplist = rec["endpoints"]
-    if not eplist:
-        continue
-
-    for ep in eplist:
-        ep_dir = ep["dir"]
-        if ep_dir == (0.0, 0.0):
-            continue
-        px, py = ep["pt"].X, ep["pt"].Y
-        pt_m = arcpy.PointGeometry(arcpy.Point(px, py), metric_sr)
-        reason = None
-        for other in features:
-            if other["lid"] == rec["lid"] and other["oid"] == rec["oid"]:
-                continue
-            if not extent_hits_point_buffer(other["ext"], px, py, ENVELOPE_PAD_M):
-                continue
-            gj = other["geom_m"]
-            try:
-                d_line = pt_m.distanceTo(gj)
-            except:
-                continue
-            if d_line > NEAR_TOL_M:
-                continue
-            snapped_to_vertex = False
-            for part in gj:
-                for v in part:
-                    if v is None: continue
-                    try:
-                        if arcpy.PointGeometry(v, metric_sr).distanceTo(pt_m) <= VERTEX_EPS_M:
-                            snapped_to_vertex = True
-                            break
-                    except:
-                        continue
-                if snapped_to_vertex:
-                    break
-            if snapped_to_vertex:
-                continue
-            qp, dalong, dperp = project_point_on_line(pt_m, gj)
-            if dperp is not None and dperp <= SEGMENT_EPS_M:
-                reason = "on_segment_no_snap"
-                break
-            if qp is not None and dalong is not None:
-                delta = min(1.0, 0.1 * NEAR_TOL_M)
-                n_dir = neighbor_dir_at(gj, dalong, delta)
-                ang = angle_deg(ep_dir, n_dir)
-                if (ang <= PARALLEL_ANGLE_DEG) or (abs(180.0 - ang) <= PARALLEL_ANGLE_DEG):
-                    continue
-                else:
-                    reason = "non_parallel_close"
-                    break
-        if reason:
-            try:
-                pt_src = pt_m.projectAs(rec["geom_src"].spatialReference if rec["geom_src"].spatialReference else src_sr)
-            except:
-                pt_src = pt_m
-            points_out.append({
-                "pt_src": pt_src,
-                "layer": rec["layer_name"],
-                "oid": rec["oid"],
-                "reason": reason
-            })
-
-if points_out:
-    with arcpy.da.InsertCursor(out_fc, ["SHAPE@", "SRC_LAYER", "SRC_OID", "REASON"]) as ic:
-        for p in points_out:
-            ic.insertRow([p["pt_src"], p["layer"], p["oid"], p["reason"]])
+with run.stage("check"):
+    if PROFILE:
+        profile = endpoint_profile(features, PROFILE, PROFILE_MAX_M, "part", stats=run.counters)
+        found = profile.river_dangles(NEAR_TOL_M, VERTEX_EPS_M, SEGMENT_EPS_M, PARALLEL_ANGLE_DEG)
+    else:
+        found = parallel_river_dangles(features, NEAR_TOL_M, VERTEX_EPS_M, SEGMENT_EPS_M,
+                                       PARALLEL_ANGLE_DEG, pad=ENVELOPE_PAD_M,
+                                       workers=WORKERS, stats=run.counters)
+    points_out = []
+    for i, px, py, reason in found:
+        f = features[i]
+        points_out.append({
+            "x": px,
+            "y": py,
+            "sr": layer_srs[f.layer],
+            "layer": f.layer_name,
+            "oid": f.oid,
+            "reason": reason
+        })
+
+with run.stage("write"):
+    if points_out:
+        pts_src = back_project_points(points_out, metric_sr)
+        with arcpy.da.InsertCursor(out_fc, ["SHAPE@", "SRC_LAYER", "SRC_OID", "REASON"]) as ic:
+            for p, pt_src in zip(points_out, pts_src):
+                ic.insertRow([pt_src, p["layer"], p["oid"], p["reason"]])
+run.info["points"] = len(points_out)
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -225,10 +196,11 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print "Output:", out_fc
 print "Matched layers:", ", ".join([lyr.name for lyr in layers])
 print "Features scanned:", sum(1 for _ in features)
 print "Problem endpoints (points) created:", len(points_out)
+print "Run record:", run.finish()
 print "Done."
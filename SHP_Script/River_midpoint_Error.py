@@ -1,14 +1,29 @@
-import arcpy, os, math, re
+import arcpy, os, sys, math, re
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except NameError:
+    pass
+from tcpl_qc.checks import midpoint_check, midpoints
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines, utm_inverse
+
+run = RunRecord("River_midpoint_Error.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 TARGET_NAMES = {"river_c", "ditch_c"}
 RADIUS_M     = 200.0
 BUF_EPS      = 0.001
+COORD_CACHE  = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB = 2048   # cache size cap; least recently used entries go first
 OUT_BASENAME = "river_gap_less_200"
 
 def _norm(s):
@@ -33,7 +48,7 @@ def _metric_sr(desc):
         if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
             return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     ext = desc.extent
     lon = (ext.XMin + ext.XMax)/2.0
     lat = (ext.YMin + ext.YMax)/2.0
@@ -42,6 +57,7 @@ def _metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
 layers     = _find_layers()
@@ -53,31 +69,63 @@ out_name_l = OUT_BASENAME if is_gdb else OUT_BASENAME + ".shp"
 out_name_p = OUT_BASENAME + "_midpts" if is_gdb else OUT_BASENAME + "_midpts.shp"
 out_fc_l   = os.path.join(out_path, out_name_l)
 out_fc_p   = os.path.join(out_path, out_name_p)
+run.output = out_fc_l
 metric_sr  = _metric_sr(first_desc)
 
-features = []
-for lyr in layers:
-    d = arcpy.Describe(lyr)
-    oid_name = d.OIDFieldName
-    with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
-        for oid, gsrc in cur:
-            try:
-                gm = gsrc.projectAs(metric_sr) if d.spatialReference.name != metric_sr.name else gsrc
-            except:
-                gm = gsrc
-            try:
-                length_m = gm.length
-                mid_m = gm.positionAlongLine(length_m/2.0, False)
-            except:
-                continue
-            features.append({"oid": int(oid), "geom_src": gsrc, "geom_m": gm, "mid_m": mid_m})
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    queries = [lyr.definitionQuery if lyr.supports("DEFINITIONQUERY") else "" for lyr in layers]
+    cache_key = cache and fingerprint([lyr.dataSource for lyr in layers],
+                                      [arcpy.GetCount_management(lyr).getOutput(0) for lyr in layers],
+                                      metric_sr.exportToString(), [run.script, queries])
+    features = cache.get(cache_key, run.counters) if cache_key else None
+if features is None:
+    oids, layer_ids, lines = [], [], []
+    for lid, lyr in enumerate(layers):
+        d = arcpy.Describe(lyr)
+        oid_name = d.OIDFieldName
+        utm = batch_utm_target(d.spatialReference.factoryCode, metric_sr.factoryCode)
+        layer_lines = []
+        with run.stage("read %s" % lyr.name):
+            with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
+                for oid, gsrc in cur:
+                    if utm:
+                        gm = gsrc
+                    else:
+                        try:
+                            gm = gsrc.projectAs(metric_sr) if d.spatialReference.name != metric_sr.name else gsrc
+                        except:
+                            run.swallowed("projectAs")
+                            gm = gsrc
+                    try:
+                        lm = line_arrays(gm)
+                    except:
+                        run.swallowed("line_arrays")
+                        continue
+                    if not len(lm[0]):
+                        continue
+                    oids.append(int(oid)); layer_ids.append(lid); layer_lines.append(lm)
+        if utm:
+            # WGS84 lon/lat -> UTM for the whole layer in one NumPy call.
+            with run.stage("project %s" % lyr.name):
+                layer_lines = project_lines(layer_lines, *utm)
+        lines.extend(layer_lines)
+
+    with run.stage("store"):
+        features = FeatureStore.from_lines(oids, lines, layers=layer_ids, layer_names=[lyr.name for lyr in layers])
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, features, run.counters)
+run.info["features_read"] = len(features)
 
-for fc in [out_fc_l, out_fc_p]:
-    if arcpy.Exists(fc):
-        arcpy.Delete_management(fc)
+with run.stage("create_output"):
+    for fc in [out_fc_l, out_fc_p]:
+        if arcpy.Exists(fc):
+            arcpy.Delete_management(fc)
 
-arcpy.CreateFeatureclass_management(out_path, out_name_l, "POLYLINE", None, "DISABLED", "DISABLED", src_sr)
-arcpy.CreateFeatureclass_management(out_path, out_name_p, "POINT",    None, "DISABLED", "DISABLED", src_sr)
+    arcpy.CreateFeatureclass_management(out_path, out_name_l, "POLYLINE", None, "DISABLED", "DISABLED", src_sr)
+    arcpy.CreateFeatureclass_management(out_path, out_name_p, "POINT",    None, "DISABLED", "DISABLED", src_sr)
 
 if not features:
     try:
@@ -87,43 +135,44 @@ if not features:
         arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc_p), "TOP")
         arcpy.RefreshTOC(); arcpy.RefreshActiveView()
     except:
-        pass
+        run.swallowed("add_layer")
+    run.finish()
     raise SystemExit
 
-keep_set = set()
-n = len(features)
-for i in range(n):
-    gi = features[i]["geom_m"]
-    mi = features[i]["mid_m"]
-    oi = features[i]["oid"]
-    hit = False
-    for j in range(n):
-        if i == j:
-            continue
-        gj = features[j]["geom_m"]
-        try:
-            dist = gj.distanceTo(mi)
-        except:
-            continue
-        if dist <= RADIUS_M + BUF_EPS:
-            hit = True
-            break
-    if hit:
-        keep_set.add(oi)
-
-if keep_set:
-    with arcpy.da.InsertCursor(out_fc_l, ["SHAPE@"]) as ic:
-        for rec in features:
-            if rec["oid"] in keep_set:
-                ic.insertRow([rec["geom_src"]])
-
-with arcpy.da.InsertCursor(out_fc_p, ["SHAPE@"]) as ip:
-    for rec in features:
-        try:
-            mid_src = rec["mid_m"].projectAs(src_sr) if metric_sr.name != src_sr.name else rec["mid_m"]
-        except:
-            mid_src = rec["mid_m"]
-        ip.insertRow([mid_src])
+with run.stage("check"):
+    mids = midpoints(features)
+    keys = features.keys()
+    keep_set = set(keys[i] for i in midpoint_check(features, RADIUS_M + BUF_EPS, mids=mids, stats=run.counters))
+run.info["kept"] = len(keep_set)
+
+with run.stage("write lines"):
+    if keep_set:
+        with arcpy.da.InsertCursor(out_fc_l, ["SHAPE@"]) as ic:
+            for lid, lyr in enumerate(layers):
+                with arcpy.da.SearchCursor(lyr, ["OID@", "SHAPE@"]) as cur:
+                    for oid, gsrc in cur:
+                        if (lid, int(oid)) in keep_set:
+                            ic.insertRow([gsrc])
+
+with run.stage("write midpoints"):
+    utm_back = batch_utm_target(src_sr.factoryCode, metric_sr.factoryCode)
+    if utm_back:
+        # All midpoints back to WGS84 lon/lat in one inverse call.
+        lon, lat = utm_inverse(mids[:, 0], mids[:, 1], *utm_back)
+        mids_src = [arcpy.PointGeometry(arcpy.Point(x, y), src_sr) for x, y in zip(lon.tolist(), lat.tolist())]
+    else:
+        mids_src = []
+        for mx, my in mids.tolist():
+            mid_m = arcpy.PointGeometry(arcpy.Point(mx, my), metric_sr)
+            try:
+                mids_src.append(mid_m.projectAs(src_sr) if metric_sr.name != src_sr.name else mid_m)
+            except:
+                run.swallowed("projectAs")
+                mids_src.append(mid_m)
+
+    with arcpy.da.InsertCursor(out_fc_p, ["SHAPE@"]) as ip:
+        for mid_src in mids_src:
+            ip.insertRow([mid_src])
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -132,11 +181,12 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc_p), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print "Output lines:", out_fc_l
 print "Output midpoints:", out_fc_p
 print "Matched layers:", ", ".join([lyr.name for lyr in layers])
 print "Features read:", len(features)
 print "Kept (midpoint <= %sm):" % RADIUS_M, len(keep_set)
+print "Run record:", run.finish()
 print "Done."
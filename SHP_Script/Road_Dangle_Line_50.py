@@ -1,15 +1,36 @@
-import arcpy, os, math, re
+import arcpy, os, sys, math, re
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except NameError:
+    pass
+from tcpl_qc.endpoint_pool import parallel_near_not_snapped
+from tcpl_qc.endpoint_profile import endpoint_profile
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.incremental import incremental_near_not_snapped
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines
+
+run = RunRecord("Road_Dangle_Line_50.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 TARGET_NAMES   = {"road_c", "trail_c", "cart_track"}
 NEAR_TOL_M     = 50.0
 VERTEX_EPS_M   = 0.2
 ENVELOPE_PAD_M = NEAR_TOL_M
+WORKERS        = 0      # endpoint check processes; 0 = one per CPU
+PROFILE        = None   # .npz endpoint profile; set it to re-run other tolerances without geometry
+PROFILE_MAX_M  = 100.0  # largest NEAR_TOL_M the profile answers
+STATE          = None   # .npz of the last run; set it to re-check only edited features and their neighbours
+COORD_CACHE    = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB   = 2048   # cache size cap; least recently used entries go first
 OUT_BASENAME   = "snap_50"
 
 def norm_name(s):
@@ -34,7 +55,7 @@ def pick_metric_sr(desc):
         if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
             return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     ext = desc.extent
     lon = (ext.XMin + ext.XMax)/2.0
     lat = (ext.YMin + ext.YMax)/2.0
@@ -43,12 +64,9 @@ def pick_metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
-def extent_hits_point_buffer(line_ext, px, py, r):
-    return not (line_ext.XMin > px + r or line_ext.XMax < px - r or
-                line_ext.YMin > py + r or line_ext.YMax < py - r)
-
 layers = list_target_layers()
 first_desc = arcpy.Describe(layers[0])
 src_sr     = first_desc.spatialReference
@@ -56,23 +74,63 @@ out_path   = first_desc.path if getattr(first_desc, "path", None) else os.path.d
 is_gdb     = out_path.lower().endswith(".gdb")
 out_name   = OUT_BASENAME if is_gdb else OUT_BASENAME + ".shp"
 out_fc     = os.path.join(out_path, out_name)
+run.output = out_fc
 metric_sr  = pick_metric_sr(first_desc)
 
-features = []
-for lyr in layers:
-    d = arcpy.Describe(lyr)
-    oid_name = d.OIDFieldName
-    with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
-        for oid, gsrc in cur:
-            try:
-                gm = gsrc.projectAs(metric_sr) if d.spatialReference and d.spatialReference.name != metric_sr.name else gsrc
-            except:
-                gm = gsrc
-            features.append({"oid": int(oid), "geom_src": gsrc, "geom_m": gm, "ext": gm.extent})
-
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-arcpy.CreateFeatureclass_management(out_path, out_name, "POLYLINE", None, "DISABLED", "DISABLED", src_sr)
+layer_srs = [arcpy.Describe(lyr).spatialReference or src_sr for lyr in layers]
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    queries = [lyr.definitionQuery if lyr.supports("DEFINITIONQUERY") else "" for lyr in layers]
+    cache_key = cache and fingerprint([lyr.dataSource for lyr in layers],
+                                      [arcpy.GetCount_management(lyr).getOutput(0) for lyr in layers],
+                                      metric_sr.exportToString(), [run.script, queries])
+    features = cache.get(cache_key, run.counters) if cache_key else None
+if features is None:
+    oids, layer_ids, lines = [], [], []
+    for lid, lyr in enumerate(layers):
+        d = arcpy.Describe(lyr)
+        oid_name = d.OIDFieldName
+        utm = d.spatialReference and batch_utm_target(d.spatialReference.factoryCode, metric_sr.factoryCode)
+        layer_lines = []
+        with run.stage("read %s" % lyr.name):
+            with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
+                for oid, gsrc in cur:
+                    if gsrc is None:
+                        continue
+                    if utm:
+                        gm = gsrc
+                    else:
+                        try:
+                            gm = gsrc.projectAs(metric_sr) if d.spatialReference and d.spatialReference.name != metric_sr.name else gsrc
+                        except:
+                            run.swallowed("projectAs")
+                            gm = gsrc
+                    try:
+                        lm = line_arrays(gm)
+                    except:
+                        run.swallowed("line_arrays")
+                        continue
+                    if len(lm[0]) < 2:
+                        continue
+                    oids.append(int(oid)); layer_ids.append(lid); layer_lines.append(lm)
+        if utm:
+            # WGS84 lon/lat -> UTM for the whole layer in one NumPy call.
+            with run.stage("project %s" % lyr.name):
+                layer_lines = project_lines(layer_lines, *utm)
+        lines.extend(layer_lines)
+
+    with run.stage("store"):
+        features = FeatureStore.from_lines(oids, lines, layers=layer_ids, layer_names=[lyr.name for lyr in layers])
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, features, run.counters)
+run.info["features_read"] = len(features)
+
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(out_path, out_name, "POLYLINE", None, "DISABLED", "DISABLED", src_sr)
 
 if not features:
     try:
@@ -81,62 +139,33 @@ if not features:
         arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
         arcpy.RefreshTOC(); arcpy.RefreshActiveView()
     except:
-        pass
+        run.swallowed("add_layer")
+    run.finish()
     raise SystemExit
 
-flagged = set()
-
-for rec in features:
-    gi = rec["geom_m"]
-    if gi is None or gi.pointCount < 2:
-        continue
-    p_start = gi.firstPoint
-    p_end   = gi.lastPoint
-    should_flag_this_feature = False
-    for (px, py) in ((p_start.X, p_start.Y), (p_end.X, p_end.Y)):
-        pt = arcpy.PointGeometry(arcpy.Point(px, py), metric_sr)
-        snapped_any_neighbor = False
-        near_any_neighbor = False
-        for other in features:
-            if other["oid"] == rec["oid"]:
-                continue
-            if not extent_hits_point_buffer(other["ext"], px, py, ENVELOPE_PAD_M):
-                continue
-            gj = other["geom_m"]
-            try:
-                d = pt.distanceTo(gj)
-            except:
-                continue
-            if d <= NEAR_TOL_M:
-                near_any_neighbor = True
-                snapped_here = False
-                for part in gj:
-                    for v in part:
-                        if v is None:
-                            continue
-                        try:
-                            dv = arcpy.PointGeometry(v, metric_sr).distanceTo(pt)
-                        except:
-                            continue
-                        if dv <= VERTEX_EPS_M:
-                            snapped_here = True
-                            break
-                    if snapped_here:
-                        break
-                if snapped_here:
-                    snapped_any_neighbor = True
-                    break
-        if not snapped_any_neighbor and near_any_neighbor:
-            should_flag_this_feature = True
-            break
-    if should_flag_this_feature:
-        flagged.add(rec["oid"])
-
-if flagged:
-    with arcpy.da.InsertCursor(out_fc, ["SHAPE@"]) as ic:
-        for rec in features:
-            if rec["oid"] in flagged:
-                ic.insertRow([rec["geom_src"]])
+# Flagged lines are (layer, oid): OIDs repeat across the matched layers.
+with run.stage("check"):
+    if PROFILE:
+        profile = endpoint_profile(features, PROFILE, PROFILE_MAX_M, "feature", stats=run.counters)
+        found = profile.near_not_snapped(NEAR_TOL_M, VERTEX_EPS_M)
+    elif STATE:
+        found = incremental_near_not_snapped(features, NEAR_TOL_M, VERTEX_EPS_M, STATE, pad=ENVELOPE_PAD_M,
+                                             stats=run.counters)
+    else:
+        found = parallel_near_not_snapped(features, NEAR_TOL_M, VERTEX_EPS_M, pad=ENVELOPE_PAD_M,
+                                          workers=WORKERS, stats=run.counters)
+    keys = features.keys()
+    flagged = set(keys[i] for i, px, py in found)
+
+with run.stage("write"):
+    if flagged:
+        with arcpy.da.InsertCursor(out_fc, ["SHAPE@"]) as ic:
+            for lid, lyr in enumerate(layers):
+                with arcpy.da.SearchCursor(lyr, ["OID@", "SHAPE@"]) as cur:
+                    for oid, gsrc in cur:
+                        if (lid, int(oid)) in flagged:
+                            ic.insertRow([gsrc])
+run.info["flagged"] = len(flagged)
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -144,10 +173,11 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print "Output:", out_fc
 print "Matched layers:", ", ".join([lyr.name for lyr in layers])
 print "Features scanned:", len(features)
 print "Lines flagged (endpoint near <= %.1f m and NOT snapped to ANY vertex): %d" % (NEAR_TOL_M, len(flagged))
+print "Run record:", run.finish()
 print "Done."
@@ -1,15 +1,37 @@
-import arcpy, os, math, re
+import arcpy, os, sys, math, re
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except NameError:
+    pass
+from tcpl_qc.checks import REASON_NOT_SNAPPED
+from tcpl_qc.endpoint_pool import parallel_near_not_snapped
+from tcpl_qc.endpoint_profile import endpoint_profile
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.incremental import incremental_near_not_snapped
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines, utm_inverse
+
+run = RunRecord("Road_Dangle_Point_50.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 TARGET_NAMES   = {"road_c", "trail_c", "cart_track"}
 NEAR_TOL_M     = 50.0
 VERTEX_EPS_M   = 0.2
 ENVELOPE_PAD_M = NEAR_TOL_M
+WORKERS        = 0      # endpoint check processes; 0 = one per CPU
+PROFILE        = None   # .npz endpoint profile; set it to re-run other tolerances without geometry
+PROFILE_MAX_M  = 100.0  # largest NEAR_TOL_M the profile answers
+STATE          = None   # .npz of the last run; set it to re-check only edited features and their neighbours
+COORD_CACHE    = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB   = 2048   # cache size cap; least recently used entries go first
 OUT_BASENAME   = "snap_50"
 
 def norm_name(s):
@@ -34,7 +56,7 @@ def pick_metric_sr(desc):
         if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
             return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     ext = desc.extent
     lon = (ext.XMin + ext.XMax)/2.0
     lat = (ext.YMin + ext.YMax)/2.0
@@ -43,11 +65,27 @@ def pick_metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
-def extent_hits_point_buffer(line_ext, px, py, r):
-    return not (line_ext.XMin > px + r or line_ext.XMax < px - r or
-                line_ext.YMin > py + r or line_ext.YMax < py - r)
+def back_project_points(points, metric_sr):
+    # Metric endpoints back to each feature's own SR; WGS84 targets in one inverse call.
+    out = [None] * len(points)
+    batch = [k for k, p in enumerate(points) if batch_utm_target(p["sr"].factoryCode, metric_sr.factoryCode)]
+    if batch:
+        zone, south = batch_utm_target(points[batch[0]]["sr"].factoryCode, metric_sr.factoryCode)
+        lon, lat = utm_inverse([points[k]["x"] for k in batch], [points[k]["y"] for k in batch], zone, south)
+        for k, x, y in zip(batch, lon.tolist(), lat.tolist()):
+            out[k] = arcpy.PointGeometry(arcpy.Point(x, y), points[k]["sr"])
+    for k, p in enumerate(points):
+        if out[k] is None:
+            pt_m = arcpy.PointGeometry(arcpy.Point(p["x"], p["y"]), metric_sr)
+            try:
+                out[k] = pt_m.projectAs(p["sr"])
+            except:
+                run.swallowed("projectAs")
+                out[k] = pt_m
+    return out
 
 layers = list_target_layers()
 first_desc = arcpy.Describe(layers[0])
@@ -56,36 +94,66 @@ out_path   = first_desc.path if getattr(first_desc, "path", None) else os.path.d
 is_gdb     = out_path.lower().endswith(".gdb")
 out_name   = OUT_BASENAME if is_gdb else OUT_BASENAME + ".shp"
 out_fc     = os.path.join(out_path, out_name)
+run.output = out_fc
 metric_sr  = pick_metric_sr(first_desc)
 
-features = []
-for lyr in layers:
-    d = arcpy.Describe(lyr)
-    oid_name = d.OIDFieldName
-    with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
-        for oid, gsrc in cur:
-            if gsrc is None: 
-                continue
-            try:
-                gm = gsrc if (d.spatialReference and d.spatialReference.name == metric_sr.name) else gsrc.projectAs(metric_sr)
-            except:
-                gm = gsrc
-            if gm is None or gm.pointCount < 2:
-                continue
-            features.append({
-                "layer_name": lyr.name,
-                "oid": int(oid),
-                "geom_src": gsrc,
-                "geom_m": gm,
-                "ext": gm.extent
-            })
-
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-arcpy.CreateFeatureclass_management(out_path, out_name, "POINT", None, "DISABLED", "DISABLED", src_sr)
-arcpy.AddField_management(out_fc, "SRC_LAYER", "TEXT", field_length=64)
-arcpy.AddField_management(out_fc, "SRC_OID",   "LONG")
-arcpy.AddField_management(out_fc, "REASON",    "TEXT", field_length=32)
+layer_srs = [arcpy.Describe(lyr).spatialReference or src_sr for lyr in layers]
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    queries = [lyr.definitionQuery if lyr.supports("DEFINITIONQUERY") else "" for lyr in layers]
+    cache_key = cache and fingerprint([lyr.dataSource for lyr in layers],
+                                      [arcpy.GetCount_management(lyr).getOutput(0) for lyr in layers],
+                                      metric_sr.exportToString(), [run.script, queries])
+    features = cache.get(cache_key, run.counters) if cache_key else None
+if features is None:
+    oids, layer_ids, lines = [], [], []
+    for lid, lyr in enumerate(layers):
+        d = arcpy.Describe(lyr)
+        oid_name = d.OIDFieldName
+        utm = d.spatialReference and batch_utm_target(d.spatialReference.factoryCode, metric_sr.factoryCode)
+        layer_lines = []
+        with run.stage("read %s" % lyr.name):
+            with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
+                for oid, gsrc in cur:
+                    if gsrc is None:
+                        continue
+                    if utm:
+                        gm = gsrc
+                    else:
+                        try:
+                            gm = gsrc.projectAs(metric_sr) if d.spatialReference and d.spatialReference.name != metric_sr.name else gsrc
+                        except:
+                            run.swallowed("projectAs")
+                            gm = gsrc
+                    try:
+                        lm = line_arrays(gm)
+                    except:
+                        run.swallowed("line_arrays")
+                        continue
+                    if len(lm[0]) < 2:
+                        continue
+                    oids.append(int(oid)); layer_ids.append(lid); layer_lines.append(lm)
+        if utm:
+            # WGS84 lon/lat -> UTM for the whole layer in one NumPy call.
+            with run.stage("project %s" % lyr.name):
+                layer_lines = project_lines(layer_lines, *utm)
+        lines.extend(layer_lines)
+
+    with run.stage("store"):
+        features = FeatureStore.from_lines(oids, lines, layers=layer_ids, layer_names=[lyr.name for lyr in layers])
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, features, run.counters)
+run.info["features_read"] = len(features)
+
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(out_path, out_name, "POINT", None, "DISABLED", "DISABLED", src_sr)
+    arcpy.AddField_management(out_fc, "SRC_LAYER", "TEXT", field_length=64)
+    arcpy.AddField_management(out_fc, "SRC_OID",   "LONG")
+    arcpy.AddField_management(out_fc, "REASON",    "TEXT", field_length=32)
 
 if not features:
     try:
@@ -94,63 +162,39 @@ if not features:
         arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
         arcpy.RefreshTOC(); arcpy.RefreshActiveView()
     except:
-        pass
+        run.swallowed("add_layer")
+    run.finish()
     raise SystemExit
 
-points_out = []
-
-for rec in features:
-    gi = rec["geom_m"]
-    p_start = gi.firstPoint
-    p_end   = gi.lastPoint
-    for (px, py) in ((p_start.X, p_start.Y), (p_end.X, p_end.Y)):
-        pt = arcpy.PointGeometry(arcpy.Point(px, py), metric_sr)
-        near_any_neighbor = False
-        snapped_any_neighbor = False
-        for other in features:
-            if other["oid"] == rec["oid"]:
-                continue
-            if not extent_hits_point_buffer(other["ext"], px, py, ENVELOPE_PAD_M):
-                continue
-            gj = other["geom_m"]
-            try:
-                d = pt.distanceTo(gj)
-            except:
-                continue
-            if d <= NEAR_TOL_M:
-                near_any_neighbor = True
-                snapped_here = False
-                for part in gj:
-                    for v in part:
-                        if v is None:
-                            continue
-                        try:
-                            if arcpy.PointGeometry(v, metric_sr).distanceTo(pt) <= VERTEX_EPS_M:
-                                snapped_here = True
-                                break
-                        except:
-                            continue
-                    if snapped_here:
-                        break
-                if snapped_here:
-                    snapped_any_neighbor = True
-                    break
-        if near_any_neighbor and not snapped_any_neighbor:
-            try:
-                pt_src = pt.projectAs(rec["geom_src"].spatialReference if rec["geom_src"].spatialReference else src_sr)
-            except:
-                pt_src = pt
-            points_out.append({
-                "pt_src": pt_src,
-                "layer": rec["layer_name"],
-                "oid": rec["oid"],
-                "reason": "near_not_snapped"
-            })
-
-if points_out:
-    with arcpy.da.InsertCursor(out_fc, ["SHAPE@", "SRC_LAYER", "SRC_OID", "REASON"]) as ic:
-        for p in points_out:
-            ic.insertRow([p["pt_src"], p["layer"], p["oid"], p["reason"]])
+with run.stage("check"):
+    if PROFILE:
+        profile = endpoint_profile(features, PROFILE, PROFILE_MAX_M, "feature", stats=run.counters)
+        found = profile.near_not_snapped(NEAR_TOL_M, VERTEX_EPS_M)
+    elif STATE:
+        found = incremental_near_not_snapped(features, NEAR_TOL_M, VERTEX_EPS_M, STATE, pad=ENVELOPE_PAD_M,
+                                             stats=run.counters)
+    else:
+        found = parallel_near_not_snapped(features, NEAR_TOL_M, VERTEX_EPS_M, pad=ENVELOPE_PAD_M,
+                                          workers=WORKERS, stats=run.counters)
+    points_out = []
+    for i, px, py in found:
+        f = features[i]
+        points_out.append({
+            "x": px,
+            "y": py,
+            "sr": layer_srs[f.layer],
+            "layer": f.layer_name,
+            "oid": f.oid,
+            "reason": REASON_NOT_SNAPPED
+        })
+
+with run.stage("write"):
+    if points_out:
+        pts_src = back_project_points(points_out, metric_sr)
+        with arcpy.da.InsertCursor(out_fc, ["SHAPE@", "SRC_LAYER", "SRC_OID", "REASON"]) as ic:
+            for p, pt_src in zip(points_out, pts_src):
+                ic.insertRow([pt_src, p["layer"], p["oid"], p["reason"]])
+run.info["points"] = len(points_out)
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -158,10 +202,11 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print "Output:", out_fc
 print "Matched layers:", ", ".join([lyr.name for lyr in layers])
 print "Features scanned:", len(features)
 print "Problem endpoints (points) created:", len(points_out)
+print "Run record:", run.finish()
 print "Done."
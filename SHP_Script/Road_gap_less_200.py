@@ -1,14 +1,33 @@
-import arcpy, os, math, re
+import arcpy, os, sys, math, re
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except NameError:
+    pass
+from tcpl_qc.gap_table import table_gap_check
+from tcpl_qc.tiling import parallel_gap_check
+from tcpl_qc.coord_cache import fingerprint, open_cache
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.segments import line_arrays
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import batch_utm_target, project_lines
+
+run = RunRecord("Road_gap_less_200.py")
 
 arcpy.env.overwriteOutput = True
 try:
     arcpy.env.addOutputsToMap = False
 except:
-    pass
+    run.swallowed("addOutputsToMap")
 
 TARGET_NAMES = {"road_c", "trail_c", "cart_track"}
 RADIUS_M     = 200.0
 BUF_EPS      = 0.001
+WORKERS      = 0       # gap check processes; 0 = one per CPU
+GAP_TABLE    = None    # .npz distance table shared by the 200/300 m scripts; None = measure every run
+TABLE_MAX_M  = 300.0   # largest radius the table answers
+COORD_CACHE  = None   # folder caching projected coordinates between runs; None = $TCPL_COORD_CACHE or off
+CACHE_MAX_MB = 2048   # cache size cap; least recently used entries go first
 OUT_BASENAME = "road_gap_less_200"
 
 def norm_name(s):
@@ -33,7 +52,7 @@ def pick_metric_sr(desc):
         if sr and sr.type == "Projected" and "Meter" in (sr.linearUnitName or "Meter"):
             return sr
     except:
-        pass
+        run.swallowed("spatialReference")
     ext = desc.extent
     lon = (ext.XMin + ext.XMax)/2.0
     lat = (ext.YMin + ext.YMax)/2.0
@@ -42,6 +61,7 @@ def pick_metric_sr(desc):
         wkid = 32600 + zone if lat >= 0 else 32700 + zone
         return arcpy.SpatialReference(wkid)
     except:
+        run.swallowed("SpatialReference")
         return arcpy.SpatialReference(3857)
 
 layers = list_target_layers()
@@ -51,28 +71,60 @@ out_path   = first_desc.path if getattr(first_desc, "path", None) else os.path.d
 is_gdb     = out_path.lower().endswith(".gdb")
 out_name   = OUT_BASENAME if is_gdb else OUT_BASENAME + ".shp"
 out_fc     = os.path.join(out_path, out_name)
+run.output = out_fc
 metric_sr  = pick_metric_sr(first_desc)
 
-roads = []
-for lyr in layers:
-    d = arcpy.Describe(lyr)
-    oid_name = d.OIDFieldName
-    with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
-        for oid, gsrc in cur:
-            soid = int(oid)
-            try:
-                gm = gsrc.projectAs(metric_sr) if d.spatialReference.name != metric_sr.name else gsrc
-            except:
-                gm = gsrc
-            try:
-                bm = gm.buffer(RADIUS_M + BUF_EPS)
-            except:
-                continue
-            roads.append({"oid": soid, "geom_src": gsrc, "geom_m": gm, "buf_m": bm})
-
-if arcpy.Exists(out_fc):
-    arcpy.Delete_management(out_fc)
-arcpy.CreateFeatureclass_management(out_path, out_name, "POLYLINE", None, "DISABLED", "DISABLED", src_sr)
+with run.stage("fingerprint"):
+    cache = open_cache(COORD_CACHE, CACHE_MAX_MB)
+    queries = [lyr.definitionQuery if lyr.supports("DEFINITIONQUERY") else "" for lyr in layers]
+    cache_key = cache and fingerprint([lyr.dataSource for lyr in layers],
+                                      [arcpy.GetCount_management(lyr).getOutput(0) for lyr in layers],
+                                      metric_sr.exportToString(), [run.script, queries])
+    roads = cache.get(cache_key, run.counters) if cache_key else None
+if roads is None:
+    oids, layer_ids, lines = [], [], []
+    for lid, lyr in enumerate(layers):
+        d = arcpy.Describe(lyr)
+        oid_name = d.OIDFieldName
+        utm = batch_utm_target(d.spatialReference.factoryCode, metric_sr.factoryCode)
+        layer_lines = []
+        with run.stage("read %s" % lyr.name):
+            with arcpy.da.SearchCursor(lyr, [oid_name, "SHAPE@"]) as cur:
+                for oid, gsrc in cur:
+                    if utm:
+                        gm = gsrc
+                    else:
+                        try:
+                            gm = gsrc.projectAs(metric_sr) if d.spatialReference.name != metric_sr.name else gsrc
+                        except:
+                            run.swallowed("projectAs")
+                            gm = gsrc
+                    try:
+                        lm = line_arrays(gm)
+                    except:
+                        run.swallowed("line_arrays")
+                        continue
+                    if not len(lm[0]):
+                        continue
+                    oids.append(int(oid)); layer_ids.append(lid); layer_lines.append(lm)
+        if utm:
+            # WGS84 lon/lat -> UTM for the whole layer in one NumPy call.
+            with run.stage("project %s" % lyr.name):
+                layer_lines = project_lines(layer_lines, *utm)
+        lines.extend(layer_lines)
+
+    with run.stage("store"):
+        roads = FeatureStore.from_lines(oids, lines, layers=layer_ids, layer_names=[lyr.name for lyr in layers])
+        del lines
+    if cache_key:
+        with run.stage("cache_write"):
+            cache.put(cache_key, roads, run.counters)
+run.info["features_read"] = len(roads)
+
+with run.stage("create_output"):
+    if arcpy.Exists(out_fc):
+        arcpy.Delete_management(out_fc)
+    arcpy.CreateFeatureclass_management(out_path, out_name, "POLYLINE", None, "DISABLED", "DISABLED", src_sr)
 
 if not roads:
     try:
@@ -81,33 +133,32 @@ if not roads:
         arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
         arcpy.RefreshTOC(); arcpy.RefreshActiveView()
     except:
-        pass
+        run.swallowed("add_layer")
+    run.finish()
     raise SystemExit
 
-keep_mutual   = set()
-keep_onesided = set()
-n = len(roads)
-for i in range(n):
-    gi = roads[i]["geom_m"]; bi = roads[i]["buf_m"]; oi = roads[i]["oid"]
-    for j in range(i+1, n):
-        gj = roads[j]["geom_m"]; bj = roads[j]["buf_m"]; oj = roads[j]["oid"]
-        try:
-            a_in_b = gi.within(bj)
-            b_in_a = gj.within(bi)
-        except:
-            continue
-        if a_in_b and b_in_a:
-            keep_mutual.add(oi); keep_mutual.add(oj)
-        elif a_in_b or b_in_a:
-            keep_onesided.add(oi if a_in_b else oj)
+# Kept features are (layer, oid): OIDs repeat across the matched layers.
+with run.stage("check"):
+    if GAP_TABLE:
+        mutual_idx, onesided_idx = table_gap_check(roads, RADIUS_M + BUF_EPS, GAP_TABLE, TABLE_MAX_M + BUF_EPS,
+                                                   stats=run.counters)
+    else:
+        mutual_idx, onesided_idx = parallel_gap_check(roads, RADIUS_M + BUF_EPS, workers=WORKERS, stats=run.counters)
+keys = roads.keys()
+keep_mutual   = set(keys[i] for i in mutual_idx)
+keep_onesided = set(keys[i] for i in onesided_idx)
 
 final_keep = keep_mutual.union(keep_onesided)
 
-if final_keep:
-    with arcpy.da.InsertCursor(out_fc, ["SHAPE@"]) as ic:
-        for rec in roads:
-            if rec["oid"] in final_keep:
-                ic.insertRow([rec["geom_src"]])
+with run.stage("write"):
+    if final_keep:
+        with arcpy.da.InsertCursor(out_fc, ["SHAPE@"]) as ic:
+            for lid, lyr in enumerate(layers):
+                with arcpy.da.SearchCursor(lyr, ["OID@", "SHAPE@"]) as cur:
+                    for oid, gsrc in cur:
+                        if (lid, int(oid)) in final_keep:
+                            ic.insertRow([gsrc])
+run.info["kept"] = len(final_keep)
 
 try:
     mxd = arcpy.mapping.MapDocument("CURRENT")
@@ -115,11 +166,12 @@ try:
     arcpy.mapping.AddLayer(df, arcpy.mapping.Layer(out_fc), "TOP")
     arcpy.RefreshTOC(); arcpy.RefreshActiveView()
 except:
-    pass
+    run.swallowed("add_layer")
 
 print "Output:", out_fc
 print "Matched layers:", ", ".join([lyr.name for lyr in layers])
 print "Features read:", len(roads)
 print "Kept (mutual):", len(keep_mutual), " | Kept (one-sided):", len(keep_onesided)
 print "Final kept (union):", len(final_keep)
+print "Run record:", run.finish()
 print "Done."
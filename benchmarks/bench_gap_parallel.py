@@ -0,0 +1,63 @@
+#... TCPL scaling of the tiled gap check over worker processes (headless)
+#
+#   python benchmarks/bench_gap_parallel.py                    100k roads, 1..16 workers
+#   python benchmarks/bench_gap_parallel.py 10000 1000000 --workers 1 4 32
+#   python benchmarks/bench_gap_parallel.py --spawn             workers started afresh, as on Windows and in ArcMap
+#
+# Runs tcpl_qc.tiling.parallel_gap_check on the synthetic road network at
+# the Road_gap_all_less_200 radius and checks every run against the serial
+# gap_check: keep_mutual and keep_onesided must be identical. Speedup and
+# efficiency are against the serial run. Workers beyond the machine's CPU
+# count still run, but can only show overhead. --spawn uses the
+# tcpl_qc.spawn workers even where fork is available.
+
+import argparse, multiprocessing, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import checks, synthetic, tiling
+from tcpl_qc.tiling import parallel_gap_check
+
+SIZES   = [100000]
+WORKERS = [1, 2, 4, 8, 16]
+SEED    = 0
+GAP_M   = 200.001
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Tiled gap check scaling over worker processes")
+    ap.add_argument("sizes", type=int, nargs="*", default=SIZES)
+    ap.add_argument("--workers", type=int, nargs="+", default=WORKERS)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--spawn", action="store_true", help="start workers afresh instead of forking")
+    args = ap.parse_args(argv)
+    if args.spawn:
+        tiling.can_fork = lambda: False
+
+    print("cpus: %d, fork: %s" % (multiprocessing.cpu_count(), tiling.can_fork()))
+    print("%9s %8s %6s %10s %8s %10s %8s %9s" % ("n", "workers", "tiles", "seconds", "speedup",
+                                                 "efficiency", "flagged", "identical"))
+    ok = True
+    for n in args.sizes:
+        store = synthetic.road_network(n, args.seed)[0]
+        t0 = now()
+        serial = checks.gap_check(store, GAP_M)
+        base = now() - t0
+        print("%9d %8s %6s %10.3f %8s %10s %8d %9s" % (n, "serial", "-", base, "1.00x", "-",
+                                                      len(serial[0] | serial[1]), "-"))
+        for w in args.workers:
+            stats = Counter()
+            t0 = now()
+            got = parallel_gap_check(store, GAP_M, workers=w, stats=stats)
+            dt = now() - t0
+            same = got == serial
+            ok = ok and same
+            print("%9d %8d %6s %10.3f %7.2fx %9.0f%% %8d %9s" % (
+                n, stats["gap_workers"], stats.get("gap_tiles", "-"), dt, base / dt,
+                100.0 * base / dt / stats["gap_workers"], len(got[0] | got[1]), same))
+    if not ok:
+        raise SystemExit("parallel results differ from the serial gap check")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
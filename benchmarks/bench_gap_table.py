@@ -0,0 +1,61 @@
+#... TCPL gap distance table vs. one gap_check per radius (headless)
+#
+#   python benchmarks/bench_gap_table.py                 10k and 100k roads
+#   python benchmarks/bench_gap_table.py 50000 --radii 100 200 300
+#
+# Builds tcpl_qc.gap_table.GapTable once at the largest radius, answers
+# every radius from it and compares each answer with a fresh gap_check.
+
+import argparse, os, sys, tempfile
+from timeit import default_timer as now
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import checks, synthetic
+from tcpl_qc.gap_table import GapTable
+
+SIZES = [10000, 100000]
+RADII = [200.001, 300.001]
+SEED  = 0
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Gap distance table vs. per-radius gap checks")
+    ap.add_argument("sizes", type=int, nargs="*", default=SIZES)
+    ap.add_argument("--radii", type=float, nargs="+", default=RADII)
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    ok = True
+    for n in args.sizes:
+        store = synthetic.road_network(n, args.seed)[0]
+        t0 = now()
+        table = GapTable.build(store, max(args.radii))
+        build = now() - t0
+        path = os.path.join(tempfile.gettempdir(), "bench_gap_table_%d.npz" % n)
+        t0 = now()
+        table.save(path)
+        table = GapTable.load(path)
+        io = now() - t0
+        print("n=%d: table of %d pairs built in %.3f s, saved+loaded in %.3f s (%.0f kB)"
+              % (n, len(table), build, io, os.path.getsize(path) / 1024.0))
+        os.remove(path)
+        print("%10s %12s %12s %9s %9s" % ("radius", "gap_check s", "table s", "flagged", "identical"))
+        total = 0.0
+        for r in args.radii:
+            t0 = now()
+            serial = checks.gap_check(store, r)
+            dt = now() - t0
+            total += dt
+            t0 = now()
+            got = table.gap_sets(r)
+            dq = now() - t0
+            same = got == serial
+            ok = ok and same
+            print("%10.3f %12.3f %12.5f %9d %9s" % (r, dt, dq, len(got[0] | got[1]), same))
+        print("all radii: %.3f s of gap checks vs %.3f s to build the table" % (total, build))
+        print("")
+    if not ok:
+        raise SystemExit("table answers differ from gap_check")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+#... TCPL incremental road dangle re-check vs. full near_not_snapped (headless)
+#
+#   python benchmarks/bench_incremental.py              10k and 50k roads, 3 rounds of edits
+#   python benchmarks/bench_incremental.py 20000 --edits 200 --rounds 5
+#
+# Runs incremental_near_not_snapped once to save a state, then applies
+# rounds of random edits (end vertices moved, features deleted, new
+# features inserted) and compares every incremental answer with a fresh
+# near_not_snapped on the edited store.
+
+import argparse, os, sys, tempfile
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import checks, synthetic
+from tcpl_qc.incremental import incremental_near_not_snapped
+from tcpl_qc.store import FeatureStore
+
+SIZES      = [10000, 50000]
+EDITS      = 50       # per round, split between modify / delete / insert
+ROUNDS     = 3
+NEAR_TOL_M = 50.0
+VERTEX_EPS = 0.001
+SEED       = 0
+
+def edit(oids, lines, n_edits, next_oid, rng):
+    """Move an end vertex of some lines, delete some and insert copies of others nearby."""
+    oids, lines = list(oids), list(lines)
+    k = max(1, n_edits // 3)
+    for i in rng.choice(len(lines), k, replace=False).tolist():
+        xy, offsets = lines[i]
+        xy = xy.copy()
+        xy[-1 if rng.rand() < 0.5 else 0] += rng.uniform(-40.0, 40.0, 2)
+        lines[i] = (xy, offsets)
+    for i in sorted(rng.choice(len(lines), k, replace=False).tolist(), reverse=True):
+        del oids[i], lines[i]
+    for i in rng.choice(len(lines), k, replace=False).tolist():
+        xy, offsets = lines[i]
+        oids.append(next_oid)
+        lines.append((xy + rng.uniform(-60.0, 60.0, 2), offsets.copy()))
+        next_oid += 1
+    return oids, lines, next_oid
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Incremental vs. full road dangle check")
+    ap.add_argument("sizes", type=int, nargs="*", default=SIZES)
+    ap.add_argument("--edits", type=int, default=EDITS)
+    ap.add_argument("--rounds", type=int, default=ROUNDS)
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    ok = True
+    rng = np.random.RandomState(args.seed)
+    for n in args.sizes:
+        store = synthetic.road_network(n, args.seed)[0]
+        oids, lines = store.oid.tolist(), [(xy.copy(), off.copy()) for xy, off in store.lines()]
+        next_oid = max(oids) + 1
+        path = os.path.join(tempfile.gettempdir(), "bench_incremental_%d.npz" % n)
+        if os.path.exists(path):
+            os.remove(path)
+        t0 = now()
+        incremental_near_not_snapped(store, NEAR_TOL_M, VERTEX_EPS, path)
+        print("n=%d: first run (full, state saved) in %.3f s" % (n, now() - t0))
+        print("%6s %9s %9s %11s %10s %9s %9s" % ("round", "features", "full s", "increment s",
+                                                 "rechecked", "flagged", "identical"))
+        for r in range(1, args.rounds + 1):
+            oids, lines, next_oid = edit(oids, lines, args.edits, next_oid, rng)
+            store = FeatureStore.from_lines(oids, lines)
+            t0 = now()
+            full = checks.near_not_snapped(store, NEAR_TOL_M, VERTEX_EPS)
+            dt = now() - t0
+            stats = Counter()
+            t0 = now()
+            got = incremental_near_not_snapped(store, NEAR_TOL_M, VERTEX_EPS, path, stats=stats)
+            di = now() - t0
+            same = got == full
+            ok = ok and same
+            print("%6d %9d %9.3f %11.3f %10d %9d %9s" % (r, len(store), dt, di, stats["endpoints_rechecked"],
+                                                        len(got), same))
+        os.remove(path)
+        print("")
+    if not ok:
+        raise SystemExit("incremental answers differ from near_not_snapped")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
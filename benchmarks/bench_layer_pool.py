@@ -0,0 +1,88 @@
+#... TCPL per-layer worker processes for the polygon tool (headless)
+#
+#   python benchmarks/bench_layer_pool.py                 2000 polygons over four layers
+#   python benchmarks/bench_layer_pool.py 8000 --workers 2 4 --cell 4
+#   python benchmarks/bench_layer_pool.py --spawn            workers started afresh, as on Windows and in ArcMap
+#
+# The synthetic polygon layer is split into its four POLYGON_LAYERS and each
+# layer is one job, as in Polygon_gap_all_less_50 with NARROW_MODE =
+# "raster" (the buffer chain needs arcpy). Jobs record stages and counters
+# into a RunRecord like the script does. Every pooled run must return the
+# same parts in the same layer order as the serial one, with the same
+# merged counters. Workers beyond the CPU count still run, but can only
+# show overhead. --spawn uses the tcpl_qc.spawn workers even where fork is
+# available; they load this script as a module and get the layers pickled.
+
+import argparse, multiprocessing, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import layer_pool, synthetic
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.layer_pool import map_layers
+from tcpl_qc.raster_opening import raster_narrow_parts
+
+N        = 2000
+WORKERS  = [2, 4]
+CELL_M   = 2.0
+RADIUS_M = 25.0
+MIN_AREA = 10.0
+SEED     = 0
+
+run = RunRecord("bench_layer_pool.py")
+
+def one_layer(store, label, cell):
+    with run.stage("%s opening" % label):
+        parts, areas = raster_narrow_parts(store, RADIUS_M, cell, min_area=MIN_AREA, stats=run.counters)
+    return parts, areas
+
+def timed(jobs, workers):
+    run.stages, run.counters = [], Counter()
+    t0 = now()
+    results = map_layers(one_layer, jobs, workers, run)
+    dt = now() - t0
+    used = run.counters.pop("layer_workers")
+    return dt, results, dict(run.counters), used
+
+def same(a, b):
+    for (pa, aa), (pb, ab) in zip(a, b):
+        if not (np.array_equal(pa.oid, pb.oid) and np.array_equal(pa.xy, pb.xy)
+                and np.array_equal(pa.part_offsets, pb.part_offsets) and np.array_equal(aa, ab)):
+            return False
+    return len(a) == len(b)
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Polygon tool layers on worker processes vs. one after another")
+    ap.add_argument("n", type=int, nargs="?", default=N)
+    ap.add_argument("--workers", type=int, nargs="+", default=WORKERS)
+    ap.add_argument("--cell", type=float, default=CELL_M)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--spawn", action="store_true", help="start workers afresh instead of forking")
+    args = ap.parse_args(argv)
+    if args.spawn:
+        layer_pool.can_fork = lambda: False
+
+    store = synthetic.polygon_layer(args.n, args.seed)[0]
+    jobs = [(store.take(np.flatnonzero(store.layer == k)), name, args.cell)
+            for k, name in enumerate(store.layer_names)]
+    print("cpus: %d, fork: %s" % (multiprocessing.cpu_count(), layer_pool.can_fork()))
+    print("layers: %s" % ", ".join("%s %d" % (name, len(s)) for s, name, _ in jobs))
+    print("%8s %10s %8s %8s %9s" % ("workers", "seconds", "speedup", "parts", "identical"))
+    base, serial, counters, _ = timed(jobs, 1)
+    print("%8s %10.3f %8s %8d %9s" % ("serial", base, "1.00x", sum(len(p) for p, _ in serial), "-"))
+    ok = True
+    for w in args.workers:
+        dt, got, got_counters, used = timed(jobs, w)
+        match = same(got, serial) and got_counters == counters
+        ok = ok and match
+        print("%8d %10.3f %7.2fx %8d %9s" % (used, dt, base / dt,
+                                            sum(len(p) for p, _ in got), match))
+    if not ok:
+        raise SystemExit("pooled layers differ from the serial run")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
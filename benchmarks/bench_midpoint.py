@@ -0,0 +1,105 @@
+#... TCPL vectorized midpoint check vs. the per-feature loop it replaced (headless)
+#
+#   python benchmarks/bench_midpoint.py                 10k and 100k rivers
+#   python benchmarks/bench_midpoint.py 50000 --radius 100
+#
+# The reference is the former implementation: positionAlongLine-style
+# midpoints one line at a time, then for every midpoint an STR-tree query
+# and point_line_distance against each candidate line. The midpoints must
+# be bit-identical and the kept features the same.
+
+import argparse, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import checks, synthetic
+from tcpl_qc.rtree import STRtree
+from tcpl_qc.segments import line_length, point_line_distance, position_along
+from tcpl_qc.store import FeatureStore
+
+SIZES  = [10000, 100000]
+RADIUS = 200.001
+SEED   = 0
+
+def reference_midpoints(store):
+    out = np.full((len(store), 2), np.nan)
+    for i in range(len(store)):
+        line = store.line(i)
+        if len(line[0]):
+            out[i] = position_along(line, line_length(line) / 2.0)
+    return out
+
+def reference_check(store, radius, mids):
+    tree = STRtree(store.env)
+    keep = []
+    for i in range(len(store)):
+        mx, my = mids[i]
+        if np.isnan(mx):
+            continue
+        for j in tree.query_within((mx, my, mx, my), radius).tolist():
+            if j != i and point_line_distance(mx, my, store.line(j)) <= radius:
+                keep.append(i)
+                break
+    return keep
+
+def odd_lines(rng, n=400):
+    """Multipart lines, single vertices, empty features and long lines of random length."""
+    lines = []
+    for k in range(n):
+        kind = k % 5
+        base = rng.uniform(0, 3000, 2)
+        if kind == 0:
+            lines.append((np.zeros((0, 2)), np.zeros(1, dtype=np.int64)))
+        elif kind == 1:
+            lines.append((base[None, :], np.array([0, 1])))
+        elif kind == 2:
+            xy = base + rng.normal(0, 50, (3, 2))
+            lines.append((xy, np.array([0, 1, 2, 3])))           # three single-vertex parts
+        elif kind == 3:
+            m = rng.randint(2, 300)
+            xy = base + np.cumsum(rng.normal(0, 20, (m, 2)), axis=0)
+            cut = sorted(set(rng.randint(1, m, 3).tolist()))
+            lines.append((xy, np.array([0] + cut + [m])))
+        else:
+            m = rng.randint(2, 40)
+            xy = base + np.cumsum(rng.normal(0, 30, (m, 2)), axis=0)
+            xy[m // 2] = xy[m // 2 - 1]                          # a zero-length segment
+            lines.append((xy, np.array([0, m])))
+    return FeatureStore.from_lines(np.arange(n), lines)
+
+def compare(label, store, radius):
+    t0 = now()
+    ref_mids = reference_midpoints(store)
+    ref = reference_check(store, radius, ref_mids)
+    t_ref = now() - t0
+    stats = Counter()
+    t0 = now()
+    mids = checks.midpoints(store)
+    got = checks.midpoint_check(store, radius, mids=mids, stats=stats)
+    t_new = now() - t0
+    same = np.array_equal(mids, ref_mids, equal_nan=True) and got == ref
+    print("%-14s %9d %10.3f %10.3f %8.1fx %8d %9s" % (label, len(store), t_ref, t_new,
+                                                       t_ref / t_new if t_new > 0 else float("inf"), len(got), same))
+    return same
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Vectorized midpoint check vs. per-feature loop")
+    ap.add_argument("sizes", type=int, nargs="*", default=SIZES)
+    ap.add_argument("--radius", type=float, default=RADIUS)
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    print("%-14s %9s %10s %10s %9s %8s %9s" % ("data", "n", "loop s", "numpy s", "speedup", "kept", "identical"))
+    ok = compare("odd lines", odd_lines(np.random.RandomState(args.seed)), args.radius)
+    for n in args.sizes:
+        ok = compare("rivers", synthetic.river_network(n, args.seed)[0], args.radius) and ok
+        ok = compare("roads", synthetic.road_network(n, args.seed)[0], args.radius) and ok
+    if not ok:
+        raise SystemExit("vectorized midpoints or kept features differ from the loop")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
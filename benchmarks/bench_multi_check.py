@@ -0,0 +1,92 @@
+#... TCPL run_checks (one read, shared indexes) vs. the road scripts one after another (headless)
+#
+#   python benchmarks/bench_multi_check.py                    10k and 50k roads, every check
+#   python benchmarks/bench_multi_check.py 20000 --checks gap_200 gap_300 snap_50
+#
+# The synthetic road network is turned into WGS84 lon/lat once, as the
+# layer would be stored. "Scripts" then reads (projects + packs) it again
+# for every check and runs each check on its own, as the standalone
+# scripts do; "run_checks" reads it once and runs the whole selection over
+# tcpl_qc.multi_check.SharedChecks. Both must flag the same features.
+# Reading here is only projection and packing; in ArcMap every script also
+# pays a full SearchCursor pass, which run_checks makes once.
+
+import argparse, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import checks, synthetic
+from tcpl_qc.geodesic import shorter_than
+from tcpl_qc.multi_check import CHECKS, run_checks
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tmerc import project_lines, utm_inverse
+
+SIZES = [10000, 50000]
+SEED  = 0
+
+def read(oids, lonlat_lines):
+    """What every script does first: project the lon/lat lines and pack them into a store."""
+    return FeatureStore.from_lines(oids, project_lines(lonlat_lines, synthetic.UTM_ZONE))
+
+def standalone(name, store, lonlat):
+    """One check the way its own script runs it (own index, nothing shared)."""
+    kind, p, _ = CHECKS[name]
+    if kind == "gap":
+        mutual, onesided = checks.gap_check(store, p["radius"])
+        return sorted(mutual | onesided)
+    if kind == "snap":
+        return checks.snap_check(store, p["near_tol"], p["vertex_eps"])
+    if kind == "midpoint":
+        return checks.midpoint_check(store, p["radius"])
+    short = shorter_than(lonlat, store.part_offsets, store.feature_offsets, p["max_length"])[0]
+    return np.flatnonzero(short).tolist()
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="One-pass multi-check engine vs. scripts in sequence")
+    ap.add_argument("sizes", type=int, nargs="*", default=SIZES)
+    ap.add_argument("--checks", nargs="+", default=list(CHECKS), choices=list(CHECKS))
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    ok = True
+    for n in args.sizes:
+        store = synthetic.road_network(n, args.seed)[0]
+        lon, lat = utm_inverse(store.xy[:, 0], store.xy[:, 1], synthetic.UTM_ZONE)
+        lonlat = np.column_stack((lon, lat))
+        lonlat_lines = [(lonlat[a:b], off) for (xy, off), (a, b) in
+                        zip(store.lines(), [store.vertex_range(i) for i in range(len(store))])]
+        oids = store.oid.tolist()
+
+        print("n=%d" % n)
+        print("%-14s %10s %10s" % ("check", "script s", "flagged"))
+        t_seq = t_reads = 0.0
+        seq = {}
+        for name in args.checks:
+            t0 = now()
+            s = read(oids, lonlat_lines)
+            t_reads += now() - t0
+            seq[name] = standalone(name, s, lonlat)
+            dt = now() - t0
+            t_seq += dt
+            print("%-14s %10.3f %10d" % (name, dt, len(seq[name])))
+
+        stats = Counter()
+        t0 = now()
+        s = read(oids, lonlat_lines)
+        t_read = now() - t0
+        got = run_checks(s, args.checks, lonlat=lonlat, stats=stats)
+        t_all = now() - t0
+        same = all(got[name] == seq[name] for name in args.checks)
+        ok = ok and same
+        print("scripts in sequence: %.3f s (reads %.3f s) | run_checks: %.3f s (read %.3f s) | %.2fx | identical: %s"
+              % (t_seq, t_reads, t_all, t_read, t_seq / t_all if t_all > 0 else float("inf"), same))
+        print("")
+    if not ok:
+        raise SystemExit("run_checks results differ from the standalone checks")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,167 @@
+#... TCPL localized polygon opening (OPENING_WINDOWS) vs. opening whole polygons
+#
+#   python benchmarks/bench_opening_windows.py                 400 dumbbells, 4 large polygons
+#   python benchmarks/bench_opening_windows.py --small 2000 --large 8 --vertices 20000
+#
+# For the synthetic dumbbells and for large two-blob polygons of about
+# --vertices vertices it reports how long tcpl_qc.opening_windows takes,
+# how much of the polygon area the windows cover, and checks:
+#   - windows: every sampled point of a polygon outside its windows lies in
+#     a disk of radius RADIUS_M inside the polygon (the disk tangent at its
+#     nearest boundary point, allowed to reach XY_TOL_M outside);
+#   - raster: the windowed raster opening equals the whole-polygon raster
+#     opening inside the windows, cell for cell. Outside them the whole
+#     raster only has staircase cells along diagonal edges, which are
+#     counted but are no narrow parts of the polygons themselves;
+#   - buffer chain (arcpy only): Buffer -r / +r / Erase on whole polygons
+#     and on polygons cut to their windows give the same area per polygon.
+
+import argparse, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import synthetic
+from tcpl_qc.opening_windows import window_boxes
+from tcpl_qc.raster_opening import (_grid, MAX_CELLS, box_mask, narrow_mask, raster_narrow_parts, rasterize,
+                                    windowed_narrow_mask)
+from tcpl_qc.segments import point_segment_matrix
+
+SMALL    = 400
+LARGE    = 4
+VERTICES = 10000
+CELL_M   = 2.0
+RADIUS_M = 25.0
+XY_TOL_M = 0.001
+MIN_AREA = 10.0
+SAMPLES  = 2000    # points checked per polygon
+SEED     = 0
+
+def ring_segments(xy, offsets):
+    a, b = [], []
+    for k in range(len(offsets) - 1):
+        idx = np.arange(offsets[k], offsets[k + 1])
+        a.append(idx)
+        b.append(np.roll(idx, -1))
+    a, b = np.concatenate(a), np.concatenate(b)
+    return xy[a], xy[b]
+
+def uncovered(xy, offsets, pts, radius, tol, chunk=256):
+    """Points whose tangent disk of the given radius leaves the polygon by more than tol."""
+    p0, p1 = ring_segments(xy, offsets)
+    bad = 0
+    for s in range(0, len(pts), chunk):
+        p = pts[s:s + chunk]
+        d = point_segment_matrix(p, p0, p1)
+        k = np.argmin(d, axis=1)
+        dmin = d[np.arange(len(p)), k]
+        near = (dmin < radius) & (dmin > 0)
+        p, k, dmin = p[near], k[near], dmin[near]
+        dx, dy = p1[k, 0] - p0[k, 0], p1[k, 1] - p0[k, 1]
+        t = np.clip(((p[:, 0] - p0[k, 0]) * dx + (p[:, 1] - p0[k, 1]) * dy) / (dx * dx + dy * dy), 0.0, 1.0)
+        q = np.column_stack((p0[k, 0] + t * dx, p0[k, 1] + t * dy))
+        c = q + radius * (p - q) / dmin[:, None]
+        dc = point_segment_matrix(c, p0, p1).min(axis=1)
+        bad += int(np.count_nonzero(dc < radius - tol - 1e-9))
+    return bad
+
+def check(store, windows, cell, samples, rng):
+    """(share of inside cells in windows, uncovered samples, differing cells, staircase cells)."""
+    owner, boxes = windows
+    start = np.searchsorted(owner, np.arange(len(store) + 1))
+    inside_n = window_n = bad = differ = stairs = 0
+    for f in range(len(store)):
+        xy, offsets = store.line(f)
+        x0, y0, c, nx, ny = _grid(store.env[f], RADIUS_M, cell, MAX_CELLS)
+        inside = rasterize(xy, offsets, x0, y0, c, nx, ny)
+        window = box_mask(boxes[start[f]:start[f + 1]], x0, y0, c, nx, ny)
+        inside_n += int(inside.sum())
+        window_n += int((inside & window).sum())
+        full = narrow_mask(inside, RADIUS_M / c)
+        differ += int((windowed_narrow_mask(inside, window, RADIUS_M / c) != (full & window)).sum())
+        stairs += int((full & ~window).sum())
+        jj, ii = np.nonzero(inside & ~window)
+        if len(jj):
+            pick = rng.choice(len(jj), min(samples, len(jj)), replace=False)
+            pts = np.column_stack((x0 + (ii[pick] + 0.5) * c, y0 + (jj[pick] + 0.5) * c))
+            bad += uncovered(xy, offsets, pts, RADIUS_M, XY_TOL_M)
+    return window_n / float(max(inside_n, 1)), bad, differ, stairs
+
+def buffer_chain(store):
+    """(whole s, windowed s, max |area difference|) from the arcpy chain, or None without arcpy."""
+    try:
+        import arcpy
+    except ImportError:
+        return None
+    import Polygon_gap_all_less_50 as tool
+    sr = arcpy.SpatialReference(32600 + synthetic.UTM_ZONE)
+    polygons = []
+    for i in range(len(store)):
+        xy, offsets = store.line(i)
+        polygons.append((int(store.oid[i]), tool.rings_polygon(xy, offsets, sr)))
+
+    def areas(windowed):
+        out = Counter()
+        for oid, gap in tool.open_and_erase(iter(polygons), sr, windowed):
+            out[oid] += gap.area
+        return out
+
+    t0 = now()
+    whole = areas(False)
+    t_whole = now() - t0
+    t0 = now()
+    local = areas(True)
+    t_local = now() - t0
+    diff = max([abs(whole[k] - local[k]) for k in set(whole) | set(local)] or [0.0])
+    return t_whole, t_local, diff
+
+def run(label, store, cell, samples, seed):
+    stats = Counter()
+    t0 = now()
+    windows = window_boxes(store, RADIUS_M, XY_TOL_M, stats=stats)
+    t_win = now() - t0
+    t0 = now()
+    raster_narrow_parts(store, RADIUS_M, cell, min_area=MIN_AREA)
+    t_full = now() - t0
+    t0 = now()
+    raster_narrow_parts(store, RADIUS_M, cell, min_area=MIN_AREA, windows=windows, stats=stats)
+    t_local = now() - t0
+    share, bad, differ, stairs = check(store, windows, cell, samples, np.random.RandomState(seed))
+    print("%-10s %6d %9d %8.3f %7.1f%% %9.3f %9.3f %8d %8d %8d" % (
+        label, len(store), len(store.xy), t_win, 100.0 * share, t_full, t_win + t_local,
+        bad, differ, stairs))
+    chain = buffer_chain(store)
+    if chain is None:
+        print("%-10s buffer chain: arcpy not available (needs ArcMap)" % "")
+    else:
+        print("%-10s buffer chain: whole %.3f s, windowed %.3f s, max |dA| %.6f m2" % (("",) + chain))
+    return bad == 0 and differ == 0
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Localized polygon opening vs. opening whole polygons")
+    ap.add_argument("--small", type=int, default=SMALL, help="synthetic dumbbell polygons")
+    ap.add_argument("--large", type=int, default=LARGE, help="large two-blob polygons")
+    ap.add_argument("--vertices", type=int, default=VERTICES)
+    ap.add_argument("--cell", type=float, default=CELL_M)
+    ap.add_argument("--samples", type=int, default=SAMPLES)
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    print("%-10s %6s %9s %8s %8s %9s %9s %8s %8s %8s" % ("data", "n", "vertices", "win s", "in win",
+                                                         "raster s", "local s", "uncov", "differ",
+                                                         "stairs"))
+    ok = True
+    if args.small:
+        ok = run("dumbbells", synthetic.polygon_layer(args.small, args.seed)[0], args.cell,
+                 args.samples, args.seed) and ok
+    if args.large:
+        ok = run("large", synthetic.large_polygon_layer(args.large, args.seed, args.vertices)[0], args.cell,
+                 args.samples, args.seed) and ok
+    if not ok:
+        raise SystemExit("points outside the windows are narrow, or windowed parts differ from whole polygons")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
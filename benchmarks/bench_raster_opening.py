@@ -0,0 +1,119 @@
+#... TCPL raster opening (NARROW_MODE = "raster") vs. the buffer chain on synthetic polygons
+#
+#   python benchmarks/bench_raster_opening.py                    200 dumbbells, 4 / 2 / 1 m cells
+#   python benchmarks/bench_raster_opening.py 1000 --cells 2 1 --ref-cell 0.5
+#
+# The narrow parts of every polygon are computed at each cell size and
+# compared per polygon with a reference: the buffer chain of
+# Polygon_gap_all_less_50 (Buffer -r, Buffer +r, Erase in in_memory) when
+# arcpy imports, otherwise the raster mode itself at --ref-cell. Reported
+# per cell size: seconds, polygons/s, polygons flagged, how many of the
+# injected narrow necks were found, and the median / 95th percentile of
+# |area - reference area| over polygons with a narrow part in either.
+
+import argparse, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import synthetic
+from tcpl_qc.raster_opening import raster_narrow_parts
+
+N        = 200
+CELLS    = [4.0, 2.0, 1.0]
+REF_CELL = 0.5
+RADIUS_M = 25.0
+MIN_AREA = 10.0
+SEED     = 0
+
+def per_polygon(store, parts, areas):
+    # Narrow area per polygon of store (0 where nothing is narrow).
+    index = dict((o, i) for i, o in enumerate(store.oid.tolist()))
+    out = np.zeros(len(store))
+    for oid, a in zip(parts.oid.tolist(), areas.tolist()):
+        out[index[oid]] += a
+    return out
+
+def raster_run(store, cell):
+    stats = Counter()
+    t0 = now()
+    parts, areas = raster_narrow_parts(store, RADIUS_M, cell, min_area=MIN_AREA, stats=stats)
+    return now() - t0, per_polygon(store, parts, areas), stats
+
+def buffer_chain(store):
+    """(seconds, per-polygon areas) from the arcpy buffer chain, or None without arcpy."""
+    try:
+        import arcpy
+    except ImportError:
+        return None
+    arcpy.env.overwriteOutput = True
+    sr = arcpy.SpatialReference(32600 + synthetic.UTM_ZONE)
+    src = arcpy.CreateUniqueName("bench_poly", "in_memory")
+    arcpy.CreateFeatureclass_management("in_memory", os.path.basename(src), "POLYGON", spatial_reference=sr)
+    arcpy.AddField_management(src, "PID", "LONG")
+    with arcpy.da.InsertCursor(src, ["SHAPE@", "PID"]) as ic:
+        for i in range(len(store)):
+            xy, offsets = store.line(i)
+            rings = arcpy.Array()
+            for k in range(len(offsets) - 1):
+                rings.add(arcpy.Array([arcpy.Point(x, y) for x, y in xy[offsets[k]:offsets[k + 1]].tolist()]))
+            ic.insertRow([arcpy.Polygon(rings, sr), i])
+    t0 = now()
+    neg = arcpy.CreateUniqueName("bench_neg", "in_memory")
+    arcpy.Buffer_analysis(src, neg, "-%g Meters" % RADIUS_M, dissolve_option="NONE", method="PLANAR")
+    opened = arcpy.CreateUniqueName("bench_open", "in_memory")
+    arcpy.Buffer_analysis(neg, opened, "%g Meters" % RADIUS_M, dissolve_option="NONE", method="PLANAR")
+    gap = arcpy.CreateUniqueName("bench_gap", "in_memory")
+    arcpy.Erase_analysis(src, opened, gap)
+    out = np.zeros(len(store))
+    with arcpy.da.SearchCursor(gap, ["PID", "SHAPE@AREA"]) as cur:
+        for pid, area in cur:
+            if area >= MIN_AREA:
+                out[pid] += area
+    dt = now() - t0
+    for fc in (src, neg, opened, gap):
+        arcpy.Delete_management(fc)
+    return dt, out
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Raster opening vs. buffer chain on synthetic dumbbell polygons")
+    ap.add_argument("n", type=int, nargs="?", default=N)
+    ap.add_argument("--cells", type=float, nargs="+", default=CELLS)
+    ap.add_argument("--ref-cell", type=float, default=REF_CELL,
+                    help="raster reference cell size when arcpy is not available (m)")
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    store, truth = synthetic.polygon_layer(args.n, args.seed)
+    narrow = set(truth["narrow"].tolist())
+    chain = buffer_chain(store)
+    if chain is None:
+        print("arcpy not available: the buffer chain needs ArcMap; reference is the raster mode at %g m" % args.ref_cell)
+        ref_s, ref, _ = raster_run(store, args.ref_cell)
+        ref_label = "raster %g m" % args.ref_cell
+    else:
+        ref_s, ref = chain
+        ref_label = "buffer chain"
+
+    print("%-14s %8s %10s %12s %8s %9s %10s %10s" % ("method", "polygons", "seconds", "polygons/s", "flagged",
+                                                     "necks", "med |dA|", "p95 |dA|"))
+
+    def row(label, seconds, areas):
+        flagged = set(np.flatnonzero(areas > 0).tolist())
+        either = (areas > 0) | (ref > 0)
+        err = np.abs(areas - ref)[either]
+        med, p95 = (np.median(err), np.percentile(err, 95)) if len(err) else (0.0, 0.0)
+        print("%-14s %8d %10.3f %12.1f %8d %9s %10.1f %10.1f" % (
+            label, len(store), seconds, len(store) / seconds if seconds > 0 else float("inf"), len(flagged),
+            "%d/%d" % (len(flagged & narrow), len(narrow)), med, p95))
+
+    row(ref_label, ref_s, ref)
+    for cell in args.cells:
+        seconds, areas, stats = raster_run(store, cell)
+        row("raster %g m" % cell, seconds, areas)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
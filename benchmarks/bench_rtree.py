@@ -0,0 +1,47 @@
+#... TCPL STR R-tree build/query benchmark (headless)
+#
+#   python benchmarks/bench_rtree.py [n ...]
+
+import os, sys
+from timeit import default_timer as now
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tcpl_qc.rtree import STRtree
+
+SIZES     = [10000, 100000, 1000000]
+N_QUERIES = 1000
+EXTENT_M  = 100000.0
+RADIUS_M  = 200.0
+
+def random_envelopes(n, rng):
+    x = rng.uniform(0.0, EXTENT_M, n)
+    y = rng.uniform(0.0, EXTENT_M, n)
+    w = rng.exponential(150.0, n)
+    h = rng.exponential(150.0, n)
+    return np.column_stack((x, y, x + w, y + h))
+
+def main(sizes):
+    rng = np.random.RandomState(42)
+    print("%10s %10s %14s %14s %14s" % ("n", "build s", "envelope us", "within us", "nearest us"))
+    for n in sizes:
+        env = random_envelopes(n, rng)
+        t0 = now(); tree = STRtree(env); t_build = now() - t0
+        pts = rng.uniform(0.0, EXTENT_M, (N_QUERIES, 2))
+        t0 = now()
+        for x, y in pts:
+            tree.query((x - RADIUS_M, y - RADIUS_M, x + RADIUS_M, y + RADIUS_M))
+        t_env = (now() - t0) / N_QUERIES
+        t0 = now()
+        for x, y in pts:
+            tree.query_within((x, y, x, y), RADIUS_M)
+        t_within = (now() - t0) / N_QUERIES
+        t0 = now()
+        for x, y in pts:
+            tree.nearest(x, y, 5)
+        t_knn = (now() - t0) / N_QUERIES
+        print("%10d %10.3f %14.1f %14.1f %14.1f" % (n, t_build, t_env * 1e6, t_within * 1e6, t_knn * 1e6))
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
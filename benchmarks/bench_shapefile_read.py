@@ -0,0 +1,78 @@
+#... TCPL shapefile reader throughput (headless)
+#
+#   python benchmarks/bench_shapefile_read.py              synthetic polylines
+#   python benchmarks/bench_shapefile_read.py a.shp b.shp  real deliveries
+
+import os, shutil, struct, sys, tempfile
+from timeit import default_timer as now
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tcpl_qc.shapefile import read_shapefile
+
+SIZES      = [10000, 100000, 1000000]
+MEAN_VERTS = 12
+EXTENT_M   = 100000.0
+REPEAT     = 3
+
+def write_synthetic(base, n, rng):
+    # Polyline .shp/.shx plus a .dbf with one integer and one text field.
+    counts = rng.poisson(MEAN_VERTS - 2, n) + 2
+    recs, index, pos = [], [], 100
+    for k, c in enumerate(counts):
+        xy = rng.uniform(0.0, EXTENT_M, 2) + np.cumsum(rng.normal(0.0, 20.0, (c, 2)), axis=0)
+        body = (struct.pack("<i4d2i", 3, xy[:, 0].min(), xy[:, 1].min(), xy[:, 0].max(), xy[:, 1].max(), 1, c)
+                + struct.pack("<i", 0) + xy.astype("<f8").tobytes())
+        recs.append(struct.pack(">2i", k + 1, len(body) // 2) + body)
+        index.append(struct.pack(">2i", pos // 2, len(body) // 2))
+        pos += 8 + len(body)
+    header = lambda length: (struct.pack(">7i", 9994, 0, 0, 0, 0, 0, length // 2)
+                             + struct.pack("<2i4d4d", 1000, 3, 0, 0, EXTENT_M, EXTENT_M, 0, 0, 0, 0))
+    with open(base + ".shp", "wb") as f:
+        f.write(header(pos)); f.write(b"".join(recs))
+    with open(base + ".shx", "wb") as f:
+        f.write(header(100 + 8 * n)); f.write(b"".join(index))
+    fields = [(b"CODE", b"N", 9, 0), (b"NAME", b"C", 20, 0)]
+    rec_len = 1 + sum(fl[2] for fl in fields)
+    with open(base + ".dbf", "wb") as f:
+        f.write(struct.pack("<4BIHH20x", 3, 124, 1, 1, n, 32 + 32 * len(fields) + 1, rec_len))
+        for name, ftype, length, dec in fields:
+            f.write(struct.pack("<11sc4xBB14x", name, ftype, length, dec))
+        f.write(b"\r")
+        f.write(b"".join(b" %9d%-20s" % (k, b"road %d" % k) for k in range(n)))
+        f.write(b"\x1a")
+
+def file_bytes(path):
+    base = os.path.splitext(path)[0]
+    return sum(os.path.getsize(base + e) for e in (".shp", ".shx", ".dbf") if os.path.exists(base + e))
+
+def bench(path):
+    best = None
+    for _ in range(REPEAT):
+        t0 = now()
+        store, columns = read_shapefile(path)
+        dt = now() - t0
+        best = dt if best is None else min(best, dt)
+    mb = file_bytes(path) / 1e6
+    print("%-28s %10d %10.1f %10.3f %10.1f %12.0f" % (os.path.basename(path)[:28], len(store), mb, best,
+                                                    mb / best, len(store) / best))
+
+def main(args):
+    print("%-28s %10s %10s %10s %10s %12s" % ("file", "features", "MB", "read s", "MB/s", "features/s"))
+    if args:
+        for path in args:
+            bench(path)
+        return
+    rng = np.random.RandomState(3)
+    tmp = tempfile.mkdtemp()
+    try:
+        for n in SIZES:
+            base = os.path.join(tmp, "road_c_%d" % n)
+            write_synthetic(base, n, rng)
+            bench(base + ".shp")
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+#... TCPL per-feature memory: list of dicts vs FeatureStore (headless, Python 3)
+#
+#   python benchmarks/bench_store_memory.py [n ...]
+#
+# The "dicts" layout mimics what the scripts used to keep per feature, with
+# the arcpy geometries stood in by lists of (x, y) tuples. Real Polyline
+# objects are larger than that, so its figure is a lower bound.
+
+import os, sys, tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tcpl_qc.store import FeatureStore
+
+SIZES       = [10000, 100000]
+MEAN_VERTS  = 12
+N_ATTRS     = 8
+EXTENT_M    = 100000.0
+
+def random_lines(n, rng):
+    lines = []
+    for k in rng.poisson(MEAN_VERTS - 2, n) + 2:
+        start = rng.uniform(0.0, EXTENT_M, 2)
+        xy = start + np.cumsum(rng.normal(0.0, 20.0, (k, 2)), axis=0)
+        lines.append((xy, np.array([0, k], dtype=np.int64)))
+    return lines
+
+def as_dicts(lines):
+    out = []
+    for oid, (xy, _) in enumerate(lines):
+        pts = [(float(x), float(y)) for x, y in xy]
+        out.append({"oid": oid,
+                    "geom_src": list(pts),
+                    "geom_m": list(pts),
+                    "ext": (min(p[0] for p in pts), min(p[1] for p in pts),
+                            max(p[0] for p in pts), max(p[1] for p in pts)),
+                    "attrs": [u"value %d" % a for a in range(N_ATTRS)]})
+    return out
+
+def traced(build, *args):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    obj = build(*args)
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+def main(sizes):
+    rng = np.random.RandomState(7)
+    print("%10s %16s %16s %10s" % ("n", "dicts B/feat", "store B/feat", "ratio"))
+    for n in sizes:
+        lines = random_lines(n, rng)
+        recs, dict_bytes = traced(as_dicts, lines)
+        del recs
+        # The store's footprint is exactly its arrays (the OID and subtype
+        # inputs are adopted without a copy, so tracemalloc would miss them).
+        store = FeatureStore.from_lines(np.arange(n), lines, np.full(n, 100152))
+        store_bytes = store.nbytes
+        print("%10d %16.0f %16.0f %10.1f" % (n, dict_bytes / float(n), store_bytes / float(n),
+                                             dict_bytes / float(store_bytes)))
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
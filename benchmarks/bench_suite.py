@@ -0,0 +1,204 @@
+#... TCPL scaling benchmark suite on synthetic networks (headless)
+#
+#   python benchmarks/bench_suite.py                          all checks, 1k..1M
+#   python benchmarks/bench_suite.py --sizes 1000 10000 --checks gap snap
+#   python benchmarks/bench_suite.py --compare benchmarks/reports/old.json
+#
+# Every check runs on the same deterministic data (tcpl_qc.synthetic) with
+# the thresholds of its ArcMap script. Results go to a JSON report that
+# records the commit, so two reports can be compared with --compare.
+# Once a check takes longer than --budget seconds the larger sizes are
+# skipped for that check (and say so in the report).
+
+import argparse, json, os, platform, subprocess, sys, time
+from collections import Counter, OrderedDict
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import checks, synthetic
+from tcpl_qc.geodesic import shorter_than
+from tcpl_qc.raster_opening import raster_narrow_parts
+from tcpl_qc.tmerc import utm_inverse
+
+SIZES      = [1000, 10000, 100000, 1000000]
+SEED       = 0
+BUDGET_S   = 120.0
+REPORT_DIR = os.path.join(ROOT, "benchmarks", "reports")
+
+# Script thresholds (metres / degrees).
+GAP_M      = 200.001
+NEAR_TOL_M = 50.0
+VERTEX_EPS = 0.2
+SEGMENT_EPS = 0.2
+PARALLEL_DEG = 15.0
+MIDPOINT_M = 200.001
+LENGTH_M   = 300.0
+OPENING_M  = 25.0    # Polygon_gap_all_less_50 RADIUS_M
+OPENING_CELL_M = 2.0
+OPENING_MIN_M2 = 10.0
+
+class Data(object):
+    """Synthetic datasets for one size, generated on first use."""
+
+    def __init__(self, n, seed):
+        self.n, self.seed = n, seed
+        self._cache = {}
+
+    def get(self, name):
+        if name not in self._cache:
+            if name == "roads":
+                self._cache[name] = synthetic.road_network(self.n, self.seed)
+            elif name == "rivers":
+                self._cache[name] = synthetic.river_network(self.n, self.seed)
+            elif name == "polygons":
+                self._cache[name] = synthetic.polygon_layer(self.n, self.seed)
+            elif name == "roads_lonlat":
+                # The length scripts measure in the layer's GCS.
+                store = self.get("roads")[0]
+                lon, lat = utm_inverse(store.xy[:, 0], store.xy[:, 1], synthetic.UTM_ZONE)
+                self._cache[name] = (store.with_xy(np.column_stack((lon, lat))), self.get("roads")[1])
+        return self._cache[name]
+
+def _gap(store, stats):
+    mutual, onesided = checks.gap_check(store, GAP_M, stats=stats)
+    return sorted(mutual | onesided)
+
+def _length(store, stats):
+    mask, n_exact = shorter_than(store.xy, store.part_offsets, store.feature_offsets, LENGTH_M)
+    stats["exact_lengths"] += n_exact
+    return np.flatnonzero(mask).tolist()
+
+def _opening(store, stats):
+    # NARROW_MODE = "raster"; square corners make nearly every polygon flagged.
+    parts, _areas = raster_narrow_parts(store, OPENING_M, OPENING_CELL_M, min_area=OPENING_MIN_M2, stats=stats)
+    index = dict((o, i) for i, o in enumerate(store.oid.tolist()))
+    return [index[o] for o in parts.oid.tolist()]
+
+# (name, dataset, function(store, stats) -> flagged feature indices, truth key or None)
+CHECKS = [
+    ("gap",          "roads",        _gap, "short_gap"),
+    ("snap",         "roads",
+     lambda s, st: checks.snap_check(s, NEAR_TOL_M, VERTEX_EPS, stats=st), "near_miss"),
+    ("road_dangle",  "roads",
+     lambda s, st: [r[0] for r in checks.near_not_snapped(s, NEAR_TOL_M, VERTEX_EPS, stats=st)], "dangle"),
+    ("river_dangle", "rivers",
+     lambda s, st: [r[0] for r in checks.river_dangles(s, NEAR_TOL_M, VERTEX_EPS, SEGMENT_EPS, PARALLEL_DEG,
+                                                        stats=st)],
+     "dangle"),
+    ("midpoint",     "rivers",       lambda s, st: checks.midpoint_check(s, MIDPOINT_M, stats=st), None),
+    ("length",       "roads_lonlat", _length, None),
+    ("polygon_opening", "polygons",  _opening, "narrow"),
+]
+# Checks that only exist as arcpy geoprocessing; reported as skipped.
+NO_HEADLESS = {}
+
+def git_commit():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.STDOUT)
+        return out.decode("ascii").strip()
+    except Exception:
+        return None
+
+def run_one(name, data, dataset, fn, truth_key):
+    store, truth = data.get(dataset)
+    stats = Counter()
+    t0 = now()
+    found = fn(store, stats)
+    dt = now() - t0
+    row = OrderedDict([("check", name), ("n", len(store)), ("status", "ok"), ("seconds", round(dt, 6)),
+                       ("features_per_s", round(len(store) / dt, 1) if dt > 0 else None),
+                       ("flagged", len(set(found)))])
+    if truth_key:
+        injected = truth[truth_key]
+        row["injected"] = len(injected)
+        row["recovered"] = len(set(injected.tolist()) & set(found))
+    row["counters"] = OrderedDict(sorted(stats.items()))
+    return row
+
+def run(sizes, names, seed, budget):
+    over = {}   # check name -> size that went over budget
+    results = []
+    for n in sizes:
+        data = Data(n, seed)
+        for name, dataset, fn, truth_key in CHECKS:
+            if name not in names:
+                continue
+            if fn is None:
+                row = OrderedDict([("check", name), ("n", n), ("status", "skipped"),
+                                   ("reason", NO_HEADLESS.get(name))])
+            elif name in over:
+                row = OrderedDict([("check", name), ("n", n), ("status", "skipped"),
+                                   ("reason", "over %.0f s budget at n=%d" % (budget, over[name]))])
+            else:
+                row = run_one(name, data, dataset, fn, truth_key)
+                if row["seconds"] > budget:
+                    over[name] = n
+            results.append(row)
+            print_row(row)
+    return results
+
+def print_row(row):
+    if row["status"] != "ok":
+        print("%-16s %9d  skipped: %s" % (row["check"], row["n"], row["reason"]))
+        return
+    hits = ("%d/%d" % (row["recovered"], row["injected"])) if "injected" in row else "-"
+    print("%-16s %9d %10.3f %12.0f %9d %9s" % (row["check"], row["n"], row["seconds"],
+                                              row["features_per_s"], row["flagged"], hits))
+
+def compare(results, old_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    before = dict(((r["check"], r["n"]), r) for r in old["results"] if r.get("status") == "ok")
+    print("")
+    print("vs %s (%s)" % (os.path.basename(old_path), (old.get("commit") or "?")[:10]))
+    print("%-16s %9s %10s %10s %8s" % ("check", "n", "old s", "new s", "speedup"))
+    for r in results:
+        b = before.get((r["check"], r["n"]))
+        if r["status"] != "ok" or b is None:
+            continue
+        speedup = b["seconds"] / r["seconds"] if r["seconds"] > 0 else float("inf")
+        print("%-16s %9d %10.3f %10.3f %7.2fx" % (r["check"], r["n"], b["seconds"], r["seconds"], speedup))
+
+def main(argv):
+    names = [c[0] for c in CHECKS]
+    ap = argparse.ArgumentParser(description="TCPL QC scaling benchmark on synthetic networks")
+    ap.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    ap.add_argument("--checks", nargs="+", default=names, choices=names)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--budget", type=float, default=BUDGET_S,
+                    help="skip larger sizes once a check takes longer than this (s)")
+    ap.add_argument("--out", help="report path (default benchmarks/reports/bench_<commit>_<time>.json)")
+    ap.add_argument("--compare", metavar="OLD_JSON", help="print speedups against an earlier report")
+    args = ap.parse_args(argv)
+
+    commit = git_commit()
+    print("%-16s %9s %10s %12s %9s %9s" % ("check", "n", "seconds", "features/s", "flagged", "injected"))
+    results = run(sorted(args.sizes), set(args.checks), args.seed, args.budget)
+
+    report = OrderedDict([
+        ("created", time.strftime("%Y-%m-%dT%H:%M:%S")),
+        ("commit", commit),
+        ("python", platform.python_version()),
+        ("numpy", np.__version__),
+        ("platform", platform.platform()),
+        ("seed", args.seed),
+        ("budget_s", args.budget),
+        ("results", results),
+    ])
+    out = args.out
+    if not out:
+        out = os.path.join(REPORT_DIR, "bench_%s_%s.json" % ((commit or "nogit")[:7], time.strftime("%Y%m%d_%H%M%S")))
+    if os.path.dirname(out) and not os.path.isdir(os.path.dirname(out)):
+        os.makedirs(os.path.dirname(out))
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("")
+    print("report: %s" % out)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,149 @@
+#... TCPL triangulation widths (NARROW_MODE "triangulation") vs. the raster and buffer openings
+#
+#   python benchmarks/bench_triangulation.py                   400 dumbbells, 200 corridors, 4 large polygons
+#   python benchmarks/bench_triangulation.py --small 2000 --corridors 1000 --large 8 --vertices 20000
+#
+# For the synthetic dumbbells, for straight-sided strips, L corridors and
+# squares with holes near (or touching) their side, and for large
+# two-blob polygons of about --vertices vertices it reports how long
+# tcpl_qc.triangulation takes with the edge flips limited to FLIP_REACH
+# (as the tool runs it) and with the whole constrained Delaunay
+# triangulation, and checks:
+#   - the triangles of every polygon cover exactly its area (holes out);
+#   - the narrow polygons found are those the generator made narrow;
+#   - strips and L corridors: the narrow area is the strip's own area;
+#   - limited and whole triangulations give the same narrow areas, to
+#     within --area-tol of the narrow area;
+#   - against the raster opening (--cell) it prints the largest area
+#     difference per polygon, for reference only: the opening also takes
+#     blunt corners and the raster stairs along diagonal edges;
+#   - buffer chain (arcpy only): Buffer -r / +r / Erase, timed the same way
+#     and its areas compared per polygon.
+
+import argparse, os, sys
+from collections import Counter
+from timeit import default_timer as now
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from tcpl_qc import synthetic
+from tcpl_qc.opening_windows import _holes, boundary_segments
+from tcpl_qc.raster_opening import raster_narrow_parts
+from tcpl_qc.triangulation import SPACING, _cross, _signed_area, triangulate, triangulation_narrow_parts
+
+SMALL     = 400
+CORRIDORS = 200
+LARGE     = 4
+VERTICES  = 10000
+CELL_M    = 2.0
+WIDTH_M   = 50.0
+MIN_AREA  = 10.0
+AREA_TOL  = 0.01   # share of the narrow area limited flips may differ from the whole triangulation
+SEED      = 0
+
+def area_by_oid(parts, areas):
+    out = Counter()
+    for oid, area in zip(parts.oid.tolist(), areas.tolist()):
+        out[oid] += area
+    return out
+
+def max_diff(x, y):
+    return max([abs(x[k] - y[k]) for k in set(x) | set(y)] or [0.0])
+
+def cover_mismatches(store):
+    """Polygons whose triangles do not add up to the polygon's area."""
+    a, b, ring, _ = boundary_segments(store)
+    hole = _holes(store, a, b, ring)
+    bad = 0
+    for f in range(len(store)):
+        p0, p1 = int(store.feature_offsets[f]), int(store.feature_offsets[f + 1])
+        xy, offsets = store.line(f)
+        xy = xy - xy.min(axis=0)
+        xy, tri, _keys, _rings = triangulate(xy, offsets, hole[p0:p1], spacing=SPACING * WIDTH_M)
+        got = 0.5 * float(_cross(xy[tri[:, 0]], xy[tri[:, 1]], xy[tri[:, 2]]).sum())
+        want = sum(abs(_signed_area(xy, np.arange(offsets[k], offsets[k + 1]))) * (-1.0 if hole[p0 + k] else 1.0)
+                   for k in range(len(offsets) - 1))
+        bad += abs(got - want) > 1e-6 * want
+    return bad
+
+def buffer_chain(store):
+    """(s, areas by oid) from the arcpy chain, or None without arcpy."""
+    try:
+        import arcpy
+    except ImportError:
+        return None
+    import Polygon_gap_all_less_50 as tool
+    sr = arcpy.SpatialReference(32600 + synthetic.UTM_ZONE)
+    polygons = []
+    for i in range(len(store)):
+        xy, offsets = store.line(i)
+        polygons.append((int(store.oid[i]), tool.rings_polygon(xy, offsets, sr)))
+    t0 = now()
+    out = Counter()
+    for oid, _gap, area in tool.area_filter(tool.open_and_erase(iter(polygons), sr, True), sr):
+        out[oid] += area
+    t = now() - t0
+    return t, out
+
+def run(label, store, truth, cell, area_tol):
+    stats = Counter()
+    t0 = now()
+    parts, areas = triangulation_narrow_parts(store, WIDTH_M, MIN_AREA, stats=stats)
+    t_tri = now() - t0
+    t0 = now()
+    full_parts, full_areas = triangulation_narrow_parts(store, WIDTH_M, MIN_AREA, flip_reach=None)
+    t_full = now() - t0
+    t0 = now()
+    r_parts, r_areas = raster_narrow_parts(store, WIDTH_M / 2.0, cell, min_area=MIN_AREA)
+    t_raster = now() - t0
+
+    tri, full, raster = area_by_oid(parts, areas), area_by_oid(full_parts, full_areas), \
+        area_by_oid(r_parts, r_areas)
+    found, want = set(tri), set(store.oid[truth["narrow"]].tolist())
+    cover = cover_mismatches(store)
+    d_full = max_diff(tri, full)
+    # Exact narrow areas where the generator knows them.
+    exact = np.flatnonzero(np.isfinite(truth.get("area", np.full(len(store), np.nan))))
+    off = sum(abs(tri[int(store.oid[i])] - truth["area"][i]) > 1e-6 * max(truth["area"][i], 1.0) for i in exact)
+    print("%-10s %6d %9d %8.3f %8.3f %9.3f %7d %7d %7d %7d %10.1f %10.1f %7d" % (
+        label, len(store), len(store.xy), t_tri, t_full, t_raster, len(want - found), len(found - want),
+        off, cover, d_full, max_diff(tri, raster), stats["edge_flips"]))
+    chain = buffer_chain(store)
+    if chain is None:
+        print("%-10s buffer chain: arcpy not available (needs ArcMap)" % "")
+    else:
+        print("%-10s buffer chain: %.3f s, max |dA| %.1f m2" % ("", chain[0], max_diff(tri, chain[1])))
+    return not (want ^ found) and off == 0 and cover == 0 and d_full <= area_tol * max(sum(full.values()), 1.0)
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Triangulation widths vs. raster and buffer openings")
+    ap.add_argument("--small", type=int, default=SMALL, help="synthetic dumbbell polygons")
+    ap.add_argument("--corridors", type=int, default=CORRIDORS, help="strips, L corridors, squares with holes")
+    ap.add_argument("--large", type=int, default=LARGE, help="large two-blob polygons")
+    ap.add_argument("--vertices", type=int, default=VERTICES)
+    ap.add_argument("--cell", type=float, default=CELL_M, help="raster opening cell (m)")
+    ap.add_argument("--area-tol", type=float, default=AREA_TOL)
+    ap.add_argument("--seed", type=int, default=SEED)
+    args = ap.parse_args(argv)
+
+    print("%-10s %6s %9s %8s %8s %9s %7s %7s %7s %7s %10s %10s %7s" % (
+        "data", "n", "vertices", "tri s", "cdt s", "raster s", "missed", "extra", "area", "cover", "cdt |dA|",
+        "rast |dA|", "flips"))
+    ok = True
+    if args.small:
+        store, truth = synthetic.polygon_layer(args.small, args.seed)
+        ok = run("dumbbells", store, truth, args.cell, args.area_tol) and ok
+    if args.corridors:
+        store, truth = synthetic.corridor_layer(args.corridors, args.seed)
+        ok = run("corridors", store, truth, args.cell, args.area_tol) and ok
+    if args.large:
+        store, truth = synthetic.large_polygon_layer(args.large, args.seed, args.vertices)
+        ok = run("large", store, truth, args.cell, args.area_tol) and ok
+    if not ok:
+        raise SystemExit("triangles miss polygon area, narrow polygons or areas differ from the generator's, "
+                         "or limited flips change the narrow area")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
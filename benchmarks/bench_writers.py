@@ -0,0 +1,78 @@
+#... TCPL bulk QC output writers: shapefile vs GeoPackage (headless)
+#
+#   python benchmarks/bench_writers.py [rows ...]
+#
+# Writes dangle-style points with SRC_LAYER/SRC_OID/REASON and the same
+# number of polylines, and reads the shapefiles back as a check.
+
+import os, shutil, sys, tempfile
+from collections import OrderedDict
+from timeit import default_timer as now
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tcpl_qc import gpkg
+from tcpl_qc.checks import REASON_NON_PARALLEL, REASON_NOT_SNAPPED, REASON_ON_SEGMENT
+from tcpl_qc.shapefile import QC_FIELDS, read_shapefile, write_points, write_store
+from tcpl_qc.store import FeatureStore
+
+SIZES      = [100000, 1000000]
+MEAN_VERTS = 12
+EXTENT_M   = 100000.0
+
+def qc_columns(n, rng):
+    layers = np.array(["road_c", "trail_c", "cart_track"])
+    reasons = np.array([REASON_ON_SEGMENT, REASON_NON_PARALLEL, REASON_NOT_SNAPPED])
+    return OrderedDict([("SRC_LAYER", layers[rng.randint(0, 3, n)]),
+                        ("SRC_OID", rng.randint(0, 10 * n, n)),
+                        ("REASON", reasons[rng.randint(0, 3, n)])])
+
+def random_store(n, rng):
+    counts = rng.poisson(MEAN_VERTS - 2, n) + 2
+    steps = rng.normal(0.0, 20.0, (int(counts.sum()), 2))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    # Random walk per line: running sum of the steps, restarted at each line.
+    walk = np.cumsum(steps, axis=0)
+    restart = walk[offsets[:-1]] - steps[offsets[:-1]]
+    xy = np.repeat(rng.uniform(0.0, EXTENT_M, (n, 2)) - restart, counts, axis=0) + walk
+    return FeatureStore(np.arange(n), xy, offsets, np.arange(n + 1))
+
+def size_mb(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / 1e6
+
+def timed(label, n, fn, paths):
+    t0 = now(); fn(); dt = now() - t0
+    mb = size_mb(paths)
+    print("%-22s %10d %10.2f %10.1f %12.0f %10.1f" % (label, n, dt, mb, n / dt, mb / dt))
+
+def main(sizes):
+    rng = np.random.RandomState(11)
+    tmp = tempfile.mkdtemp()
+    print("%-22s %10s %10s %10s %12s %10s" % ("output", "rows", "write s", "MB", "rows/s", "MB/s"))
+    try:
+        for n in sizes:
+            x, y = rng.uniform(0.0, EXTENT_M, n), rng.uniform(0.0, EXTENT_M, n)
+            cols = qc_columns(n, rng)
+            base = os.path.join(tmp, "snap_50_%d" % n)
+            timed("points .shp", n, lambda: write_points(base + ".shp", x, y, cols, QC_FIELDS),
+                  [base + e for e in (".shp", ".shx", ".dbf")])
+            back, back_cols = read_shapefile(base + ".shp")
+            assert np.array_equal(back.xy, np.column_stack((x, y)))
+            assert (back_cols["REASON"] == cols["REASON"]).all()
+            path = os.path.join(tmp, "qc_%d.gpkg" % n)
+            timed("points .gpkg", n, lambda: gpkg.write_points(path, "snap_50", x, y, cols, QC_FIELDS),
+                  [path])
+            store = random_store(n, rng)
+            base = os.path.join(tmp, "road_gap_less_200_%d" % n)
+            timed("polylines .shp", n, lambda: write_store(base + ".shp", store),
+                  [base + e for e in (".shp", ".shx", ".dbf")])
+            back, _ = read_shapefile(base + ".shp")
+            assert np.array_equal(back.xy, store.xy)
+            path = os.path.join(tmp, "lines_%d.gpkg" % n)
+            timed("polylines .gpkg", n, lambda: gpkg.write_store(path, "road_gap_less_200", store), [path])
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
@@ -0,0 +1 @@
+#... TCPL shared QC helpers (headless, NumPy only; no arcpy imports here)
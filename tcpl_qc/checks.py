@@ -0,0 +1,313 @@
+#... TCPL headless QC checks over a FeatureStore in metric coordinates
+#
+# Each function reproduces the loop of the matching ArcMap script; the
+# scripts only read features into a FeatureStore, call one of these and
+# write the result. Results are feature indices into the store.
+#
+# Every check takes an optional stats mapping (e.g. RunRecord.counters from
+# tcpl_qc.instrument) and adds to it:
+#   pairs_tested     feature pairs that reached the geometry predicates
+#   pairs_pruned     pairs the spatial index ruled out
+#   predicate_calls  distance / snap / locate evaluations
+
+import math
+
+import numpy as np
+
+from tcpl_qc.grid_hash import candidate_pairs
+from tcpl_qc.hausdorff import mutual_within
+from tcpl_qc.rtree import STRtree
+from tcpl_qc.segment_grid import SegmentGrid, store_segments
+from tcpl_qc.segments import line_length, locate_point, point_line_distance, position_along, segment_lengths
+from tcpl_qc.vertex_hash import VertexHash
+
+REASON_ON_SEGMENT   = "on_segment_no_snap"
+REASON_NON_PARALLEL = "non_parallel_close"
+REASON_NOT_SNAPPED  = "near_not_snapped"
+
+def _box(x, y, r):
+    return (x - r, y - r, x + r, y + r)
+
+def unit_vec(dx, dy):
+    m = math.hypot(dx, dy)
+    if m == 0:
+        return (0.0, 0.0)
+    return (dx / m, dy / m)
+
+def angle_deg(u, v):
+    dot = u[0] * v[0] + u[1] * v[1]
+    return math.degrees(math.acos(max(-1.0, min(1.0, dot))))
+
+def _tally(stats, tested, possible, calls):
+    if stats is not None:
+        stats["pairs_tested"] += tested
+        stats["pairs_pruned"] += possible - tested
+        stats["predicate_calls"] += calls
+
+def valid_features(store):
+    # Features with at least one vertex (empty ones have a NaN envelope).
+    return np.flatnonzero(~np.isnan(store.env).any(axis=1))
+
+def gap_check(store, radius, stats=None):
+    """Road/River gap scripts: (keep_mutual, keep_onesided) sets of feature indices.
+
+    A feature is in keep_mutual when some other feature and it lie within
+    radius of each other both ways; in keep_onesided when it lies within
+    radius of another feature that does not lie within radius of it.
+    """
+    idx = valid_features(store)
+    cand_i, cand_j = candidate_pairs(store.env[idx], radius)
+    keep_mutual, keep_onesided = gap_pairs(store, idx[cand_i], idx[cand_j], radius)
+    n = len(idx)
+    _tally(stats, len(cand_i), n * (n - 1) // 2, len(cand_i))
+    return keep_mutual, keep_onesided
+
+def gap_pairs(store, pairs_i, pairs_j, radius):
+    """(keep_mutual, keep_onesided) contributed by the given feature pairs alone.
+
+    The gap result is the union of these per-pair contributions, so pairs
+    can be split into batches (tcpl_qc.tiling) and the sets merged.
+    """
+    keep_mutual, keep_onesided = set(), set()
+    for i, j in zip(np.asarray(pairs_i).tolist(), np.asarray(pairs_j).tolist()):
+        a_in_b, b_in_a = mutual_within(store.line(i), store.line(j), radius)
+        if a_in_b and b_in_a:
+            keep_mutual.add(i); keep_mutual.add(j)
+        elif a_in_b or b_in_a:
+            keep_onesided.add(i if a_in_b else j)
+    return keep_mutual, keep_onesided
+
+def feature_endpoints(store):
+    """(index, x, y) of the first and last vertex of every feature with >= 2 vertices."""
+    out = []
+    for i in range(len(store)):
+        v0, v1 = store.vertex_range(i)
+        if v1 - v0 < 2:
+            continue
+        out.append((i, float(store.xy[v0, 0]), float(store.xy[v0, 1])))
+        out.append((i, float(store.xy[v1 - 1, 0]), float(store.xy[v1 - 1, 1])))
+    return out
+
+def part_endpoints(store):
+    """(index, x, y, ux, uy) for both ends of every part with >= 2 vertices.
+
+    (ux, uy) is the unit direction of the end segment, pointing along the
+    part; it is (0, 0) for a zero-length end segment.
+    """
+    out = []
+    xy = store.xy
+    for i in range(len(store)):
+        p0, p1 = int(store.feature_offsets[i]), int(store.feature_offsets[i + 1])
+        for k in range(p0, p1):
+            s, e = int(store.part_offsets[k]), int(store.part_offsets[k + 1])
+            if e - s < 2:
+                continue
+            u = unit_vec(xy[s + 1, 0] - xy[s, 0], xy[s + 1, 1] - xy[s, 1])
+            out.append((i, float(xy[s, 0]), float(xy[s, 1]), u[0], u[1]))
+            u = unit_vec(xy[e - 1, 0] - xy[e - 2, 0], xy[e - 1, 1] - xy[e - 2, 1])
+            out.append((i, float(xy[e - 1, 0]), float(xy[e - 1, 1]), u[0], u[1]))
+    return out
+
+def build_indexes(store, vertex_eps):
+    """(STRtree over envelopes, VertexHash over vertices) shared by the endpoint checks."""
+    return STRtree(store.env), VertexHash(store.xy, store.vertex_owner(), vertex_eps)
+
+def snap_endpoint(store, i, px, py, near_tol, vertex_eps, pad, tree, vhash, stats=None):
+    """Road_snap_50 test for one endpoint: True when it is near a line without snapping to it."""
+    near_any = False
+    snapped_to_vertex = False
+    tested = calls = 0
+    for j in tree.query(_box(px, py, pad)).tolist():
+        if j == i:
+            continue
+        tested += 1
+        calls += 1
+        if point_line_distance(px, py, store.line(j)) <= near_tol:
+            near_any = True
+            calls += 1
+            if vhash.owner_has_vertex_within(px, py, j, vertex_eps):
+                snapped_to_vertex = True
+            if not snapped_to_vertex:
+                break
+    if stats is not None:
+        stats["pairs_tested"] += tested
+        stats["predicate_calls"] += calls
+    return near_any and not snapped_to_vertex
+
+def snap_check(store, near_tol, vertex_eps, pad=None, indexes=None, stats=None):
+    """Road_snap_50: sorted feature indices with an unsnapped endpoint.
+
+    Neighbours are visited in store order and the first one within near_tol
+    decides: the endpoint is a problem unless that line has a vertex within
+    vertex_eps of it (later neighbours are only looked at once it snapped).
+    """
+    pad = near_tol if pad is None else pad
+    tree, vhash = indexes or build_indexes(store, vertex_eps)
+    flagged = set()
+    endpoints = feature_endpoints(store)
+    local = {"pairs_tested": 0, "predicate_calls": 0}
+    for i, px, py in endpoints:
+        if snap_endpoint(store, i, px, py, near_tol, vertex_eps, pad, tree, vhash, local):
+            flagged.add(i)
+    _tally(stats, local["pairs_tested"], len(endpoints) * max(tree.size - 1, 0), local["predicate_calls"])
+    return sorted(flagged)
+
+def dangle_endpoint(store, i, px, py, near_tol, vertex_eps, pad, tree, vhash, stats=None):
+    """Road dangle test for one endpoint: True when it is near a line but on none of their vertices."""
+    near_any_neighbor = False
+    snapped_any_neighbor = False
+    tested = calls = 0
+    for j in tree.query(_box(px, py, pad)).tolist():
+        if j == i:
+            continue
+        tested += 1
+        calls += 1
+        if point_line_distance(px, py, store.line(j)) <= near_tol:
+            near_any_neighbor = True
+            calls += 1
+            if vhash.owner_has_vertex_within(px, py, j, vertex_eps):
+                snapped_any_neighbor = True
+                break
+    if stats is not None:
+        stats["pairs_tested"] += tested
+        stats["predicate_calls"] += calls
+    return near_any_neighbor and not snapped_any_neighbor
+
+def near_not_snapped(store, near_tol, vertex_eps, pad=None, indexes=None, stats=None):
+    """Road dangle scripts: (index, x, y) of endpoints near another line but on none of its vertices.
+
+    An endpoint is reported when at least one other line lies within
+    near_tol and none of the lines within near_tol has a vertex within
+    vertex_eps of it.
+    """
+    pad = near_tol if pad is None else pad
+    tree, vhash = indexes or build_indexes(store, vertex_eps)
+    out = []
+    endpoints = feature_endpoints(store)
+    local = {"pairs_tested": 0, "predicate_calls": 0}
+    for i, px, py in endpoints:
+        if dangle_endpoint(store, i, px, py, near_tol, vertex_eps, pad, tree, vhash, local):
+            out.append((i, px, py))
+    _tally(stats, local["pairs_tested"], len(endpoints) * max(tree.size - 1, 0), local["predicate_calls"])
+    return out
+
+def angle_step(near_tol):
+    # Half-length of the piece of neighbour line whose direction is compared.
+    return min(1.0, 0.1 * near_tol)
+
+def crossing_angle(line, dalong, ep_dir, delta):
+    """Angle in degrees (0-180) between ep_dir and the line around dalong (+-delta metres)."""
+    a = max(0.0, dalong - delta)
+    b = min(line_length(line), dalong + delta)
+    ax, ay = position_along(line, a)
+    bx, by = position_along(line, b)
+    return angle_deg(ep_dir, unit_vec(bx - ax, by - ay))
+
+def classify_endpoint(store, i, px, py, ep_dir, near_tol, vertex_eps, segment_eps,
+                      parallel_deg, pad, tree, vhash, stats=None):
+    """Reason for one River endpoint, or None; neighbours are visited in store order."""
+    reason = None
+    tested = calls = 0
+    for j in tree.query(_box(px, py, pad)).tolist():
+        if j == i:
+            continue
+        tested += 1
+        line = store.line(j)
+        calls += 1
+        if point_line_distance(px, py, line) > near_tol:
+            continue
+        calls += 1
+        if vhash.owner_has_vertex_within(px, py, j, vertex_eps):
+            continue
+        calls += 1
+        qx, qy, dalong, dperp = locate_point(px, py, line)
+        if dperp <= segment_eps:
+            reason = REASON_ON_SEGMENT
+            break
+        if qx is None:
+            continue
+        ang = crossing_angle(line, dalong, ep_dir, angle_step(near_tol))
+        if ang <= parallel_deg or abs(180.0 - ang) <= parallel_deg:
+            continue
+        reason = REASON_NON_PARALLEL
+        break
+    if stats is not None:
+        stats["pairs_tested"] += tested
+        stats["predicate_calls"] += calls
+    return reason
+
+def river_dangles(store, near_tol, vertex_eps, segment_eps, parallel_deg, pad=None, indexes=None,
+                  stats=None):
+    """River dangle scripts: (index, x, y, reason) for every problem endpoint.
+
+    For each part end, the first neighbour within near_tol that has no
+    vertex within vertex_eps decides: on_segment_no_snap when the endpoint
+    lies within segment_eps of it, non_parallel_close when the neighbour
+    runs more than parallel_deg off the end segment's direction; a parallel
+    neighbour is passed over.
+    """
+    pad = near_tol if pad is None else pad
+    tree, vhash = indexes or build_indexes(store, vertex_eps)
+    out = []
+    local = {"pairs_tested": 0, "predicate_calls": 0}
+    queries = 0
+    for i, px, py, ux, uy in part_endpoints(store):
+        if (ux, uy) == (0.0, 0.0):
+            continue
+        queries += 1
+        reason = classify_endpoint(store, i, px, py, (ux, uy), near_tol, vertex_eps,
+                                   segment_eps, parallel_deg, pad, tree, vhash, local)
+        if reason:
+            out.append((i, px, py, reason))
+    _tally(stats, local["pairs_tested"], queries * max(tree.size - 1, 0), local["predicate_calls"])
+    return out
+
+def midpoints(store):
+    """(n, 2) planar midpoint (half the length along the line) of every feature.
+
+    Features with the same number of segments are handled together: their
+    segment lengths form one (features, segments) array, so the length sums,
+    cumulative sums and the segment holding the midpoint are row-wise NumPy
+    operations with the same rounding as segments.position_along per line.
+    """
+    n = len(store)
+    out = np.full((n, 2), np.nan)
+    xy = store.xy
+    i0, i1, owner = store_segments(store)
+    seglen = segment_lengths(xy[i0], xy[i1])
+    count = np.bincount(owner, minlength=n)
+    first = np.cumsum(count) - count
+    v0 = store.part_offsets[store.feature_offsets[:-1]]
+    v1 = store.part_offsets[store.feature_offsets[1:]]
+    bare = np.flatnonzero((v1 > v0) & (count == 0))   # only single-vertex parts: the first vertex
+    out[bare] = xy[v0[bare]]
+    for m in np.unique(count[count > 0]).tolist():
+        f = np.flatnonzero(count == m)
+        seg = first[f][:, None] + np.arange(m)
+        lengths = seglen[seg]
+        cum = np.cumsum(lengths, axis=1)
+        half = lengths.sum(axis=1) / 2.0
+        dist = np.minimum(np.maximum(half, 0.0), cum[:, -1])
+        k = np.minimum((cum < dist[:, None]).sum(axis=1), m - 1)
+        rows = np.arange(len(f))
+        s, lk = seg[rows, k], lengths[rows, k]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.where(lk > 0, (dist - (cum[rows, k] - lk)) / lk, 0.0)
+        a, b = i0[s], i1[s]
+        out[f, 0] = xy[a, 0] + t * (xy[b, 0] - xy[a, 0])
+        out[f, 1] = xy[a, 1] + t * (xy[b, 1] - xy[a, 1])
+    return out
+
+def midpoint_check(store, radius, mids=None, grid=None, stats=None):
+    """River_midpoint_Error: sorted indices whose midpoint is within radius of another line.
+
+    Distances are point to segment over a SegmentGrid; a midpoint stops
+    being tested once one segment of another line is within radius.
+    """
+    mids = midpoints(store) if mids is None else mids
+    grid = grid or SegmentGrid(store, radius)
+    local = {"pairs_tested": 0, "segment_distances": 0}
+    hit = grid.near_other(mids[:, 0], mids[:, 1], np.arange(len(store)), radius, stats=local)
+    queries = int((~np.isnan(mids[:, 0])).sum())
+    _tally(stats, local["pairs_tested"], queries * max(len(store) - 1, 0), local["segment_distances"])
+    return np.flatnonzero(hit).tolist()
@@ -0,0 +1,285 @@
+#... TCPL on-disk cache of projected FeatureStores (memory-mapped .npy)
+#
+# A script that finds its key in the cache skips both the SearchCursor read
+# and the projection: the store's arrays are opened with np.load(mmap_mode="r")
+# and only the pages the checks touch are read from disk.
+#
+# The key is a SHA-1 over, per source: the dataset path, the feature count,
+# the newest modification time of the files that hold it and a hash of
+# their content; then the target CRS (its WKT) and a selection (the script,
+# subtype codes, definition queries; whatever changes what is read).
+# Sources that are not plain files (SDE, services) are never cached.
+#
+# Files up to FULL_HASH_BYTES in total are hashed completely; above that
+# only the first and last SAMPLE_BYTES of each file are, together with its
+# size and mtime. In a file geodatabase only the files of the source's own
+# table are hashed (a<number>.gdbtable, .gdbtablx, .spx, ...): the number
+# is looked up by name in the geodatabase's catalog table (a00000001, read
+# after the published OpenFileGDB layout), so outputs written into the
+# same .gdb and *.lock files leave the key alone. Where the catalog cannot
+# be read the whole folder is hashed, lock files left out.
+#
+# Each entry is a folder <key>/ with one .npy per array and meta.json; the
+# mtime of meta.json is its last use. After a store is added, the least
+# recently used entries are removed until the cache fits in max_bytes.
+
+import hashlib, json, os, shutil, struct, time
+
+import numpy as np
+
+from tcpl_qc.store import FeatureStore
+
+CACHE_ENV       = "TCPL_COORD_CACHE"
+CACHE_VERSION   = 1        # bump when the readers change what ends up in a store
+DEFAULT_MAX_MB  = 2048
+FULL_HASH_BYTES = 256 * 1024 * 1024
+SAMPLE_BYTES    = 1024 * 1024
+SHAPEFILE_EXTS  = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+GDB_CATALOG     = "a00000001"
+ARRAYS          = ("oid", "subtype", "layer", "xy", "part_offsets", "feature_offsets", "env")
+
+def _varuint(buf, pos):
+    # Little-endian base-128 integer at buf[pos:]; (value, next position).
+    value = shift = 0
+    while True:
+        b = bytearray(buf[pos:pos + 1])[0]
+        value |= (b & 0x7F) << shift
+        pos += 1
+        shift += 7
+        if not b & 0x80:
+            return value, pos
+
+def gdb_catalog(gdb):
+    """{lower-case table name: table number} of a file geodatabase, or None if its catalog cannot be read."""
+    base = os.path.join(gdb, GDB_CATALOG)
+    try:
+        with open(base + ".gdbtable", "rb") as fh:
+            table = fh.read()
+        with open(base + ".gdbtablx", "rb") as fh:
+            tablx = fh.read()
+        _, blocks, rows, width = struct.unpack_from("<4i", tablx, 0)
+        if blocks * 1024 < rows or width not in (4, 5, 6):
+            return None  # sparse row map
+        pos = struct.unpack_from("<q", table, 32)[0] + 4
+        _version, _flags, n_fields = struct.unpack_from("<iih", table, pos)
+        pos += 10
+        fields = []
+        for _ in range(n_fields):
+            size = bytearray(table[pos:pos + 1])[0]
+            name = table[pos + 1:pos + 1 + 2 * size].decode("utf-16-le")
+            pos += 1 + 2 * size
+            pos += 1 + 2 * bytearray(table[pos:pos + 1])[0]  # alias
+            ftype = bytearray(table[pos:pos + 1])[0]
+            pos += 1
+            if ftype == 4:
+                nullable = bytearray(table[pos + 4:pos + 5])[0] & 1
+                size, pos = _varuint(table, pos + 5)
+                pos += size
+            elif ftype in (0, 1, 2, 3, 5):
+                nullable = bytearray(table[pos + 1:pos + 2])[0] & 1
+                pos += 3 + bytearray(table[pos + 2:pos + 3])[0]
+            elif ftype in (6, 8, 10, 11, 12):
+                nullable = bytearray(table[pos + 1:pos + 2])[0] & 1
+                pos += 2
+            else:
+                return None  # geometry or raster: not a catalog
+            fields.append((name.lower(), ftype, nullable))
+        n_nullable = sum(1 for f in fields if f[2])
+        out = {}
+        for row in range(rows):
+            at = sum(b << (8 * i) for i, b in enumerate(bytearray(tablx[16 + row * width:16 + (row + 1) * width])))
+            if not at:
+                continue
+            nulls = bytearray(table[at + 4:at + 4 + (n_nullable + 7) // 8])
+            pos, bit, name = at + 4 + len(nulls), 0, None
+            for fname, ftype, nullable in fields:
+                if nullable:
+                    bit += 1
+                    if nulls[(bit - 1) // 8] & (1 << ((bit - 1) % 8)):
+                        continue
+                if ftype == 6:
+                    continue
+                if ftype in (4, 8, 12):
+                    size, pos = _varuint(table, pos)
+                    if fname == "name":
+                        name = table[pos:pos + size].decode("utf-8")
+                    pos += size
+                else:
+                    pos += {0: 2, 1: 4, 2: 4, 3: 8, 5: 8, 10: 16, 11: 16}[ftype]
+            if name is not None:
+                out[name.lower()] = row + 1
+        return out
+    except (IOError, OSError, IndexError, KeyError, ValueError, struct.error):
+        return None
+
+def gdb_table_files(gdb, name):
+    """Sorted files of table `name` in a file geodatabase, or None if the catalog does not list it."""
+    number = (gdb_catalog(gdb) or {}).get(name.lower())
+    if number is None:
+        return None
+    prefix = "a%08x." % number
+    files = sorted(os.path.join(gdb, f) for f in os.listdir(gdb)
+                   if f.lower().startswith(prefix) and not f.lower().endswith(".lock"))
+    return files or None
+
+def source_files(path):
+    """Sorted files on disk holding the dataset at path; [] when it is not file based."""
+    path = os.path.normpath(path)
+    probe = path
+    while True:
+        ext = os.path.splitext(probe)[1].lower()
+        if ext == ".gdb" and os.path.isdir(probe):
+            files = gdb_table_files(probe, os.path.basename(path)) if probe != path else None
+            return files or sorted(os.path.join(probe, f) for f in os.listdir(probe)
+                                   if os.path.isfile(os.path.join(probe, f)) and not f.lower().endswith(".lock"))
+        if ext == ".mdb" and os.path.isfile(probe):
+            return [probe]
+        if ext == ".sde":
+            return []
+        parent = os.path.dirname(probe)
+        if not parent or parent == probe:
+            break
+        probe = parent
+    stem, ext = os.path.splitext(path)
+    if ext.lower() != ".shp" and os.path.isfile(path + ".shp"):
+        stem, ext = path, ".shp"
+    if ext.lower() == ".shp":
+        return sorted(stem + e for e in SHAPEFILE_EXTS if os.path.isfile(stem + e))
+    return [path] if os.path.isfile(path) else []
+
+def content_hash(files):
+    """SHA-1 of the files' names, sizes and bytes (sampled for large data, see above)."""
+    h = hashlib.sha1()
+    sizes = [os.path.getsize(f) for f in files]
+    full = sum(sizes) <= FULL_HASH_BYTES
+    for f, size in zip(files, sizes):
+        h.update(("%s:%d\n" % (os.path.basename(f).lower(), size)).encode("utf-8"))
+        with open(f, "rb") as fh:
+            if full or size <= 2 * SAMPLE_BYTES:
+                for chunk in iter(lambda: fh.read(SAMPLE_BYTES), b""):
+                    h.update(chunk)
+            else:
+                h.update(("%r\n" % os.path.getmtime(f)).encode("utf-8"))
+                h.update(fh.read(SAMPLE_BYTES))
+                fh.seek(-SAMPLE_BYTES, os.SEEK_END)
+                h.update(fh.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+def fingerprint(paths, counts, crs, selection=None):
+    """Cache key for reading `paths` (with these feature counts) into `crs`, or None if not cacheable."""
+    sources = []
+    for path, count in zip(paths, counts):
+        files = source_files(path)
+        if not files:
+            return None
+        try:
+            sources.append([os.path.normcase(os.path.abspath(path)), int(count),
+                            max(os.path.getmtime(f) for f in files), content_hash(files)])
+        except (IOError, OSError):
+            return None
+    doc = json.dumps([CACHE_VERSION, sources, crs, selection], sort_keys=True, default=str)
+    return hashlib.sha1(doc.encode("utf-8")).hexdigest()[:24]
+
+def _folder_bytes(folder):
+    return sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+
+class CoordCache(object):
+    """Folder of cached stores, at most max_bytes in total (least recently used go first)."""
+
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = int(max_bytes)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    def _entry(self, key):
+        return os.path.join(self.folder, key)
+
+    def get(self, key, stats=None):
+        """The cached store for key (arrays memory-mapped, read only), or None."""
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, "meta.json")
+        store = None
+        if os.path.isfile(meta_path):
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                a = dict((name, np.load(os.path.join(entry, name + ".npy"), mmap_mode="r")) for name in ARRAYS)
+                store = FeatureStore(a["oid"], a["xy"], a["part_offsets"], a["feature_offsets"],
+                                     a["subtype"], a["layer"], meta["layer_names"], env=a["env"])
+                os.utime(meta_path, None)
+            except (IOError, OSError, ValueError, KeyError):
+                store = None
+        if stats is not None:
+            stats["coord_cache_hits" if store is not None else "coord_cache_misses"] += 1
+        return store
+
+    def put(self, key, store, stats=None):
+        """Save store under key, then evict down to max_bytes; returns the entry's size in bytes.
+
+        A cache that cannot be written (disk full, permissions) is not an
+        error for the run: nothing is stored and 0 is returned.
+        """
+        entry = self._entry(key)
+        tmp = "%s.tmp%d" % (entry, os.getpid())
+        try:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            for name in ARRAYS:
+                np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(getattr(store, name)))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"version": CACHE_VERSION, "features": len(store),
+                           "layer_names": list(store.layer_names),
+                           "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=1)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            shutil.rmtree(tmp, ignore_errors=True)
+            if stats is not None:
+                stats["coord_cache_errors"] += 1
+            return 0
+        size = _folder_bytes(entry)
+        evicted = self.evict(keep=key)
+        if stats is not None:
+            stats["coord_cache_bytes_written"] += size
+            stats["coord_cache_evicted"] += evicted
+        return size
+
+    def entries(self):
+        """[(key, bytes, last used)] of complete entries, least recently used first."""
+        out = []
+        for key in os.listdir(self.folder):
+            meta_path = os.path.join(self._entry(key), "meta.json")
+            if ".tmp" in key or not os.path.isfile(meta_path):
+                continue
+            out.append((key, _folder_bytes(self._entry(key)), os.path.getmtime(meta_path)))
+        out.sort(key=lambda e: e[2])
+        return out
+
+    def evict(self, keep=None):
+        """Remove least recently used entries (never keep) until the cache fits; returns how many."""
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            if not os.path.isdir(self._entry(key)):
+                total -= size
+                removed += 1
+        return removed
+
+def open_cache(folder=None, max_mb=DEFAULT_MAX_MB):
+    """CoordCache in folder (default: $TCPL_COORD_CACHE), or None when caching is off."""
+    folder = folder or os.environ.get(CACHE_ENV)
+    if not folder:
+        return None
+    try:
+        return CoordCache(folder, max_mb * 1024 * 1024)
+    except OSError:
+        return None
@@ -0,0 +1,206 @@
+#... TCPL endpoint checks (snap, road and river dangles) over a worker pool
+#
+# The endpoint loops are independent per endpoint, so the endpoints are cut
+# into contiguous ranges and classified by worker processes. The store's
+# coordinate, offset and envelope arrays and the endpoint table are copied
+# once into multiprocessing.shared_memory blocks; a task is only a
+# (start, stop) range. Each worker attaches to the blocks by name when it
+# starts, wraps them in a FeatureStore without copying and builds its own
+# STRtree and VertexHash from them. Ranges come back in order and are concatenated,
+# so the output is in the same order, and equal to, the serial check.
+#
+# Reasons: on_segment_no_snap / non_parallel_close for the river ends,
+# near_not_snapped for the road ends (snap_check keeps its feature list).
+#
+# shared_memory needs Python 3.8, so in ArcMap's Python 2.7 the checks run
+# serially. Otherwise, like tcpl_qc.tiling, the pool forks its workers
+# where it can, and on Windows starts new Python processes (tcpl_qc.spawn)
+# that get only the block names, kind and parameters.
+
+import math
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    resource_tracker = shared_memory = None
+
+from tcpl_qc.checks import (REASON_NOT_SNAPPED, _tally, build_indexes, classify_endpoint,
+                            dangle_endpoint, feature_endpoints, near_not_snapped, part_endpoints,
+                            river_dangles, snap_check, snap_endpoint, valid_features)
+from tcpl_qc.spawn import can_spawn, spawn_map
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.tiling import can_fork
+
+TASKS_PER_WORKER = 8
+
+# Per-worker state set by _attach: block handles, store, indexes, endpoints.
+_worker = {}
+
+class SharedArrays(object):
+    """NumPy arrays copied into shared memory blocks; spec lets other processes attach."""
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.spec = []
+        try:
+            for name, a in arrays:
+                a = np.ascontiguousarray(a)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+                self.blocks.append(shm)
+                np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+                self.spec.append((name, shm.name, a.shape, a.dtype.str))
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+def _open(shm_name, track):
+    if track or os.name != "posix":
+        return shared_memory.SharedMemory(name=shm_name)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=shm_name, track=False)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def attach(spec, track=True):
+    """(handles, {name: array}) for a SharedArrays spec; the arrays are views, not copies.
+
+    Forked workers share the creating process's resource tracker, so the
+    blocks are unlinked once, by SharedArrays.close in the parent. A spawned
+    worker has a tracker of its own, which would unlink them when the worker
+    exits; it attaches with track=False to keep them out of it.
+    """
+    handles, arrays = [], {}
+    for name, shm_name, shape, dtype in spec:
+        shm = _open(shm_name, track)
+        handles.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return handles, arrays
+
+def _attach(spec, kind, params, track=True):
+    handles, a = attach(spec, track)
+    n = len(a["env"])
+    store = FeatureStore(np.arange(n), a["xy"], a["part_offsets"], a["feature_offsets"], env=a["env"])
+    _worker.update(handles=handles, store=store, ends=a["ends"], kind=kind, params=params,
+                   indexes=build_indexes(store, params["vertex_eps"]))
+
+def _classify_range(bounds):
+    # Worker: (rows flagged in ends[start:stop], reasons, pairs tested, predicate calls).
+    start, stop = bounds
+    store, ends, kind, p = _worker["store"], _worker["ends"], _worker["kind"], _worker["params"]
+    tree, vhash = _worker["indexes"]
+    local = {"pairs_tested": 0, "predicate_calls": 0}
+    rows, reasons = [], []
+    for r in range(start, stop):
+        i, px, py = int(ends[r, 0]), float(ends[r, 1]), float(ends[r, 2])
+        if kind == "river":
+            reason = classify_endpoint(store, i, px, py, (float(ends[r, 3]), float(ends[r, 4])),
+                                       p["near_tol"], p["vertex_eps"], p["segment_eps"],
+                                       p["parallel_deg"], p["pad"], tree, vhash, local)
+        elif kind == "snap":
+            reason = snap_endpoint(store, i, px, py, p["near_tol"], p["vertex_eps"], p["pad"],
+                                   tree, vhash, local) and REASON_NOT_SNAPPED
+        else:
+            reason = dangle_endpoint(store, i, px, py, p["near_tol"], p["vertex_eps"], p["pad"],
+                                     tree, vhash, local) and REASON_NOT_SNAPPED
+        if reason:
+            rows.append(r)
+            reasons.append(reason)
+    return rows, reasons, local["pairs_tested"], local["predicate_calls"]
+
+def ranges(n, workers, tasks_per_worker=TASKS_PER_WORKER):
+    """Contiguous (start, stop) ranges covering range(n), about tasks_per_worker per worker."""
+    step = max(1, int(math.ceil(n / float(max(1, workers * tasks_per_worker)))))
+    return [(s, min(n, s + step)) for s in range(0, n, step)]
+
+def classify_endpoints(store, ends, kind, params, workers):
+    """Classify the rows of the endpoint table ends on `workers` forked or spawned processes.
+
+    ends is (n, 3) [index, x, y] or, for kind "river", (n, 5) with the end
+    direction. Returns (flagged rows in ascending order, their reasons,
+    pairs tested, predicate calls).
+    """
+    shared = SharedArrays([("xy", store.xy), ("part_offsets", store.part_offsets),
+                           ("feature_offsets", store.feature_offsets), ("env", store.env),
+                           ("ends", ends)])
+    rows, reasons = [], []
+    tested = calls = 0
+    try:
+        if can_fork():
+            from concurrent.futures import ProcessPoolExecutor
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_attach,
+                                     initargs=(shared.spec, kind, params)) as ex:
+                done = list(ex.map(_classify_range, ranges(len(ends), workers)))
+        else:
+            done = spawn_map(_classify_range, ranges(len(ends), workers), workers, _attach,
+                             (shared.spec, kind, params, False))
+    finally:
+        shared.close()
+    for r, why, t, c in done:
+        rows.extend(r)
+        reasons.extend(why)
+        tested += t
+        calls += c
+    return rows, reasons, tested, calls
+
+def _possible(store, n_ends):
+    # Endpoint/line pairs an STRtree over the store would have pruned from (see checks._tally):
+    # its size counts the features with vertices only.
+    return n_ends * max(len(valid_features(store)) - 1, 0)
+
+def _serial(workers):
+    workers = workers or multiprocessing.cpu_count()
+    return workers <= 1 or shared_memory is None or not (can_fork() or can_spawn()), workers
+
+def parallel_snap_check(store, near_tol, vertex_eps, pad=None, workers=None, stats=None):
+    """snap_check on up to `workers` processes (None or 0: one per CPU); same result."""
+    serial, workers = _serial(workers)
+    if serial:
+        return snap_check(store, near_tol, vertex_eps, pad=pad, stats=stats)
+    pad = near_tol if pad is None else pad
+    ends = np.array(feature_endpoints(store), dtype=np.float64).reshape(-1, 3)
+    params = {"near_tol": near_tol, "vertex_eps": vertex_eps, "pad": pad}
+    rows, _, tested, calls = classify_endpoints(store, ends, "snap", params, workers)
+    _tally(stats, tested, _possible(store, len(ends)), calls)
+    return sorted(set(int(ends[r, 0]) for r in rows))
+
+def parallel_near_not_snapped(store, near_tol, vertex_eps, pad=None, workers=None, stats=None):
+    """near_not_snapped on up to `workers` processes (None or 0: one per CPU); same result."""
+    serial, workers = _serial(workers)
+    if serial:
+        return near_not_snapped(store, near_tol, vertex_eps, pad=pad, stats=stats)
+    pad = near_tol if pad is None else pad
+    endpoints = feature_endpoints(store)
+    ends = np.array(endpoints, dtype=np.float64).reshape(-1, 3)
+    params = {"near_tol": near_tol, "vertex_eps": vertex_eps, "pad": pad}
+    rows, _, tested, calls = classify_endpoints(store, ends, "dangle", params, workers)
+    _tally(stats, tested, _possible(store, len(ends)), calls)
+    return [endpoints[r] for r in rows]
+
+def parallel_river_dangles(store, near_tol, vertex_eps, segment_eps, parallel_deg, pad=None,
+                           workers=None, stats=None):
+    """river_dangles on up to `workers` processes (None or 0: one per CPU); same result and order."""
+    serial, workers = _serial(workers)
+    if serial:
+        return river_dangles(store, near_tol, vertex_eps, segment_eps, parallel_deg, pad=pad,
+                             stats=stats)
+    pad = near_tol if pad is None else pad
+    endpoints = [e for e in part_endpoints(store) if (e[3], e[4]) != (0.0, 0.0)]
+    ends = np.array(endpoints, dtype=np.float64).reshape(-1, 5)
+    params = {"near_tol": near_tol, "vertex_eps": vertex_eps, "segment_eps": segment_eps,
+              "parallel_deg": parallel_deg, "pad": pad}
+    rows, reasons, tested, calls = classify_endpoints(store, ends, "river", params, workers)
+    _tally(stats, tested, _possible(store, len(ends)), calls)
+    return [endpoints[r][:3] + (why,) for r, why in zip(rows, reasons)]
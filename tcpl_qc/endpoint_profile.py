@@ -0,0 +1,198 @@
+#... TCPL endpoint proximity profile: measure once, classify at any tolerance
+#
+# One pass records, for every endpoint and every other line within max_tol
+# of it: the distance to that line, the distance to its nearest vertex, the
+# foot point's position along it, the distance to the foot point and the
+# angle between the end segment and the line there. Rows are kept in the
+# order the checks visit neighbours (endpoint, then line index), so the
+# "first near line decides" rules of snap_check and river_dangles become
+# first-row-per-endpoint lookups. Any NEAR_TOL_M <= max_tol, VERTEX_EPS_M,
+# SEGMENT_EPS_M and PARALLEL_ANGLE_DEG is then a NumPy filter whose result
+# equals the geometry checks in tcpl_qc.checks.
+#
+# Crossing angles are measured over +-angle_step(max_tol) metres of the
+# neighbour, as classify_endpoint does for NEAR_TOL_M = max_tol; river
+# classification at a NEAR_TOL_M with a different step (below 10 m when
+# max_tol is 10 m or more) raises ValueError.
+
+import numpy as np
+
+from tcpl_qc.checks import (REASON_NON_PARALLEL, REASON_ON_SEGMENT, _box, angle_step, crossing_angle,
+                            feature_endpoints, part_endpoints)
+from tcpl_qc.gap_table import xy_digest
+from tcpl_qc.rtree import STRtree
+from tcpl_qc.segments import locate_point, point_line_distance
+
+END_KINDS = ("feature", "part")   # first/last vertex of each feature (roads), or of each part (rivers)
+
+# Arrays written by save(), besides the scalars.
+FIELDS = ("end_feature", "end_xy", "end_dir", "row_end", "row_line", "d_line", "d_vertex", "d_perp",
+          "along", "angle", "oid", "layer")
+
+class EndpointProfile(object):
+    """Endpoint-to-line measurements within max_tol, one row per (endpoint, line) pair.
+
+    end_feature/end_xy/end_dir describe the endpoints; row_end and
+    row_line say which endpoint and line each row belongs to.
+    """
+
+    def __init__(self, n, ends, max_tol, angle_delta, digest="", **arrays):
+        self.n = int(n)
+        self.ends = ends
+        self.max_tol = float(max_tol)
+        self.angle_delta = float(angle_delta)
+        self.digest = digest
+        for name in FIELDS:
+            setattr(self, name, np.asarray(arrays[name]))
+
+    @classmethod
+    def build(cls, store, max_tol, ends="feature", stats=None):
+        if ends not in END_KINDS:
+            raise ValueError("ends must be one of %s" % (END_KINDS,))
+        if ends == "feature":
+            points = [(i, x, y, 0.0, 0.0) for i, x, y in feature_endpoints(store)]
+        else:
+            points = [e for e in part_endpoints(store) if (e[3], e[4]) != (0.0, 0.0)]
+        tree = STRtree(store.env)
+        delta = angle_step(max_tol)
+        xy = store.xy
+        rows = []
+        tested = 0
+        for k, (i, px, py, ux, uy) in enumerate(points):
+            for j in tree.query(_box(px, py, max_tol)).tolist():
+                if j == i:
+                    continue
+                tested += 1
+                line = store.line(j)
+                d = point_line_distance(px, py, line)
+                if d > max_tol:
+                    continue
+                v0, v1 = store.vertex_range(j)
+                dv = float(np.hypot(xy[v0:v1, 0] - px, xy[v0:v1, 1] - py).min())
+                qx, qy, dalong, dperp = locate_point(px, py, line)
+                ang = np.nan
+                if ends == "part" and qx is not None:
+                    ang = crossing_angle(line, dalong, (ux, uy), delta)
+                rows.append((k, j, d, dv, dperp, dalong, ang))
+        if stats is not None:
+            stats["pairs_tested"] += tested
+            stats["pairs_pruned"] += len(points) * max(tree.size - 1, 0) - tested
+            stats["predicate_calls"] += tested + 2 * len(rows)
+        pts = np.array(points, dtype=np.float64).reshape(-1, 5)
+        r = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        return cls(len(store), ends, max_tol, delta, xy_digest(store),
+                   end_feature=pts[:, 0].astype(np.int64), end_xy=pts[:, 1:3], end_dir=pts[:, 3:5],
+                   row_end=r[:, 0].astype(np.int64), row_line=r[:, 1].astype(np.int64),
+                   d_line=r[:, 2], d_vertex=r[:, 3], d_perp=r[:, 4], along=r[:, 5], angle=r[:, 6],
+                   oid=store.oid, layer=store.layer)
+
+    def __len__(self):
+        return len(self.row_end)
+
+    def _check(self, near_tol):
+        if near_tol > self.max_tol:
+            raise ValueError("near_tol %g is beyond the profile's max_tol %g" % (near_tol, self.max_tol))
+
+    def _first(self, mask):
+        # (endpoints, their first row) where mask holds; rows are in visiting order.
+        rows = np.flatnonzero(mask)
+        ends, first = np.unique(self.row_end[rows], return_index=True)
+        return ends, rows[first]
+
+    def _points(self, ends):
+        return [(int(self.end_feature[k]), float(self.end_xy[k, 0]), float(self.end_xy[k, 1]))
+                for k in ends.tolist()]
+
+    def matches(self, store):
+        """True when the profile was built from exactly this store's features and coordinates."""
+        return (self.n == len(store) and np.array_equal(self.oid, store.oid)
+                and np.array_equal(self.layer, store.layer) and self.digest == xy_digest(store))
+
+    def nearest(self):
+        """Per endpoint: (nearest line distance, nearest other-line vertex distance, along, angle).
+
+        along and angle belong to the nearest line; inf / nan where no line
+        is within max_tol.
+        """
+        n_end = len(self.end_feature)
+        d_line = np.full(n_end, np.inf)
+        d_vertex = np.full(n_end, np.inf)
+        along = np.full(n_end, np.nan)
+        angle = np.full(n_end, np.nan)
+        np.minimum.at(d_line, self.row_end, self.d_line)
+        np.minimum.at(d_vertex, self.row_end, self.d_vertex)
+        # Reversed so the first (lowest line index) of equally near rows wins.
+        rows = np.flatnonzero(self.d_line == d_line[self.row_end])[::-1]
+        along[self.row_end[rows]] = self.along[rows]
+        angle[self.row_end[rows]] = self.angle[rows]
+        return d_line, d_vertex, along, angle
+
+    def snap_check(self, near_tol, vertex_eps):
+        """checks.snap_check: sorted feature indices with an unsnapped endpoint."""
+        self._check(near_tol)
+        ends, rows = self._first(self.d_line <= near_tol)
+        bad = ends[self.d_vertex[rows] > vertex_eps]
+        return sorted(set(self.end_feature[bad].tolist()))
+
+    def near_not_snapped(self, near_tol, vertex_eps):
+        """checks.near_not_snapped: (index, x, y) of endpoints near a line but on none of its vertices."""
+        self._check(near_tol)
+        near = self.d_line <= near_tol
+        n_end = len(self.end_feature)
+        has_near = np.bincount(self.row_end[near], minlength=n_end) > 0
+        has_snap = np.bincount(self.row_end[near & (self.d_vertex <= vertex_eps)], minlength=n_end) > 0
+        return self._points(np.flatnonzero(has_near & ~has_snap))
+
+    def river_dangles(self, near_tol, vertex_eps, segment_eps, parallel_deg):
+        """checks.river_dangles: (index, x, y, reason) for every problem endpoint."""
+        self._check(near_tol)
+        if self.ends != "part":
+            raise ValueError("river classification needs a profile built with ends='part'")
+        if angle_step(near_tol) != self.angle_delta:
+            raise ValueError("angles were measured over +-%g m; near_tol %g needs +-%g m"
+                             % (self.angle_delta, near_tol, angle_step(near_tol)))
+        on_segment = self.d_perp <= segment_eps
+        with np.errstate(invalid="ignore"):
+            parallel = (self.angle <= parallel_deg) | (np.abs(180.0 - self.angle) <= parallel_deg)
+        crossing = ~np.isnan(self.angle) & ~parallel
+        decides = (self.d_line <= near_tol) & (self.d_vertex > vertex_eps) & (on_segment | crossing)
+        ends, rows = self._first(decides)
+        reasons = np.where(on_segment[rows], REASON_ON_SEGMENT, REASON_NON_PARALLEL)
+        return [p + (str(why),) for p, why in zip(self._points(ends), reasons.tolist())]
+
+    def save(self, path):
+        arrays = dict((name, getattr(self, name)) for name in FIELDS)
+        with open(path, "wb") as f:
+            np.savez(f, n=self.n, ends=np.array(self.ends.encode("ascii")), max_tol=self.max_tol,
+                     angle_delta=self.angle_delta, digest=np.array(self.digest.encode("ascii")), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        z = np.load(path)
+        try:
+            text = dict((k, z[k].tolist()) for k in ("ends", "digest"))
+            for k, v in text.items():
+                if isinstance(v, bytes):
+                    text[k] = v.decode("ascii")
+            arrays = dict((name, z[name]) for name in FIELDS)
+            return cls(int(z["n"]), text["ends"], float(z["max_tol"]), float(z["angle_delta"]),
+                       text["digest"], **arrays)
+        finally:
+            z.close()
+
+def endpoint_profile(store, path, max_tol, ends="feature", stats=None):
+    """The profile saved at path, or a new one built (and saved) when it does not match store."""
+    try:
+        profile = EndpointProfile.load(path)
+    except (IOError, OSError, KeyError, ValueError):
+        profile = None
+    if (profile is None or profile.ends != ends or profile.max_tol != max_tol
+            or not profile.matches(store)):
+        profile = EndpointProfile.build(store, max_tol, ends, stats=stats)
+        profile.save(path)
+        if stats is not None:
+            stats["profile_built"] += 1
+    elif stats is not None:
+        stats["profile_reused"] += 1
+    return profile
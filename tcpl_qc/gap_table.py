@@ -0,0 +1,164 @@
+#... TCPL gap distance table: one geometry pass, any radius afterwards
+#
+# For every feature pair whose extents are within max_radius of each other
+# the table holds both directed Hausdorff distances (A to B and B to A,
+# exact to tol; inf when above max_radius). The gap result for any radius
+# up to max_radius, the mutual/one-sided split and distance histograms are
+# then plain array comparisons. Answers equal gap_check's except for a
+# pair whose distance lies within tol (1 mm) of the radius, which is also
+# the resolution of gap_check itself.
+#
+# Tables are saved as .npz together with the OIDs, layer ids and a digest
+# of the coordinates, so a table built from other data is never reused.
+
+import hashlib
+
+import numpy as np
+
+from tcpl_qc.checks import valid_features
+from tcpl_qc.grid_hash import candidate_pairs
+from tcpl_qc.hausdorff import directed_hausdorff, envelope_within
+
+DEFAULT_TOL = 1e-3
+
+def xy_digest(store):
+    """SHA-1 of the store's coordinates and offsets."""
+    h = hashlib.sha1()
+    for a in (store.xy, store.part_offsets, store.feature_offsets):
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+def _distance(a, b, max_radius, tol):
+    # Exact directed distance when it is <= max_radius, else inf.
+    if not envelope_within(a, b, max_radius):
+        return np.inf
+    if directed_hausdorff(a, b, limit=max_radius, tol=tol) > max_radius:
+        return np.inf
+    return directed_hausdorff(a, b, tol=tol)
+
+class GapTable(object):
+    """Directed Hausdorff distances between every feature pair within max_radius.
+
+    i, j are feature indices (i < j); d_ij is the distance from line i to
+    line j (how far i strays from j), d_ji the other way; inf means above
+    max_radius.
+    """
+
+    def __init__(self, n, i, j, d_ij, d_ji, max_radius, tol=DEFAULT_TOL, oid=None, layer=None,
+                 digest=""):
+        self.n = int(n)
+        self.i = np.asarray(i, dtype=np.int64)
+        self.j = np.asarray(j, dtype=np.int64)
+        self.d_ij = np.asarray(d_ij, dtype=np.float64)
+        self.d_ji = np.asarray(d_ji, dtype=np.float64)
+        self.max_radius = float(max_radius)
+        self.tol = float(tol)
+        self.oid = None if oid is None else np.asarray(oid, dtype=np.int64)
+        self.layer = None if layer is None else np.asarray(layer, dtype=np.int16)
+        self.digest = digest
+
+    @classmethod
+    def build(cls, store, max_radius, tol=DEFAULT_TOL, stats=None):
+        """Measure every candidate pair of store once, up to max_radius."""
+        idx = valid_features(store)
+        cand_i, cand_j = candidate_pairs(store.env[idx], max_radius)
+        pi, pj = idx[cand_i], idx[cand_j]
+        d_ij = np.empty(len(pi))
+        d_ji = np.empty(len(pi))
+        for k, (i, j) in enumerate(zip(pi.tolist(), pj.tolist())):
+            a, b = store.line(i), store.line(j)
+            d_ij[k] = _distance(a, b, max_radius, tol)
+            d_ji[k] = _distance(b, a, max_radius, tol)
+        if stats is not None:
+            n = len(idx)
+            stats["pairs_tested"] += len(pi)
+            stats["pairs_pruned"] += n * (n - 1) // 2 - len(pi)
+            stats["predicate_calls"] += 2 * len(pi)
+        # Pairs with neither direction in range can never matter.
+        near = np.isfinite(d_ij) | np.isfinite(d_ji)
+        return cls(len(store), pi[near], pj[near], d_ij[near], d_ji[near], max_radius, tol,
+                   store.oid, store.layer, xy_digest(store))
+
+    def __len__(self):
+        return len(self.i)
+
+    def _check(self, radius):
+        if radius > self.max_radius:
+            raise ValueError("radius %g is beyond the table's max_radius %g" % (radius, self.max_radius))
+
+    def matches(self, store):
+        """True when the table was built from exactly this store's features and coordinates."""
+        return (self.n == len(store) and self.oid is not None and np.array_equal(self.oid, store.oid)
+                and np.array_equal(self.layer, store.layer) and self.digest == xy_digest(store))
+
+    def gap_sets(self, radius):
+        """(keep_mutual, keep_onesided) sets of feature indices, as gap_check(store, radius)."""
+        self._check(radius)
+        a_in_b = self.d_ij <= radius
+        b_in_a = self.d_ji <= radius
+        both = a_in_b & b_in_a
+        keep_mutual = set(self.i[both].tolist()) | set(self.j[both].tolist())
+        keep_onesided = (set(self.i[a_in_b & ~b_in_a].tolist()) |
+                         set(self.j[b_in_a & ~a_in_b].tolist()))
+        return keep_mutual, keep_onesided
+
+    def nearest(self):
+        """(n,) distance from each feature to the closest other line it lies within; inf if none."""
+        out = np.full(self.n, np.inf)
+        np.minimum.at(out, self.i, self.d_ij)
+        np.minimum.at(out, self.j, self.d_ji)
+        return out
+
+    def counts(self, radii):
+        """[(radius, mutual, onesided, flagged)] feature counts for each radius."""
+        rows = []
+        for r in radii:
+            mutual, onesided = self.gap_sets(r)
+            rows.append((r, len(mutual), len(onesided), len(mutual | onesided)))
+        return rows
+
+    def histogram(self, bins=10):
+        """np.histogram of the nearest-line distances that are within max_radius."""
+        d = self.nearest()
+        return np.histogram(d[np.isfinite(d)], bins=bins, range=(0.0, self.max_radius))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, n=self.n, i=self.i, j=self.j, d_ij=self.d_ij, d_ji=self.d_ji,
+                     max_radius=self.max_radius, tol=self.tol,
+                     oid=self.oid if self.oid is not None else np.zeros(0, dtype=np.int64),
+                     layer=self.layer if self.layer is not None else np.zeros(0, dtype=np.int16),
+                     digest=np.array(self.digest.encode("ascii")))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        z = np.load(path)
+        try:
+            digest = z["digest"].tolist()
+            if isinstance(digest, bytes):
+                digest = digest.decode("ascii")
+            return cls(int(z["n"]), z["i"], z["j"], z["d_ij"], z["d_ji"], float(z["max_radius"]),
+                       float(z["tol"]), z["oid"], z["layer"], digest)
+        finally:
+            z.close()
+
+def table_gap_check(store, radius, path, max_radius, stats=None):
+    """gap_check answered from the table at path, (re)building and saving it when it does not match store.
+
+    The table is built to max(max_radius, radius), so scripts with
+    different radii can share one file.
+    """
+    table = None
+    try:
+        table = GapTable.load(path)
+    except (IOError, OSError, KeyError, ValueError):
+        table = None
+    if table is None or table.max_radius < radius or not table.matches(store):
+        table = GapTable.build(store, max(max_radius, radius), stats=stats)
+        table.save(path)
+        if stats is not None:
+            stats["gap_table_built"] += 1
+    elif stats is not None:
+        stats["gap_table_reused"] += 1
+    return table.gap_sets(radius)
@@ -0,0 +1,112 @@
+#... TCPL batched WGS84 polyline lengths (GEODESIC metres) with NumPy
+#
+# Lines are flat coordinate arrays: xy holds lon/lat in degrees, part k runs
+# xy[part_offsets[k]:part_offsets[k+1]] and feature f owns parts
+# feature_offsets[f] .. feature_offsets[f+1]-1.
+
+import numpy as np
+
+from tcpl_qc.tmerc import WGS84_A, WGS84_F
+
+WGS84_B = WGS84_A * (1.0 - WGS84_F)
+VINCENTY_TOL = 1e-12
+VINCENTY_MAX_ITER = 200
+# Features whose approximate length lies within this fraction of the
+# threshold are re-measured exactly; far outside it the approximation
+# (< 1e-6 relative on sub-kilometre segments) cannot change the decision.
+BAND_REL = 1e-3
+
+def segment_endpoints(xy, part_offsets):
+    """(i0, i1) vertex indices of every segment; segments never span parts."""
+    n = len(xy)
+    last = np.zeros(n, dtype=bool)
+    ends = np.asarray(part_offsets[1:], dtype=np.int64) - 1
+    last[ends[ends >= 0]] = True
+    i0 = np.flatnonzero(~last[:-1]) if n > 1 else np.zeros(0, dtype=np.int64)
+    return i0, i0 + 1
+
+def segment_features(xy, part_offsets, feature_offsets, i0):
+    # Feature that owns each segment.
+    part_of_vertex = np.repeat(np.arange(len(part_offsets) - 1), np.diff(part_offsets))
+    feat_of_part = np.repeat(np.arange(len(feature_offsets) - 1), np.diff(feature_offsets))
+    return feat_of_part[part_of_vertex[i0]]
+
+def approx_distance(lon1, lat1, lon2, lat2):
+    """Short-line ellipsoidal distance from the local radii of curvature at mid-latitude."""
+    phi = np.radians(0.5 * (lat1 + lat2))
+    e2 = WGS84_F * (2.0 - WGS84_F)
+    w = np.sqrt(1.0 - e2 * np.sin(phi) ** 2)
+    rn = WGS84_A / w
+    rm = WGS84_A * (1.0 - e2) / w ** 3
+    dlon = (lon2 - lon1 + 180.0) % 360.0 - 180.0
+    return np.hypot(np.radians(dlon) * rn * np.cos(phi), np.radians(lat2 - lat1) * rm)
+
+def vincenty_distance(lon1, lat1, lon2, lat2):
+    """Vincenty inverse on WGS84, vectorised; NaN where it fails to converge (near-antipodal)."""
+    lon1, lat1, lon2, lat2 = [np.asarray(v, dtype=np.float64) for v in (lon1, lat1, lon2, lat2)]
+    f = WGS84_F
+    L = np.radians((lon2 - lon1 + 180.0) % 360.0 - 180.0)
+    U1 = np.arctan((1.0 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1.0 - f) * np.tan(np.radians(lat2)))
+    sU1, cU1, sU2, cU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+    lam = L.copy()
+    active = np.ones(L.shape, dtype=bool)
+    sin_sig = cos_sig = sig = cos2_alpha = cos_2sm = np.zeros(L.shape)
+    for _ in range(VINCENTY_MAX_ITER):
+        sl, cl = np.sin(lam), np.cos(lam)
+        sin_sig = np.hypot(cU2 * sl, cU1 * sU2 - sU1 * cU2 * cl)
+        cos_sig = sU1 * sU2 + cU1 * cU2 * cl
+        sig = np.arctan2(sin_sig, cos_sig)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sin_alpha = np.where(sin_sig > 0, cU1 * cU2 * sl / sin_sig, 0.0)
+            cos2_alpha = 1.0 - sin_alpha ** 2
+            cos_2sm = np.where(cos2_alpha > 0, cos_sig - 2.0 * sU1 * sU2 / cos2_alpha, 0.0)
+        C = f / 16.0 * cos2_alpha * (4.0 + f * (4.0 - 3.0 * cos2_alpha))
+        lam_new = L + (1.0 - C) * f * sin_alpha * (
+            sig + C * sin_sig * (cos_2sm + C * cos_sig * (-1.0 + 2.0 * cos_2sm ** 2)))
+        done = np.abs(lam_new - lam) <= VINCENTY_TOL
+        lam = np.where(active, lam_new, lam)
+        active &= ~done
+        if not active.any():
+            break
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1.0 + u2 / 16384.0 * (4096.0 + u2 * (-768.0 + u2 * (320.0 - 175.0 * u2)))
+    B = u2 / 1024.0 * (256.0 + u2 * (-128.0 + u2 * (74.0 - 47.0 * u2)))
+    d_sig = B * sin_sig * (cos_2sm + B / 4.0 * (
+        cos_sig * (-1.0 + 2.0 * cos_2sm ** 2) -
+        B / 6.0 * cos_2sm * (-3.0 + 4.0 * sin_sig ** 2) * (-3.0 + 4.0 * cos_2sm ** 2)))
+    s = WGS84_B * A * (sig - d_sig)
+    return np.where(active, np.nan, s)
+
+def polyline_lengths(xy, part_offsets, feature_offsets, exact=True, features=None):
+    """Length of every feature (or only of `features`) in metres."""
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    part_offsets = np.asarray(part_offsets, dtype=np.int64)
+    feature_offsets = np.asarray(feature_offsets, dtype=np.int64)
+    n_feat = len(feature_offsets) - 1
+    i0, i1 = segment_endpoints(xy, part_offsets)
+    seg_feat = segment_features(xy, part_offsets, feature_offsets, i0)
+    if features is not None:
+        pick = np.zeros(n_feat, dtype=bool)
+        pick[np.asarray(features, dtype=np.int64)] = True
+        keep = pick[seg_feat]
+        i0, i1, seg_feat = i0[keep], i1[keep], seg_feat[keep]
+    fn = vincenty_distance if exact else approx_distance
+    d = fn(xy[i0, 0], xy[i0, 1], xy[i1, 0], xy[i1, 1])
+    return np.bincount(seg_feat, weights=d, minlength=n_feat)
+
+def shorter_than(xy, part_offsets, feature_offsets, threshold_m, band_rel=BAND_REL):
+    """Boolean mask of features with geodesic length < threshold_m.
+
+    Every feature is measured with the cheap approximation; only those
+    within band_rel * threshold_m of the threshold get the Vincenty
+    computation. Returns (mask, number of features measured exactly).
+    """
+    approx = polyline_lengths(xy, part_offsets, feature_offsets, exact=False)
+    close = np.flatnonzero(np.abs(approx - threshold_m) <= band_rel * threshold_m)
+    lengths = approx
+    if len(close):
+        exact = polyline_lengths(xy, part_offsets, feature_offsets, exact=True, features=close)
+        lengths = approx.copy()
+        lengths[close] = exact[close]
+    return lengths < threshold_m, len(close)
@@ -0,0 +1,185 @@
+#... TCPL headless GeoPackage writer (stdlib sqlite3, one transaction)
+#
+# Writes one feature table per call from FeatureStore-layout arrays; the
+# table is replaced if it exists, other tables in the file are kept.
+
+import sqlite3
+import struct
+
+import numpy as np
+
+from tcpl_qc.shapefile import SHP_POINT, SHP_POLYGON, SHP_POLYLINE, field_specs
+
+GPKG_APPLICATION_ID = 0x47504B47   # "GPKG"
+GPKG_USER_VERSION   = 10200
+# srs_id used for a WKT that comes without an EPSG code.
+CUSTOM_SRS_ID = 100000
+WGS84_WKT = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+             'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]]')
+
+_META_SQL = [
+    """CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (
+        srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY,
+        organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL,
+        definition TEXT NOT NULL, description TEXT)""",
+    """CREATE TABLE IF NOT EXISTS gpkg_contents (
+        table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL,
+        identifier TEXT UNIQUE, description TEXT DEFAULT '',
+        last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+        min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE,
+        srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id))""",
+    """CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (
+        table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+        geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL,
+        z TINYINT NOT NULL, m TINYINT NOT NULL,
+        CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name),
+        CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+        CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""",
+]
+_REQUIRED_SRS = [
+    ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+    ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None),
+    ("WGS 84 geodetic", 4326, "EPSG", 4326, WGS84_WKT, None),
+]
+_SQL_TYPES = {"F": "DOUBLE", "L": "BOOLEAN", "C": "TEXT", "D": "TEXT"}
+
+def _sql_type(spec):
+    if spec[1] == "N":
+        return "DOUBLE" if spec[3] else "INTEGER"
+    return _SQL_TYPES.get(spec[1], "TEXT")
+
+def _quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+def _ring_area(xy):
+    # Shoelace; negative for clockwise rings (shapefile outer rings).
+    x, y = xy[:, 0], xy[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+def _wkb(kind, xy, offsets):
+    if kind == "POINT":
+        return struct.pack("<BI", 1, 1) + xy[0].tobytes()
+    if kind == "MULTILINESTRING":
+        parts = [struct.pack("<BII", 1, 2, int(offsets[k + 1] - offsets[k])) +
+                 xy[offsets[k]:offsets[k + 1]].tobytes() for k in range(len(offsets) - 1)]
+        return struct.pack("<BII", 1, 5, len(parts)) + b"".join(parts)
+    # MULTIPOLYGON: every clockwise ring starts a polygon, the counter-
+    # clockwise rings after it are its holes (shapefile ring order).
+    polygons = []
+    for k in range(len(offsets) - 1):
+        ring = xy[offsets[k]:offsets[k + 1]]
+        if _ring_area(ring) <= 0 or not polygons:
+            polygons.append([])
+        polygons[-1].append(ring)
+    out = [struct.pack("<BII", 1, 6, len(polygons))]
+    for rings in polygons:
+        out.append(struct.pack("<BII", 1, 3, len(rings)))
+        out.extend(struct.pack("<I", len(r)) + r.tobytes() for r in rings)
+    return b"".join(out)
+
+def geometry_blobs(kind, xy, part_offsets, feature_offsets, srs_id):
+    """GeoPackage geometry blob (header + little-endian WKB) per feature; None for no parts."""
+    xy = np.ascontiguousarray(xy, dtype="<f8").reshape(-1, 2)
+    blobs = []
+    for f in range(len(feature_offsets) - 1):
+        p0, p1 = int(feature_offsets[f]), int(feature_offsets[f + 1])
+        if p1 == p0:
+            blobs.append(None)
+            continue
+        offsets = part_offsets[p0:p1 + 1]
+        v0, v1 = int(offsets[0]), int(offsets[-1])
+        fxy = xy[v0:v1]
+        if kind == "POINT":
+            head = struct.pack("<2sBBi", b"GP", 0, 0x01, srs_id)
+        else:
+            head = struct.pack("<2sBBi4d", b"GP", 0, 0x03, srs_id, fxy[:, 0].min(), fxy[:, 0].max(),
+                               fxy[:, 1].min(), fxy[:, 1].max())
+        blobs.append(sqlite3.Binary(head + _wkb(kind, fxy, offsets - v0)))
+    return blobs
+
+def _geometry_kind(shape_type):
+    if shape_type in SHP_POINT:
+        return "POINT"
+    if shape_type in SHP_POLYLINE:
+        return "MULTILINESTRING"
+    if shape_type in SHP_POLYGON:
+        return "MULTIPOLYGON"
+    raise ValueError("Unsupported shape type %d" % shape_type)
+
+def _column_values(col, ftype):
+    vals = np.asarray(col)
+    if ftype in "NF" and vals.dtype.kind == "f":
+        return [None if v != v else v for v in vals.tolist()]
+    if ftype == "L":
+        return [int(v) for v in vals.astype(bool).tolist()]
+    return vals.tolist()
+
+def write_gpkg(path, table, shape_type, xy, part_offsets, feature_offsets, columns=None, fields=None,
+               srs_id=None, srs_wkt=None, srs_name=None):
+    """Write one feature table into the GeoPackage at path (created if needed).
+
+    Geometries are POINT, MULTILINESTRING or MULTIPOLYGON after the
+    shapefile shape_type. srs_id is an EPSG code; with only srs_wkt a
+    custom id is used, with neither the undefined cartesian SRS (-1).
+    All rows go in with one executemany inside a single transaction.
+    """
+    kind = _geometry_kind(shape_type)
+    columns = columns or {}
+    specs = field_specs(columns, fields)
+    if srs_id is None:
+        srs_id = CUSTOM_SRS_ID if srs_wkt else -1
+    part_offsets = np.asarray(part_offsets, dtype=np.int64)
+    feature_offsets = np.asarray(feature_offsets, dtype=np.int64)
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    blobs = geometry_blobs(kind, xy, part_offsets, feature_offsets, srs_id)
+    rows = zip(blobs, *[_column_values(columns[s[0]], s[1]) for s in specs])
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA application_id = %d" % GPKG_APPLICATION_ID)
+        conn.execute("PRAGMA user_version = %d" % GPKG_USER_VERSION)
+        conn.execute("BEGIN")
+        try:
+            for sql in _META_SQL:
+                conn.execute(sql)
+            conn.executemany("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)",
+                             _REQUIRED_SRS)
+            if srs_id not in (-1, 0, 4326):
+                org = "EPSG" if srs_id != CUSTOM_SRS_ID else "NONE"
+                conn.execute("INSERT OR REPLACE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)",
+                             (srs_name or "srs %d" % srs_id, srs_id, org, srs_id,
+                              srs_wkt or "undefined", None))
+            conn.execute("DROP TABLE IF EXISTS %s" % _quote(table))
+            conn.execute("DELETE FROM gpkg_geometry_columns WHERE table_name = ?", (table,))
+            conn.execute("DELETE FROM gpkg_contents WHERE table_name = ?", (table,))
+            cols = ["fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL", "geom %s" % kind]
+            cols += ["%s %s" % (_quote(s[0]), _sql_type(s)) for s in specs]
+            conn.execute("CREATE TABLE %s (%s)" % (_quote(table), ", ".join(cols)))
+            conn.executemany("INSERT INTO %s (geom%s) VALUES (?%s)" % (
+                _quote(table), "".join(", " + _quote(s[0]) for s in specs), ", ?" * len(specs)), rows)
+            bbox = [None] * 4
+            if len(xy):
+                bbox = [float(xy[:, 0].min()), float(xy[:, 1].min()),
+                        float(xy[:, 0].max()), float(xy[:, 1].max())]
+            conn.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, min_x, min_y, "
+                         "max_x, max_y, srs_id) VALUES (?, 'features', ?, ?, ?, ?, ?, ?)",
+                         [table, table] + bbox + [srs_id])
+            conn.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, ?, 0, 0)",
+                         (table, kind, srs_id))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def write_store(path, table, store, columns=None, fields=None, shape_type=SHP_POLYLINE[0], **srs):
+    """Write the features of a FeatureStore (polylines by default) as one table."""
+    write_gpkg(path, table, shape_type, store.xy, store.part_offsets, store.feature_offsets,
+               columns, fields, **srs)
+
+def write_points(path, table, x, y, columns=None, fields=None, **srs):
+    """Write a point table, e.g. QC endpoints with QC_FIELDS columns."""
+    xy = np.column_stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)))
+    offsets = np.arange(len(xy) + 1, dtype=np.int64)
+    write_gpkg(path, table, SHP_POINT[0], xy, offsets, offsets, columns, fields, **srs)
@@ -0,0 +1,82 @@
+#... TCPL uniform-grid spatial hash (broad phase for the pairwise gap checks)
+
+import numpy as np
+
+def envelopes_close(env, i, j, radius):
+    # True where the axis gaps between envelope i and envelope j are both <= radius.
+    dx = np.maximum(env[i, 0], env[j, 0]) - np.minimum(env[i, 2], env[j, 2])
+    dy = np.maximum(env[i, 1], env[j, 1]) - np.minimum(env[i, 3], env[j, 3])
+    return (dx <= radius) & (dy <= radius)
+
+def envelopes_overlap(env, i, j):
+    return ((np.maximum(env[i, 0], env[j, 0]) <= np.minimum(env[i, 2], env[j, 2])) &
+            (np.maximum(env[i, 1], env[j, 1]) <= np.minimum(env[i, 3], env[j, 3])))
+
+def candidate_pairs(env, radius, cell_size=None):
+    """Return (I, J) index arrays, I < J, of every envelope pair whose gap is <= radius.
+
+    env is an (n, 4) array of XMin, YMin, XMax, YMax in metres. Each envelope is
+    padded by radius/2 and hashed into every grid cell it covers; a pair is only
+    reported from the cell holding the lower-left corner of the padded overlap,
+    so no pair comes out twice.
+    """
+    env = np.asarray(env, dtype=np.float64).reshape(-1, 4)
+    n = len(env)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    half = radius / 2.0
+    if cell_size is None:
+        cell_size = 2.0 * radius
+    cell_size = float(max(cell_size, 1e-9))
+
+    pad = env + np.array([-half, -half, half, half])
+    ox, oy = pad[:, 0].min(), pad[:, 1].min()
+    cx0 = np.floor((pad[:, 0] - ox) / cell_size).astype(np.int64)
+    cy0 = np.floor((pad[:, 1] - oy) / cell_size).astype(np.int64)
+    cx1 = np.floor((pad[:, 2] - ox) / cell_size).astype(np.int64)
+    cy1 = np.floor((pad[:, 3] - oy) / cell_size).astype(np.int64)
+    nx = cx1 - cx0 + 1
+    ny = cy1 - cy0 + 1
+    ncell = nx * ny
+    stride = int(cy1.max()) + 1
+
+    # One (cell key, feature) entry per covered cell.
+    fid = np.repeat(np.arange(n, dtype=np.int64), ncell)
+    first = np.repeat(np.cumsum(ncell) - ncell, ncell)
+    k = np.arange(len(fid), dtype=np.int64) - first
+    kx = cx0[fid] + k // ny[fid]
+    ky = cy0[fid] + k % ny[fid]
+    key = kx * stride + ky
+
+    order = np.argsort(key, kind="mergesort")
+    key = key[order]
+    fid = fid[order]
+    bounds = np.flatnonzero(np.diff(key)) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(key)]))
+
+    out_i, out_j = [], []
+    for s, e in zip(starts, stops):
+        m = e - s
+        if m < 2:
+            continue
+        members = fid[s:e]
+        a, b = np.triu_indices(m, 1)
+        i = members[a]; j = members[b]
+        ok = envelopes_overlap(pad, i, j)
+        if not ok.any():
+            continue
+        i = i[ok]; j = j[ok]
+        # Report only from the cell owning the overlap's lower-left corner.
+        rx = np.floor((np.maximum(pad[i, 0], pad[j, 0]) - ox) / cell_size).astype(np.int64)
+        ry = np.floor((np.maximum(pad[i, 1], pad[j, 1]) - oy) / cell_size).astype(np.int64)
+        own = (rx * stride + ry) == key[s]
+        if own.any():
+            i = i[own]; j = j[own]
+            out_i.append(np.minimum(i, j)); out_j.append(np.maximum(i, j))
+
+    if not out_i:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    I = np.concatenate(out_i); J = np.concatenate(out_j)
+    order = np.lexsort((J, I))
+    return I[order], J[order]
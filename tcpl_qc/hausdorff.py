@@ -0,0 +1,107 @@
+#... TCPL buffer-free "line A within R of line B" test (directed Hausdorff)
+
+import numpy as np
+
+from tcpl_qc.segments import segments, point_segment_matrix
+
+VERTEX_CHUNK = 512
+
+def directed_hausdorff(a, b, limit=None, tol=1e-3):
+    """Directed Hausdorff distance from polyline a to polyline b, in metres.
+
+    a and b are (xy, offsets) tuples as returned by segments.line_arrays.
+    The R-neighbourhood of a single segment is convex, so an A sub-segment
+    whose two ends are both within R of the same B segment is within R
+    everywhere; sub-segments that cannot be settled that way are bisected
+    until they are shorter than tol. The result is within tol of the exact
+    distance. A is taken VERTEX_CHUNK vertices (then segments) at a time,
+    each chunk against the B segments near it only, so memory stays at
+    about VERTEX_CHUNK times those.
+
+    With limit given, the search stops as soon as the answer relative to
+    limit is known: a vertex farther than limit returns at once, and the
+    result is only guaranteed to be exact when it is not above limit.
+    """
+    axy, aoff = a
+    b0, b1 = segments(*b)
+    if len(axy) == 0 or len(b0) == 0:
+        return np.inf
+
+    # Chunks of A are only compared with the B segments whose extent is
+    # within some reach of the chunk's: every point closer than that to B
+    # has its nearest B segment among them.
+    bx0, bx1 = np.minimum(b0[:, 0], b1[:, 0]), np.maximum(b0[:, 0], b1[:, 0])
+    by0, by1 = np.minimum(b0[:, 1], b1[:, 1]), np.maximum(b0[:, 1], b1[:, 1])
+
+    def gap(lo, hi):
+        gx = np.maximum(np.maximum(bx0 - hi[0], lo[0] - bx1), 0.0)
+        gy = np.maximum(np.maximum(by0 - hi[1], lo[1] - by1), 0.0)
+        return np.hypot(gx, gy)
+
+    def nearest(pts, g, reach):
+        near = g <= reach
+        if not near.any():
+            return np.full(len(pts), np.inf)
+        return point_segment_matrix(pts, b0[near], b1[near]).min(axis=1)
+
+    # Vertices first, so an obviously distant line exits early. Within
+    # limit (or the largest distance so far) first; vertices not settled
+    # by that are looked up again within the largest distance found, or
+    # within the distance from the B vertex nearest to the chunk's extent
+    # to its farthest corner.
+    lb = 0.0
+    for s in range(0, len(axy), VERTEX_CHUNK):
+        q = axy[s:s + VERTEX_CHUNK]
+        lo, hi = q.min(axis=0), q.max(axis=0)
+        g = gap(lo, hi)
+        reach = limit if limit is not None else lb
+        dv = nearest(q, g, reach)
+        top = float(dv.max())
+        if top > reach:
+            if limit is not None:
+                return top
+            far = np.hypot(np.maximum(np.abs(b0[:, 0] - lo[0]), np.abs(b0[:, 0] - hi[0])),
+                           np.maximum(np.abs(b0[:, 1] - lo[1]), np.abs(b0[:, 1] - hi[1]))).min()
+            dv = nearest(q, g, min(top, float(far)))
+        lb = max(lb, float(dv.max()))
+
+    # Then the segments. Every vertex is within lb of B, so every point of
+    # a segment is within lb plus half its length.
+    a0, a1 = segments(axy, aoff)
+    for s in range(0, len(a0), VERTEX_CHUNK):
+        p0, p1 = a0[s:s + VERTEX_CHUNK], a1[s:s + VERTEX_CHUNK]
+        reach = lb + 0.5 * float(np.hypot(p1[:, 0] - p0[:, 0], p1[:, 1] - p0[:, 1]).max()) + tol
+        near = gap(np.minimum(p0, p1).min(axis=0), np.maximum(p0, p1).max(axis=0)) <= reach
+        c0, c1 = b0[near], b1[near]
+        d0 = point_segment_matrix(p0, c0, c1)
+        d1 = point_segment_matrix(p1, c0, c1)
+        while len(p0):
+            ub = np.maximum(d0, d1).min(axis=1)
+            target = limit if limit is not None else lb + tol
+            seglen = np.hypot(p1[:, 0] - p0[:, 0], p1[:, 1] - p0[:, 1])
+            open_ = (ub > target) & (seglen > tol)
+            if not open_.any():
+                break
+            p0, p1, d0, d1 = p0[open_], p1[open_], d0[open_], d1[open_]
+            mid = 0.5 * (p0 + p1)
+            dm = point_segment_matrix(mid, c0, c1)
+            lb = max(lb, float(dm.min(axis=1).max()))
+            if limit is not None and lb > limit:
+                return lb
+            p0, p1 = np.concatenate((p0, mid)), np.concatenate((mid, p1))
+            d0, d1 = np.concatenate((d0, dm)), np.concatenate((dm, d1))
+    return lb
+
+def envelope_within(a, b, r):
+    # Cheap necessary condition: A's extent inside B's extent grown by r.
+    axy, bxy = a[0], b[0]
+    return (axy[:, 0].min() >= bxy[:, 0].min() - r and axy[:, 0].max() <= bxy[:, 0].max() + r and
+            axy[:, 1].min() >= bxy[:, 1].min() - r and axy[:, 1].max() <= bxy[:, 1].max() + r)
+
+def mutual_within(a, b, r, tol=1e-3):
+    """Return (a_in_b, b_in_a): is each line inside the r-buffer of the other."""
+    if len(a[0]) == 0 or len(b[0]) == 0:
+        return False, False
+    a_in_b = envelope_within(a, b, r) and directed_hausdorff(a, b, limit=r, tol=tol) <= r
+    b_in_a = envelope_within(b, a, r) and directed_hausdorff(b, a, limit=r, tol=tol) <= r
+    return a_in_b, b_in_a
@@ -0,0 +1,143 @@
+#... TCPL incremental re-check of edited features (road dangle endpoints)
+#
+# The last run's state is saved next to its output: the (layer name, OID)
+# of every feature, a SHA-1 of its geometry, its envelope and the keys of
+# the endpoints it flagged. On the next run features are matched by key:
+# inserted, deleted and modified (hash differs) ones are the edits.
+#
+# An endpoint's result only depends on the lines whose envelope meets the
+# box of +-pad around it (the STRtree query of the full check). So only
+# endpoints of edited features, and endpoints within pad of the old or new
+# envelope of an edited feature, are classified again; every other endpoint
+# keeps its previous result. The patched list is emitted in store order and
+# is identical to a full near_not_snapped run. Changed tolerances, a
+# missing or unreadable state, or duplicate keys fall back to the full check.
+
+import hashlib
+import zipfile
+
+import numpy as np
+
+from tcpl_qc.checks import _tally, build_indexes, dangle_endpoint, feature_endpoints, near_not_snapped
+from tcpl_qc.rtree import STRtree
+
+def geometry_hashes(store):
+    """(n,) array of 20-byte SHA-1 digests of every feature's parts and coordinates."""
+    out = []
+    for i in range(len(store)):
+        xy, offsets = store.line(i)
+        h = hashlib.sha1(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(xy, dtype=np.float64).tobytes())
+        out.append(h.digest())
+    return np.array(out, dtype="S20").reshape(len(store))
+
+def feature_keys(store):
+    """(layer name, OID) of every feature, the identity kept between runs."""
+    names = store.layer_names
+    return [(names[l] if l < len(names) else "", o) for l, o in zip(store.layer.tolist(), store.oid.tolist())]
+
+class DangleState(object):
+    """What a near_not_snapped run leaves for the next one."""
+
+    def __init__(self, keys, hashes, env, flagged, params):
+        self.keys = list(keys)
+        self.hashes = np.asarray(hashes, dtype="S20")
+        self.env = np.asarray(env, dtype=np.float64).reshape(-1, 4)
+        self.flagged = set(flagged)      # (layer name, OID, 0 for the first / 1 for the last vertex)
+        self.params = tuple(float(p) for p in params)
+
+    def save(self, path):
+        layers = np.array([k[0] for k in self.keys], dtype=object).astype("U")
+        fl = sorted(self.flagged)
+        with open(path, "wb") as f:
+            np.savez(f, layer=layers, oid=np.array([k[1] for k in self.keys], dtype=np.int64),
+                     hashes=self.hashes, env=self.env, params=np.array(self.params),
+                     flagged_layer=np.array([k[0] for k in fl], dtype=object).astype("U"),
+                     flagged_oid=np.array([k[1] for k in fl], dtype=np.int64),
+                     flagged_end=np.array([k[2] for k in fl], dtype=np.int64))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        z = np.load(path)
+        try:
+            keys = list(zip(z["layer"].tolist(), z["oid"].tolist()))
+            flagged = zip(z["flagged_layer"].tolist(), z["flagged_oid"].tolist(), z["flagged_end"].tolist())
+            return cls(keys, z["hashes"], z["env"], flagged, z["params"].tolist())
+        finally:
+            z.close()
+
+def _end_keys(keys, endpoints):
+    # (layer name, OID, 0/1) for the feature_endpoints list (first and last vertex alternate).
+    return [keys[i] + (k % 2,) for k, (i, _, _) in enumerate(endpoints)]
+
+def _full(store, near_tol, vertex_eps, pad, stats):
+    out = near_not_snapped(store, near_tol, vertex_eps, pad=pad, stats=stats)
+    keys = feature_keys(store)
+    endpoints = feature_endpoints(store)
+    flagged_at = set((i, px, py) for i, px, py in out)
+    flagged = [k for k, e in zip(_end_keys(keys, endpoints), endpoints) if e in flagged_at]
+    return out, flagged
+
+def incremental_near_not_snapped(store, near_tol, vertex_eps, state_path, pad=None, stats=None):
+    """near_not_snapped(store, ...) reusing the results saved at state_path for unedited areas.
+
+    Writes the new state to state_path. stats gets the usual pair counters
+    for the endpoints actually re-checked, plus features_inserted,
+    features_deleted, features_modified and endpoints_rechecked.
+    """
+    pad = near_tol if pad is None else pad
+    params = (near_tol, vertex_eps, pad)
+    keys = feature_keys(store)
+    hashes = geometry_hashes(store)
+    try:
+        state = DangleState.load(state_path)
+    except (IOError, OSError, EOFError, KeyError, ValueError, zipfile.BadZipfile):
+        state = None
+    if (state is None or state.params != tuple(float(p) for p in params)
+            or len(set(keys)) != len(keys)):
+        out, flagged = _full(store, near_tol, vertex_eps, pad, stats)
+        DangleState(keys, hashes, store.env, flagged, params).save(state_path)
+        if stats is not None:
+            stats["incremental_full_runs"] += 1
+        return out
+
+    old_index = dict((k, i) for i, k in enumerate(state.keys))
+    new_index = dict((k, i) for i, k in enumerate(keys))
+    inserted = [i for i, k in enumerate(keys) if k not in old_index]
+    modified = [i for i, k in enumerate(keys) if k in old_index and hashes[i] != state.hashes[old_index[k]]]
+    deleted = [old_index[k] for k in state.keys if k not in new_index]
+    edited = np.zeros(len(store), dtype=bool)
+    edited[inserted + modified] = True
+    changed_env = np.vstack((store.env[inserted + modified],
+                             state.env[deleted + [old_index[keys[i]] for i in modified]])).reshape(-1, 4)
+
+    endpoints = feature_endpoints(store)
+    end_keys = _end_keys(keys, endpoints)
+    ends = np.array([(i, px, py) for i, px, py in endpoints], dtype=np.float64).reshape(-1, 3)
+    recheck = edited[ends[:, 0].astype(np.int64)] if len(ends) else np.zeros(0, dtype=bool)
+    changed_env = changed_env[~np.isnan(changed_env).any(axis=1)]
+    if len(changed_env) and len(ends):
+        points = STRtree(np.column_stack((ends[:, 1], ends[:, 2], ends[:, 1], ends[:, 2])))
+        for x0, y0, x1, y1 in changed_env.tolist():
+            recheck[points.query((x0 - pad, y0 - pad, x1 + pad, y1 + pad))] = True
+
+    tree, vhash = build_indexes(store, vertex_eps)
+    local = {"pairs_tested": 0, "predicate_calls": 0}
+    out, flagged = [], []
+    for k, (i, px, py) in enumerate(endpoints):
+        if recheck[k]:
+            hit = dangle_endpoint(store, i, px, py, near_tol, vertex_eps, pad, tree, vhash, local)
+        else:
+            hit = end_keys[k] in state.flagged
+        if hit:
+            out.append((i, px, py))
+            flagged.append(end_keys[k])
+    DangleState(keys, hashes, store.env, flagged, params).save(state_path)
+    _tally(stats, local["pairs_tested"], int(recheck.sum()) * max(tree.size - 1, 0), local["predicate_calls"])
+    if stats is not None:
+        stats["features_inserted"] += len(inserted)
+        stats["features_deleted"] += len(deleted)
+        stats["features_modified"] += len(modified)
+        stats["endpoints_rechecked"] += int(recheck.sum())
+    return out
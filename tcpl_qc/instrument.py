@@ -0,0 +1,144 @@
+#... TCPL run instrumentation: stage timers, memory peaks, counters, JSON run record
+#
+# One RunRecord per script run. Stages are timed with `with run.stage(...)`,
+# the checks in tcpl_qc.checks add their pair/predicate counts to
+# run.counters (pass stats=run.counters), and bare `except:` blocks call
+# run.swallowed(where) so the exceptions they hide are at least counted.
+#
+# Memory peaks come from tracemalloc, which is off unless TCPL_TRACE_MEMORY=1
+# is set (or trace_memory=True is passed): it slows the Python-heavy check
+# loops several times over. It does not exist in ArcMap's Python 2.7 (memory
+# is then null) and only sees memory allocated through Python, NumPy arrays
+# included, not what arcpy allocates internally.
+
+import json, os, platform, sys, time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer as now
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+TRACE_ENV      = "TCPL_TRACE_MEMORY"
+WORKSPACE_EXTS = (".gdb", ".mdb", ".sde")
+MAX_ERRORS     = 20   # swallowed exception messages kept in the record
+
+def record_path(out_fc):
+    """JSON path next to an output feature class, outside any geodatabase.
+
+    C:/qc/data.gdb/road_gap_less_200 -> C:/qc/data_road_gap_less_200.run.json
+    C:/qc/snap_50.shp                -> C:/qc/snap_50.run.json
+    """
+    folder, name = os.path.split(os.path.normpath(out_fc))
+    prefix = ""
+    probe = folder
+    while probe:
+        base, ext = os.path.splitext(os.path.basename(probe))
+        if ext.lower() in WORKSPACE_EXTS:
+            folder, prefix = os.path.dirname(probe), base + "_"
+        parent = os.path.dirname(probe)
+        if parent == probe:
+            break
+        probe = parent
+    return os.path.join(folder, prefix + os.path.splitext(name)[0] + ".run.json")
+
+def _describe(where, e):
+    try:
+        return "%s: %s: %s" % (where, type(e).__name__, e)
+    except Exception:
+        return "%s: %s: %r" % (where, type(e).__name__, e)
+
+class RunRecord(object):
+    """Timings, memory peaks and counters of one script run, written as JSON."""
+
+    def __init__(self, script, trace_memory=None):
+        self.script = script
+        self.output = None          # output feature class; the record goes next to it
+        self.status = "running"
+        self.stages = []
+        self.counters = Counter()
+        self.swallowed_at = Counter()
+        self.errors = []
+        self.info = OrderedDict()
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._t0 = now()
+        self._peak = None
+        if trace_memory is None:
+            trace_memory = os.environ.get(TRACE_ENV, "0") not in ("", "0")
+        self._trace = bool(trace_memory and tracemalloc is not None)
+        self._own_trace = False
+        if self._trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_trace = True
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block; on an exception the run is marked failed and the record written."""
+        entry = OrderedDict([("name", name), ("seconds", None), ("peak_bytes", None)])
+        self.stages.append(entry)
+        if self._trace and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        t0 = now()
+        try:
+            yield entry
+        except Exception as e:
+            self._stage_done(entry, t0)
+            self.errors.append(_describe(name, e))
+            if self.output:
+                self.finish("failed")
+            raise
+        self._stage_done(entry, t0)
+
+    def _stage_done(self, entry, t0):
+        entry["seconds"] = round(now() - t0, 6)
+        if self._trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            entry["peak_bytes"] = peak
+            self._peak = peak if self._peak is None else max(self._peak, peak)
+
+    def count(self, name, k=1):
+        self.counters[name] += k
+
+    def swallowed(self, where):
+        """Count the exception being handled by a bare except: (call inside the block)."""
+        self.swallowed_at[where] += 1
+        self.counters["exceptions_swallowed"] += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(_describe(where, sys.exc_info()[1]))
+
+    def as_dict(self):
+        return OrderedDict([
+            ("script", self.script),
+            ("status", self.status),
+            ("output", self.output),
+            ("started", self.started),
+            ("seconds", round(now() - self._t0, 6)),
+            ("peak_bytes", self._peak),
+            ("tracemalloc", self._trace),
+            ("python", platform.python_version()),
+            ("platform", platform.platform()),
+            ("stages", self.stages),
+            ("counters", OrderedDict(sorted(self.counters.items()))),
+            ("exceptions_swallowed", OrderedDict(sorted(self.swallowed_at.items()))),
+            ("errors", self.errors),
+            ("info", self.info),
+        ])
+
+    def finish(self, status="ok", path=None):
+        """Write the record (next to self.output unless path is given); returns the path or None."""
+        self.status = status
+        record = self.as_dict()
+        if self._own_trace:
+            tracemalloc.stop()
+            self._own_trace = self._trace = False
+        path = path or (record_path(self.output) if self.output else None)
+        if not path:
+            return None
+        try:
+            with open(path, "w") as f:
+                json.dump(record, f, indent=2, default=str)
+        except (IOError, OSError):
+            return None
+        return path
@@ -0,0 +1,102 @@
+#... TCPL independent per-layer jobs over worker processes
+#
+# Polygon_gap_all_less_50 handles every layer on its own: read, project,
+# opening, erase, write to a scratch feature class. map_layers runs those
+# jobs on a pool of forked workers, one job per task, and hands the results
+# back in job order whatever order the workers finish in, so whatever the
+# caller appends from them comes out the same as in a serial run.
+#
+# The job function and its arguments are set before the pool forks and are
+# inherited by the workers; only the job index goes out and only the result
+# comes back (it must pickle). A job that records into a RunRecord does so
+# in the worker's copy; the stages, counters and swallowed exceptions it
+# added are returned with the result and merged into the parent's record,
+# again in job order.
+#
+# Where fork is not available (Windows, ArcMap's Python 2.7) the workers
+# are new Python processes from tcpl_qc.spawn instead. fn then has to be a
+# module-level function of a module or of the running script, which every
+# worker loads once, and the jobs have to pickle (no arcpy objects: pass a
+# spatial reference as its exportToString() text). The run record the
+# worker resets and sends back is the global of fn's module that is `run`
+# in the parent. Only without any Python interpreter to start do the jobs
+# run one after another in this process.
+
+import multiprocessing
+from collections import Counter
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+from tcpl_qc.spawn import can_spawn, function_ref, resolve, spawn_map
+from tcpl_qc.tiling import can_fork
+
+# fn, jobs and run of the current map_layers call: inherited by forked
+# workers, set by _spawned_init in spawned ones.
+_pool = {}
+
+def layer_workers(workers, n_jobs):
+    """Processes map_layers will use: workers (None or 0 = one per CPU), at most one per job, 1 without either
+    fork or an interpreter to spawn."""
+    workers = min(workers or multiprocessing.cpu_count(), n_jobs)
+    if workers <= 1 or not (can_fork() or can_spawn()):
+        return 1
+    return workers
+
+def _run(job):
+    run = _pool["run"]
+    if run is not None:
+        # Start from an empty record so only this job's entries go back.
+        run.stages, run.counters, run.swallowed_at, run.errors = [], Counter(), Counter(), []
+    result = _pool["fn"](*job)
+    if run is None:
+        return result, None
+    return result, (run.stages, run.counters, run.swallowed_at, run.errors)
+
+def _run_job(k):
+    return _run(_pool["jobs"][k])
+
+def _spawned_init(fn_ref, run_name):
+    fn = resolve(fn_ref)
+    _pool.update(fn=fn, run=fn.__globals__.get(run_name) if run_name else None)
+
+def _merge(run, part):
+    stages, counters, swallowed_at, errors = part
+    run.stages.extend(stages)
+    run.counters.update(counters)
+    run.swallowed_at.update(swallowed_at)
+    run.errors.extend(errors)
+
+def map_layers(fn, jobs, workers=None, run=None):
+    """[fn(*job) for job in jobs], on up to `workers` forked or spawned processes.
+
+    Results are in job order. With run (a RunRecord) given, what fn records
+    into it inside the workers is merged back in job order as well, and
+    run.counters gets layer_workers (processes actually used).
+    """
+    jobs = list(jobs)
+    workers = layer_workers(workers, len(jobs))
+    if run is not None:
+        run.counters["layer_workers"] = workers
+    if workers <= 1:
+        return [fn(*job) for job in jobs]
+    if can_fork():
+        _pool.update(fn=fn, jobs=jobs, run=run)
+        try:
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+                futures = [ex.submit(_run_job, k) for k in range(len(jobs))]
+                done = [f.result() for f in futures]
+        finally:
+            _pool.clear()
+    else:
+        names = [k for k, v in fn.__globals__.items() if run is not None and v is run]
+        done = spawn_map(_run, jobs, workers, _spawned_init, (function_ref(fn), names[0] if names else None))
+    results = []
+    for result, part in done:
+        if part is not None:
+            _merge(run, part)
+        results.append(result)
+    return results
@@ -0,0 +1,109 @@
+#... TCPL one-pass multi-check engine over one projected road store
+#
+# Road_gap_all_less_200/300, Road_snap_50, Road_less_300 and the midpoint
+# check all read TransportationGroundCurves (ROAD_C, TRAIL_C, CART_TRACK_C),
+# project it and build their own index. SharedChecks holds one store and
+# builds every structure once, on first use by a check:
+#   STRtree over the envelopes   snap
+#   VertexHash per VERTEX_EPS    snap
+#   midpoints                    midpoint
+#   GapTable at the largest gap radius, when two or more gap radii are run
+# and run_checks([...]) runs any selection of CHECKS over it. Results are
+# the same sorted feature indices the standalone scripts keep.
+#
+# The checks run in this process so they can share the structures; the
+# standalone scripts remain the way to run a single check on several cores.
+
+from collections import OrderedDict
+
+import numpy as np
+
+from tcpl_qc.checks import gap_check, midpoint_check, midpoints, snap_check
+from tcpl_qc.gap_table import GapTable
+from tcpl_qc.geodesic import shorter_than
+from tcpl_qc.rtree import STRtree
+from tcpl_qc.vertex_hash import VertexHash
+
+BUF_EPS = 0.001
+
+# name -> (kind, thresholds, output feature class of the standalone script)
+CHECKS = OrderedDict([
+    ("gap_200",      ("gap",      {"radius": 200.0 + BUF_EPS},               "road_gap_less_200")),
+    ("gap_300",      ("gap",      {"radius": 300.0 + BUF_EPS},               "road_gap_less_300")),
+    ("snap_50",      ("snap",     {"near_tol": 50.0, "vertex_eps": 0.2},     "snap_50")),
+    ("midpoint_200", ("midpoint", {"radius": 200.0 + BUF_EPS},               "road_midpoint_less_200")),
+    ("length_300",   ("length",   {"max_length": 300.0},                     "road_less_300")),
+])
+
+class SharedChecks(object):
+    """One metric store plus the indexes the checks share, built on first use.
+
+    lonlat is the store's xy in WGS84 lon/lat (for the geodesic length
+    check); lengths, when given instead, are the geodesic lengths in metres.
+    """
+
+    def __init__(self, store, lonlat=None, lengths=None, names=None):
+        self.store = store
+        self.lonlat = None if lonlat is None else np.asarray(lonlat, dtype=np.float64).reshape(-1, 2)
+        self.lengths = None if lengths is None else np.asarray(lengths, dtype=np.float64)
+        self.names = list(CHECKS) if names is None else list(names)
+        self._tree = None
+        self._vhash = {}
+        self._mids = None
+        self._table = None
+
+    def tree(self):
+        if self._tree is None:
+            self._tree = STRtree(self.store.env)
+        return self._tree
+
+    def indexes(self, vertex_eps):
+        if vertex_eps not in self._vhash:
+            self._vhash[vertex_eps] = VertexHash(self.store.xy, self.store.vertex_owner(), vertex_eps)
+        return self.tree(), self._vhash[vertex_eps]
+
+    def mids(self):
+        """(n, 2) midpoints of the store's features, computed once for every midpoint check."""
+        if self._mids is None:
+            self._mids = midpoints(self.store)
+        return self._mids
+
+    def gap_table(self, stats=None):
+        # Only worth building when it answers more than one selected radius.
+        radii = [CHECKS[n][1]["radius"] for n in self.names if CHECKS[n][0] == "gap"]
+        if len(radii) < 2:
+            return None
+        if self._table is None:
+            self._table = GapTable.build(self.store, max(radii), stats=stats)
+            if stats is not None:
+                stats["gap_table_built"] += 1
+        return self._table
+
+    def run(self, name, stats=None):
+        """Sorted feature indices flagged by check `name`."""
+        if name not in CHECKS:
+            raise ValueError("unknown check %r; choose from %s" % (name, ", ".join(CHECKS)))
+        kind, p, _ = CHECKS[name]
+        store = self.store
+        if kind == "gap":
+            table = self.gap_table(stats)
+            mutual, onesided = table.gap_sets(p["radius"]) if table else gap_check(store, p["radius"], stats=stats)
+            return sorted(mutual | onesided)
+        if kind == "snap":
+            return snap_check(store, p["near_tol"], p["vertex_eps"], indexes=self.indexes(p["vertex_eps"]),
+                              stats=stats)
+        if kind == "midpoint":
+            return midpoint_check(store, p["radius"], mids=self.mids(), stats=stats)
+        if self.lengths is not None:
+            return np.flatnonzero(self.lengths < p["max_length"]).tolist()
+        if self.lonlat is None:
+            raise ValueError("%s needs lon/lat coordinates or geodesic lengths" % name)
+        short, n_exact = shorter_than(self.lonlat, store.part_offsets, store.feature_offsets, p["max_length"])
+        if stats is not None:
+            stats["exact_lengths"] += n_exact
+        return np.flatnonzero(short).tolist()
+
+def run_checks(store, names, lonlat=None, lengths=None, stats=None):
+    """OrderedDict check name -> sorted flagged feature indices, for every name in names."""
+    shared = SharedChecks(store, lonlat, lengths, names)
+    return OrderedDict((name, shared.run(name, stats)) for name in names)
@@ -0,0 +1,256 @@
+#... TCPL windows where an opening by RADIUS_M can remove anything from a polygon
+#
+# A point p of a polygon is left out of the opening (erode by r, dilate by r)
+# only if no disk of radius r inside the polygon contains it. Take the
+# boundary point q nearest to p and the disk of radius r tangent to the
+# boundary at q on the inside: it contains p, so it must leave the polygon,
+# and the only boundary that can enter it lies within 2 r of q. That is
+#   - a segment not adjacent to q's own segment within 2 r = THRESHOLD_M
+#     that also enters the strip the tangent disks of q's segment sweep
+#     (within r of the segment moved r inwards), which bounds q to the part
+#     of its segment inside the other segment's envelope grown by 2 r, or
+#   - the other segment at a convex vertex v of q's segment, which only
+#     reaches the disk while |q - v| < r cot(theta / 2) for the interior
+#     angle theta (the tangent point of the inscribed circle).
+# Reflex vertices and straight runs never do. p lies within r of q, so
+# growing those boxes by r gives windows that hold every part the opening
+# can remove. Outside them the erase result is empty.
+#
+# The strip test is what keeps densely digitized boundaries cheap: along a
+# smooth curve every segment has non-adjacent neighbours within 2 r, but
+# they stay out of its strip. With a tolerance tol (the XY tolerance), a
+# segment entering a strip by at most tol and a convex vertex whose
+# tangent disks reach at most tol into the next segment are ignored; the
+# parts that drops are never thicker than tol.
+#
+# Inside a window W the opening only looks 2 r around each point (a disk of
+# radius r through p lies within 2 r of p), so
+#   narrow(P) & W == narrow(P & (W grown by 2 r)) & W
+# and the opening and erase can run on the clipped polygon alone.
+#
+# Close segment pairs come from a uniform grid of THRESHOLD_M cells over
+# every feature's segments (envelopes grown by half the threshold, so any
+# two segments within it share a cell); each pair is kept in one cell only
+# and measured with NumPy.
+
+import numpy as np
+
+from tcpl_qc.segments import point_segment_distance
+
+PAIR_CHUNK = 2000000   # candidate pairs measured per batch
+
+def _ranges(starts, counts):
+    # Concatenation of arange(s, s + c) for every (s, c).
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(int(counts.sum())) - first
+
+def _ring_signed_areas(xy, a, b, ring, n_rings):
+    # Shoelace over the closed segments; positive for counter-clockwise rings.
+    cross = xy[a, 0] * xy[b, 1] - xy[b, 0] * xy[a, 1]
+    return 0.5 * np.bincount(ring, weights=cross, minlength=n_rings)
+
+def _holes(store, a, b, ring):
+    """Boolean per part: the ring is a hole (inside an odd number of the feature's other rings)."""
+    n_rings = len(store.part_offsets) - 1
+    hole = np.zeros(n_rings, dtype=bool)
+    counts = np.diff(store.feature_offsets)
+    for f in np.flatnonzero(counts > 1).tolist():
+        p0, p1 = int(store.feature_offsets[f]), int(store.feature_offsets[f + 1])
+        sel = (ring >= p0) & (ring < p1)
+        sa, sb, sr = a[sel], b[sel], ring[sel]
+        for k in range(p0, p1):
+            own = np.flatnonzero(sr == k)
+            if not len(own):
+                continue
+            # The middle of its first segment: a vertex may touch the other ring.
+            px, py = 0.5 * (store.xy[sa[own[0]]] + store.xy[sb[own[0]]])
+            other = sr != k
+            ya, yb = store.xy[sa[other], 1], store.xy[sb[other], 1]
+            xa, xb = store.xy[sa[other], 0], store.xy[sb[other], 0]
+            crosses = (ya > py) != (yb > py)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                xc = xa + (py - ya) * (xb - xa) / (yb - ya)
+            hole[k] = bool(np.count_nonzero(crosses & (xc > px)) % 2)
+    return hole
+
+def boundary_segments(store):
+    """(a, b, ring, nxt) for every non-degenerate boundary segment, rings closed.
+
+    a and b are vertex indices of both ends, ring the part it belongs to
+    (rings of fewer than three vertices are left out) and nxt the index
+    of the following segment on the same ring.
+    """
+    po = store.part_offsets
+    size = np.diff(po)
+    v = np.arange(len(store.xy))
+    part = np.repeat(np.arange(len(size)), size)
+    ok = size[part] >= 3
+    last = v == po[1:][part] - 1
+    nxt_v = np.where(last, po[:-1][part], v + 1)
+    keep = ok & (store.xy[v] != store.xy[nxt_v]).any(axis=1)
+    a, b, ring = v[keep], nxt_v[keep], part[keep]
+    idx = np.arange(len(a))
+    first = np.r_[True, ring[1:] != ring[:-1]] if len(a) else np.zeros(0, dtype=bool)
+    start = np.maximum.accumulate(np.where(first, idx, 0)) if len(a) else idx
+    is_last = np.r_[ring[1:] != ring[:-1], True] if len(a) else np.zeros(0, dtype=bool)
+    nxt = np.where(is_last, start, idx + 1)
+    return a, b, ring, nxt
+
+def segment_distance(p0, p1, q0, q1):
+    """Distance between segments p0-p1 and q0-q1, row by row ((m, 2) arrays)."""
+    d = np.minimum.reduce([
+        point_segment_distance(p0[:, 0], p0[:, 1], q0[:, 0], q0[:, 1], q1[:, 0], q1[:, 1]),
+        point_segment_distance(p1[:, 0], p1[:, 1], q0[:, 0], q0[:, 1], q1[:, 0], q1[:, 1]),
+        point_segment_distance(q0[:, 0], q0[:, 1], p0[:, 0], p0[:, 1], p1[:, 0], p1[:, 1]),
+        point_segment_distance(q1[:, 0], q1[:, 1], p0[:, 0], p0[:, 1], p1[:, 0], p1[:, 1]),
+    ])
+
+    def side(o, u, w):
+        return np.sign((u[:, 0] - o[:, 0]) * (w[:, 1] - o[:, 1]) - (u[:, 1] - o[:, 1]) * (w[:, 0] - o[:, 0]))
+
+    crossing = ((side(p0, p1, q0) * side(p0, p1, q1) < 0) & (side(q0, q1, p0) * side(q0, q1, p1) < 0))
+    d[crossing] = 0.0
+    return d
+
+def segment_pair_candidates(store, dist, segs=None):
+    """Yield (s, t) arrays of segment pairs that may lie within dist, in batches.
+
+    Both segments belong to the same feature and are not adjacent on a
+    ring; every pair within dist comes up exactly once. segs is
+    boundary_segments(store) when already at hand.
+    """
+    a, b, ring, nxt = segs if segs is not None else boundary_segments(store)
+    if not len(a):
+        return
+    xy = store.xy
+    owner = np.searchsorted(store.feature_offsets, ring, side="right") - 1
+    half = dist / 2.0
+    lo = np.minimum(xy[a], xy[b]) - half
+    hi = np.maximum(xy[a], xy[b]) + half
+    cell = max(float(dist), 1e-9)
+    origin = lo.min(axis=0)
+    c0 = np.floor((lo - origin) / cell).astype(np.int64)
+    c1 = np.floor((hi - origin) / cell).astype(np.int64)
+    ny = int(c1[:, 1].max()) + 1
+    nx = int(c1[:, 0].max()) + 1
+    span = c1 - c0 + 1
+    n_cells = span[:, 0] * span[:, 1]
+    seg = np.repeat(np.arange(len(a)), n_cells)
+    k = _ranges(np.zeros(len(a), dtype=np.int64), n_cells)
+    cx = c0[seg, 0] + k // span[seg, 1]
+    cy = c0[seg, 1] + k % span[seg, 1]
+    key = (owner[seg] * nx + cx) * ny + cy
+    order = np.argsort(key, kind="mergesort")
+    key, seg, cx, cy = key[order], seg[order], cx[order], cy[order]
+    # Every entry pairs with the later entries of its cell.
+    counts = np.searchsorted(key, key, side="right") - np.arange(len(key)) - 1
+    cum = np.cumsum(counts)
+    e0 = 0
+    while e0 < len(key):
+        base = cum[e0 - 1] if e0 else 0
+        e1 = max(e0 + 1, int(np.searchsorted(cum, base + PAIR_CHUNK, side="right")))
+        rows = np.arange(e0, min(e1, len(key)))
+        e0 = e1
+        i = np.repeat(rows, counts[rows])
+        if not len(i):
+            continue
+        s, t = seg[i], seg[_ranges(rows + 1, counts[rows])]
+        # Keep the pair only in the cell holding the low corner of the envelope overlap.
+        ox = np.floor((np.maximum(lo[s, 0], lo[t, 0]) - origin[0]) / cell).astype(np.int64)
+        oy = np.floor((np.maximum(lo[s, 1], lo[t, 1]) - origin[1]) / cell).astype(np.int64)
+        keep = (ox == cx[i]) & (oy == cy[i]) & (s != t) & (nxt[s] != t) & (nxt[t] != s)
+        keep &= ((np.minimum(hi[s], hi[t]) - np.maximum(lo[s], lo[t])) >= 0).all(axis=1)
+        if keep.any():
+            yield s[keep], t[keep]
+
+def close_segment_pairs(store, dist, segs=None, stats=None):
+    """(s, t) with s < t: segments of the same feature, not adjacent on a ring, within dist.
+
+    stats gets segment_pairs_tested (pairs measured) and segment_pairs_close.
+    """
+    a, b, ring, nxt = segs if segs is not None else boundary_segments(store)
+    xy = store.xy
+    out_s, out_t = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    tested = 0
+    for s, t in segment_pair_candidates(store, dist, (a, b, ring, nxt)):
+        tested += len(s)
+        close = segment_distance(xy[a[s]], xy[b[s]], xy[a[t]], xy[b[t]]) <= dist
+        out_s.append(np.minimum(s[close], t[close]))
+        out_t.append(np.maximum(s[close], t[close]))
+    s, t = np.concatenate(out_s), np.concatenate(out_t)
+    if stats is not None:
+        stats["segment_pairs_tested"] += tested
+        stats["segment_pairs_close"] += len(s)
+    return s, t
+
+def window_boxes(store, radius, tol=0.0, stats=None):
+    """(owner, boxes): XMin, YMin, XMax, YMax boxes holding every part an opening by radius removes.
+
+    owner is the feature index of each box; a feature without boxes loses
+    nothing to the opening (nothing thicker than tol). stats gets
+    segment_pairs_tested (candidate pairs within 2 r by their envelopes),
+    strip_hits, convex_vertices and window_boxes.
+    """
+    segs = boundary_segments(store)
+    a, b, ring, nxt = segs
+    xy = store.xy
+    owner = np.searchsorted(store.feature_offsets, ring, side="right") - 1
+    r = float(radius)
+    n_rings = len(store.part_offsets) - 1
+    d1 = xy[b] - xy[a]
+    l1 = np.hypot(d1[:, 0], d1[:, 1])
+    # Unit normal towards the polygon's inside.
+    left = (_ring_signed_areas(xy, a, b, ring, n_rings) > 0) != _holes(store, a, b, ring)
+    sign = np.where(left[ring], 1.0, -1.0)[:, None]
+    inward = sign * np.column_stack((-d1[:, 1], d1[:, 0])) / l1[:, None]
+    boxes, owners = [], []
+
+    # Segment pairs, one side at a time: w entering the strip of u bounds q
+    # on u to w's envelope grown by 2 r.
+    env_lo = np.minimum(xy[a], xy[b])
+    env_hi = np.maximum(xy[a], xy[b])
+    mid = (xy[a] + xy[b]) / 2.0
+    half_len = l1 / 2.0
+    tested = hits = 0
+    for s, t in segment_pair_candidates(store, 2.0 * r, segs):
+        tested += len(s)
+        for u, w in ((s, t), (t, s)):
+            # Midpoint distance less both half lengths bounds the segment distance from below.
+            gap = np.hypot(*(mid[u] + r * inward[u] - mid[w]).T) - half_len[u] - half_len[w]
+            u, w = u[gap < r - tol], w[gap < r - tol]
+            shift = r * inward[u]
+            inside = segment_distance(xy[a[u]] + shift, xy[b[u]] + shift, xy[a[w]], xy[b[w]]) < r - tol
+            u, w = u[inside], w[inside]
+            hits += len(u)
+            lo = np.maximum(env_lo[u], env_lo[w] - 2.0 * r) - r
+            hi = np.minimum(env_hi[u], env_hi[w] + 2.0 * r) + r
+            boxes.append(np.column_stack((lo, hi)))
+            owners.append(owner[u])
+
+    # Convex vertices: the vertex between segment k and nxt[k]. A disk
+    # tangent at the vertex reaches r (1 + cos theta) into the next segment.
+    d2 = d1[nxt]
+    cross = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0]
+    convex = (cross != 0) & ((cross > 0) == left[ring]) & (nxt != np.arange(len(a)))
+    k = np.flatnonzero(convex)
+    l2 = l1[nxt[k]]
+    l1 = l1[k]
+    cos = -(d1[k, 0] * d2[k, 0] + d1[k, 1] * d2[k, 1]) / (l1 * l2)
+    deep = r * (1.0 + cos) > tol
+    k, l1, l2, cos = k[deep], l1[deep], l2[deep], cos[deep]
+    with np.errstate(divide="ignore"):
+        reach = r * np.sqrt((1.0 + cos) / np.maximum(1.0 - cos, 0.0))
+    half = np.minimum(reach, np.maximum(l1, l2)) + r
+    v = xy[b[k]]
+    boxes.append(np.column_stack((v - half[:, None], v + half[:, None])))
+    owners.append(owner[k])
+
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4))
+    owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int64)
+    order = np.argsort(owners, kind="mergesort")
+    if stats is not None:
+        stats["segment_pairs_tested"] += tested
+        stats["strip_hits"] += hits
+        stats["convex_vertices"] += len(k)
+        stats["window_boxes"] += len(order)
+    return owners[order], boxes[order]
@@ -0,0 +1,290 @@
+#... TCPL raster approximation of the polygon opening (narrow parts < THRESHOLD_M)
+#
+# Polygon_gap_all_less_50 erodes every polygon by RADIUS_M, dilates the
+# result by RADIUS_M again (an opening) and keeps what the opening lost:
+# the parts no disk of radius RADIUS_M inside the polygon can reach. Here
+# each polygon is rasterized on its own grid of cell_m cells instead and
+#   eroded = inside cells farther than RADIUS_M from any outside cell
+#   opened = cells within RADIUS_M of an eroded cell
+#   narrow = inside and not opened
+# Both distance tests come from a Euclidean distance transform that is
+# exact up to RADIUS_M (column distances by running min/max, then one
+# shifted minimum per row offset), so the cost is cells x (2 R + 1) for
+# R = RADIUS_M / cell_m. Distances are between cell centres and the true
+# boundary lies about half a cell closer, which is added to the radius.
+#
+# The narrow cells of a polygon are traced back into rings along the cell
+# edges (outer rings clockwise, holes counter-clockwise, as in shapefiles
+# and arcpy) and returned as one feature per polygon with its area. Parts
+# under the minimum area (cells joined by a side) are dropped one by one
+# first, as the opening mode drops the parts of each gap.
+# Results are approximate to about one cell along every boundary.
+#
+# With windows from tcpl_qc.opening_windows only the cells inside a window
+# can be narrow. The grid is then cut into tiles; the distance transforms
+# run on the tiles holding window cells, each with a halo wide enough that
+# the tile's cells come out as on the whole grid, and everything else is
+# skipped. A polygon whose busy tiles (halo included) would cover more
+# cells than its grid is done in one piece and masked by its windows.
+
+import numpy as np
+
+from tcpl_qc.segments import connected_components
+from tcpl_qc.store import FeatureStore
+
+DEFAULT_CELL_M = 2.0
+MAX_CELLS      = 4000000   # per polygon; larger polygons get a coarser cell
+TILE_CELLS     = 128       # tile side for windowed runs
+
+def _ranges(starts, counts):
+    # Concatenation of arange(s, s + c) for every (s, c).
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(int(counts.sum())) - first
+
+def rasterize(xy, ring_offsets, x0, y0, cell, nx, ny):
+    """(ny, nx) bool grid of the cell centres inside the rings (even-odd rule).
+
+    Row j, column i is the cell centred on (x0 + (i + 0.5) cell,
+    y0 + (j + 0.5) cell).
+    """
+    mask = np.zeros((ny, nx), dtype=bool)
+    a, b = [], []
+    for k in range(len(ring_offsets) - 1):
+        s, e = int(ring_offsets[k]), int(ring_offsets[k + 1])
+        if e - s >= 3:
+            idx = np.arange(s, e)
+            a.append(idx)
+            b.append(np.roll(idx, -1))   # closes the ring whether or not the last vertex repeats the first
+    if not a:
+        return mask
+    a, b = np.concatenate(a), np.concatenate(b)
+    xa, ya, xb, yb = xy[a, 0], xy[a, 1], xy[b, 0], xy[b, 1]
+    lo = np.ceil((np.minimum(ya, yb) - y0) / cell - 0.5).astype(np.int64)
+    hi = np.ceil((np.maximum(ya, yb) - y0) / cell - 0.5).astype(np.int64)
+    lo, hi = np.clip(lo, 0, ny), np.clip(hi, 0, ny)
+    counts = hi - lo
+    edge = np.repeat(np.arange(len(a)), counts)
+    row = _ranges(lo, counts)
+    yc = y0 + (row + 0.5) * cell
+    xc = xa[edge] + (yc - ya[edge]) * (xb[edge] - xa[edge]) / (yb[edge] - ya[edge])
+    col = np.clip(np.floor((xc - x0) / cell - 0.5).astype(np.int64) + 1, 0, nx)
+    toggles = np.zeros((ny, nx + 1), dtype=np.int64)
+    np.add.at(toggles, (row, col), 1)
+    return (np.cumsum(toggles[:, :nx], axis=1) % 2).astype(bool)
+
+def distance_transform(target, max_cells):
+    """Distance in cells from every cell to the nearest True cell of target.
+
+    Exact (centre to centre) up to max_cells; farther cells get inf.
+    """
+    ny, nx = target.shape
+    big = ny + nx + 1
+    rows = np.arange(ny)[:, None]
+    last = np.maximum.accumulate(np.where(target, rows, -big), axis=0)
+    nxt = np.minimum.accumulate(np.where(target, rows, 2 * big)[::-1], axis=0)[::-1]
+    g = np.minimum(rows - last, nxt - rows).astype(np.float64)
+    r = int(np.floor(max_cells))
+    g2 = np.where(g <= r, g * g, np.inf)
+    d2 = g2.copy()
+    for k in range(1, r + 1):
+        kk = float(k * k)
+        np.minimum(d2[:, k:], g2[:, :-k] + kk, out=d2[:, k:])
+        np.minimum(d2[:, :-k], g2[:, k:] + kk, out=d2[:, :-k])
+    d = np.sqrt(d2)
+    d[d > max_cells] = np.inf
+    return d
+
+def narrow_mask(inside, radius_cells):
+    """Inside cells no disk of radius_cells cells within inside can cover."""
+    reach = radius_cells + 0.5
+    eroded = inside & ~(distance_transform(~inside, reach) <= reach)
+    if not eroded.any():
+        return inside.copy()
+    opened = distance_transform(eroded, reach) <= reach
+    return inside & ~opened
+
+def box_mask(boxes, x0, y0, cell, nx, ny):
+    """(ny, nx) bool grid of the cells whose centres lie in any XMin, YMin, XMax, YMax box."""
+    i0 = np.clip(np.ceil((boxes[:, 0] - x0) / cell - 0.5), 0, nx).astype(np.int64)
+    j0 = np.clip(np.ceil((boxes[:, 1] - y0) / cell - 0.5), 0, ny).astype(np.int64)
+    i1 = np.clip(np.floor((boxes[:, 2] - x0) / cell - 0.5) + 1, 0, nx).astype(np.int64)
+    j1 = np.clip(np.floor((boxes[:, 3] - y0) / cell - 0.5) + 1, 0, ny).astype(np.int64)
+    ok = (i1 > i0) & (j1 > j0)
+    i0, j0, i1, j1 = i0[ok], j0[ok], i1[ok], j1[ok]
+    # Corner increments, then running sums along both axes.
+    acc = np.zeros((ny + 1, nx + 1), dtype=np.int32)
+    np.add.at(acc, (j0, i0), 1)
+    np.add.at(acc, (j0, i1), -1)
+    np.add.at(acc, (j1, i0), -1)
+    np.add.at(acc, (j1, i1), 1)
+    return np.cumsum(np.cumsum(acc, axis=0), axis=1)[:ny, :nx] > 0
+
+def windowed_narrow_mask(inside, window, radius_cells, tile=TILE_CELLS, stats=None):
+    """narrow_mask(inside, radius_cells) & window, computed only on tiles holding window cells."""
+    ny, nx = inside.shape
+    # narrow_mask looks 2 (radius + 0.5) cells around a cell; keep a spare one.
+    halo = int(np.ceil(2.0 * radius_cells + 1.0)) + 1
+    ty, tx = -(-ny // tile), -(-nx // tile)
+    padded = np.zeros((ty * tile, tx * tile), dtype=bool)
+    padded[:ny, :nx] = window
+    busy = np.argwhere(padded.reshape(ty, tile, tx, tile).any(axis=(1, 3)))
+    cost = sum((min(ny, (j + 1) * tile + halo) - max(0, j * tile - halo))
+               * (min(nx, (i + 1) * tile + halo) - max(0, i * tile - halo)) for j, i in busy.tolist())
+    if cost >= ny * nx:
+        if stats is not None:
+            stats["raster_cells_opened"] += ny * nx
+        return narrow_mask(inside, radius_cells) & window
+    out = np.zeros((ny, nx), dtype=bool)
+    for j, i in busy.tolist():
+        r0, r1 = j * tile, min(ny, (j + 1) * tile)
+        c0, c1 = i * tile, min(nx, (i + 1) * tile)
+        h0, h1 = max(0, r0 - halo), min(ny, r1 + halo)
+        g0, g1 = max(0, c0 - halo), min(nx, c1 + halo)
+        narrow = narrow_mask(inside[h0:h1, g0:g1], radius_cells)
+        out[r0:r1, c0:c1] = narrow[r0 - h0:r1 - h0, c0 - g0:c1 - g0] & window[r0:r1, c0:c1]
+    if stats is not None:
+        stats["raster_cells_opened"] += cost
+        stats["raster_tiles"] += len(busy)
+    return out
+
+def trace_rings(mask, x0, y0, cell):
+    """Rings along the cell edges around the True cells; the cells lie right of travel.
+
+    Returns (xy, ring_offsets) with every ring closed and only its corner
+    vertices kept.
+    """
+    m = np.pad(mask, 1, mode="constant")
+    # Corner (i, j) is at x0 + (i - 1) cell, y0 + (j - 1) cell in padded indices.
+    out = {}
+    # Horizontal edges between rows j-1 (below) and j (above).
+    diff = m[1:, :] != m[:-1, :]
+    jj, ii = np.nonzero(diff)
+    above = m[jj + 1, ii]
+    for j, i, up in zip((jj + 1).tolist(), ii.tolist(), above.tolist()):
+        # Cell above on the right: travel west; cell below on the right: travel east.
+        a, b = ((i + 1, j), (i, j)) if up else ((i, j), (i + 1, j))
+        out.setdefault(a, []).append(b)
+    diff = m[:, 1:] != m[:, :-1]
+    jj, ii = np.nonzero(diff)
+    right = m[jj, ii + 1]
+    for j, i, rt in zip(jj.tolist(), (ii + 1).tolist(), right.tolist()):
+        # Cell to the east on the right: travel north; to the west: travel south.
+        a, b = ((i, j), (i, j + 1)) if rt else ((i, j + 1), (i, j))
+        out.setdefault(a, []).append(b)
+    rings, offsets = [], [0]
+    while out:
+        # Start where only one edge leaves, never on a saddle.
+        start = next(v for v in out if len(out[v]) == 1)
+        ring = [start]
+        prev, cur = None, start
+        while True:
+            nxt = out[cur]
+            if len(nxt) == 1:
+                b = nxt.pop()
+            else:
+                # Saddle: turn right, so cells touching only at a corner stay apart.
+                dx, dy = cur[0] - prev[0], cur[1] - prev[1]
+                want = (cur[0] + dy, cur[1] - dx)
+                b = want if want in nxt else nxt[0]
+                nxt.remove(b)
+            if not nxt:
+                del out[cur]
+            prev, cur = cur, b
+            if cur == start:
+                break
+            ring.append(cur)
+        pts = np.array(ring, dtype=np.float64)
+        turn = ((pts - np.roll(pts, 1, axis=0)) != (np.roll(pts, -1, axis=0) - pts)).any(axis=1)
+        corners = pts[turn]
+        rings.append(np.vstack((corners, corners[:1])))
+        offsets.append(offsets[-1] + len(corners) + 1)
+    if not rings:
+        return np.zeros((0, 2)), np.zeros(1, dtype=np.int64)
+    xy = np.concatenate(rings)
+    return np.column_stack((x0 + (xy[:, 0] - 1) * cell, y0 + (xy[:, 1] - 1) * cell)), np.array(offsets)
+
+def _drop_small_parts(mask, min_cells):
+    # Parts are cells joined by a side (cells touching at a corner are traced
+    # apart); those of fewer than min_cells cells are cleared. Returns (mask,
+    # parts cleared).
+    jj, ii = np.nonzero(mask)
+    index = np.full(mask.shape, -1, dtype=np.int64)
+    index[jj, ii] = np.arange(len(jj))
+    right = np.nonzero(mask[:, :-1] & mask[:, 1:])
+    up = np.nonzero(mask[:-1, :] & mask[1:, :])
+    s = np.concatenate((index[right], index[up]))
+    t = np.concatenate((index[right[0], right[1] + 1], index[up[0] + 1, up[1]]))
+    label = connected_components(len(jj), s, t)
+    size = np.bincount(label, minlength=len(jj))
+    small = (size > 0) & (size < min_cells)
+    if not small.any():
+        return mask, 0
+    out = mask.copy()
+    gone = small[label]
+    out[jj[gone], ii[gone]] = False
+    return out, int(small.sum())
+
+def _grid(env, radius, cell, max_cells):
+    # Window around one polygon with room for the radius on every side.
+    margin = radius + 2.0 * cell
+    w, h = env[2] - env[0] + 2 * margin, env[3] - env[1] + 2 * margin
+    if w * h / (cell * cell) > max_cells:
+        cell = float(np.sqrt(w * h / max_cells))
+        margin = radius + 2.0 * cell
+        w, h = env[2] - env[0] + 2 * margin, env[3] - env[1] + 2 * margin
+    return env[0] - margin, env[1] - margin, cell, int(np.ceil(w / cell)), int(np.ceil(h / cell))
+
+def raster_narrow_parts(store, radius, cell_m=DEFAULT_CELL_M, min_area=0.0, max_cells=MAX_CELLS, windows=None,
+                        stats=None):
+    """Narrow parts of every polygon in a metric store: (parts, area_m2).
+
+    parts is a FeatureStore of rings with one feature per polygon that has
+    narrow cells left (oid and layer are the polygon's) once every part
+    (cells joined by a side) under min_area is dropped; area_m2 is the
+    area of each. windows is the (owner, boxes) of
+    tcpl_qc.opening_windows.window_boxes for the same store and radius:
+    polygons without a box are skipped and the others only opened around
+    their boxes, with the same cells as without windows inside the boxes.
+    stats gets raster_cells, raster_coarsened (polygons whose cell was
+    enlarged to stay within max_cells) and parts_below_min_area, with
+    windows also raster_cells_opened, raster_tiles and
+    polygons_without_windows.
+    """
+    oids, layers, lines, areas = [], [], [], []
+    if windows is not None:
+        w_owner, w_boxes = windows
+        w_start = np.searchsorted(w_owner, np.arange(len(store) + 1))
+    for f in range(len(store)):
+        env = store.env[f]
+        if np.isnan(env).any():
+            continue
+        if windows is not None and w_start[f] == w_start[f + 1]:
+            if stats is not None:
+                stats["polygons_without_windows"] += 1
+            continue
+        xy, offsets = store.line(f)
+        x0, y0, cell, nx, ny = _grid(env, radius, cell_m, max_cells)
+        inside = rasterize(xy, offsets, x0, y0, cell, nx, ny)
+        if windows is None:
+            narrow = narrow_mask(inside, radius / cell)
+        else:
+            window = box_mask(w_boxes[w_start[f]:w_start[f + 1]], x0, y0, cell, nx, ny)
+            narrow = windowed_narrow_mask(inside, window, radius / cell, stats=stats)
+        if stats is not None:
+            stats["raster_cells"] += nx * ny
+            stats["raster_coarsened"] += int(cell != cell_m)
+        if not narrow.any():
+            continue
+        narrow, dropped = _drop_small_parts(narrow, min_area / (cell * cell))
+        if stats is not None:
+            stats["parts_below_min_area"] += dropped
+        n_cells = int(narrow.sum())
+        if not n_cells:
+            continue
+        area = n_cells * cell * cell
+        oids.append(int(store.oid[f]))
+        layers.append(int(store.layer[f]))
+        lines.append(trace_rings(narrow, x0, y0, cell))
+        areas.append(area)
+    parts = FeatureStore.from_lines(oids, lines, layers=layers, layer_names=store.layer_names)
+    return parts, np.array(areas, dtype=np.float64)
@@ -0,0 +1,139 @@
+#... TCPL Sort-Tile-Recursive packed R-tree over feature envelopes
+
+import heapq, math
+
+import numpy as np
+
+NODE_CAPACITY = 16
+
+def box_distance(env, q):
+    """Euclidean gap between boxes env (n, 4) and one query box q; 0 if they touch."""
+    dx = np.maximum(np.maximum(q[0] - env[:, 2], env[:, 0] - q[2]), 0.0)
+    dy = np.maximum(np.maximum(q[1] - env[:, 3], env[:, 1] - q[3]), 0.0)
+    return np.hypot(dx, dy)
+
+def _str_order(env, capacity):
+    # Order boxes so that consecutive runs of `capacity` form the STR tiles.
+    n = len(env)
+    cx = (env[:, 0] + env[:, 2]) * 0.5
+    cy = (env[:, 1] + env[:, 3]) * 0.5
+    n_nodes = int(math.ceil(n / float(capacity)))
+    n_slices = int(math.ceil(math.sqrt(n_nodes)))
+    slice_size = n_slices * capacity
+    by_x = np.argsort(cx, kind="mergesort")
+    slice_id = np.empty(n, dtype=np.int64)
+    slice_id[by_x] = np.arange(n) // slice_size
+    return np.lexsort((cy, slice_id))
+
+def _group_envelopes(env, capacity):
+    n = len(env)
+    starts = np.arange(0, n, capacity)
+    return np.column_stack((np.minimum.reduceat(env[:, 0], starts),
+                            np.minimum.reduceat(env[:, 1], starts),
+                            np.maximum.reduceat(env[:, 2], starts),
+                            np.maximum.reduceat(env[:, 3], starts)))
+
+class STRtree(object):
+    """Static R-tree bulk-loaded with Sort-Tile-Recursive packing.
+
+    env is an (n, 4) array of XMin, YMin, XMax, YMax. Queries return the
+    original row indices, sorted ascending, so callers that stop at the
+    first hit see candidates in the same order as a plain loop would.
+    """
+
+    def __init__(self, env, capacity=NODE_CAPACITY):
+        env = np.asarray(env, dtype=np.float64).reshape(-1, 4)
+        self.capacity = int(capacity)
+        # levels[0] is the root level, levels[-1] the leaves. Every non-leaf
+        # row points at a run first[k] .. first[k]+count[k]-1 of the level below.
+        self.levels, self.first, self.count = [], [], []
+        self.ids = np.zeros(0, dtype=np.int64)
+        # Rows with a NaN envelope (features without vertices) are left out;
+        # size counts the rows indexed.
+        rows = np.flatnonzero(~np.isnan(env).any(axis=1))
+        self.size = len(rows)
+        if len(rows) == 0:
+            return
+        order = _str_order(env[rows], self.capacity)
+        self.ids = rows[order]
+        level = env[self.ids]
+        levels, firsts, counts = [level], [None], [None]
+        while len(level) > 1:
+            first = np.arange(0, len(level), self.capacity, dtype=np.int64)
+            count = np.minimum(self.capacity, len(level) - first)
+            level = _group_envelopes(level, self.capacity)
+            order = _str_order(level, self.capacity)
+            level, first, count = level[order], first[order], count[order]
+            levels.append(level); firsts.append(first); counts.append(count)
+        levels.reverse(); firsts.reverse(); counts.reverse()
+        self.levels, self.first, self.count = levels, firsts, counts
+
+    def _children(self, nodes, depth):
+        first = self.first[depth][nodes]
+        count = self.count[depth][nodes]
+        step = np.arange(self.capacity)
+        kids = first[:, None] + step
+        return kids[step < count[:, None]]
+
+    def _search(self, hit):
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        nodes = np.arange(len(self.levels[0]), dtype=np.int64)
+        for depth, level in enumerate(self.levels):
+            nodes = nodes[hit(level[nodes])]
+            if not len(nodes):
+                return np.zeros(0, dtype=np.int64)
+            if depth + 1 < len(self.levels):
+                nodes = self._children(nodes, depth)
+        return np.sort(self.ids[nodes])
+
+    def query(self, q):
+        """Indices of boxes that intersect (or touch) box q."""
+        q = [float(v) for v in q]
+        return self._search(lambda e: (e[:, 0] <= q[2]) & (e[:, 2] >= q[0]) &
+                                      (e[:, 1] <= q[3]) & (e[:, 3] >= q[1]))
+
+    def query_within(self, q, r):
+        """Indices of boxes whose Euclidean distance to box q is <= r."""
+        q = [float(v) for v in q]
+        return self._search(lambda e: box_distance(e, q) <= r)
+
+    def nearest(self, x, y, k=1, distance=None, exclude=None):
+        """The k nearest items to point (x, y) as a list of (distance, index).
+
+        Without a distance function the box distance is used. distance(i),
+        if given, must return the exact distance to item i; it is never less
+        than the box distance, so best-first order stays correct. Items for
+        which it returns None, and the index `exclude`, are skipped.
+        """
+        if self.size == 0 or k <= 0:
+            return []
+        q = (float(x), float(y), float(x), float(y))
+        last = len(self.levels) - 1
+        heap = []
+        top = np.arange(len(self.levels[0]), dtype=np.int64)
+        for d, node in zip(box_distance(self.levels[0], q).tolist(), top.tolist()):
+            heap.append((d, 0, 0, node))
+        heapq.heapify(heap)
+        out = []
+        while heap and len(out) < k:
+            d, kind, depth, node = heapq.heappop(heap)
+            if kind == 2:
+                out.append((d, node))
+                continue
+            if depth == last:
+                item = int(self.ids[node])
+                if item == exclude:
+                    continue
+                if distance is None:
+                    out.append((d, item))
+                else:
+                    dd = distance(item)
+                    if dd is not None:
+                        heapq.heappush(heap, (float(dd), 2, depth, item))
+                continue
+            kids = self._children(np.array([node], dtype=np.int64), depth)
+            dists = box_distance(self.levels[depth + 1][kids], q)
+            for dk, kid in zip(dists.tolist(), kids.tolist()):
+                heapq.heappush(heap, (dk, 0, depth + 1, kid))
+        return out
@@ -0,0 +1,146 @@
+#... TCPL uniform-grid index over the segments of every line (point-to-line proximity)
+#
+# Every segment is hashed into each grid cell its envelope covers. A segment
+# within r of a point has its envelope inside the point's +-r box, so with
+# cells of side >= r only the 2x2 to 3x3 cells under that box can hold it.
+# Lookups and distances are NumPy over chunks of points: (point, segment)
+# candidates come from binary searches over the sorted cell keys and go
+# through point_segment_distance in one call.
+#
+# The cell holding the point is searched first, for all points at once;
+# points that already have a hit there are dropped before the surrounding
+# cells are searched, which is the vectorized form of stopping at the first
+# line within r.
+
+import numpy as np
+
+from tcpl_qc.segments import point_segment_distance
+
+CHUNK = 4096   # points per batch; bounds the candidate arrays
+# Cells are a hair wider than the radius so rounding can never put a
+# segment within radius outside the 3x3 cells around a point.
+CELL_SLACK = 1.0 + 1e-6
+
+def store_segments(store):
+    """(i0, i1, owner): vertex indices of both ends and the feature of every segment.
+
+    Segments never cross parts. Like tcpl_qc.segments.segments, a feature
+    with no segment but exactly one vertex gets one zero-length segment,
+    so it behaves as a point.
+    """
+    starts = np.ones(len(store.xy), dtype=bool)
+    starts[store.part_offsets[1:][store.part_offsets[1:] > 0] - 1] = False   # last vertex of every part
+    i0 = np.flatnonzero(starts)
+    i1 = i0 + 1
+    seg_owner = store.vertex_owner()[i0]
+    v0 = store.part_offsets[store.feature_offsets[:-1]]
+    v1 = store.part_offsets[store.feature_offsets[1:]]
+    lone = np.flatnonzero((v1 - v0 == 1) & (np.bincount(seg_owner, minlength=len(store)) == 0))
+    if len(lone):
+        i0 = np.concatenate((i0, v0[lone]))
+        i1 = np.concatenate((i1, v0[lone]))
+        seg_owner = np.concatenate((seg_owner, lone))
+        order = np.argsort(seg_owner, kind="mergesort")
+        i0, i1, seg_owner = i0[order], i1[order], seg_owner[order]
+    return i0, i1, seg_owner
+
+def _ranges(starts, counts):
+    # Concatenation of arange(s, s + c) for every (s, c).
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(int(counts.sum())) - first
+
+class SegmentGrid(object):
+    """Segments of a FeatureStore bucketed into cells for queries up to max_radius metres."""
+
+    def __init__(self, store, max_radius):
+        i0, i1, self.owner = store_segments(store)
+        xy = store.xy
+        self.x0, self.y0 = xy[i0, 0], xy[i0, 1]
+        self.x1, self.y1 = xy[i1, 0], xy[i1, 1]
+        self.max_radius = float(max_radius)
+        self.cell = max(self.max_radius * CELL_SLACK, 1e-9)
+        if len(i0):
+            self.ox = min(self.x0.min(), self.x1.min())
+            self.oy = min(self.y0.min(), self.y1.min())
+        else:
+            self.ox = self.oy = 0.0
+        cx0, cy0 = self._cells(np.minimum(self.x0, self.x1), np.minimum(self.y0, self.y1))
+        cx1, cy1 = self._cells(np.maximum(self.x0, self.x1), np.maximum(self.y0, self.y1))
+        self.stride = int(cy1.max()) + 1 if len(cy1) else 1
+        nx, ny = cx1 - cx0 + 1, cy1 - cy0 + 1
+        seg = np.repeat(np.arange(len(i0), dtype=np.int64), nx * ny)
+        k = _ranges(np.zeros(len(i0), dtype=np.int64), nx * ny)
+        key = (cx0[seg] + k // ny[seg]) * self.stride + (cy0[seg] + k % ny[seg])
+        order = np.argsort(key, kind="mergesort")
+        self.keys = key[order]
+        self.seg = seg[order]
+
+    def __len__(self):
+        return len(self.owner)
+
+    def _cells(self, x, y):
+        kx = np.floor((np.asarray(x) - self.ox) / self.cell).astype(np.int64)
+        ky = np.floor((np.asarray(y) - self.oy) / self.cell).astype(np.int64)
+        return kx, ky
+
+    def _candidates(self, pts, kx, ky):
+        # (point row, segment) for every segment hashed into cell (kx, ky) of each point.
+        ok = (kx >= 0) & (ky >= 0) & (ky < self.stride)
+        pts, key = pts[ok], kx[ok] * self.stride + ky[ok]
+        lo = np.searchsorted(self.keys, key, side="left")
+        hi = np.searchsorted(self.keys, key, side="right")
+        counts = hi - lo
+        return np.repeat(pts, counts), self.seg[_ranges(lo, counts)]
+
+    def near_other(self, px, py, exclude, radius, stats=None):
+        """Boolean per point: a segment of a feature other than exclude[k] lies within radius.
+
+        NaN points are never near. stats gets segment_distances (point to
+        segment distances evaluated) and pairs_tested (distinct point /
+        feature pairs they belong to).
+        """
+        if radius > self.max_radius:
+            raise ValueError("radius %g is beyond the grid's max_radius %g" % (radius, self.max_radius))
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        exclude = np.asarray(exclude, dtype=np.int64)
+        hit = np.zeros(len(px), dtype=bool)
+        evaluated = pairs = 0
+        n_feat = int(self.owner.max()) + 1 if len(self.owner) else 1
+        for s in range(0, len(px), CHUNK):
+            rows = np.arange(s, min(s + CHUNK, len(px)))
+            rows = rows[~(np.isnan(px[rows]) | np.isnan(py[rows]))]
+            if not len(rows) or not len(self.owner):
+                continue
+            cx, cy = self._cells(px[rows], py[rows])
+            reach = radius * CELL_SLACK
+            lx, ly = self._cells(px[rows] - reach, py[rows] - reach)
+            hx, hy = self._cells(px[rows] + reach, py[rows] + reach)
+            # Own cell first, then every other cell under the +-radius box.
+            passes = [[(0, 0)], [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]]
+            for cells in passes:
+                live = np.flatnonzero(~hit[rows])
+                if not len(live):
+                    break
+                cand_p, cand_s = [], []
+                for dx, dy in cells:
+                    kx, ky = cx[live] + dx, cy[live] + dy
+                    inside = (kx >= lx[live]) & (kx <= hx[live]) & (ky >= ly[live]) & (ky <= hy[live])
+                    p, g = self._candidates(live[inside], kx[inside], ky[inside])
+                    cand_p.append(p)
+                    cand_s.append(g)
+                p = np.concatenate(cand_p)
+                g = np.concatenate(cand_s)
+                r = rows[p]
+                other = self.owner[g] != exclude[r]
+                r, g = r[other], g[other]
+                if not len(r):
+                    continue
+                d = point_segment_distance(px[r], py[r], self.x0[g], self.y0[g], self.x1[g], self.y1[g])
+                evaluated += len(r)
+                pairs += len(np.unique(r * n_feat + self.owner[g]))
+                hit[r[d <= radius]] = True
+        if stats is not None:
+            stats["segment_distances"] += evaluated
+            stats["pairs_tested"] += pairs
+        return hit
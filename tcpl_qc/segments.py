@@ -0,0 +1,203 @@
+#... TCPL coordinate-array helpers for polylines (no arcpy needed)
+
+import numpy as np
+
+def envelope_array(extents):
+    return np.array([(e.XMin, e.YMin, e.XMax, e.YMax) for e in extents], dtype=np.float64).reshape(-1, 4)
+
+def line_envelopes(lines):
+    """(n, 4) XMin, YMin, XMax, YMax array for a list of (xy, offsets) lines."""
+    env = np.empty((len(lines), 4), dtype=np.float64)
+    for k, (xy, _offsets) in enumerate(lines):
+        env[k, :2] = xy.min(axis=0)
+        env[k, 2:] = xy.max(axis=0)
+    return env
+
+def line_arrays(geom):
+    """Return (xy, offsets) for a polyline-like geometry.
+
+    Works on anything that iterates as parts of points with .X/.Y (arcpy
+    Polyline included); None entries inside a part are skipped. xy is an
+    (n, 2) float64 array and part k runs xy[offsets[k]:offsets[k+1]].
+    """
+    pts = []
+    offsets = [0]
+    for part in geom:
+        for p in part:
+            if p is None:
+                continue
+            pts.append((p.X, p.Y))
+        if len(pts) > offsets[-1]:
+            offsets.append(len(pts))
+    xy = np.array(pts, dtype=np.float64).reshape(-1, 2)
+    return xy, np.array(offsets, dtype=np.int64)
+
+def ring_arrays(geom):
+    """Return (xy, offsets) with one entry per ring of a polygon-like geometry.
+
+    Like line_arrays, but a None inside a part (arcpy's marker before each
+    interior ring) starts a new ring instead of being skipped.
+    """
+    return part_ring_arrays(geom)[:2]
+
+def part_ring_arrays(geom):
+    """ring_arrays plus the index of the part (outer ring) every ring belongs to."""
+    pts = []
+    offsets = [0]
+    part_of = []
+    for k, part in enumerate(geom):
+        for p in part:
+            if p is None:
+                if len(pts) > offsets[-1]:
+                    offsets.append(len(pts))
+                    part_of.append(k)
+                continue
+            pts.append((p.X, p.Y))
+        if len(pts) > offsets[-1]:
+            offsets.append(len(pts))
+            part_of.append(k)
+    xy = np.array(pts, dtype=np.float64).reshape(-1, 2)
+    return xy, np.array(offsets, dtype=np.int64), np.array(part_of, dtype=np.int64)
+
+def ring_areas(xy, offsets):
+    """Signed shoelace area of every ring (positive counter-clockwise), in one pass.
+
+    Rings may be closed or open. Each ring is taken relative to its first
+    vertex, so projected coordinates in the millions keep their precision.
+    """
+    counts = np.diff(offsets)
+    ring = np.repeat(np.arange(len(counts)), counts)
+    nxt = np.arange(1, len(xy) + 1)
+    nxt[offsets[1:][counts > 0] - 1] = offsets[:-1][counts > 0]
+    d = xy - xy[offsets[:-1][ring]] if len(xy) else xy
+    cross = d[:, 0] * d[nxt, 1] - d[nxt, 0] * d[:, 1]
+    return 0.5 * np.bincount(ring, weights=cross, minlength=len(counts))
+
+def part_areas(xy, offsets, part_of, n_parts=None):
+    """Area of every part of a polygon: its rings' signed areas summed (holes run the other way)."""
+    n = int(part_of.max()) + 1 if n_parts is None and len(part_of) else (n_parts or 0)
+    return np.abs(np.bincount(part_of, weights=ring_areas(xy, offsets), minlength=n))
+
+def connected_components(n, s, t):
+    """Component label of each of n nodes joined by the edges s[i]-t[i]: the smallest node index in it.
+
+    Labels are hooked along the edges to the smaller one, then shortcut to
+    their root, until no edge joins two labels.
+    """
+    label = np.arange(n)
+    s, t = np.asarray(s, dtype=np.int64), np.asarray(t, dtype=np.int64)
+    while len(s):
+        ls, lt = label[s], label[t]
+        differ = ls != lt
+        if not differ.any():
+            break
+        lo, hi = np.minimum(ls, lt)[differ], np.maximum(ls, lt)[differ]
+        np.minimum.at(label, hi, lo)
+        while True:
+            up = label[label]
+            if (up == label).all():
+                break
+            label = up
+    return label
+
+def pack_lines(lines):
+    """Concatenate (xy, offsets) lines into (xy, part_offsets, feature_offsets)."""
+    xys, parts, feats = [], [np.zeros(1, dtype=np.int64)], [0]
+    base = 0
+    for xy, offsets in lines:
+        xys.append(np.asarray(xy, dtype=np.float64).reshape(-1, 2))
+        parts.append(np.asarray(offsets[1:], dtype=np.int64) + base)
+        base += len(xys[-1])
+        feats.append(feats[-1] + len(offsets) - 1)
+    xy = np.concatenate(xys) if xys else np.zeros((0, 2))
+    return xy, np.concatenate(parts), np.array(feats, dtype=np.int64)
+
+def segment_index(offsets):
+    # Index of the first vertex of every segment (segments never cross parts).
+    starts = []
+    for k in range(len(offsets) - 1):
+        s, e = int(offsets[k]), int(offsets[k + 1])
+        if e - s >= 2:
+            starts.append(np.arange(s, e - 1, dtype=np.int64))
+    if not starts:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(starts)
+
+def segments(xy, offsets):
+    """Return (p0, p1), two (m, 2) arrays with the start/end of every segment."""
+    k = segment_index(offsets)
+    if len(k) == 0 and len(xy) == 1:
+        return xy[:1], xy[:1]
+    return xy[k], xy[k + 1]
+
+def point_segment_distance(px, py, x0, y0, x1, y1):
+    """Distance from points to segments with NumPy broadcasting.
+
+    Degenerate (zero-length) segments behave like points.
+    """
+    dx = x1 - x0
+    dy = y1 - y0
+    l2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = ((px - x0) * dx + (py - y0) * dy) / l2
+    t = np.where(l2 > 0.0, np.clip(t, 0.0, 1.0), 0.0)
+    return np.hypot(px - x0 - t * dx, py - y0 - t * dy)
+
+def point_segment_matrix(pts, p0, p1):
+    # (len(pts), len(p0)) distances from every point to every segment.
+    return point_segment_distance(pts[:, 0:1], pts[:, 1:2],
+                                  p0[:, 0], p0[:, 1], p1[:, 0], p1[:, 1])
+
+def segment_lengths(p0, p1):
+    return np.hypot(p1[:, 0] - p0[:, 0], p1[:, 1] - p0[:, 1])
+
+def line_length(line):
+    """Planar length of a (xy, offsets) line (sum over parts, like Polyline.length)."""
+    p0, p1 = segments(*line)
+    return float(segment_lengths(p0, p1).sum())
+
+def point_line_distance(x, y, line):
+    """Planar distance from (x, y) to a (xy, offsets) line, like PointGeometry.distanceTo."""
+    p0, p1 = segments(*line)
+    if not len(p0):
+        return np.inf
+    return float(point_segment_distance(x, y, p0[:, 0], p0[:, 1], p1[:, 0], p1[:, 1]).min())
+
+def locate_point(x, y, line):
+    """(qx, qy, distance_along, distance_from) of the nearest point on the line.
+
+    Mirrors Polyline.queryPointAndDistance: distance_along is measured from
+    the start of the first part, parts taken in order; ties go to the
+    earliest segment.
+    """
+    p0, p1 = segments(*line)
+    if not len(p0):
+        return None, None, None, np.inf
+    dx = p1[:, 0] - p0[:, 0]
+    dy = p1[:, 1] - p0[:, 1]
+    l2 = dx * dx + dy * dy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = ((x - p0[:, 0]) * dx + (y - p0[:, 1]) * dy) / l2
+    t = np.where(l2 > 0.0, np.clip(t, 0.0, 1.0), 0.0)
+    qx = p0[:, 0] + t * dx
+    qy = p0[:, 1] + t * dy
+    d = np.hypot(x - qx, y - qy)
+    k = int(np.argmin(d))
+    seglen = np.sqrt(l2)
+    along = float(seglen[:k].sum() + t[k] * seglen[k])
+    return float(qx[k]), float(qy[k]), along, float(d[k])
+
+def position_along(line, distance):
+    """(x, y) at `distance` metres along the line, like Polyline.positionAlongLine."""
+    p0, p1 = segments(*line)
+    if not len(p0):
+        xy = line[0]
+        return (float(xy[0, 0]), float(xy[0, 1])) if len(xy) else (None, None)
+    seglen = segment_lengths(p0, p1)
+    cum = np.cumsum(seglen)
+    distance = min(max(float(distance), 0.0), float(cum[-1]))
+    k = min(int(np.searchsorted(cum, distance, side="left")), len(seglen) - 1)
+    start = cum[k] - seglen[k]
+    t = (distance - start) / seglen[k] if seglen[k] > 0 else 0.0
+    return (float(p0[k, 0] + t * (p1[k, 0] - p0[k, 0])),
+            float(p0[k, 1] + t * (p1[k, 1] - p0[k, 1])))
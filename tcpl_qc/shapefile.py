@@ -0,0 +1,526 @@
+#... TCPL headless ESRI shapefile reader (.shp/.shx/.dbf) with NumPy
+#
+# Files are memory-mapped and decoded with np.frombuffer: the .shx gives
+# every record offset, the fixed-size record fields are gathered for all
+# records at once and the variable-size parts/points blocks are copied with
+# one fancy-index per chunk, so there is no Python loop over features.
+
+import mmap
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from tcpl_qc.store import FeatureStore
+
+SHP_FILE_CODE = 9994
+SHP_NULL      = 0
+SHP_POINT     = (1, 11, 21)
+SHP_POLYLINE  = (3, 13, 23)
+SHP_POLYGON   = (5, 15, 25)
+DBF_ENCODING  = "utf-8"
+# Used for a text column that is not valid in the .cpg/default encoding.
+DBF_FALLBACK_ENCODING = "latin-1"
+# Upper bound on the bytes copied per gather step (bounds the index array).
+GATHER_CHUNK_BYTES = 1 << 24
+
+def _sibling(path, ext):
+    base = os.path.splitext(path)[0]
+    for e in (ext, ext.upper()):
+        if os.path.exists(base + e):
+            return base + e
+    return None
+
+def _map(path):
+    f = open(path, "rb")
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b"", f
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), f
+    except:
+        f.close()
+        raise
+
+def _close(mm, f):
+    try:
+        if isinstance(mm, mmap.mmap):
+            mm.close()
+    except BufferError:
+        # A view is still alive (only while an exception unwinds); the map
+        # is released when it is collected.
+        pass
+    f.close()
+
+def _field(buf, starts, dtype):
+    # One fixed-size little-endian field at byte offset starts[k] of every record.
+    dtype = np.dtype(dtype)
+    idx = np.asarray(starts, dtype=np.int64)[:, None] + np.arange(dtype.itemsize)
+    return buf[idx].view(dtype).reshape(len(starts))
+
+def _chunks(starts, nbytes):
+    """Yield (o0, o1, idx): out[o0:o1] (in units) maps to the byte ranges at idx.
+
+    The ranges starts[k]:starts[k] + nbytes[k] are laid end to end in
+    out. Units are 32-bit words when every range is 4-byte aligned (as all
+    polyline/polygon records are), single bytes otherwise; the unit is
+    yielded first.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    nbytes = np.asarray(nbytes, dtype=np.int64)
+    unit = 4 if not ((starts % 4).any() or (nbytes % 4).any()) else 1
+    yield unit
+    cum = np.concatenate(([0], np.cumsum(nbytes)))
+    r0, n = 0, len(starts)
+    while r0 < n:
+        r1 = max(r0 + 1, int(np.searchsorted(cum, cum[r0] + GATHER_CHUNK_BYTES, side="right")) - 1)
+        r1 = min(r1, n)
+        o0, o1 = cum[r0] // unit, cum[r1] // unit
+        idx = np.arange(o0, o1, dtype=np.int64)
+        idx += np.repeat((starts[r0:r1] - cum[r0:r1]) // unit, nbytes[r0:r1] // unit)
+        yield o0, o1, idx
+        r0 = r1
+
+def _units(buf, unit):
+    return buf[:len(buf) - len(buf) % unit].view(np.uint32 if unit == 4 else np.uint8)
+
+def _gather(buf, starts, nbytes, dtype):
+    """Concatenate buf[starts[k]:starts[k] + nbytes[k]] over k, viewed as dtype."""
+    out = np.empty(int(np.sum(nbytes)), dtype=np.uint8)
+    chunks = _chunks(starts, nbytes)
+    unit = next(chunks)
+    src, dst = _units(buf, unit), _units(out, unit)
+    for o0, o1, idx in chunks:
+        dst[o0:o1] = src[idx]
+    return out.view(dtype)
+
+def _scatter(buf, starts, nbytes, data):
+    """Inverse of _gather: write the bytes of data to buf[starts[k]:starts[k] + nbytes[k]]."""
+    data = np.ascontiguousarray(data).reshape(-1).view(np.uint8)
+    chunks = _chunks(starts, nbytes)
+    unit = next(chunks)
+    src, dst = _units(data, unit), _units(buf, unit)
+    for o0, o1, idx in chunks:
+        dst[idx] = src[o0:o1]
+
+def _record_offsets(shx_path):
+    mm, f = _map(shx_path)
+    try:
+        idx = np.frombuffer(mm, dtype=">i4", offset=100).reshape(-1, 2)
+        # Offsets and lengths are in 16-bit words; content starts after the
+        # 8-byte record header.
+        starts = idx[:, 0].astype(np.int64) * 2 + 8
+        lengths = idx[:, 1].astype(np.int64) * 2
+        del idx
+    finally:
+        _close(mm, f)
+    return starts, lengths
+
+def _scan_offsets(buf):
+    # No .shx: walk the record headers (one Python step per record).
+    starts, lengths = [], []
+    pos, end = 100, len(buf)
+    while pos + 8 <= end:
+        n = int(np.frombuffer(buf, dtype=">i4", count=1, offset=pos + 4)[0]) * 2
+        starts.append(pos + 8); lengths.append(n)
+        pos += 8 + n
+    return np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+def read_shp(path):
+    """Decode the geometry of a .shp file.
+
+    Returns (shape_type, xy, part_offsets, feature_offsets, env) in the
+    FeatureStore layout: xy is (n, 2) float64 (Z and M are dropped), env the
+    (n_features, 4) record bounding boxes (NaN for null shapes). Points are
+    one-vertex, one-part features. Uses the .shx next to the file when there
+    is one.
+    """
+    mm, f = _map(path)
+    try:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        if len(buf) < 100 or int(buf[:4].view(">i4")[0]) != SHP_FILE_CODE:
+            raise ValueError("%s is not a shapefile" % path)
+        shape_type = int(buf[32:36].view("<i4")[0])
+        shx = _sibling(path, ".shx")
+        starts, lengths = _record_offsets(shx) if shx else _scan_offsets(buf)
+        n = len(starts)
+        rec_type = _field(buf, starts, "<i4") if n else np.zeros(0, dtype=np.int32)
+        live = np.flatnonzero((rec_type != SHP_NULL) & (lengths > 4))
+        env = np.full((n, 4), np.nan)
+        if shape_type in SHP_POINT:
+            xy = _gather(buf, starts[live] + 4, np.full(len(live), 16), "<f8").reshape(-1, 2)
+            env[live] = np.hstack((xy, xy))
+            counts = np.zeros(n, dtype=np.int64); counts[live] = 1
+            part_offsets = np.concatenate(([0], np.cumsum(counts[live])))
+            feature_offsets = np.concatenate(([0], np.cumsum(counts)))
+        elif shape_type in SHP_POLYLINE + SHP_POLYGON:
+            base = starts[live]
+            env[live] = _gather(buf, base + 4, np.full(len(live), 32), "<f8").reshape(-1, 4)
+            n_parts = _field(buf, base + 36, "<i4").astype(np.int64)
+            n_points = _field(buf, base + 40, "<i4").astype(np.int64)
+            parts = _gather(buf, base + 44, 4 * n_parts, "<i4").astype(np.int64)
+            xy = _gather(buf, base + 44 + 4 * n_parts, 16 * n_points, "<f8").reshape(-1, 2)
+            # Part starts are relative to their record; shift them to xy rows.
+            vbase = np.cumsum(n_points) - n_points
+            parts += np.repeat(vbase, n_parts)
+            part_offsets = np.concatenate((parts, [len(xy)]))
+            per_feature = np.zeros(n, dtype=np.int64); per_feature[live] = n_parts
+            feature_offsets = np.concatenate(([0], np.cumsum(per_feature)))
+        else:
+            raise ValueError("Unsupported shape type %d in %s" % (shape_type, path))
+        del buf
+    finally:
+        _close(mm, f)
+    return shape_type, xy, part_offsets, feature_offsets, env
+
+def _dbf_encoding(path):
+    cpg = _sibling(path, ".cpg")
+    if cpg:
+        with open(cpg) as f:
+            name = f.read().strip()
+        if name.isdigit():
+            name = "cp" + name
+        try:
+            "".encode(name)
+            return name
+        except LookupError:
+            pass
+    return DBF_ENCODING
+
+def _dbf_column(raw, ftype, decimals, encoding):
+    if ftype in "NF":
+        text = np.char.strip(raw)
+        blank = (text == b"") | (np.char.count(text, b"*") > 0)
+        if ftype == "N" and decimals == 0 and raw.dtype.itemsize < 19 and not blank.any():
+            return text.astype(np.int64)
+        vals = np.full(len(raw), np.nan)
+        if (~blank).any():
+            vals[~blank] = text[~blank].astype(np.float64)
+        return vals
+    if ftype == "L":
+        return (raw == b"T") | (raw == b"t") | (raw == b"Y") | (raw == b"y")
+    # C, D (YYYYMMDD) and anything else stay text.
+    try:
+        text = np.char.decode(raw, encoding)
+    except UnicodeDecodeError:
+        text = np.char.decode(raw, DBF_FALLBACK_ENCODING)
+    return np.char.rstrip(text)
+
+def read_dbf(path, encoding=None):
+    """Decode a .dbf table into an OrderedDict of column name -> array.
+
+    N/F fields become int64 (whole numbers, no blanks) or float64 (blanks
+    are NaN), L fields bool, everything else unicode text with trailing
+    blanks removed. Records flagged as deleted are kept so that row k
+    still matches shape record k.
+    """
+    encoding = encoding or _dbf_encoding(path)
+    mm, f = _map(path)
+    try:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        n_rec = int(buf[4:8].view("<u4")[0])
+        header_len = int(buf[8:10].view("<u2")[0])
+        record_len = int(buf[10:12].view("<u2")[0])
+        fields, pos, offset = [], 32, 1
+        while pos + 32 <= header_len and buf[pos] != 0x0D:
+            desc = mm[pos:pos + 32]
+            name = desc[:11].split(b"\0")[0].decode(encoding, "replace")
+            length, decimals = ord(desc[16:17]), ord(desc[17:18])
+            fields.append((name, desc[11:12].decode("ascii"), length, decimals, offset))
+            offset += length
+            pos += 32
+        # Each record is a deletion flag byte followed by the fixed-width fields.
+        dtype = np.dtype({"names": ["f%d" % k for k in range(len(fields))],
+                          "formats": ["S%d" % fl[2] for fl in fields],
+                          "offsets": [fl[4] for fl in fields],
+                          "itemsize": record_len})
+        table = np.frombuffer(mm, dtype=dtype, count=n_rec, offset=header_len)
+        columns = OrderedDict()
+        for k, (name, ftype, _length, decimals, _offset) in enumerate(fields):
+            columns[name] = _dbf_column(table["f%d" % k], ftype, decimals, encoding)
+        del table, buf
+    finally:
+        _close(mm, f)
+    return columns
+
+def read_prj(path):
+    """WKT of the .prj next to path, or None."""
+    prj = _sibling(path, ".prj")
+    if not prj:
+        return None
+    with open(prj) as f:
+        return f.read().strip() or None
+
+def read_shapefile(path, with_attributes=True):
+    """(FeatureStore, columns) for one shapefile.
+
+    OIDs are the 0-based record numbers (the FID ArcMap shows); the store's
+    single layer is named after the file. columns is the read_dbf result,
+    or None when with_attributes is False or there is no .dbf.
+    """
+    store, columns = read_layers([path], with_attributes)
+    return store, columns[0]
+
+def read_layers(paths, with_attributes=True):
+    """Read several shapefiles into one multi-layer FeatureStore.
+
+    Layer k of the store is paths[k]; returns (store, columns) where
+    columns[k] holds the attribute columns of paths[k].
+    """
+    oids, xys, parts, feats, envs, layer, columns = [], [], [], [], [], [], []
+    vbase = pbase = 0
+    for lid, path in enumerate(paths):
+        _type, xy, part_offsets, feature_offsets, env = read_shp(path)
+        n = len(env)
+        oids.append(np.arange(n, dtype=np.int64))
+        xys.append(xy)
+        parts.append(part_offsets[:-1] + vbase)
+        feats.append(feature_offsets[:-1] + pbase)
+        envs.append(env)
+        layer.append(np.full(n, lid, dtype=np.int16))
+        vbase += len(xy)
+        pbase += len(part_offsets) - 1
+        dbf = _sibling(path, ".dbf") if with_attributes else None
+        columns.append(read_dbf(dbf) if dbf else None)
+    store = FeatureStore(np.concatenate(oids) if oids else np.zeros(0, dtype=np.int64),
+                         np.concatenate(xys) if xys else np.zeros((0, 2)),
+                         np.concatenate(parts + [[vbase]]),
+                         np.concatenate(feats + [[pbase]]),
+                         layer=np.concatenate(layer) if layer else None,
+                         layer_names=[os.path.splitext(os.path.basename(p))[0] for p in paths],
+                         env=np.concatenate(envs) if envs else None)
+    return store, columns
+
+# Fields of the QC point outputs (snap_50 dangle points and the like),
+# matching the AddField_management calls of the ArcMap scripts.
+QC_FIELDS = [("SRC_LAYER", "C", 64, 0), ("SRC_OID", "N", 10, 0), ("REASON", "C", 32, 0)]
+FLOAT_WIDTH    = 19   # widest numeric field dBASE readers take
+FLOAT_DECIMALS = 11   # most decimals an inferred float field gets
+
+def field_specs(columns, fields=None, encoding=DBF_ENCODING):
+    """(name, type, length, decimals) for every column, in column order.
+
+    Explicit specs in fields win; the rest are inferred from the dtype:
+    integers N(18), floats N(19, d), bools L, text C sized to the longest
+    encoded value (max 254 bytes). d is the most decimals, up to 11, that
+    leave room for the column's widest value; columns that do not fit with
+    one decimal (|value| of about 1e17 and over) become F(19, 11) written
+    with an exponent.
+    """
+    given = dict((f[0], f) for f in (fields or []))
+    specs = []
+    for name, col in columns.items():
+        if name in given:
+            specs.append(given[name])
+            continue
+        col = np.asarray(col)
+        if col.dtype.kind == "b":
+            specs.append((name, "L", 1, 0))
+        elif col.dtype.kind in "iu":
+            specs.append((name, "N", 18, 0))
+        elif col.dtype.kind == "f":
+            specs.append(_float_spec(name, col))
+        else:
+            text = _text(col)
+            width = int(np.char.str_len(np.char.encode(text, encoding)).max()) if len(text) else 1
+            specs.append((name, "C", max(1, min(width, 254)), 0))
+    return specs
+
+def _float_spec(name, col):
+    vals = col.astype(np.float64)
+    vals = vals[np.isfinite(vals)]
+    if not len(vals):
+        return (name, "N", FLOAT_WIDTH, FLOAT_DECIMALS)
+    # The widest text is that of the smallest or the largest value.
+    lo, hi = float(vals.min()), float(vals.max())
+    for decimals in range(FLOAT_DECIMALS, 0, -1):
+        if max(len("%.*f" % (decimals, lo)), len("%.*f" % (decimals, hi))) <= FLOAT_WIDTH:
+            return (name, "N", FLOAT_WIDTH, decimals)
+    return (name, "F", FLOAT_WIDTH, FLOAT_DECIMALS)
+
+def _text(col):
+    col = np.asarray(col)
+    if col.dtype.kind == "U":
+        return col
+    if col.dtype.kind == "S":
+        return np.char.decode(col, DBF_ENCODING)
+    vals = [u"" if v is None else u"%s" % (v,) for v in col.tolist()]
+    return np.array(vals) if vals else np.zeros(0, dtype="U1")
+
+def _format_ints(vals, length):
+    # Right-aligned decimal text built digit by digit (np.char.mod is a
+    # Python-level loop and dominates the write time otherwise).
+    vals = np.asarray(vals, dtype=np.int64)
+    neg = vals < 0
+    mag = np.abs(vals)
+    ndig = np.ones(len(vals), dtype=np.int64)
+    p = mag // 10
+    while p.any():
+        ndig += p > 0
+        p //= 10
+    if (ndig + neg > length).any():
+        raise ValueError("Value too wide for a %d-character field" % length)
+    out = np.full((len(vals), length), ord(" "), dtype=np.uint8)
+    for k in range(int(ndig.max()) if len(vals) else 0):
+        rows = k < ndig
+        out[rows, length - 1 - k] = ord("0") + mag[rows] % 10
+        mag //= 10
+    out[neg, length - 1 - ndig[neg]] = ord("-")
+    return out.view("S%d" % length).reshape(len(vals))
+
+def _dbf_values(col, ftype, length, decimals, encoding):
+    # Fixed-width bytes for one column (numbers right-aligned, blanks for NaN).
+    col = np.asarray(col)
+    if ftype == "L":
+        return np.where(col.astype(bool), b"T", b"F").astype("S1")
+    if ftype in "NF":
+        if not decimals and col.dtype.kind in "iub":
+            return _format_ints(col, length)
+        vals = col.astype(np.float64)
+        ok = ~np.isnan(vals)
+        text = np.full(len(col), b" " * length, dtype="S%d" % length)
+        if ok.any():
+            if ftype == "F":
+                num = np.char.encode(np.char.mod("%%.%de" % decimals, vals[ok]), "ascii")
+            elif decimals:
+                num = np.char.encode(np.char.mod("%%.%df" % decimals, vals[ok]), "ascii")
+            else:
+                num = _format_ints(np.round(vals[ok]), length)
+            if num.dtype.itemsize > length:
+                raise ValueError("Value too wide for a %s(%d, %d) field" % (ftype, length, decimals))
+            text[ok] = np.char.rjust(num, length)
+        return text
+    # Text is encoded once per distinct value. Values are cut to the field
+    # width; a multi-byte character cut in half is read back through the
+    # fallback encoding.
+    uniq, inverse = np.unique(_text(col).astype("U%d" % length), return_inverse=True)
+    enc = np.char.ljust(np.char.encode(uniq, encoding).astype("S%d" % length), length)
+    return enc[inverse.reshape(-1)]
+
+def write_dbf(path, columns, n, fields=None, encoding=DBF_ENCODING):
+    """Write a dBASE III table of n rows from an OrderedDict of columns."""
+    specs = field_specs(columns, fields, encoding)
+    record_len = 1 + sum(s[2] for s in specs)
+    header_len = 32 + 32 * len(specs) + 1
+    dtype = np.dtype([("_deleted", "S1")] + [("f%d" % k, "S%d" % s[2]) for k, s in enumerate(specs)])
+    table = np.zeros(n, dtype=dtype)
+    table["_deleted"] = b" "
+    for k, (name, ftype, length, decimals) in enumerate(specs):
+        table["f%d" % k] = _dbf_values(columns[name], ftype, length, decimals, encoding)
+    header = np.zeros(32, dtype=np.uint8)
+    header[0] = 3
+    header[1:4] = (124, 1, 1)
+    header[4:8] = np.array([n], dtype="<u4").view(np.uint8)
+    header[8:10] = np.array([header_len], dtype="<u2").view(np.uint8)
+    header[10:12] = np.array([record_len], dtype="<u2").view(np.uint8)
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        for name, ftype, length, decimals in specs:
+            desc = np.zeros(32, dtype=np.uint8)
+            raw = name.encode("ascii")[:10]
+            desc[:len(raw)] = np.frombuffer(raw, dtype=np.uint8)
+            desc[11] = ord(ftype)
+            desc[16], desc[17] = length, decimals
+            f.write(desc.tobytes())
+        f.write(b"\r")
+        f.write(table.tobytes())
+        f.write(b"\x1a")
+
+def _shp_header(shape_type, file_bytes, bbox):
+    h = np.zeros(100, dtype=np.uint8)
+    h[0:28] = np.array([SHP_FILE_CODE, 0, 0, 0, 0, 0, file_bytes // 2], dtype=">i4").view(np.uint8)
+    h[28:36] = np.array([1000, shape_type], dtype="<i4").view(np.uint8)
+    h[36:100] = np.asarray(bbox, dtype="<f8").view(np.uint8)
+    return h.tobytes()
+
+def write_shp(path, shape_type, xy, part_offsets, feature_offsets):
+    """Write .shp and .shx from FeatureStore-layout arrays in one pass each.
+
+    Features without parts are written as null shapes. For point files
+    every non-null feature must have exactly one vertex. Only 2D shapes
+    (point 1, polyline 3, polygon 5) are written; the Z and M types would
+    need their ranges and arrays as well.
+    """
+    if shape_type not in (SHP_POINT[0], SHP_POLYLINE[0], SHP_POLYGON[0]):
+        raise ValueError("Unsupported shape type %d (only 1, 3 and 5 are written)" % shape_type)
+    xy = np.ascontiguousarray(xy, dtype="<f8").reshape(-1, 2)
+    part_offsets = np.asarray(part_offsets, dtype=np.int64)
+    feature_offsets = np.asarray(feature_offsets, dtype=np.int64)
+    n = len(feature_offsets) - 1
+    n_parts = np.diff(feature_offsets)
+    vstart = part_offsets[feature_offsets[:-1]]
+    n_points = part_offsets[feature_offsets[1:]] - vstart
+    live = np.flatnonzero(n_parts > 0)
+    if shape_type in SHP_POINT:
+        if (n_points[live] != 1).any():
+            raise ValueError("Point shapefiles need exactly one vertex per feature")
+        content = np.where(n_parts > 0, 20, 4)
+    elif shape_type in SHP_POLYLINE + SHP_POLYGON:
+        content = np.where(n_parts > 0, 44 + 4 * n_parts + 16 * n_points, 4)
+    else:
+        raise ValueError("Unsupported shape type %d" % shape_type)
+    rec_start = 100 + np.cumsum(8 + content) - (8 + content)
+    total = 100 + int(np.sum(8 + content))
+    out = np.zeros(total, dtype=np.uint8)
+    _scatter(out, rec_start, np.full(n, 8),
+             np.column_stack((np.arange(1, n + 1), content // 2)).astype(">i4"))
+    rec_type = np.where(n_parts > 0, shape_type, SHP_NULL).astype("<i4")
+    _scatter(out, rec_start + 8, np.full(n, 4), rec_type)
+    if len(live):
+        starts = vstart[live]
+        box = np.column_stack((np.minimum.reduceat(xy[:, 0], starts), np.minimum.reduceat(xy[:, 1], starts),
+                               np.maximum.reduceat(xy[:, 0], starts), np.maximum.reduceat(xy[:, 1], starts)))
+        bbox = [box[:, 0].min(), box[:, 1].min(), box[:, 2].max(), box[:, 3].max(), 0, 0, 0, 0]
+    else:
+        bbox = [0.0] * 8
+    base = rec_start[live] + 12
+    if shape_type in SHP_POINT:
+        _scatter(out, base, np.full(len(live), 16), xy[vstart[live]])
+    else:
+        fixed = np.zeros(len(live), dtype=[("box", "<f8", (4,)), ("np", "<i4"), ("npt", "<i4")])
+        fixed["box"], fixed["np"], fixed["npt"] = box, n_parts[live], n_points[live]
+        _scatter(out, base, np.full(len(live), 40), fixed)
+        # Part starts relative to their own record.
+        rel = part_offsets[:-1] - np.repeat(vstart, n_parts)
+        _scatter(out, base + 40, 4 * n_parts[live], rel.astype("<i4"))
+        # Live features own consecutive rows of xy, so their point blocks
+        # are xy itself, split by record.
+        _scatter(out, base + 40 + 4 * n_parts[live], 16 * n_points[live],
+                 xy[vstart[live[0]]:vstart[live[-1]] + n_points[live[-1]]])
+    out[:100] = np.frombuffer(_shp_header(shape_type, total, bbox), dtype=np.uint8)
+    base_path = os.path.splitext(path)[0]
+    with open(base_path + ".shp", "wb") as f:
+        f.write(out.tobytes())
+    index = np.column_stack((rec_start // 2, content // 2)).astype(">i4")
+    with open(base_path + ".shx", "wb") as f:
+        f.write(_shp_header(shape_type, 100 + 8 * n, bbox))
+        f.write(index.tobytes())
+
+def write_shapefile(path, shape_type, xy, part_offsets, feature_offsets, columns=None, fields=None,
+                    prj=None, encoding=DBF_ENCODING):
+    """Write .shp/.shx/.dbf (plus .cpg, and .prj when prj WKT is given).
+
+    columns is an OrderedDict of name -> array, one value per feature; a
+    shapefile needs at least one field, so an "Id" column of zeros is
+    written when there are none (as ArcMap does).
+    """
+    n = len(feature_offsets) - 1
+    base = os.path.splitext(path)[0]
+    write_shp(base + ".shp", shape_type, xy, part_offsets, feature_offsets)
+    columns = columns if columns else OrderedDict([("Id", np.zeros(n, dtype=np.int64))])
+    write_dbf(base + ".dbf", columns, n, fields, encoding)
+    with open(base + ".cpg", "w") as f:
+        f.write(encoding.upper())
+    if prj:
+        with open(base + ".prj", "w") as f:
+            f.write(prj)
+
+def write_store(path, store, columns=None, fields=None, prj=None, shape_type=SHP_POLYLINE[0]):
+    """Write the features of a FeatureStore (polylines by default)."""
+    write_shapefile(path, shape_type, store.xy, store.part_offsets, store.feature_offsets,
+                    columns, fields, prj)
+
+def write_points(path, x, y, columns=None, fields=None, prj=None):
+    """Write a point shapefile, e.g. QC endpoints with QC_FIELDS columns."""
+    xy = np.column_stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)))
+    offsets = np.arange(len(xy) + 1, dtype=np.int64)
+    write_shapefile(path, SHP_POINT[0], xy, offsets, offsets, columns, fields, prj)
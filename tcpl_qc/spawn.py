@@ -0,0 +1,139 @@
+#... TCPL worker processes started from scratch (Windows, ArcMap) instead of forked
+#
+# Where fork is not available the pools in tcpl_qc run their jobs in new
+# Python processes. multiprocessing's own "spawn" start method is not used:
+# it imports the parent's __main__ again in every worker, and most QC
+# scripts do their work at module level, so every worker would run the
+# whole script. Inside ArcMap it would also start ArcMap.exe, not Python.
+#
+# A worker here is `python -c ...` (python_executable(): the running
+# interpreter, or the python.exe of the installation when Python is
+# embedded, as in ArcMap) that gets its jobs in a pickle file, calls the
+# initializer once, then the function on every job, and pickles the results
+# into another file. Functions go by reference: module and name, or the
+# script's path and name for functions of the script being run, which the
+# worker loads as a module of its own (SCRIPT_MODULE, so its
+# `if __name__ == "__main__"` block does not run). Jobs and results must
+# pickle (protocol 2, so a Python 2.7 parent and worker agree).
+#
+# Jobs are dealt out round robin over the workers up front; results come
+# back in job order.
+
+import os, pickle, shutil, subprocess, sys, tempfile
+
+ROOT            = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_MODULE   = "tcpl_spawned_script"
+PICKLE_PROTOCOL = 2
+# Hosts that embed Python: their executable is not an interpreter, and
+# forking them would copy the whole application.
+EMBEDDING_HOSTS = ("arcmap", "arccatalog", "arcscene", "arcglobe", "arcgispro")
+NO_WINDOW       = 0x08000000   # CREATE_NO_WINDOW: no console for workers started from ArcMap
+
+def python_executable():
+    """Interpreter for worker processes, or None when there is none to be found."""
+    exe = sys.executable or ""
+    name = os.path.basename(exe.replace("\\", "/")).lower()
+    if exe and name.startswith("python") and not name.startswith(EMBEDDING_HOSTS):
+        return exe
+    for folder in (sys.exec_prefix, os.path.dirname(exe)):
+        for name in ("python.exe", "python"):
+            path = os.path.join(folder, name)
+            if folder and os.path.isfile(path):
+                return path
+    return None
+
+def can_spawn():
+    """True when jobs can go to new worker processes here."""
+    return python_executable() is not None
+
+def function_ref(fn):
+    """Picklable reference to a module-level function (of a module, or of the script being run)."""
+    module = getattr(fn, "__module__", None)
+    if module == "__main__":
+        path = getattr(sys.modules["__main__"], "__file__", None)
+        if not path:
+            raise ValueError("%s is defined in an interactive session, not a script" % fn.__name__)
+        return ("script", os.path.abspath(path), fn.__name__)
+    return ("module", module, fn.__name__)
+
+def _load_script(path):
+    if SCRIPT_MODULE in sys.modules:
+        return sys.modules[SCRIPT_MODULE]
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source(SCRIPT_MODULE, path)
+    spec = importlib.util.spec_from_file_location(SCRIPT_MODULE, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[SCRIPT_MODULE] = module
+    spec.loader.exec_module(module)
+    return module
+
+def resolve(ref):
+    """The function a function_ref refers to, imported or loaded here."""
+    kind, where, name = ref
+    if kind == "script":
+        return getattr(_load_script(where), name)
+    __import__(where)
+    return getattr(sys.modules[where], name)
+
+def _serve(path_in, path_out):
+    # Worker side: run the jobs in path_in, results to path_out.
+    with open(path_in, "rb") as f:
+        task = pickle.load(f)
+    for p in reversed(task["sys_path"]):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+    if task["init"] is not None:
+        resolve(task["init"])(*task["initargs"])
+    fn = resolve(task["fn"])
+    out = [(k, fn(job)) for k, job in task["jobs"]]
+    with open(path_out, "wb") as f:
+        pickle.dump(out, f, PICKLE_PROTOCOL)
+
+def spawn_map(fn, jobs, workers, initializer=None, initargs=()):
+    """[fn(job) for job in jobs] on `workers` new processes, in job order.
+
+    initializer(*initargs) runs once in every worker before its jobs. A
+    worker that fails raises RuntimeError here with the end of its stderr.
+    """
+    jobs = list(jobs)
+    workers = max(1, min(workers, len(jobs)))
+    exe = python_executable()
+    if exe is None:
+        raise RuntimeError("no Python interpreter found for worker processes")
+    folder = tempfile.mkdtemp(prefix="tcpl_spawn_")
+    try:
+        procs = []
+        for w in range(workers):
+            path_in, path_out = os.path.join(folder, "%d.in" % w), os.path.join(folder, "%d.out" % w)
+            task = {"sys_path": [ROOT] + [p for p in sys.path if p],
+                    "init": function_ref(initializer) if initializer is not None else None,
+                    "initargs": tuple(initargs), "fn": function_ref(fn),
+                    "jobs": [(k, jobs[k]) for k in range(w, len(jobs), workers)]}
+            with open(path_in, "wb") as f:
+                pickle.dump(task, f, PICKLE_PROTOCOL)
+            code = "import sys; sys.path.insert(0, %r); from tcpl_qc.spawn import _serve; _serve(%r, %r)" % (
+                ROOT, path_in, path_out)
+            err = open(os.path.join(folder, "%d.err" % w), "wb")
+            flags = NO_WINDOW if sys.platform == "win32" else 0
+            procs.append((subprocess.Popen([exe, "-c", code], stdout=err, stderr=err, creationflags=flags),
+                          err, path_out))
+        results = [None] * len(jobs)
+        failed = []
+        for proc, err, path_out in procs:
+            proc.wait()
+            err.close()
+            if proc.returncode != 0 or not os.path.isfile(path_out):
+                with open(err.name, "rb") as f:
+                    failed.append(f.read()[-2000:].decode("utf-8", "replace"))
+                continue
+            with open(path_out, "rb") as f:
+                for k, result in pickle.load(f):
+                    results[k] = result
+        if failed:
+            raise RuntimeError("worker process failed:\n%s" % failed[0])
+        return results
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,143 @@
+#... TCPL columnar polyline store (contiguous NumPy arrays, no geometry objects)
+
+import numpy as np
+
+from tcpl_qc.segments import pack_lines
+
+class Feature(object):
+    """Lightweight view of one row of a FeatureStore; holds no data itself."""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def oid(self):
+        return int(self.store.oid[self.index])
+
+    @property
+    def subtype(self):
+        return int(self.store.subtype[self.index])
+
+    @property
+    def layer(self):
+        return int(self.store.layer[self.index])
+
+    @property
+    def layer_name(self):
+        return self.store.layer_names[self.layer]
+
+    @property
+    def envelope(self):
+        return self.store.env[self.index]
+
+    @property
+    def line(self):
+        return self.store.line(self.index)
+
+    def __repr__(self):
+        return "Feature(layer=%d, oid=%d)" % (self.layer, self.oid)
+
+class FeatureStore(object):
+    """Polylines held as flat arrays.
+
+    oid, subtype and layer are per-feature columns; xy holds every vertex,
+    part k runs xy[part_offsets[k]:part_offsets[k+1]] and feature f owns
+    parts feature_offsets[f] .. feature_offsets[f+1]-1. env is the (n, 4)
+    XMin, YMin, XMax, YMax of each feature (NaN for a feature with no
+    vertices; computed from xy unless given). Indexing returns a Feature
+    view.
+    """
+
+    __slots__ = ("oid", "subtype", "layer", "layer_names", "xy", "part_offsets", "feature_offsets", "env")
+
+    def __init__(self, oid, xy, part_offsets, feature_offsets, subtype=None, layer=None, layer_names=None,
+                 env=None):
+        n = len(feature_offsets) - 1
+        self.oid = np.asarray(oid, dtype=np.int64).reshape(n)
+        self.subtype = (np.full(n, -1, dtype=np.int32) if subtype is None
+                        else np.asarray(subtype, dtype=np.int32).reshape(n))
+        self.layer = (np.zeros(n, dtype=np.int16) if layer is None
+                      else np.asarray(layer, dtype=np.int16).reshape(n))
+        self.layer_names = list(layer_names or [""])
+        self.xy = np.ascontiguousarray(xy, dtype=np.float64).reshape(-1, 2)
+        self.part_offsets = np.asarray(part_offsets, dtype=np.int64)
+        self.feature_offsets = np.asarray(feature_offsets, dtype=np.int64)
+        self.env = self._envelopes() if env is None else np.asarray(env, dtype=np.float64).reshape(n, 4)
+
+    @classmethod
+    def from_lines(cls, oids, lines, subtypes=None, layers=None, layer_names=None):
+        """Build from a list of (xy, offsets) lines, one per OID."""
+        xy, part_offsets, feature_offsets = pack_lines(lines)
+        return cls(oids, xy, part_offsets, feature_offsets, subtypes, layers, layer_names)
+
+    def _envelopes(self):
+        n = len(self)
+        env = np.full((n, 4), np.nan)
+        vstart = self.part_offsets[self.feature_offsets[:-1]]
+        vstop = self.part_offsets[self.feature_offsets[1:]]
+        # Empty features add no vertices, so the non-empty ones tile xy and
+        # reduceat over their starts covers exactly their own vertices.
+        has = np.flatnonzero(vstop > vstart)
+        if len(has):
+            starts = vstart[has]
+            env[has, 0] = np.minimum.reduceat(self.xy[:, 0], starts)
+            env[has, 1] = np.minimum.reduceat(self.xy[:, 1], starts)
+            env[has, 2] = np.maximum.reduceat(self.xy[:, 0], starts)
+            env[has, 3] = np.maximum.reduceat(self.xy[:, 1], starts)
+        return env
+
+    def __len__(self):
+        return len(self.feature_offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Feature(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Feature(self, i)
+
+    def vertex_range(self, i):
+        return (int(self.part_offsets[self.feature_offsets[i]]),
+                int(self.part_offsets[self.feature_offsets[i + 1]]))
+
+    def line(self, i):
+        """(xy, offsets) of feature i; xy is a view into the shared array."""
+        p0, p1 = int(self.feature_offsets[i]), int(self.feature_offsets[i + 1])
+        offsets = self.part_offsets[p0:p1 + 1]
+        base = int(offsets[0])
+        return self.xy[base:int(offsets[-1])], offsets - base
+
+    def lines(self):
+        return [self.line(i) for i in range(len(self))]
+
+    def vertex_owner(self):
+        """Feature index of every vertex in xy."""
+        per_part = np.repeat(np.arange(len(self)), np.diff(self.feature_offsets))
+        return np.repeat(per_part, np.diff(self.part_offsets))
+
+    def with_xy(self, xy):
+        """Same features with replaced coordinates (e.g. after projection)."""
+        return FeatureStore(self.oid, xy, self.part_offsets, self.feature_offsets,
+                            self.subtype, self.layer, self.layer_names)
+
+    def take(self, indices):
+        """New store holding only the given features, in the given order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return FeatureStore.from_lines(self.oid[indices], [self.line(i) for i in indices],
+                                       self.subtype[indices], self.layer[indices], self.layer_names)
+
+    def keys(self):
+        """(layer, oid) of every feature; unique even across layers."""
+        return list(zip(self.layer.tolist(), self.oid.tolist()))
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, a).nbytes for a in ("oid", "subtype", "layer", "xy",
+                                                     "part_offsets", "feature_offsets", "env"))
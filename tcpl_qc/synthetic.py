@@ -0,0 +1,276 @@
+#... TCPL deterministic synthetic networks for benchmarks (metric UTM coordinates)
+#
+# Every generator takes (n, seed) and returns (store, truth): a FeatureStore
+# with exactly n features and a dict of defect name -> sorted feature
+# indices that were injected on purpose. The same (n, seed) always gives
+# the same arrays.
+
+import numpy as np
+
+from tcpl_qc.store import FeatureStore
+
+ROAD_C       = 100152
+TRAIL_C      = 100156
+CART_TRACK_C = 100150
+RIVER_C      = 100314
+DITCH_C      = 100298
+ROAD_SUBTYPES  = (ROAD_C, TRAIL_C, CART_TRACK_C)
+ROAD_WEIGHTS   = (0.6, 0.25, 0.15)
+POLYGON_LAYERS = ("AgricultureSurfaces", "HydrographySurfaces", "PhysiographySurfaces", "VegetationSurfaces")
+
+# UTM zone 44N, somewhere inland; use tmerc.utm_inverse(x, y, UTM_ZONE) for lon/lat.
+UTM_ZONE = 44
+ORIGIN   = (400000.0, 2300000.0)
+GRID_M   = 500.0     # road block size
+BASIN_M  = 8000.0    # spacing of river outlets
+PARCEL_M = 600.0     # spacing of polygons
+DEFECT_RATE = 0.01   # share of features per defect kind
+
+def _pick_defects(rng, n, kinds, rate=DEFECT_RATE):
+    # Disjoint random feature sets, one per defect kind.
+    k = int(round(rate * n))
+    order = rng.permutation(n)
+    return dict((name, np.sort(order[i * k:(i + 1) * k])) for i, name in enumerate(kinds))
+
+def _polylines(a, b, n_vert, wiggle, rng):
+    """(n, n_vert, 2) lines from a to b, bent sideways by up to ~wiggle metres (ends fixed)."""
+    t = np.linspace(0.0, 1.0, n_vert)
+    d = b - a
+    length = np.hypot(d[:, 0], d[:, 1])[:, None]
+    perp = np.column_stack((-d[:, 1], d[:, 0])) / np.maximum(length, 1e-9)
+    amp = rng.normal(0.0, wiggle, (len(a), 1)) * np.sin(np.pi * t)[None, :]
+    amp += rng.normal(0.0, 0.1 * wiggle, (len(a), n_vert)) * np.sin(np.pi * t)[None, :]
+    return a[:, None, :] + t[None, :, None] * d[:, None, :] + amp[:, :, None] * perp[:, None, :]
+
+def _store(lines, subtypes, layers=None, layer_names=None):
+    n, k = lines.shape[:2]
+    offsets = np.arange(0, n * k + 1, k, dtype=np.int64)
+    return FeatureStore(np.arange(n), lines.reshape(-1, 2), offsets, np.arange(n + 1),
+                        subtypes, layers, layer_names)
+
+def _side_piece(lines, rng):
+    # A 60-180 m piece running alongside each given line, 20-150 m off it.
+    a, b = lines[:, 0], lines[:, -1]
+    d = b - a
+    length = np.maximum(np.hypot(d[:, 0], d[:, 1]), 1e-9)[:, None]
+    u = d / length
+    perp = np.column_stack((-u[:, 1], u[:, 0])) * np.where(rng.rand(len(a)) < 0.5, -1.0, 1.0)[:, None]
+    start = a + u * rng.uniform(0.2, 0.5, (len(a), 1)) * length + perp * rng.uniform(20.0, 150.0, (len(a), 1))
+    end = start + u * rng.uniform(60.0, 180.0, (len(a), 1))
+    return start, end
+
+def road_network(n, seed=0):
+    """Grid-plus-noise road network of n lines (6 vertices each).
+
+    Roads follow the edges of a jittered grid of GRID_M blocks and meet
+    exactly at the grid nodes. Injected defects:
+    dangle     end pulled 5-40 m back from its junction (near, not snapped)
+    near_miss  end pushed 0.5-3 m sideways off its junction
+    short_gap  line replaced by a 60-180 m piece 20-150 m beside a road
+    """
+    rng = np.random.RandomState(seed)
+    g = int(np.ceil(np.sqrt(n / 2.0))) + 1
+    nodes = (np.stack(np.meshgrid(np.arange(g), np.arange(g), indexing="ij"), -1).reshape(-1, 2) * GRID_M
+             + ORIGIN + rng.normal(0.0, 40.0, (g * g, 2)))
+    ids = np.arange(g * g).reshape(g, g)
+    edges = np.vstack((np.column_stack((ids[:-1, :].ravel(), ids[1:, :].ravel())),
+                       np.column_stack((ids[:, :-1].ravel(), ids[:, 1:].ravel()))))
+    edges = edges[rng.permutation(len(edges))[:n]]
+    lines = _polylines(nodes[edges[:, 0]], nodes[edges[:, 1]], 6, 15.0, rng)
+    subtypes = np.array(ROAD_SUBTYPES)[rng.choice(len(ROAD_SUBTYPES), n, p=ROAD_WEIGHTS)]
+    truth = _pick_defects(rng, n, ("dangle", "near_miss", "short_gap"))
+
+    i = truth["dangle"]
+    a, b = lines[i, -2], lines[i, -1]
+    u = (b - a) / np.maximum(np.hypot(*(b - a).T), 1e-9)[:, None]
+    lines[i, -1] = b - u * rng.uniform(5.0, 40.0, (len(i), 1))
+    i = truth["near_miss"]
+    a, b = lines[i, -2], lines[i, -1]
+    u = (b - a) / np.maximum(np.hypot(*(b - a).T), 1e-9)[:, None]
+    lines[i, -1] = b + np.column_stack((-u[:, 1], u[:, 0])) * rng.uniform(0.5, 3.0, (len(i), 1))
+    i = truth["short_gap"]
+    host = lines[rng.randint(0, n, len(i))]
+    start, end = _side_piece(host, rng)
+    lines[i] = _polylines(start, end, 6, 2.0, rng)
+    return _store(lines, subtypes), truth
+
+def river_network(n, seed=0):
+    """Dendritic river network of n lines (8 vertices each, drawn downstream).
+
+    One main stem per basin (outlets BASIN_M apart); every tributary ends
+    exactly on an inner vertex of an earlier line, branching 30-70 degrees
+    upstream. Stems and first tributaries are RIVER_C, the rest DITCH_C.
+    Injected defects:
+    dangle     mouth pulled 5-40 m back from the parent line
+    near_miss  mouth moved onto the parent between two vertices
+    short_gap  line replaced by a 60-180 m piece 20-150 m beside a river
+    """
+    rng = np.random.RandomState(seed)
+    k = 8
+    n_roots = max(1, min(n, n // 50))
+    side = int(np.ceil(np.sqrt(n_roots)))
+    cell = np.arange(n_roots)
+    mouth = (np.column_stack((cell // side, cell % side)) * BASIN_M + ORIGIN
+             + rng.uniform(-0.2, 0.2, (n_roots, 2)) * BASIN_M)
+    ang = rng.uniform(0.0, 2.0 * np.pi, n_roots)
+    length = rng.uniform(2000.0, 4000.0, n_roots)
+    source = mouth + np.column_stack((np.cos(ang), np.sin(ang))) * length[:, None]
+    lines = np.empty((n, k, 2))
+    depth = np.zeros(n, dtype=np.int64)
+    parent = np.full(n, -1, dtype=np.int64)
+    joint = np.full(n, -1, dtype=np.int64)
+    lines[:n_roots] = _polylines(source, mouth, k, 60.0, rng)
+    count = n_roots
+    while count < n:
+        m = min(n - count, count)
+        par = rng.randint(0, count, m)
+        j = rng.randint(1, k - 1, m)
+        at = lines[par, j]
+        up = lines[par, j - 1] - at
+        up_ang = np.arctan2(up[:, 1], up[:, 0])
+        turn = rng.uniform(np.radians(30.0), np.radians(70.0), m) * np.where(rng.rand(m) < 0.5, -1.0, 1.0)
+        plen = np.hypot(*(lines[par, 0] - lines[par, -1]).T)
+        clen = np.maximum(150.0, plen * rng.uniform(0.4, 0.8, m))
+        src = at + np.column_stack((np.cos(up_ang + turn), np.sin(up_ang + turn))) * clen[:, None]
+        lines[count:count + m] = _polylines(src, at, k, 0.03 * clen.mean(), rng)
+        depth[count:count + m] = depth[par] + 1
+        parent[count:count + m] = par
+        joint[count:count + m] = j
+        count += m
+    subtypes = np.where(depth <= 1, RIVER_C, DITCH_C)
+    tribs = np.flatnonzero(parent >= 0)
+    picked = _pick_defects(rng, len(tribs), ("dangle", "near_miss", "short_gap"))
+    truth = dict((name, tribs[idx]) for name, idx in picked.items())
+
+    i = truth["dangle"]
+    a, b = lines[i, -2], lines[i, -1]
+    u = (b - a) / np.maximum(np.hypot(*(b - a).T), 1e-9)[:, None]
+    lines[i, -1] = b - u * rng.uniform(5.0, 40.0, (len(i), 1))
+    i = truth["near_miss"]
+    p, j = parent[i], joint[i]
+    lines[i, -1] = 0.5 * (lines[p, j] + lines[p, j + 1])
+    i = truth["short_gap"]
+    start, end = _side_piece(lines[parent[i]], rng)
+    lines[i] = _polylines(start, end, k, 2.0, rng)
+    return _store(lines, subtypes), truth
+
+def polygon_layer(n, seed=0):
+    """n dumbbell polygons (two squares joined by a neck), one ring each.
+
+    Squares are 60-200 m, necks 5-100 m wide and 20-80 m long; rings are
+    closed and clockwise (shapefile outer rings). Features are spread over
+    the four POLYGON_LAYERS. truth["narrow"] are those with a neck
+    narrower than 50 m.
+    """
+    rng = np.random.RandomState(seed)
+    s = rng.uniform(60.0, 200.0, n)
+    w = rng.uniform(5.0, 100.0, n)
+    w = np.minimum(w, 0.8 * s)
+    h = rng.uniform(10.0, 40.0, n)
+    xs = np.column_stack((-h - s, -h - s, -h, -h, h, h, h + s, h + s, h, h, -h, -h, -h - s))
+    ys = np.column_stack((-s, s, s, w, w, s, s, -s, -s, -w, -w, -s, -s)) / 2.0
+    ang = rng.uniform(0.0, np.pi, n)[:, None]
+    side = int(np.ceil(np.sqrt(n)))
+    cell = np.arange(n)
+    centre = (np.column_stack((cell // side, cell % side)) * PARCEL_M + ORIGIN
+              + rng.uniform(-50.0, 50.0, (n, 2)))
+    lines = np.stack((xs * np.cos(ang) - ys * np.sin(ang) + centre[:, 0:1],
+                      xs * np.sin(ang) + ys * np.cos(ang) + centre[:, 1:2]), -1)
+    layers = rng.randint(0, len(POLYGON_LAYERS), n)
+    store = _store(lines, np.full(n, -1), layers, list(POLYGON_LAYERS))
+    return store, {"narrow": np.flatnonzero(w < 50.0)}
+
+def large_polygon_layer(n, seed=0, vertices=10000):
+    """n large polygons of about `vertices` vertices: two wavy blobs joined by a neck.
+
+    Blobs are 400-1200 m in radius with a few per cent of smooth boundary
+    noise, necks 5-100 m wide and 40-200 m long; every other polygon has a
+    round hole of 50-150 m in its first blob. Outer rings are clockwise and
+    holes counter-clockwise (shapefile order). Features are spread over the
+    four POLYGON_LAYERS. truth["narrow"] are those with a neck narrower
+    than 50 m; nowhere else is a polygon narrower than that.
+    """
+    rng = np.random.RandomState(seed)
+    rb = rng.uniform(400.0, 1200.0, (n, 2))
+    w = rng.uniform(5.0, 100.0, n)
+    neck = rng.uniform(40.0, 200.0, n)
+    hole_r = rng.uniform(50.0, 150.0, n)
+    ang = rng.uniform(0.0, np.pi, n)
+    layers = rng.randint(0, len(POLYGON_LAYERS), n)
+    side = int(np.ceil(np.sqrt(n)))
+    spacing = 2.0 * 1.05 * 1200.0 + 200.0 + 600.0
+    m = max(8, vertices // 2)
+    lines = []
+    for k in range(n):
+        a = np.arcsin(w[k] / 2.0 / rb[k])                  # neck attachment angle on each blob
+        cx = neck[k] / 2.0 + rb[k] * np.cos(a)
+        parts = []
+        for b, (c, t0) in enumerate(((-cx[0], a[0]), (cx[1], np.pi + a[1]))):
+            sweep = 2.0 * np.pi - 2.0 * a[b]
+            t = np.linspace(t0, t0 + sweep, m)
+            noise = np.zeros(m)
+            for f in rng.randint(3, 9, 3):
+                # Whole half-waves over the sweep, so the noise is zero where the neck joins.
+                noise += rng.uniform(0.0, 0.012) * np.sin(f * np.pi * (t - t0) / sweep)
+            r = rb[k, b] * (1.0 + noise)
+            parts.append(np.column_stack((c + r * np.cos(t), r * np.sin(t))))
+        outer = np.vstack(parts + [parts[0][:1]])[::-1]   # counter-clockwise built, stored clockwise
+        rings = [outer]
+        if k % 2 == 0:
+            t = np.linspace(0.0, 2.0 * np.pi, max(8, m // 20))
+            rings.append(np.column_stack((-cx[0] + hole_r[k] * np.cos(t), hole_r[k] * np.sin(t))))
+        xy = np.vstack(rings)
+        rot = np.array([[np.cos(ang[k]), np.sin(ang[k])], [-np.sin(ang[k]), np.cos(ang[k])]])
+        centre = np.array([k // side, k % side]) * spacing + ORIGIN
+        offsets = np.cumsum([0] + [len(ring) for ring in rings])
+        lines.append((xy.dot(rot) + centre, offsets))
+    store = FeatureStore.from_lines(np.arange(n), lines, np.full(n, -1), layers, list(POLYGON_LAYERS))
+    return store, {"narrow": np.flatnonzero(w < 50.0)}
+
+def corridor_layer(n, seed=0):
+    """n polygons with straight sides: strips, L corridors and squares with holes.
+
+    Four kinds in turn: a strip (rectangle 60-600 m long), an L corridor
+    (arms 60-400 m, at least three times as long as wide), a 300 m square with a square hole 20-180 m from one of
+    its sides, and a 300 m square with a triangular hole touching its
+    side. Strips, corridors and gaps are 5-40 m or 60-100 m wide, away from
+    the 50 m threshold where the corner of an L is itself half narrow.
+    Outer rings are clockwise and holes counter-clockwise. truth["narrow"]
+    are those narrower than 50 m somewhere; truth["area"] is the area
+    narrower than that per feature where it is exact (strips and
+    corridors), NaN elsewhere.
+    """
+    rng = np.random.RandomState(seed)
+    w = np.where(rng.rand(n) < 0.5, rng.uniform(5.0, 40.0, n), rng.uniform(60.0, 100.0, n))
+    length = rng.uniform(60.0, 600.0, n)
+    ang = rng.uniform(0.0, np.pi, n)
+    layers = rng.randint(0, len(POLYGON_LAYERS), n)
+    side = int(np.ceil(np.sqrt(n)))
+    narrow = np.zeros(n, dtype=bool)
+    area = np.full(n, np.nan)
+    lines = []
+    for k in range(n):
+        kind = k % 4
+        if kind == 0:
+            rings = [[(0, 0), (0, w[k]), (length[k], w[k]), (length[k], 0)]]
+            narrow[k] = w[k] < 50.0
+            area[k] = w[k] * length[k] if narrow[k] else 0.0
+        elif kind == 1:
+            arm = min(max(length[k], 3.0 * w[k]), 400.0)
+            rings = [[(0, 0), (0, arm), (w[k], arm), (w[k], w[k]), (arm, w[k]), (arm, 0)]]
+            narrow[k] = w[k] < 50.0
+            area[k] = (2.0 * arm - w[k]) * w[k] if narrow[k] else 0.0
+        elif kind == 2:
+            rings = [[(0, 0), (0, 300), (300, 300), (300, 0)],
+                     [(60, w[k]), (240, w[k]), (240, 240), (60, 240)]]
+            narrow[k] = w[k] < 50.0
+        else:
+            rings = [[(0, 0), (0, 300), (300, 300), (300, 0)], [(150, 0), (220, 120), (80, 120)]]
+            narrow[k] = True
+        rot = np.array([[np.cos(ang[k]), np.sin(ang[k])], [-np.sin(ang[k]), np.cos(ang[k])]])
+        centre = np.array([k // side, k % side]) * PARCEL_M + ORIGIN
+        closed = [np.array(r + r[:1], dtype=np.float64) for r in rings]
+        offsets = np.cumsum([0] + [len(r) for r in closed])
+        lines.append((np.vstack(closed).dot(rot) + centre, offsets))
+    store = FeatureStore.from_lines(np.arange(n), lines, np.full(n, -1), layers, list(POLYGON_LAYERS))
+    return store, {"narrow": np.flatnonzero(narrow), "area": area}
@@ -0,0 +1,143 @@
+#... TCPL tile-partitioned gap check across worker processes
+#
+# Features are split into tiles of about equal count (x slabs, then y within
+# each slab, like the STR packing in tcpl_qc.rtree). A tile owns its
+# features; its worker also gets every feature whose envelope lies within
+# the search radius of the owned extent (the halo), so no pair is cut by a
+# tile border. Each candidate pair is evaluated only by the tile that owns
+# its lower-indexed feature, so nothing is counted twice, and the merged
+# sets equal those of a serial gap_check.
+#
+# Workers are forked where fork is available. On Windows and in ArcMap's
+# Python 2.7 they are new Python processes (tcpl_qc.spawn) that get their
+# tiles pickled: a tile job is plain arrays and the radius, so nothing but
+# this module has to be loaded there. Only without an interpreter to start
+# do the tiles run one after another in this process; the result is the
+# same every way.
+
+import math
+import multiprocessing
+import sys
+
+import numpy as np
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+
+from tcpl_qc.checks import gap_check, gap_pairs, valid_features
+from tcpl_qc.grid_hash import candidate_pairs
+from tcpl_qc.spawn import EMBEDDING_HOSTS, can_spawn, spawn_map
+from tcpl_qc.store import FeatureStore
+
+TILES_PER_WORKER = 4
+# Halo slack so float rounding never drops a pair the serial check would test.
+HALO_SLACK = 1e-6
+
+def _ranges(starts, counts):
+    # Concatenation of arange(s, s + c) for every (s, c).
+    counts = np.asarray(counts, dtype=np.int64)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(np.asarray(starts, dtype=np.int64), counts) + np.arange(int(counts.sum())) - first
+
+def subset_arrays(store, sel):
+    """(xy, part_offsets, feature_offsets, env) of the features sel, gathered without a Python loop."""
+    sel = np.asarray(sel, dtype=np.int64)
+    fo, po = store.feature_offsets, store.part_offsets
+    n_parts = fo[sel + 1] - fo[sel]
+    parts = _ranges(fo[sel], n_parts)
+    n_verts = po[parts + 1] - po[parts]
+    verts = _ranges(po[parts], n_verts)
+    part_offsets = np.concatenate(([0], np.cumsum(n_verts))).astype(np.int64)
+    feature_offsets = np.concatenate(([0], np.cumsum(n_parts))).astype(np.int64)
+    return store.xy[verts], part_offsets, feature_offsets, store.env[sel]
+
+def balanced_tiles(env, n_tiles):
+    """Split envelope rows into about n_tiles groups of equal size by their centres."""
+    cx = 0.5 * (env[:, 0] + env[:, 2])
+    cy = 0.5 * (env[:, 1] + env[:, 3])
+    s = max(1, int(math.ceil(math.sqrt(n_tiles))))
+    tiles = []
+    for slab in np.array_split(np.argsort(cx, kind="mergesort"), s):
+        slab = slab[np.argsort(cy[slab], kind="mergesort")]
+        tiles.extend(t for t in np.array_split(slab, s) if len(t))
+    return tiles
+
+def _gap_tile(job):
+    # Worker: pairs owned by one tile -> (global mutual, global onesided, pairs tested).
+    tile, ids, owner, xy, part_offsets, feature_offsets, env, radius = job
+    local = FeatureStore(ids, xy, part_offsets, feature_offsets, env=env)
+    cand_i, cand_j = candidate_pairs(env, radius)
+    first = np.where(ids[cand_i] < ids[cand_j], cand_i, cand_j)
+    mine = owner[first] == tile
+    cand_i, cand_j = cand_i[mine], cand_j[mine]
+    mutual, onesided = gap_pairs(local, cand_i, cand_j, radius)
+    return ([int(ids[i]) for i in mutual], [int(ids[i]) for i in onesided], len(cand_i))
+
+def gap_jobs(store, radius, n_tiles):
+    """One job per tile: owned features plus the halo within radius of their extent."""
+    idx = valid_features(store)
+    env = store.env[idx]
+    owner = np.full(len(store), -1, dtype=np.int64)
+    tiles = balanced_tiles(env, n_tiles)
+    for t, rows in enumerate(tiles):
+        owner[idx[rows]] = t
+    halo = radius * (1.0 + HALO_SLACK) + HALO_SLACK
+    jobs = []
+    for t, rows in enumerate(tiles):
+        box = env[rows]
+        x0, y0 = box[:, 0].min() - halo, box[:, 1].min() - halo
+        x1, y1 = box[:, 2].max() + halo, box[:, 3].max() + halo
+        near = (env[:, 0] <= x1) & (env[:, 2] >= x0) & (env[:, 1] <= y1) & (env[:, 3] >= y0)
+        sel = idx[near]
+        xy, po, fo, senv = subset_arrays(store, sel)
+        jobs.append((t, sel, owner[sel], xy, po, fo, senv, radius))
+    return jobs
+
+def can_fork():
+    """True when tiles can go to forked worker processes here."""
+    if ProcessPoolExecutor is None or sys.version_info < (3, 7):
+        return False
+    host = sys.executable and sys.executable.replace("\\", "/").rsplit("/", 1)[-1].lower()
+    if host and host.startswith(EMBEDDING_HOSTS):
+        return False
+    return "fork" in multiprocessing.get_all_start_methods()
+
+def parallel_gap_check(store, radius, workers=None, n_tiles=None, stats=None):
+    """gap_check split into halo tiles and run on up to `workers` processes.
+
+    workers None or 0 means one per CPU. Returns the same (keep_mutual,
+    keep_onesided) sets as gap_check; with one worker, or where processes
+    can be neither forked nor spawned, gap_check itself runs. stats gets the
+    same counters as gap_check plus gap_workers (processes actually used)
+    and gap_tiles.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    fork = can_fork()
+    if workers <= 1 or not (fork or can_spawn()):
+        if stats is not None:
+            stats["gap_workers"] = 1
+        return gap_check(store, radius, stats=stats)
+    n_tiles = n_tiles or workers * TILES_PER_WORKER
+    jobs = gap_jobs(store, radius, n_tiles)
+    keep_mutual, keep_onesided = set(), set()
+    tested = 0
+    if fork:
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+            done = list(ex.map(_gap_tile, jobs))
+    else:
+        done = spawn_map(_gap_tile, jobs, workers)
+    for mutual, onesided, n_pairs in done:
+        keep_mutual.update(mutual)
+        keep_onesided.update(onesided)
+        tested += n_pairs
+    if stats is not None:
+        n = len(valid_features(store))
+        stats["pairs_tested"] += tested
+        stats["pairs_pruned"] += n * (n - 1) // 2 - tested
+        stats["predicate_calls"] += tested
+        stats["gap_workers"] = workers
+        stats["gap_tiles"] = len(jobs)
+    return keep_mutual, keep_onesided
@@ -0,0 +1,573 @@
+#... TCPL triangulation-based width of polygons (narrow parts < THRESHOLD_M)
+#
+# Each polygon is cut into triangles and every triangle gets the width of
+# the polygon across it; the triangles narrower than the threshold are
+# merged into that polygon's narrow part, less the parts under the minimum
+# area. No buffers and no grid: the result follows the polygon's own
+# vertices.
+#
+# Triangulation. Ring edges longer than SPACING times the threshold
+# first get vertices in between, so that a strip between two long
+# straight edges is cut into triangles across it. Holes are bridged into
+# their outer ring (from the hole's rightmost vertex to a visible vertex
+# of the ring, as in Eberly's ear clipping; a hole touching the ring is
+# spliced in where it touches) and the single ring left is ear clipped.
+# Ears are found for all vertices of the ring at once: a convex vertex
+# is an ear when no other non-convex vertex lies in its triangle. Ears
+# whose closing edge is short next to their neighbours' go first, and
+# ears with no neighbouring ear chosen as well are clipped together,
+# since their triangles cannot overlap, so a round costs one pass over
+# the ring. Edge flips (Lawson) then turn the ear clipping into the
+# constrained Delaunay triangulation, again every internal edge at once
+# and each triangle in one flip per round. Delaunay triangles are as fat
+# as the boundary allows, so the widths below stay local. Narrow
+# triangles are made of short edges, so only quads where one diagonal is
+# shorter than FLIP_REACH times the width are flipped: across the wide
+# inside of a large polygon, with thousands of boundary vertices, the
+# long flips would be almost all the work and change no narrow triangle.
+#
+# Width. An internal edge is a chord across the polygon when its ends lie
+# on different rings, or at least pi / 2 times its length apart along
+# their ring: the boundary between them bends at least as much as a half
+# circle. Chords along a smooth boundary, and across a disk wider than the
+# threshold, are then no widths. The other internal edges count as
+# boundary, and a triangle with
+#   one chord        (a tip) is as wide as the chord,
+#   two chords       (a sleeve) as the distance from the vertex between
+#                    them to its ring edge,
+#   three chords     (a junction) as its longest chord, and so is a sleeve
+#                    whose third edge is internal (it only cuts off a bay,
+#                    the polygon goes on beyond it),
+#   no chord         is not narrow, unless two of its edges are ring
+#                    edges (a cap: the end of a strip, or a corner); then
+#                    it is as wide as the triangle across its third edge,
+#                    or as its inscribed circle if that is wider,
+# and a ring that is a single triangle is as wide as its inscribed circle.
+# Corners sharper than about 80 degrees come out narrow near their tip (a
+# spike); blunter ones, which the opening rounds off, do not, so at
+# corners the areas are smaller than those of the opening.
+
+import numpy as np
+
+from tcpl_qc.opening_windows import _holes, boundary_segments
+from tcpl_qc.segments import connected_components
+from tcpl_qc.store import FeatureStore
+
+PAIR_CHUNK  = 2000000   # vertex / triangle pairs tested per batch
+FLIP_ROUNDS = 10000     # bound on edge flip rounds per polygon
+FLIP_REACH  = 2.0       # edges flipped while a diagonal is shorter than this times the width
+CHORD_BEND  = np.pi / 2.0
+EAR_SLACK   = 1.5       # an ear waits while a neighbouring ear closes with an edge this many times shorter
+SPACING     = 0.5       # ring edges longer than this times the width get vertices in between
+
+def _ranges(starts, counts):
+    # Concatenation of arange(s, s + c) for every (s, c).
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(int(counts.sum())) - first
+
+def _member(x, keys):
+    # x in the sorted keys, elementwise (np.isin is newer than ArcMap's NumPy).
+    if not len(keys):
+        return np.zeros(np.shape(x), dtype=bool)
+    pos = np.minimum(np.searchsorted(keys, x), len(keys) - 1)
+    return keys[pos] == x
+
+def _cross(o, u, w):
+    return (u[..., 0] - o[..., 0]) * (w[..., 1] - o[..., 1]) - (u[..., 1] - o[..., 1]) * (w[..., 0] - o[..., 0])
+
+def _in_circle(pa, pb, pc, pd):
+    # True where pd lies inside the circle through the counter-clockwise pa, pb, pc.
+    ax, ay = pa[:, 0] - pd[:, 0], pa[:, 1] - pd[:, 1]
+    bx, by = pb[:, 0] - pd[:, 0], pb[:, 1] - pd[:, 1]
+    cx, cy = pc[:, 0] - pd[:, 0], pc[:, 1] - pd[:, 1]
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    det = a2 * (bx * cy - cx * by) - b2 * (ax * cy - cx * ay) + c2 * (ax * by - bx * ay)
+    scale = np.maximum(np.maximum(a2, b2), c2)
+    return det > 1e-10 * scale * scale
+
+def _signed_area(xy, ring):
+    p = xy[ring]
+    q = np.roll(p, -1, axis=0)
+    return 0.5 * float((p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]).sum())
+
+def _drop_flat(xy, ring):
+    # Vertices on the straight line through their neighbours (and zero-width
+    # spikes) until none are left; they add nothing to the shape.
+    while len(ring) > 3:
+        p, v, n = xy[np.roll(ring, 1)], xy[ring], xy[np.roll(ring, -1)]
+        d1, d2 = v - p, n - v
+        scale = np.hypot(d1[:, 0], d1[:, 1]) * np.hypot(d2[:, 0], d2[:, 1])
+        flat = np.abs(_cross(p, v, n)) <= 1e-12 * scale
+        if not flat.any():
+            break
+        ring = ring[~flat]
+        ring = ring[(xy[ring] != xy[np.roll(ring, -1)]).any(axis=1)]
+    return ring
+
+def _inside_triangles(tri, pts):
+    """For (k, 3, 2) triangles: True where some point lies in or on the triangle, apart from its corners."""
+    hit = np.zeros(len(tri), dtype=bool)
+    if not len(tri) or not len(pts):
+        return hit
+    order = np.argsort(pts[:, 0], kind="mergesort")
+    px = pts[order, 0]
+    lo = np.searchsorted(px, tri[:, :, 0].min(axis=1), side="left")
+    hi = np.searchsorted(px, tri[:, :, 0].max(axis=1), side="right")
+    counts = hi - lo
+    ymin, ymax = tri[:, :, 1].min(axis=1), tri[:, :, 1].max(axis=1)
+    cum = np.cumsum(counts)
+    t0 = 0
+    while t0 < len(tri):
+        base = cum[t0 - 1] if t0 else 0
+        t1 = max(t0 + 1, int(np.searchsorted(cum, base + PAIR_CHUNK, side="right")))
+        rows = np.arange(t0, min(t1, len(tri)))
+        t0 = t1
+        t = np.repeat(rows, counts[rows])
+        if not len(t):
+            continue
+        q = pts[order[_ranges(lo[rows], counts[rows])]]
+        keep = (q[:, 1] >= ymin[t]) & (q[:, 1] <= ymax[t])
+        t, q = t[keep], q[keep]
+        a, b, c = tri[t, 0], tri[t, 1], tri[t, 2]
+        corner = (q == a).all(axis=1) | (q == b).all(axis=1) | (q == c).all(axis=1)
+        inside = (_cross(a, b, q) >= 0) & (_cross(b, c, q) >= 0) & (_cross(c, a, q) >= 0) & ~corner
+        hit[t[inside]] = True
+    return hit
+
+def _touch(xy, ring, hole):
+    # (position in hole, ring edge, at the edge's first end) of a hole
+    # vertex on an edge of the ring, or None.
+    a, b = xy[ring], xy[np.roll(ring, -1)]
+    d = b - a
+    size = np.hypot(d[:, 0], d[:, 1])
+    tol = 1e-9 * np.abs(a).max() * size
+    step = max(1, PAIR_CHUNK // len(ring))
+    for i0 in range(0, len(hole), step):
+        off = xy[hole[i0:i0 + step]][:, None] - a
+        cross = d[:, 0] * off[:, :, 1] - d[:, 1] * off[:, :, 0]
+        t = d[:, 0] * off[:, :, 0] + d[:, 1] * off[:, :, 1]
+        on = (np.abs(cross) <= tol) & (t >= -tol) & (t < size * size - tol)
+        if on.any():
+            i, k = np.argwhere(on)[0]
+            return i0 + int(i), int(k), bool(t[i, k] <= tol[k])
+    return None
+
+def _bridge(xy, ring, hole):
+    """ring with hole spliced in: ring counter-clockwise, hole clockwise."""
+    touch = _touch(xy, ring, hole)
+    if touch is not None:
+        # The hole touches the ring: spliced in there, with the ring's
+        # vertex standing for the hole's where both are at one point.
+        i, k, at_start = touch
+        loop = np.roll(hole, -i)
+        loop = np.r_[loop[1:], loop[:1]] if at_start else np.r_[loop, loop[:1]]
+        return np.concatenate((ring[:k + 1], loop, ring[k + 1:]))
+    h = hole[np.argmax(xy[hole, 0])]
+    hx, hy = xy[h]
+    a, b = xy[ring], xy[np.roll(ring, -1)]
+    spans = ((a[:, 1] <= hy) & (b[:, 1] >= hy)) | ((a[:, 1] >= hy) & (b[:, 1] <= hy))
+    dy = b[:, 1] - a[:, 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = np.where(dy != 0, a[:, 0] + (hy - a[:, 1]) * (b[:, 0] - a[:, 0]) / dy,
+                     np.minimum(a[:, 0], b[:, 0]))
+    x = np.where(spans & (x >= hx), x, np.inf)
+    k = int(np.argmin(x))
+    if not np.isfinite(x[k]):
+        raise ValueError("hole is not inside its ring")
+    # The end of the hit edge farther along the ray is visible unless a
+    # reflex vertex lies in the triangle it spans with the hit point; then
+    # the one of those closest in angle to the ray is.
+    pos = k if a[k, 0] >= b[k, 0] else (k + 1) % len(ring)
+    if (b[k] == (x[k], hy)).all():
+        pos = (k + 1) % len(ring)
+    elif (a[k] == (x[k], hy)).all():
+        pos = k
+    m = xy[ring[pos]]
+    hit = np.array([x[k], hy])
+    p, n = xy[np.roll(ring, 1)], xy[np.roll(ring, -1)]
+    reflex = _cross(p, xy[ring], n) <= 0
+    tri = np.array([[hx, hy], hit, m]) if _cross(np.array([hx, hy]), hit, m) >= 0 \
+        else np.array([[hx, hy], m, hit])
+    cand = np.flatnonzero(reflex)
+    if len(cand) and (m != hit).any():
+        q = xy[ring[cand]]
+        ins = (_cross(tri[0], tri[1], q) > 0) & (_cross(tri[1], tri[2], q) > 0) & (_cross(tri[2], tri[0], q) > 0)
+        if ins.any():
+            cand, q = cand[ins], q[ins]
+            ang = np.abs(q[:, 1] - hy) / np.maximum(q[:, 0] - hx, 1e-300)
+            best = np.lexsort((np.hypot(q[:, 0] - hx, q[:, 1] - hy), ang))[0]
+            pos = int(cand[best])
+    # A vertex bridged before appears more than once; splice at the copy
+    # whose interior wedge the bridge leaves through.
+    copies = np.flatnonzero(ring == ring[pos])
+    if len(copies) > 1:
+        m = xy[ring[pos]]
+        d = np.array([hx, hy]) - m
+        for i in copies:
+            e1 = xy[ring[(i + 1) % len(ring)]] - m
+            e2 = xy[ring[i - 1]] - m
+            c1, c2 = e1[0] * d[1] - e1[1] * d[0], d[0] * e2[1] - d[1] * e2[0]
+            if (e1[0] * e2[1] - e1[1] * e2[0] > 0 and c1 > 0 and c2 > 0) or \
+                    (e1[0] * e2[1] - e1[1] * e2[0] <= 0 and (c1 > 0 or c2 > 0)):
+                pos = int(i)
+                break
+    j = int(np.flatnonzero(hole == h)[0])
+    loop = np.concatenate((np.roll(hole, -j), [h]))
+    return np.concatenate((ring[:pos + 1], loop, ring[pos:]))
+
+def ear_clip(xy, ring, max_edge=None, stats=None):
+    """(k, 3) counter-clockwise triangles of a counter-clockwise ring of vertex indices.
+
+    Vertices may repeat (bridges to holes). An ear waits while a
+    neighbouring ear closes the ring with an edge EAR_SLACK times shorter,
+    and with max_edge ears closing it with an edge shorter than that go
+    first: narrow parts are cut straight across instead of into fans from
+    their ends, which flips could not undo across the vertices put on
+    straight ring edges (the quads there are not convex). stats gets
+    ear_rounds and ears_forced (no ear left, the flattest convex vertex clipped; only on
+    self-intersecting rings).
+    """
+    out = []
+    rounds = forced = 0
+    ring = np.asarray(ring, dtype=np.int64)
+    while len(ring) >= 3:
+        rounds += 1
+        p, v, n = np.roll(ring, 1), ring, np.roll(ring, -1)
+        cross = _cross(xy[p], xy[v], xy[n])
+        # Vertices put on a ring edge are only straight up to rounding.
+        d1, d2 = xy[v] - xy[p], xy[n] - xy[v]
+        convex = cross > 1e-9 * np.hypot(d1[:, 0], d1[:, 1]) * np.hypot(d2[:, 0], d2[:, 1])
+        cand = np.flatnonzero(convex)
+        tri = np.concatenate((xy[p[cand]][:, None], xy[v[cand]][:, None], xy[n[cand]][:, None]), axis=1)
+        ear = np.zeros(len(ring), dtype=bool)
+        ear[cand] = ~_inside_triangles(tri, xy[ring[~convex]])
+        if not ear.any():
+            if not len(cand):
+                break
+            forced += 1
+            ear[cand[np.argmin(cross[cand])]] = True
+        close = np.where(ear, np.hypot(*(xy[n] - xy[p]).T), np.inf)
+        if max_edge is not None and (close < max_edge).any():
+            close[close >= max_edge] = np.inf
+        ear = np.isfinite(close) & (close <= EAR_SLACK * np.minimum(np.roll(close, 1), np.roll(close, -1)))
+        # Keep every other ear of a run of neighbouring ears.
+        idx = np.arange(len(ring))
+        run_start = np.maximum.accumulate(np.where(ear & ~np.r_[False, ear[:-1]], idx, 0))
+        take = ear & ((idx - run_start) % 2 == 0)
+        if take[0] and take[-1]:
+            take[-1] = False
+        out.append(np.column_stack((p[take], v[take], n[take])))
+        ring = ring[~take]
+    if stats is not None:
+        stats["ear_rounds"] += rounds
+        stats["ears_forced"] += forced
+    return np.concatenate(out) if out else np.zeros((0, 3), dtype=np.int64)
+
+def _edge_keys(a, b, nv):
+    return np.minimum(a, b) * nv + np.maximum(a, b)
+
+def _link_twins(tri, nv, twin, h):
+    # twin[] of the half-edges h (3 t + e runs from tri[t, e] to the next
+    # corner) paired among themselves; those without a partner in h keep theirs.
+    a = tri.ravel()[h]
+    b = tri[h // 3, (h % 3 + 1) % 3]
+    d = a * nv + b
+    order = np.argsort(d, kind="mergesort")
+    pos = np.minimum(np.searchsorted(d[order], b * nv + a), len(h) - 1)
+    hit = d[order][pos] == b * nv + a
+    twin[h[hit]] = h[order[pos[hit]]]
+
+def delaunay_flips(xy, tri, fixed_keys, max_edge=None, stats=None):
+    """Flip internal edges of a triangulation until every one is locally Delaunay.
+
+    tri is (k, 3) counter-clockwise and changed in place; edges whose
+    _edge_keys are in the sorted fixed_keys (the boundary) are never
+    flipped. With max_edge only edges where the old or the new diagonal is
+    shorter than that are. After the first round only the edges of
+    triangles changed by the last one are tested again. stats gets
+    flip_rounds and edge_flips.
+    """
+    nv = len(xy)
+    twin = np.full(3 * len(tri), -1, dtype=np.int64)
+    todo = np.arange(3 * len(tri))
+    if len(todo):
+        _link_twins(tri, nv, twin, todo)
+        # Flips only make new diagonals, so the boundary stays without twins.
+        twin[_member(_edge_keys(tri.ravel(), np.roll(tri, -1, axis=1).ravel(), nv), fixed_keys)] = -1
+    rounds = flips = 0
+    while len(todo) and rounds < FLIP_ROUNDS:
+        h1 = todo[twin[todo] >= 0]
+        h1 = np.unique(np.minimum(h1, twin[h1]))
+        h2 = twin[h1]
+        t1, e1, t2, e2 = h1 // 3, h1 % 3, h2 // 3, h2 % 3
+        ia, ib, ic, id_ = tri[t1, e1], tri[t1, (e1 + 1) % 3], tri[t1, (e1 + 2) % 3], tri[t2, (e2 + 2) % 3]
+        pa, pb, pc, pd = xy[ia], xy[ib], xy[ic], xy[id_]
+        bad = _in_circle(pa, pb, pc, pd) & (_cross(pa, pd, pc) > 0) & (_cross(pd, pb, pc) > 0)
+        if max_edge is not None:
+            bad &= np.minimum(np.hypot(*(pa - pb).T), np.hypot(*(pc - pd).T)) < max_edge
+        j = np.flatnonzero(bad)
+        if not len(j):
+            break
+        rounds += 1
+        # One flip per triangle: an edge goes when it is the first bad edge of both its triangles.
+        first = np.full(len(tri), len(j), dtype=np.int64)
+        np.minimum.at(first, t1[j], np.arange(len(j)))
+        np.minimum.at(first, t2[j], np.arange(len(j)))
+        j = j[(first[t1[j]] == np.arange(len(j))) & (first[t2[j]] == np.arange(len(j)))]
+        changed = np.concatenate((t1[j], t2[j]))
+        own = (3 * changed[:, None] + np.arange(3)).ravel()
+        around = twin[own]
+        tri[t1[j]] = np.column_stack((ia[j], id_[j], ic[j]))
+        tri[t2[j]] = np.column_stack((id_[j], ib[j], ic[j]))
+        twin[own] = -1
+        near = np.unique(np.concatenate((changed, around[around >= 0] // 3)))
+        _link_twins(tri, nv, twin, (3 * near[:, None] + np.arange(3)).ravel())
+        todo = own
+        flips += len(j)
+    if stats is not None:
+        stats["flip_rounds"] += rounds
+        stats["edge_flips"] += flips
+    return tri
+
+def _densify(xy, ring, spacing, base):
+    # ring with every edge longer than spacing cut into equal pieces; the
+    # new vertices get indices from base on. Returns (ring, new points).
+    a, b = xy[ring], xy[np.roll(ring, -1)]
+    k = np.maximum(np.ceil(np.hypot(*(b - a).T) / spacing), 1.0).astype(np.int64)
+    edge = np.repeat(np.arange(len(ring)), k)
+    j = np.arange(int(k.sum())) - np.repeat(np.cumsum(k) - k, k)
+    new = j > 0
+    pts = a[edge[new]] + (b - a)[edge[new]] * (j[new] / k[edge[new]].astype(np.float64))[:, None]
+    out = np.empty(len(edge), dtype=np.int64)
+    out[~new] = ring
+    out[new] = base + np.arange(len(pts))
+    return out, pts
+
+def triangulate(xy, offsets, hole, max_edge=None, spacing=None, stats=None):
+    """Constrained Delaunay triangles of one polygon: (xy, tri, boundary_keys, rings).
+
+    xy, offsets are its rings (closed or not) and hole flags each ring.
+    With spacing, ring edges longer than that get vertices in between,
+    appended to the xy returned. tri is (k, 3) counter-clockwise vertex
+    indices into it; rings are the vertex indices of every ring kept (flat
+    vertices dropped, outer rings counter-clockwise and holes clockwise)
+    and boundary_keys the sorted _edge_keys of their edges. max_edge is
+    passed on to delaunay_flips. stats gets triangles besides the
+    ear_clip and delaunay_flips counters.
+    """
+    rings = []
+    extra = []
+    base = len(xy)
+    for k in range(len(offsets) - 1):
+        ring = np.arange(offsets[k], offsets[k + 1])
+        if len(ring) > 1 and (xy[ring[0]] == xy[ring[-1]]).all():
+            ring = ring[:-1]
+        if len(ring) < 3:
+            continue
+        # Of repeated vertices the last one starts the next segment.
+        ring = _drop_flat(xy, ring[np.r_[(xy[ring[1:]] != xy[ring[:-1]]).any(axis=1), True]])
+        if len(ring) < 3 or _signed_area(xy, ring) == 0:
+            continue
+        area = _signed_area(xy, ring)
+        if (area < 0) != bool(hole[k]):
+            ring = ring[::-1]
+        if spacing:
+            ring, pts = _densify(xy, ring, spacing, base)
+            extra.append(pts)
+            base += len(pts)
+        rings.append((bool(hole[k]), abs(area), ring))
+    if extra:
+        xy = np.concatenate([xy] + extra)
+    outers = [r for h, _, r in rings if not h]
+    out_area = [a for h, a, _ in rings if not h]
+    merged = [[r] for r in outers]
+    for h, _, r in rings:
+        if not h or not outers:
+            continue
+        # The hole belongs to the smallest outer ring around it (tested from
+        # the middle of its first edge, as its vertices may touch one).
+        px, py = 0.5 * (xy[r[0]] + xy[r[1]])
+        best = None
+        for i, o in enumerate(outers):
+            a, b = xy[o], xy[np.roll(o, -1)]
+            crosses = (a[:, 1] > py) != (b[:, 1] > py)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                xc = a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+            if np.count_nonzero(crosses & (xc > px)) % 2 and (best is None or out_area[i] < out_area[best]):
+                best = i
+        if best is not None:
+            merged[best].append(r)
+    tris, keys = [], []
+    for group in merged:
+        ring = group[0]
+        for r in group:
+            keys.append(_edge_keys(r, np.roll(r, -1), len(xy)))
+        # Rightmost holes first, so a ray from a later hole can end on an earlier one.
+        for r in sorted(group[1:], key=lambda r: -xy[r, 0].max()):
+            ring = _bridge(xy, ring, r)
+        tris.append(ear_clip(xy, ring, max_edge, stats))
+    tri = np.concatenate(tris) if tris else np.zeros((0, 3), dtype=np.int64)
+    keys = np.unique(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+    tri = tri[_cross(xy[tri[:, 0]], xy[tri[:, 1]], xy[tri[:, 2]]) > 0]
+    tri = delaunay_flips(xy, tri, keys, max_edge, stats)
+    if stats is not None:
+        stats["triangles"] += len(tri)
+    return xy, tri, keys, [r for _h, _a, r in rings]
+
+def triangle_widths(xy, tri, boundary_keys, rings):
+    """Width of the polygon across every triangle (inf where it is no width).
+
+    rings and boundary_keys are those triangulate returns with tri.
+    """
+    nv = len(xy)
+    ring_of = np.full(nv, -1, dtype=np.int64)
+    along = np.zeros(nv)
+    perimeter = np.zeros(len(rings))
+    for k, r in enumerate(rings):
+        seg = np.hypot(*(xy[np.roll(r, -1)] - xy[r]).T)
+        ring_of[r] = k
+        along[r] = np.cumsum(seg) - seg
+        perimeter[k] = seg.sum()
+    a, b = tri, np.roll(tri, -1, axis=1)
+    length = np.hypot(*(xy[b] - xy[a]).transpose(2, 0, 1))
+    on_ring = _member(_edge_keys(a, b, nv), boundary_keys)
+    d = np.abs(along[a] - along[b])
+    path = np.minimum(d, perimeter[ring_of[a]] - d)
+    chord = ~on_ring & ((ring_of[a] != ring_of[b]) | (path >= CHORD_BEND * length))
+    n = chord.sum(axis=1)
+    width = np.full(len(tri), np.inf)
+    # Tip: the chord itself.
+    one = n == 1
+    width[one] = length[one][chord[one]]
+    # Sleeve: the vertex between both chords to the remaining ring edge.
+    two = np.flatnonzero(n == 2)
+    e = np.argmin(chord[two], axis=1)
+    ring_edge = on_ring[two, e]
+    width[two[~ring_edge]] = np.where(chord[two[~ring_edge]], length[two[~ring_edge]], 0.0).max(axis=1)
+    two, e = two[ring_edge], e[ring_edge]
+    p0, p1, q = xy[tri[two, e]], xy[tri[two, (e + 1) % 3]], xy[tri[two, (e + 2) % 3]]
+    dx, dy = p1[:, 0] - p0[:, 0], p1[:, 1] - p0[:, 1]
+    t = np.clip(((q[:, 0] - p0[:, 0]) * dx + (q[:, 1] - p0[:, 1]) * dy) / (dx * dx + dy * dy), 0.0, 1.0)
+    width[two] = np.hypot(q[:, 0] - p0[:, 0] - t * dx, q[:, 1] - p0[:, 1] - t * dy)
+    # Junction, and sleeves whose third edge only cuts off a bay: the widest chord.
+    three = n == 3
+    width[three] = length[three].max(axis=1)
+    # Inscribed circles; a ring that is one triangle is as wide as its own.
+    area = 0.5 * _cross(xy[tri[:, 0]], xy[tri[:, 1]], xy[tri[:, 2]])
+    inscribed = 4.0 * area / length.sum(axis=1)
+    alone = on_ring.all(axis=1)
+    width[alone] = inscribed[alone]
+    # Cap: two ring edges and no chord, the end of a strip or a corner. It
+    # is as wide as the triangle across its third edge, or as its inscribed
+    # circle if that is wider; two caps against each other (a polygon of
+    # two triangles) as the wider of their inscribed circles.
+    cap = np.flatnonzero((n == 0) & (on_ring.sum(axis=1) == 2))
+    if len(cap):
+        e = np.argmin(on_ring[cap], axis=1)
+        u, w = tri[cap, e], tri[cap, (e + 1) % 3]
+        # The neighbour's half-edge runs w -> u.
+        directed = a.ravel() * nv + b.ravel()
+        order = np.argsort(directed, kind="mergesort")
+        pos = np.minimum(np.searchsorted(directed[order], w * nv + u), len(order) - 1)
+        found = directed[order[pos]] == w * nv + u
+        nb = order[pos] // 3
+        across = np.where(found, width[nb], np.inf)
+        both = found & np.isinf(across) & (n[nb] == 0) & (on_ring[nb].sum(axis=1) == 2)
+        across[both] = inscribed[nb[both]]
+        width[cap] = np.maximum(across, inscribed[cap])
+    return width
+
+def merge_triangles(xy, tri):
+    """Rings around the union of triangles: (xy, ring_offsets), outer rings clockwise, rings closed."""
+    nv = len(xy)
+    a, b = tri.ravel(), np.roll(tri, -1, axis=1).ravel()
+    inner = _member(a * nv + b, np.sort(b * nv + a))
+    a, b = a[~inner], b[~inner]
+    out = {}
+    for u, w in zip(a.tolist(), b.tolist()):
+        out.setdefault(u, []).append(w)
+    rings, offsets = [], [0]
+    while out:
+        start = next(iter(out))
+        ring = [start]
+        cur = start
+        while True:
+            nxt = out[cur]
+            w = nxt.pop()
+            if not nxt:
+                del out[cur]
+            cur = w
+            if cur == start:
+                break
+            ring.append(cur)
+        # Counter-clockwise around the triangles; clockwise is the outer ring for arcpy.
+        pts = xy[ring[::-1] + ring[-1:]]
+        rings.append(pts)
+        offsets.append(offsets[-1] + len(pts))
+    if not rings:
+        return np.zeros((0, 2)), np.zeros(1, dtype=np.int64)
+    return np.concatenate(rings), np.array(offsets, dtype=np.int64)
+
+def _drop_small_parts(xy, tri, min_area):
+    # Parts are triangles joined by an edge; those under min_area are
+    # dropped. Returns (triangles kept, parts dropped).
+    nv = len(xy)
+    a, b = tri.ravel(), np.roll(tri, -1, axis=1).ravel()
+    d = a * nv + b
+    order = np.argsort(d, kind="mergesort")
+    pos = np.minimum(np.searchsorted(d[order], b * nv + a), len(d) - 1)
+    hit = np.flatnonzero(d[order][pos] == b * nv + a)
+    label = connected_components(len(tri), hit // 3, order[pos[hit]] // 3)
+    area = np.bincount(label, weights=0.5 * _cross(xy[tri[:, 0]], xy[tri[:, 1]], xy[tri[:, 2]]),
+                       minlength=len(tri))
+    small = (np.bincount(label, minlength=len(tri)) > 0) & (area < min_area)
+    return tri[~small[label]], int(small.sum())
+
+def triangulation_narrow_parts(store, width, min_area=0.0, flip_reach=FLIP_REACH, stats=None):
+    """Narrow parts of every polygon in a metric store: (parts, area_m2).
+
+    Triangles of each polygon narrower than width are merged into one
+    feature per polygon (oid and layer are the polygon's) once every part
+    (triangles joined by an edge) under min_area is dropped; area_m2 is
+    their area. Edges are flipped while a
+    diagonal is shorter than flip_reach * width (None: the whole
+    constrained Delaunay triangulation). stats gets the triangulate
+    counters, triangles_narrow and parts_below_min_area.
+    """
+    a_all, b_all, ring_all, _ = boundary_segments(store)
+    hole = _holes(store, a_all, b_all, ring_all)
+    max_edge = None if flip_reach is None else flip_reach * width
+    oids, layers, lines, areas = [], [], [], []
+    for f in range(len(store)):
+        p0, p1 = int(store.feature_offsets[f]), int(store.feature_offsets[f + 1])
+        if p1 == p0:
+            continue
+        v0, v1 = int(store.part_offsets[p0]), int(store.part_offsets[p1])
+        if v1 - v0 < 3:
+            continue
+        # Local coordinates keep the in-circle tests well inside float precision.
+        origin = store.xy[v0:v1].min(axis=0)
+        xy = store.xy[v0:v1] - origin
+        offsets = store.part_offsets[p0:p1 + 1] - v0
+        xy, tri, keys, rings = triangulate(xy, offsets, hole[p0:p1], max_edge, SPACING * width, stats)
+        if not len(tri):
+            continue
+        w = triangle_widths(xy, tri, keys, rings)
+        narrow = tri[w < width]
+        if stats is not None:
+            stats["triangles_narrow"] += len(narrow)
+        if not len(narrow):
+            continue
+        narrow, dropped = _drop_small_parts(xy, narrow, min_area)
+        if stats is not None:
+            stats["parts_below_min_area"] += dropped
+        if not len(narrow):
+            continue
+        area = 0.5 * float(_cross(xy[narrow[:, 0]], xy[narrow[:, 1]], xy[narrow[:, 2]]).sum())
+        rxy, roff = merge_triangles(xy, narrow)
+        oids.append(int(store.oid[f]))
+        layers.append(int(store.layer[f]))
+        lines.append((rxy + origin, roff))
+        areas.append(area)
+    parts = FeatureStore.from_lines(oids, lines, layers=layers, layer_names=store.layer_names)
+    return parts, np.array(areas, dtype=np.float64)
@@ -0,0 +1,87 @@
+#... TCPL quantized vertex index for the "endpoint snapped to a vertex" test
+
+import numpy as np
+
+# Cells are a hair wider than the tolerance so rounding in the quantization
+# can never push a vertex within tolerance outside the 3x3 neighbourhood.
+CELL_SLACK = 1.0 + 1e-6
+
+class VertexHash(object):
+    """Vertices bucketed into square cells of side ~eps.
+
+    xy is an (n, 2) array of vertex coordinates and owner an (n,) array with
+    the feature each vertex belongs to. Every vertex within eps of a point
+    lies in the 3x3 block of cells around it, so a lookup only touches those
+    nine cells (binary search over the sorted cell keys, no Python loop).
+    """
+
+    def __init__(self, xy, owner, eps):
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        self.eps = float(eps)
+        self.cell = self.eps * CELL_SLACK
+        if len(xy):
+            self.ox, self.oy = xy[:, 0].min(), xy[:, 1].min()
+        else:
+            self.ox = self.oy = 0.0
+        kx, ky = self._cells(xy[:, 0], xy[:, 1])
+        self.stride = int(ky.max()) + 3 if len(ky) else 3
+        key = (kx + 1) * self.stride + (ky + 1)
+        order = np.argsort(key, kind="mergesort")
+        self.keys = key[order]
+        self.xy = xy[order]
+        self.owner = np.asarray(owner, dtype=np.int64)[order]
+        self.vid = order
+
+    @classmethod
+    def from_lines(cls, lines, eps):
+        """Build from a list of (xy, offsets) tuples; owners are list positions."""
+        xy = [l[0] for l in lines]
+        owner = [np.full(len(l[0]), k, dtype=np.int64) for k, l in enumerate(lines)]
+        if not xy:
+            return cls(np.zeros((0, 2)), np.zeros(0, dtype=np.int64), eps)
+        return cls(np.concatenate(xy), np.concatenate(owner), eps)
+
+    def _cells(self, x, y):
+        kx = np.floor((np.asarray(x) - self.ox) / self.cell).astype(np.int64)
+        ky = np.floor((np.asarray(y) - self.oy) / self.cell).astype(np.int64)
+        return kx, ky
+
+    def _rows_near(self, x, y, eps):
+        kx, ky = self._cells(x, y)
+        rows = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cx, cy = int(kx) + dx, int(ky) + dy
+                if cx < -1 or cy < -1 or cy + 1 >= self.stride:
+                    continue
+                key = (cx + 1) * self.stride + (cy + 1)
+                lo = np.searchsorted(self.keys, key, side="left")
+                hi = np.searchsorted(self.keys, key, side="right")
+                if hi > lo:
+                    rows.append(np.arange(lo, hi))
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.concatenate(rows)
+        d = np.hypot(self.xy[rows, 0] - x, self.xy[rows, 1] - y)
+        return rows[d <= eps]
+
+    def _eps(self, eps):
+        if eps is None:
+            return self.eps
+        if eps > self.eps:
+            raise ValueError("eps %g is larger than the index tolerance %g" % (eps, self.eps))
+        return float(eps)
+
+    def within(self, x, y, eps=None):
+        """Original vertex ids within eps (default: the build tolerance) of (x, y)."""
+        eps = self._eps(eps)
+        return np.sort(self.vid[self._rows_near(x, y, eps)])
+
+    def owners_within(self, x, y, eps=None):
+        """Sorted unique owners with a vertex within eps of (x, y)."""
+        eps = self._eps(eps)
+        return np.unique(self.owner[self._rows_near(x, y, eps)])
+
+    def owner_has_vertex_within(self, x, y, owner, eps=None):
+        eps = self._eps(eps)
+        return bool((self.owner[self._rows_near(x, y, eps)] == owner).any())
@@ -0,0 +1,118 @@
+#... TCPL coordinate cache keys for file geodatabases (headless)
+#
+# The .gdb folders here are built by hand: a catalog table a00000001 in
+# the OpenFileGDB layout (ObjectID, Name, FileFormat) and placeholder
+# bytes for the other tables' files, which the key only hashes.
+
+import os, struct
+
+import numpy as np
+
+from tcpl_qc import synthetic
+from tcpl_qc.coord_cache import CoordCache, fingerprint, gdb_catalog, source_files
+
+CRS = "PROJCS[\"WGS_1984_UTM_Zone_48N\"]"
+
+def _varuint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        out.append(b | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+def _field(name, ftype, tail):
+    return struct.pack("<B", len(name)) + name.encode("utf-16-le") + b"\x00" + struct.pack("<B", ftype) + tail
+
+def write_catalog(gdb, names):
+    """Catalog listing names[i] as table i + 1 (None: a deleted row)."""
+    fields = (_field("ID", 6, b"\x04\x02") +
+              _field("Name", 4, struct.pack("<iB", 160, 0) + _varuint(0)) +
+              _field("FileFormat", 1, b"\x04\x00\x00"))
+    header = struct.pack("<iih", 4, 0, 3) + fields
+    body = struct.pack("<i", len(header)) + header
+    rows, offsets = b"", []
+    for name in names:
+        if name is None:
+            offsets.append(0)
+            continue
+        blob = _varuint(len(name.encode("utf-8"))) + name.encode("utf-8") + struct.pack("<i", 0)
+        offsets.append(40 + len(body) + len(rows))
+        rows += struct.pack("<i", len(blob)) + blob
+    size = 40 + len(body) + len(rows)
+    with open(os.path.join(gdb, "a00000001.gdbtable"), "wb") as fh:
+        fh.write(struct.pack("<iiiiiiqq", 3, sum(n is not None for n in names), 64, 5, 0, 0, size, 40) + body + rows)
+    blocks = (len(names) + 1023) // 1024
+    offsets += [0] * (blocks * 1024 - len(offsets))
+    with open(os.path.join(gdb, "a00000001.gdbtablx"), "wb") as fh:
+        fh.write(struct.pack("<4i", 3, blocks, len(names), 4) + struct.pack("<%di" % len(offsets), *offsets))
+
+def write_table(gdb, number, seed):
+    data = np.random.RandomState(seed).bytes(4096)
+    for ext in (".gdbtable", ".gdbtablx", ".spx"):
+        with open(os.path.join(gdb, "a%08x%s" % (number, ext)), "wb") as fh:
+            fh.write(data)
+
+SYSTEM = ["GDB_SystemCatalog", "GDB_DBTune", "GDB_SpatialRefs", "GDB_Items", "GDB_ItemTypes",
+          "GDB_ItemRelationships", "GDB_ItemRelationshipTypes", "GDB_ReplicaLog"]
+
+def make_gdb(tmpdir):
+    gdb = os.path.join(str(tmpdir), "data.gdb")
+    os.makedirs(gdb)
+    names = SYSTEM + [None, "Roads"]
+    write_catalog(gdb, names)
+    write_table(gdb, 10, 0)
+    return gdb, names
+
+def test_catalog_lists_tables_by_number(tmpdir):
+    gdb, names = make_gdb(tmpdir)
+    catalog = gdb_catalog(gdb)
+    assert catalog["roads"] == 10
+    assert catalog["gdb_systemcatalog"] == 1
+    assert None not in catalog and len(catalog) == 9
+
+def test_source_files_are_the_tables_own(tmpdir):
+    gdb, _ = make_gdb(tmpdir)
+    open(os.path.join(gdb, "a0000000a.HOST.1234.5678.sr.lock"), "w").close()
+    files = [os.path.basename(f) for f in source_files(os.path.join(gdb, "Roads"))]
+    assert files == ["a0000000a.gdbtable", "a0000000a.gdbtablx", "a0000000a.spx"]
+    # A feature dataset in between does not change the table looked up.
+    assert source_files(os.path.join(gdb, "Transport", "Roads")) == source_files(os.path.join(gdb, "Roads"))
+
+def test_warm_hit_after_output_written_into_same_gdb(tmpdir):
+    gdb, names = make_gdb(tmpdir)
+    src = os.path.join(gdb, "Roads")
+    store = synthetic.road_network(200)[0]
+    cache = CoordCache(os.path.join(str(tmpdir), "cache"))
+    key = fingerprint([src], [len(store)], CRS, "Road_checks_all")
+    assert key is not None and cache.get(key) is None
+    cache.put(key, store)
+
+    # The run writes its output table into the same .gdb while holding locks.
+    write_catalog(gdb, names + ["road_midpoint_less_200_midpts"])
+    write_table(gdb, 11, 1)
+    for f in ("_gdb.HOST.1234.5678.sr.lock", "a0000000a.HOST.1234.5678.sr.lock"):
+        open(os.path.join(gdb, f), "w").close()
+
+    assert fingerprint([src], [len(store)], CRS, "Road_checks_all") == key
+    stats = {"coord_cache_hits": 0, "coord_cache_misses": 0}
+    hit = cache.get(key, stats)
+    assert stats["coord_cache_hits"] == 1
+    assert np.array_equal(np.asarray(hit.xy), store.xy)
+
+def test_edit_to_source_table_changes_key(tmpdir):
+    gdb, _ = make_gdb(tmpdir)
+    src = os.path.join(gdb, "Roads")
+    key = fingerprint([src], [100], CRS)
+    write_table(gdb, 10, 2)
+    assert fingerprint([src], [100], CRS) != key
+
+def test_unreadable_catalog_hashes_whole_gdb_without_locks(tmpdir):
+    gdb, _ = make_gdb(tmpdir)
+    with open(os.path.join(gdb, "a00000001.gdbtablx"), "wb") as fh:
+        fh.write(b"\x00")
+    open(os.path.join(gdb, "_gdb.HOST.1234.5678.sr.lock"), "w").close()
+    files = [os.path.basename(f) for f in source_files(os.path.join(gdb, "Roads"))]
+    assert "a00000001.gdbtable" in files and "a0000000a.spx" in files
+    assert not [f for f in files if f.endswith(".lock")]
@@ -0,0 +1,67 @@
+#... TCPL grid hash broad phase against an all-pairs envelope loop (headless)
+
+import numpy as np
+
+from tcpl_qc.grid_hash import candidate_pairs
+
+def all_pairs(env, radius):
+    """Every i < j whose envelopes are within radius on both axes, the slow way."""
+    out = []
+    for i in range(len(env)):
+        for j in range(i + 1, len(env)):
+            dx = max(env[i, 0], env[j, 0]) - min(env[i, 2], env[j, 2])
+            dy = max(env[i, 1], env[j, 1]) - min(env[i, 3], env[j, 3])
+            if dx <= radius and dy <= radius:
+                out.append((i, j))
+    return out
+
+def random_envelopes(rng, n, radius):
+    # Coordinates on a 1/8 m grid, so gaps of exactly radius stay exact
+    # after padding. A third are points or small, a third up to a few cells
+    # across, and the rest sit exactly radius or 0 away from another one.
+    x0 = np.round(rng.uniform(-2000.0, 2000.0, n) * 8.0) / 8.0
+    y0 = np.round(rng.uniform(-2000.0, 2000.0, n) * 8.0) / 8.0
+    size = np.where(rng.rand(n, 2) < 0.5, np.round(rng.uniform(0.0, 20.0, (n, 2))),
+                    np.round(rng.uniform(0.0, 8.0 * radius, (n, 2))))
+    size[: n // 10] = 0.0
+    env = np.column_stack((x0, y0, x0 + size[:, 0], y0 + size[:, 1]))
+    for k in range(2 * n // 3, n):
+        other = env[rng.randint(0, 2 * n // 3)]
+        gap = radius if rng.rand() < 0.5 else 0.0
+        w, h = env[k, 2] - env[k, 0], env[k, 3] - env[k, 1]
+        # To the right of or above the other one, sharing a y or x start.
+        if rng.rand() < 0.5:
+            env[k] = (other[2] + gap, other[1], other[2] + gap + w, other[1] + h)
+        else:
+            env[k] = (other[0], other[3] + gap, other[0] + w, other[3] + gap + h)
+    return env
+
+def test_matches_all_pairs():
+    rng = np.random.RandomState(0)
+    for radius in (25.0, 100.0, 200.0):
+        env = random_envelopes(rng, 400, radius)
+        want = all_pairs(env, radius)
+        assert want
+        for cell in (None, radius / 2.0, 7.0 * radius):
+            I, J = candidate_pairs(env, radius, cell)
+            got = list(zip(I.tolist(), J.tolist()))
+            assert got == want
+            assert len(set(got)) == len(got)
+
+def test_touching_edges():
+    radius = 100.0
+    # Gaps of exactly radius on x, on y and on both (corner); one just over.
+    env = np.array([[0.0, 0.0, 50.0, 50.0],
+                    [150.0, 0.0, 200.0, 10.0],
+                    [0.0, 150.0, 10.0, 160.0],
+                    [150.0, 150.0, 160.0, 160.0],
+                    [-150.0001, 0.0, -100.0001, 50.0]])
+    I, J = candidate_pairs(env, radius)
+    got = list(zip(I.tolist(), J.tolist()))
+    assert got == all_pairs(env, radius)
+    assert (0, 1) in got and (0, 2) in got and (0, 3) in got and (0, 4) not in got
+
+def test_fewer_than_two():
+    for env in (np.zeros((0, 4)), np.array([[0.0, 0.0, 1.0, 1.0]])):
+        I, J = candidate_pairs(env, 10.0)
+        assert len(I) == len(J) == 0
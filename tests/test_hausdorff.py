@@ -0,0 +1,52 @@
+#... TCPL directed Hausdorff distance against dense sampling (headless)
+
+import numpy as np
+
+from tcpl_qc import hausdorff
+from tcpl_qc.hausdorff import directed_hausdorff, mutual_within
+from tcpl_qc.segments import point_segment_matrix, segments
+
+STEP = 0.05
+
+def sampled(a, b):
+    """Largest distance from points STEP apart along a to b: within STEP / 2 below the exact one."""
+    p0, p1 = segments(*a)
+    b0, b1 = segments(*b)
+    pts = []
+    for u, v in zip(p0, p1):
+        k = max(1, int(np.ceil(np.hypot(*(v - u)) / STEP)))
+        pts.append(u + (v - u) * (np.arange(k + 1) / float(k))[:, None])
+    return float(point_segment_matrix(np.concatenate(pts), b0, b1).min(axis=1).max())
+
+def random_line(rng, n, shift=0.0):
+    xy = np.cumsum(rng.normal(0.0, 30.0, (n, 2)), axis=0) + shift
+    return xy, np.array([0, n])
+
+def test_matches_dense_sampling(monkeypatch):
+    # Small chunks, so that most lines span several of them.
+    monkeypatch.setattr(hausdorff, "VERTEX_CHUNK", 7)
+    rng = np.random.RandomState(0)
+    for _ in range(60):
+        a = random_line(rng, rng.randint(2, 40))
+        b = random_line(rng, rng.randint(2, 40), rng.normal(0.0, 40.0, 2))
+        d, ref = directed_hausdorff(a, b), sampled(a, b)
+        assert ref - 1e-9 <= d <= ref + STEP / 2.0 + 1e-3
+
+def test_limit_decides_the_same_side(monkeypatch):
+    monkeypatch.setattr(hausdorff, "VERTEX_CHUNK", 5)
+    rng = np.random.RandomState(1)
+    for _ in range(60):
+        a = random_line(rng, rng.randint(2, 30))
+        b = random_line(rng, rng.randint(2, 30), rng.normal(0.0, 40.0, 2))
+        d = directed_hausdorff(a, b)
+        for limit in (10.0, 40.0, 80.0):
+            if abs(d - limit) > 2e-3:
+                assert (directed_hausdorff(a, b, limit=limit) <= limit) == (d <= limit)
+
+def test_long_parallel_lines():
+    t = np.linspace(0.0, 6000.0, 6000)
+    a = (np.column_stack((t, 10.0 * np.sin(t / 50.0))), np.array([0, 6000]))
+    b = (np.column_stack((t, 10.0 * np.sin(t / 50.0) + 30.0)), np.array([0, 6000]))
+    assert abs(directed_hausdorff(a, b) - 30.0) < 1e-3
+    assert mutual_within(a, b, 30.01) == (True, True)
+    assert mutual_within(a, b, 29.99) == (False, False)
@@ -0,0 +1,99 @@
+#... TCPL incremental road dangle re-check against a full near_not_snapped (headless)
+
+import os
+from collections import Counter
+
+import numpy as np
+
+from tcpl_qc import synthetic
+from tcpl_qc.checks import near_not_snapped
+from tcpl_qc.incremental import incremental_near_not_snapped
+from tcpl_qc.store import FeatureStore
+
+NEAR_TOL = 50.0
+VERTEX_EPS = 0.001
+
+def network(n=1500, seed=0):
+    store = synthetic.road_network(n, seed)[0]
+    return store.oid.tolist(), [(xy.copy(), off.copy()) for xy, off in store.lines()]
+
+def check(oids, lines, path, **kw):
+    """(incremental result, stats) after asserting it equals the full check."""
+    store = FeatureStore.from_lines(oids, lines)
+    stats = Counter()
+    got = incremental_near_not_snapped(store, kw.get("near_tol", NEAR_TOL), VERTEX_EPS, path, stats=stats)
+    assert got == near_not_snapped(store, kw.get("near_tol", NEAR_TOL), VERTEX_EPS)
+    return got, stats
+
+def test_modify_delete_insert_rounds(tmpdir):
+    path = os.path.join(str(tmpdir), "state.npz")
+    rng = np.random.RandomState(0)
+    oids, lines = network()
+    _, stats = check(oids, lines, path)
+    assert stats["incremental_full_runs"] == 1
+
+    # Modify: end vertices moved by up to 40 m, onto or off other roads.
+    for i in rng.choice(len(lines), 20, replace=False).tolist():
+        xy = lines[i][0].copy()
+        xy[-1 if i % 2 else 0] += rng.uniform(-40.0, 40.0, 2)
+        lines[i] = (xy, lines[i][1])
+    _, stats = check(oids, lines, path)
+    assert stats["features_modified"] == 20 and not stats["incremental_full_runs"]
+    # Only endpoints near the edits, not the 2 per feature of a full run.
+    assert 0 < stats["endpoints_rechecked"] < len(lines)
+
+    # Delete.
+    for i in sorted(rng.choice(len(lines), 20, replace=False).tolist(), reverse=True):
+        del oids[i], lines[i]
+    _, stats = check(oids, lines, path)
+    assert stats["features_deleted"] == 20 and stats["features_modified"] == 0
+
+    # Insert: shifted copies, new OIDs, ending next to existing roads.
+    next_oid = max(oids) + 1
+    for k, i in enumerate(rng.choice(len(lines), 20, replace=False).tolist()):
+        oids.append(next_oid + k)
+        lines.append((lines[i][0] + rng.uniform(-60.0, 60.0, 2), lines[i][1].copy()))
+    _, stats = check(oids, lines, path)
+    assert stats["features_inserted"] == 20 and not stats["incremental_full_runs"]
+
+    # No edits: nothing re-checked, same answer.
+    _, stats = check(oids, lines, path)
+    assert stats["endpoints_rechecked"] == 0 and stats["pairs_tested"] == 0
+
+def test_changed_tolerance_runs_full(tmpdir):
+    path = os.path.join(str(tmpdir), "state.npz")
+    oids, lines = network(500)
+    check(oids, lines, path)
+    _, stats = check(oids, lines, path, near_tol=NEAR_TOL / 2.0)
+    assert stats["incremental_full_runs"] == 1 and stats["endpoints_rechecked"] == 0
+    # The state now holds the new tolerance.
+    _, stats = check(oids, lines, path, near_tol=NEAR_TOL / 2.0)
+    assert not stats["incremental_full_runs"]
+
+def test_missing_or_corrupt_state_runs_full(tmpdir):
+    path = os.path.join(str(tmpdir), "state.npz")
+    oids, lines = network(500)
+    _, stats = check(oids, lines, path)
+    assert stats["incremental_full_runs"] == 1
+    with open(path, "rb") as f:
+        data = f.read()
+    for bad in (b"not a state", data[:len(data) // 2], b""):
+        with open(path, "wb") as f:
+            f.write(bad)
+        _, stats = check(oids, lines, path)
+        assert stats["incremental_full_runs"] == 1
+    # A state without some of its arrays.
+    with open(path, "wb") as f:
+        np.savez(f, oid=np.arange(3))
+    _, stats = check(oids, lines, path)
+    assert stats["incremental_full_runs"] == 1
+
+def test_duplicate_keys_run_full(tmpdir):
+    path = os.path.join(str(tmpdir), "state.npz")
+    oids, lines = network(500)
+    check(oids, lines, path)
+    oids[1] = oids[0]
+    _, stats = check(oids, lines, path)
+    assert stats["incremental_full_runs"] == 1
+    _, stats = check(oids, lines, path)
+    assert stats["incremental_full_runs"] == 1
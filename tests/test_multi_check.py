@@ -0,0 +1,23 @@
+#... TCPL shared multi-check engine against the single checks (headless)
+
+import numpy as np
+
+from tcpl_qc import synthetic
+from tcpl_qc.checks import midpoint_check, midpoints
+from tcpl_qc.multi_check import CHECKS, SharedChecks, run_checks
+
+def test_midpoints_shared_with_the_check():
+    store = synthetic.road_network(1500, 0)[0]
+    shared = SharedChecks(store, names=["midpoint_200"])
+    index = shared.run("midpoint_200")
+    assert index == midpoint_check(store, CHECKS["midpoint_200"][1]["radius"])
+    # Built once by the check; the _midpts output writes all of them.
+    assert len(index) and shared.mids() is shared.mids()
+    assert np.array_equal(shared.mids(), midpoints(store))
+
+def test_run_checks_matches_single_checks():
+    store = synthetic.road_network(1500, 0)[0]
+    names = ["gap_200", "gap_300", "snap_50", "midpoint_200"]
+    together = run_checks(store, names)
+    for name in names:
+        assert together[name] == SharedChecks(store, names=[name]).run(name)
@@ -0,0 +1,71 @@
+#... TCPL opening windows hold everything the opening removes; raster opening parts (headless)
+
+from collections import Counter
+
+import numpy as np
+
+from tcpl_qc.opening_windows import window_boxes
+from tcpl_qc.raster_opening import _grid, box_mask, narrow_mask, rasterize, raster_narrow_parts
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.synthetic import polygon_layer
+
+RADIUS = 25.0
+TOL = 0.001
+CELL = 1.0
+
+def polygons(shapes):
+    """Store of polygons given as lists of rings (outer clockwise, holes counter-clockwise)."""
+    lines = []
+    for rings in shapes:
+        closed = [np.array(r + r[:1], dtype=np.float64) for r in rings]
+        lines.append((np.vstack(closed), np.cumsum([0] + [len(r) for r in closed])))
+    return FeatureStore.from_lines(np.arange(len(shapes)), lines)
+
+# Square with a hole 30 m off its bottom side, a 20 degree spike on the
+# right and a sharp notch cut into the top.
+HOLED_SPIKY = polygons([[
+    [(0, 0), (0, 300), (140, 300), (150, 200), (160, 300), (300, 300), (300, 160), (480, 150), (300, 140),
+     (300, 0)],
+    [(60, 30), (240, 30), (240, 240), (60, 240)],
+]])
+
+def loss_outside_boxes(store):
+    """Per polygon: (cells the opening removes, of those the ones outside every window box)."""
+    owner, boxes = window_boxes(store, RADIUS, TOL)
+    out = []
+    for f in range(len(store)):
+        xy, offsets = store.line(f)
+        x0, y0, cell, nx, ny = _grid(store.env[f], RADIUS, CELL, 4000000)
+        narrow = narrow_mask(rasterize(xy, offsets, x0, y0, cell, nx, ny), RADIUS / cell)
+        outside = narrow & ~box_mask(boxes[owner == f], x0, y0, cell, nx, ny)
+        out.append((int(narrow.sum()), int(outside.sum())))
+    return out
+
+def test_dumbbell_loses_nothing_outside_the_boxes():
+    store, _truth = polygon_layer(12, seed=3)
+    for lost, outside in loss_outside_boxes(store):
+        # Right-angle corners lose a little to the opening even where the neck is wide.
+        assert lost > 0 and outside == 0
+
+def test_hole_and_sharp_corners_lose_nothing_outside_the_boxes():
+    [(lost, outside)] = loss_outside_boxes(HOLED_SPIKY)
+    assert lost > 0 and outside == 0
+
+def test_windowed_raster_opening_matches_the_whole_grid():
+    store, _truth = polygon_layer(12, seed=3)
+    for s in (store, HOLED_SPIKY):
+        windows = window_boxes(s, RADIUS, TOL)
+        whole, whole_areas = raster_narrow_parts(s, RADIUS, CELL)
+        windowed, windowed_areas = raster_narrow_parts(s, RADIUS, CELL, windows=windows)
+        assert whole.oid.tolist() == windowed.oid.tolist()
+        assert np.allclose(whole_areas, windowed_areas)
+
+def test_raster_drops_small_parts_one_by_one():
+    # One polygon of two rings: a 300 x 10 m strip and a 3 x 2 m sliver.
+    store = polygons([[[(0, 0), (0, 10), (300, 10), (300, 0)], [(0, 50), (0, 52), (3, 52), (3, 50)]]])
+    for windows in (None, window_boxes(store, RADIUS, TOL)):
+        stats = Counter()
+        parts, areas = raster_narrow_parts(store, RADIUS, CELL, min_area=10.0, windows=windows, stats=stats)
+        assert parts.oid.tolist() == [0]
+        assert np.allclose(areas, [3000.0])
+        assert stats["parts_below_min_area"] == 1
@@ -0,0 +1,53 @@
+#... TCPL part areas and connected components against slow references (headless)
+
+import numpy as np
+
+from tcpl_qc.segments import connected_components, part_areas
+
+def square(x, y, side, clockwise):
+    ring = [(x, y), (x, y + side), (x + side, y + side), (x + side, y)]
+    return ring if clockwise else ring[::-1]
+
+def test_part_areas_with_holes_and_several_parts():
+    # UTM-sized coordinates; outer rings clockwise, holes counter-clockwise,
+    # some rings closed and some not.
+    x, y = 512345.0, 5432109.0
+    rings = [
+        (0, square(x, y, 100.0, True), True),                  # part 0: 100 x 100 ...
+        (0, square(x + 10, y + 10, 20.0, False), False),        # ... less a 20 x 20 hole
+        (0, square(x + 50, y + 50, 30.0, False), True),         # ... and a 30 x 30 one
+        (1, [(x + 200, y), (x + 200, y + 10), (x + 210, y)], False),   # part 1: triangle
+        (2, square(x + 300, y, 50.0, True), False),             # part 2: 50 x 50, no hole
+    ]
+    pts, offsets, part_of = [], [0], []
+    for part, ring, closed in rings:
+        pts.extend(ring + ring[:1] if closed else ring)
+        offsets.append(len(pts))
+        part_of.append(part)
+    xy = np.array(pts, dtype=np.float64)
+    offsets, part_of = np.array(offsets), np.array(part_of)
+    want = [100.0 ** 2 - 20.0 ** 2 - 30.0 ** 2, 50.0, 50.0 ** 2]
+    assert np.allclose(part_areas(xy, offsets, part_of), want, rtol=0, atol=1e-6)
+    # n_parts keeps parts without rings, as with an empty part at the end.
+    assert np.allclose(part_areas(xy, offsets, part_of, 4), want + [0.0], rtol=0, atol=1e-6)
+
+def test_connected_components_match_a_union_find():
+    rng = np.random.RandomState(7)
+    for _ in range(100):
+        n = rng.randint(1, 50)
+        m = rng.randint(0, 70)
+        s, t = rng.randint(0, n, m), rng.randint(0, n, m)
+        root = list(range(n))
+
+        def find(i):
+            while root[i] != i:
+                i = root[i]
+            return i
+
+        for i, j in zip(s.tolist(), t.tolist()):
+            a, b = find(i), find(j)
+            root[max(a, b)] = min(a, b)
+        assert connected_components(n, s, t).tolist() == [find(i) for i in range(n)]
+    # A long chain given from its far end.
+    n = 10000
+    assert (connected_components(n, np.arange(n - 1)[::-1], np.arange(1, n)[::-1]) == 0).all()
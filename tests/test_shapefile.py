@@ -0,0 +1,50 @@
+#... TCPL NumPy shapefile writer: numeric fields and shape types (headless)
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from tcpl_qc.shapefile import field_specs, read_dbf, read_shapefile, write_points, write_shp
+
+def test_large_and_negative_floats_round_trip(tmpdir):
+    path = os.path.join(str(tmpdir), "pts.shp")
+    cols = OrderedDict([("area_m2", np.array([1.5, 2.5e7, 0.125])),
+                        ("easting", np.array([-2.5e6, 612345.678901, np.nan])),
+                        ("northing", np.array([5512345.123456789, 1e16, -3.0])),
+                        ("small", np.array([1e-9, -0.5, 7.0])),
+                        ("huge", np.array([1e20, -3.5e18, 1.0]))])
+    write_points(path, [0.0, 1.0, 2.0], [0.0, 1.0, 2.0], columns=cols)
+    specs = dict((s[0], s) for s in field_specs(cols))
+    assert specs["small"] == ("small", "N", 19, 11)
+    assert specs["area_m2"] == ("area_m2", "N", 19, 10)
+    assert specs["easting"][1:3] == ("N", 19) and specs["northing"][1:3] == ("N", 19)
+    assert specs["huge"][1] == "F"
+    back = read_dbf(os.path.splitext(path)[0] + ".dbf")
+    for name, col in cols.items():
+        ftype, _, decimals = specs[name][1:]
+        # N rounds to its decimals, F keeps 12 significant digits.
+        tol = 0.5 * 10.0 ** -decimals if ftype == "N" else 1e-11 * np.abs(col)
+        assert np.array_equal(np.isnan(back[name]), np.isnan(col))
+        live = ~np.isnan(col)
+        assert (np.abs(back[name] - col)[live] <= (tol[live] if ftype == "F" else tol)).all(), name
+
+def test_explicit_spec_too_narrow_still_raises(tmpdir):
+    with pytest.raises(ValueError):
+        write_points(os.path.join(str(tmpdir), "p.shp"), [0.0], [0.0],
+                     columns=OrderedDict([("v", np.array([2.5e7]))]), fields=[("v", "N", 10, 4)])
+
+def test_points_read_back(tmpdir):
+    path = os.path.join(str(tmpdir), "p.shp")
+    write_points(path, [500000.0, -1.0], [4427757.25, 2.0], columns=OrderedDict([("id", np.array([3, 4]))]))
+    store, columns = read_shapefile(path)
+    assert np.array_equal(store.xy, [[500000.0, 4427757.25], [-1.0, 2.0]])
+    assert columns["id"].tolist() == [3, 4]
+
+@pytest.mark.parametrize("shape_type", [11, 13, 15, 21, 23, 25, 8])
+def test_z_and_m_types_rejected(tmpdir, shape_type):
+    offsets = np.array([0, 2])
+    with pytest.raises(ValueError):
+        write_shp(os.path.join(str(tmpdir), "zm.shp"), shape_type, np.zeros((2, 2)), offsets, np.array([0, 1]))
+    assert not os.path.exists(os.path.join(str(tmpdir), "zm.shp"))
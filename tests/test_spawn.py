@@ -0,0 +1,81 @@
+#... TCPL worker processes started afresh (tcpl_qc.spawn, tcpl_qc.layer_pool without fork)
+
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from tcpl_qc import checks, endpoint_pool, layer_pool, synthetic, tiling
+from tcpl_qc.instrument import RunRecord
+from tcpl_qc.spawn import spawn_map
+from tcpl_qc.store import FeatureStore
+
+run = RunRecord("test_spawn.py")
+_offset = []
+
+def set_offset(k):
+    _offset.append(k)
+
+def shifted(x):
+    return x + _offset[0]
+
+def fails(x):
+    raise ValueError("job %d" % x)
+
+def layer(xy, label):
+    with run.stage("%s opening" % label):
+        run.count("vertices", len(xy))
+    return label, float(np.asarray(xy).sum())
+
+def test_results_in_job_order_after_initializer():
+    assert spawn_map(shifted, range(7), 3, set_offset, (100,)) == list(range(100, 107))
+
+def test_failing_worker_raises():
+    with pytest.raises(RuntimeError, match="job"):
+        spawn_map(fails, [1, 2], 2)
+
+def test_layer_pool_without_fork_matches_serial(monkeypatch):
+    rng = np.random.RandomState(0)
+    jobs = [(rng.normal(size=(n, 2)), "layer%d" % n) for n in (5, 9, 2, 7)]
+    want = [layer(*job) for job in jobs]
+    monkeypatch.setattr(layer_pool, "can_fork", lambda: False)
+    run.stages, run.counters = [], Counter()
+    got = layer_pool.map_layers(layer, jobs, 3, run)
+    assert got == want
+    assert run.counters["layer_workers"] == 3 and run.counters["vertices"] == 23
+    assert [s["name"] for s in run.stages] == ["layer5 opening", "layer9 opening", "layer2 opening", "layer7 opening"]
+
+def test_gap_tiles_without_fork_match_serial(monkeypatch):
+    store = synthetic.road_network(2000, 0)[0]
+    monkeypatch.setattr(tiling, "can_fork", lambda: False)
+    stats = Counter()
+    assert tiling.parallel_gap_check(store, 200.001, workers=2, stats=stats) == checks.gap_check(store, 200.001)
+    assert stats["gap_workers"] == 2
+
+def test_endpoint_workers_without_fork_match_serial(monkeypatch):
+    pytest.importorskip("multiprocessing.shared_memory")
+    rivers = synthetic.river_network(600, 0)[0]
+    roads = synthetic.road_network(600, 0)[0]
+    want = (checks.river_dangles(rivers, 50.0, 0.2, 0.2, 15.0), checks.snap_check(roads, 50.0, 0.2),
+            checks.near_not_snapped(roads, 50.0, 0.2))
+    monkeypatch.setattr(endpoint_pool, "can_fork", lambda: False)
+    got = (endpoint_pool.parallel_river_dangles(rivers, 50.0, 0.2, 0.2, 15.0, workers=2),
+           endpoint_pool.parallel_snap_check(roads, 50.0, 0.2, workers=2),
+           endpoint_pool.parallel_near_not_snapped(roads, 50.0, 0.2, workers=2))
+    assert got == want and want[0] and want[1]
+
+def test_endpoint_workers_count_pruned_pairs_as_serial(monkeypatch):
+    pytest.importorskip("multiprocessing.shared_memory")
+    roads = synthetic.road_network(300, 0)[0]
+    # Features without vertices are not in the index and not pairs that could be pruned.
+    lines = [roads.line(i) for i in range(len(roads))] + [(np.zeros((0, 2)), np.array([0]))] * 3
+    store = FeatureStore.from_lines(list(range(len(lines))), lines)
+    want, got = Counter(), Counter()
+    checks.snap_check(store, 50.0, 0.2, stats=want)
+    checks.near_not_snapped(store, 50.0, 0.2, stats=want)
+    monkeypatch.setattr(endpoint_pool, "can_fork", lambda: False)
+    endpoint_pool.parallel_snap_check(store, 50.0, 0.2, workers=2, stats=got)
+    endpoint_pool.parallel_near_not_snapped(store, 50.0, 0.2, workers=2, stats=got)
+    assert got == want and want["pairs_pruned"] > 0
+    ends = len(checks.feature_endpoints(store))
+    assert want["pairs_tested"] + want["pairs_pruned"] == 2 * ends * (len(roads) - 1)
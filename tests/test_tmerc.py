@@ -0,0 +1,49 @@
+#... TCPL batch transverse Mercator against published UTM coordinates (headless)
+
+import numpy as np
+
+from tcpl_qc.tmerc import central_meridian, project_lines, utm_forward, utm_inverse
+
+MM = 1e-3
+
+def test_known_points():
+    # 75 W 40 N is on the zone 18 central meridian: N = k0 * meridian arc.
+    x, y = utm_forward(-75.0, 40.0, 18)
+    assert abs(x - 500000.0) < MM and abs(y - 4427757.219) < MM
+    # Sydney, 151.2093 E 33.8688 S, zone 56 south.
+    x, y = utm_forward(151.2093, -33.8688, 56, south=True)
+    assert abs(x - 334368.634) < MM and abs(y - 6250948.345) < MM
+    # The equator on a central meridian: the false origin of either hemisphere.
+    x, y = utm_forward(3.0, 0.0, 31, south=True)
+    assert abs(x - 500000.0) < MM and abs(y - 10000000.0) < MM
+
+def test_zone_edge_is_symmetric():
+    # 72 W is the edge between zones 18 and 19: the same northing, eastings mirrored about 500 km.
+    lat = np.linspace(-80.0, 84.0, 50)
+    x18, y18 = utm_forward(np.full(50, -72.0), lat, 18, south=False)
+    x19, y19 = utm_forward(np.full(50, -72.0), lat, 19, south=False)
+    assert np.allclose(x18 - 500000.0, 500000.0 - x19, rtol=0.0, atol=MM)
+    assert np.allclose(y18, y19, rtol=0.0, atol=MM)
+
+def test_round_trip_at_zone_edge():
+    rng = np.random.RandomState(0)
+    for zone, south in ((18, False), (56, True), (1, False), (60, True)):
+        cm = central_meridian(zone)
+        # At the zone edge and half a degree past it, where layers spill over.
+        lon = cm + rng.choice([-3.5, -3.0, 3.0, 3.5], 200) + rng.uniform(-0.01, 0.01, 200)
+        lat = rng.uniform(0.0, 84.0, 200) * (-1.0 if south else 1.0)
+        x, y = utm_forward(lon, lat, zone, south)
+        lon2, lat2 = utm_inverse(x, y, zone, south)
+        # Zones 1 and 60 wrap at the antimeridian.
+        dlon = (lon2 - lon + 180.0) % 360.0 - 180.0
+        assert np.abs(dlon).max() < 1e-9 and np.abs(lat2 - lat).max() < 1e-9
+
+def test_project_lines_keeps_line_layout():
+    lines = [(np.array([[-75.0, 40.0], [-74.9, 40.1]]), np.array([0, 2])),
+             (np.array([[-75.2, 39.9], [-75.1, 40.0], [-75.0, 40.2]]), np.array([0, 1, 3]))]
+    out = project_lines(lines, 18)
+    assert [len(xy) for xy, _ in out] == [2, 3]
+    assert out[1][1] is lines[1][1]
+    back = project_lines(out, 18, inverse=True)
+    for (xy, _), (xy2, _) in zip(lines, back):
+        assert np.abs(xy2 - xy).max() < 1e-9
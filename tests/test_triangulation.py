@@ -0,0 +1,74 @@
+#... TCPL triangulation widths: cover, exact strip areas, no false narrow parts (headless)
+
+from collections import Counter
+
+import numpy as np
+
+from tcpl_qc.opening_windows import _holes, boundary_segments
+from tcpl_qc.store import FeatureStore
+from tcpl_qc.triangulation import SPACING, _cross, _signed_area, triangulate, triangulation_narrow_parts
+
+WIDTH = 50.0
+
+def polygons(*shapes, **kw):
+    """Store of polygons given as lists of rings (outer clockwise, holes counter-clockwise), turned by angle."""
+    a = np.radians(kw.get("angle", 0.0))
+    rot = np.array([[np.cos(a), np.sin(a)], [-np.sin(a), np.cos(a)]])
+    lines = []
+    for k, rings in enumerate(shapes):
+        closed = [np.array(r + r[:1], dtype=np.float64) for r in rings]
+        offsets = np.cumsum([0] + [len(r) for r in closed])
+        lines.append((np.vstack(closed).dot(rot) + (500000.0 + 1000.0 * k, 5500000.0), offsets))
+    return FeatureStore.from_lines(np.arange(len(shapes)), lines)
+
+SQUARE = [(0, 0), (0, 300), (300, 300), (300, 0)]
+STRIP = [(0, 0), (0, 10), (300, 10), (300, 0)]
+L_CORRIDOR = [(0, 0), (0, 200), (20, 200), (20, 20), (200, 20), (200, 0)]
+SQUARE_HOLE = [(60, 30), (240, 30), (240, 240), (60, 240)]
+TOUCHING_HOLE = [(150, 0), (220, 120), (80, 120)]
+
+def test_triangles_cover_the_polygon():
+    store = polygons([SQUARE], [STRIP], [L_CORRIDOR], [SQUARE, SQUARE_HOLE], [SQUARE, TOUCHING_HOLE], angle=17.0)
+    a, b, ring, _ = boundary_segments(store)
+    hole = _holes(store, a, b, ring)
+    assert hole.tolist() == [False, False, False, False, True, False, True]
+    for f in range(len(store)):
+        p0, p1 = int(store.feature_offsets[f]), int(store.feature_offsets[f + 1])
+        xy, offsets = store.line(f)
+        xy = xy - xy.min(axis=0)
+        for max_edge in (None, 2.0 * WIDTH):
+            txy, tri, _keys, _rings = triangulate(xy, offsets, hole[p0:p1], max_edge, SPACING * WIDTH)
+            area = 0.5 * _cross(txy[tri[:, 0]], txy[tri[:, 1]], txy[tri[:, 2]])
+            want = sum(abs(_signed_area(xy, np.arange(offsets[k], offsets[k + 1]))) * (-1.0 if hole[p0 + k] else 1.0)
+                       for k in range(len(offsets) - 1))
+            assert (area > 0).all()
+            assert abs(float(area.sum()) - want) < 1e-6 * want
+
+def test_strip_and_corridor_flagged_with_exact_area():
+    for angle in (0.0, 33.0):
+        store = polygons([STRIP], [L_CORRIDOR], angle=angle)
+        parts, areas = triangulation_narrow_parts(store, WIDTH, min_area=10.0)
+        assert parts.oid.tolist() == [0, 1]
+        assert np.allclose(areas, [300.0 * 10.0, (2 * 200.0 - 20.0) * 20.0], rtol=1e-9)
+
+def test_wide_square_has_no_narrow_part():
+    store = polygons([SQUARE], angle=20.0)
+    parts, areas = triangulation_narrow_parts(store, WIDTH, min_area=10.0)
+    assert len(parts) == 0 and len(areas) == 0
+
+def test_gap_between_hole_and_side_is_narrow():
+    # 30 m between the hole and the bottom side; every other gap is 60 m.
+    store = polygons([SQUARE, SQUARE_HOLE], [SQUARE, TOUCHING_HOLE])
+    parts, areas = triangulation_narrow_parts(store, WIDTH, min_area=10.0)
+    assert parts.oid.tolist() == [0, 1]
+    assert (areas > 10.0).all()
+
+def test_small_parts_dropped_one_by_one():
+    # One polygon of two rings: a 300 x 10 m strip and a 3 x 2 m sliver,
+    # narrow as a whole and both far above and below min_area.
+    store = polygons([STRIP, [(0, 50), (0, 52), (3, 52), (3, 50)]])
+    stats = Counter()
+    parts, areas = triangulation_narrow_parts(store, WIDTH, min_area=10.0, stats=stats)
+    assert parts.oid.tolist() == [0]
+    assert np.allclose(areas, [3000.0], rtol=1e-9)
+    assert stats["parts_below_min_area"] == 1